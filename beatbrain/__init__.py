@@ -1 +1,3 @@
-from . import datasets, helpers, models, utils
+# Subpackages aren't imported here, so that lightweight modules (like `beatbrain.runtime`) can be
+# used without importing PyTorch Lightning, torchvision, librosa, etc.
+# Import them explicitly instead, e.g. `from beatbrain import models`.
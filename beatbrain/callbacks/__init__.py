@@ -0,0 +1,7 @@
+"""
+PyTorch Lightning callbacks
+"""
+from .throughput import ThroughputMonitor
+from .precision import PrecisionCallback
+from .tracing import TracingCallback
+from .visualization import VisualizationCallback
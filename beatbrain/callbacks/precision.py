@@ -0,0 +1,43 @@
+from pytorch_lightning.callbacks import Callback
+
+from ..models.precision import autocast, get_autocast_dtype, get_memory_format
+from ..utils import registry
+
+
+@registry.register("callback", "PrecisionCallback")
+class PrecisionCallback(Callback):
+    def __init__(self, precision=32, memory_format="contiguous"):
+        """
+        Switches a model to a lower-precision and/or channels-last training mode.
+
+        Sets `autocast_dtype` and `memory_format` on the LightningModule (which its `training_step`/`validation_step`
+        use to autocast and lay out inputs) and converts the module's weights to `memory_format`.
+
+        Args:
+            precision: `32` for full precision, or `"bf16"` for bfloat16 autocasting on CPU
+            memory_format (str): Either `"contiguous"` (NCHW) or `"channels_last"` (NHWC)
+        """
+        super().__init__()
+        self.autocast_dtype = get_autocast_dtype(precision)
+        self.memory_format = get_memory_format(memory_format)
+        # Fail at configuration time rather than at the first training step
+        autocast(self.autocast_dtype)
+
+    def _configure(self, pl_module):
+        pl_module.autocast_dtype = self.autocast_dtype
+        if getattr(pl_module, "memory_format", None) != self.memory_format:
+            pl_module.memory_format = self.memory_format
+            pl_module.to(memory_format=self.memory_format)
+
+    # Validation sanity checks run before training starts, so configure the module at whichever comes first
+    def on_sanity_check_start(self, trainer, pl_module):
+        self._configure(pl_module)
+
+    def on_train_start(self, trainer, pl_module):
+        self._configure(pl_module)
+
+    def on_validation_start(self, trainer, pl_module):
+        self._configure(pl_module)
+
+    def on_test_start(self, trainer, pl_module):
+        self._configure(pl_module)
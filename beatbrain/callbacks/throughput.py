@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import resource
+import functools
+from pathlib import Path
+from collections import deque
+
+import numpy as np
+import torch
+from pytorch_lightning.callbacks import Callback
+
+from ..utils import registry
+
+# Module methods wrapped to time each phase of a training step. A method's time excludes the time spent in other timed
+# methods that it calls (newer Lightning versions run `training_step` and `backward` inside `optimizer_step`).
+TIMED_METHODS = {
+    "training_step": "forward",
+    "backward": "backward",
+    "optimizer_step": "optimizer",
+}
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of the current process (in MB)
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def _batch_size(batch):
+    if isinstance(batch, torch.Tensor):
+        return len(batch)
+    if isinstance(batch, (list, tuple)) and batch:
+        return _batch_size(batch[0])
+    if isinstance(batch, dict) and batch:
+        return _batch_size(next(iter(batch.values())))
+    return 0
+
+
+@registry.register("callback", "ThroughputMonitor")
+class ThroughputMonitor(Callback):
+    STAGES = ["data_wait", "forward", "backward", "optimizer", "step"]
+
+    def __init__(self, log_every_n_steps=50, window=None, report_path=None):
+        """
+        Measures where training time goes: waiting on the DataLoader vs. the forward pass, backward pass and optimizer step.
+
+        Every `log_every_n_steps` training steps, rolling means over the last `window` steps are sent to the trainer's loggers.
+        When training ends, a JSON report with per-stage statistics, overall samples/sec and peak RSS is written to `report_path`.
+
+        Args:
+            log_every_n_steps (int): How often to log rolling summaries
+            window (int): The number of most recent steps to summarize. Defaults to `log_every_n_steps`.
+            report_path: Where to write the final JSON report. Defaults to `throughput.json` in the trainer's weights save path.
+        """
+        super().__init__()
+        self.log_every_n_steps = log_every_n_steps
+        self.window = window or log_every_n_steps
+        self.report_path = report_path
+        self.times = {stage: [] for stage in self.STAGES}
+        self.recent = {stage: deque(maxlen=self.window) for stage in self.STAGES}
+        self.recent_samples = deque(maxlen=self.window)
+        self.num_samples = 0
+        self.train_time = 0.0
+        # Newer Lightning versions run a sanity check validation before the first training epoch starts
+        self._validation_time = 0.0
+        # The time spent in nested timed calls, for each timed call in progress
+        self._nested_times = []
+
+    def _wrap(self, pl_module, name, stage):
+        method = getattr(pl_module, name)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            self._nested_times.append(0.0)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self._current[stage] += elapsed - self._nested_times.pop()
+                if self._nested_times:
+                    self._nested_times[-1] += elapsed
+                if stage == "forward":
+                    self._current_samples = max(
+                        self._current_samples,
+                        _batch_size(args[0] if args else kwargs.get("batch")),
+                    )
+
+        setattr(pl_module, name, timed)
+
+    def on_train_start(self, trainer, pl_module):
+        for name, stage in TIMED_METHODS.items():
+            self._wrap(pl_module, name, stage)
+        self._train_start = time.perf_counter()
+
+    def on_train_epoch_start(self, trainer, pl_module, *args):
+        self._last_batch_end = time.perf_counter()
+        self._validation_time = 0.0
+
+    def on_epoch_start(self, trainer, pl_module):
+        # Newer Lightning versions also call this before validation epochs, but older ones only have this hook
+        if not hasattr(Callback, "on_train_epoch_start"):
+            self.on_train_epoch_start(trainer, pl_module)
+
+    def on_validation_start(self, trainer, pl_module):
+        self._validation_start = time.perf_counter()
+
+    def on_validation_end(self, trainer, pl_module):
+        self._validation_time += time.perf_counter() - self._validation_start
+
+    def on_batch_start(self, trainer, pl_module):
+        self._batch_start = time.perf_counter()
+        # Validation runs between training batches, so it mustn't be counted as time spent waiting for data
+        data_wait = self._batch_start - self._last_batch_end - self._validation_time
+        self._validation_time = 0.0
+        self._current = {stage: 0.0 for stage in self.STAGES}
+        self._current["data_wait"] = max(data_wait, 0.0)
+        self._current_samples = 0
+
+    def on_batch_end(self, trainer, pl_module):
+        self._last_batch_end = time.perf_counter()
+        self._current["step"] = self._last_batch_end - self._batch_start
+        for stage, value in self._current.items():
+            self.times[stage].append(value)
+            self.recent[stage].append(value)
+        self.num_samples += self._current_samples
+        self.recent_samples.append(self._current_samples)
+        if (
+            trainer.logger is not None
+            and len(self.times["step"]) % self.log_every_n_steps == 0
+        ):
+            trainer.logger.log_metrics(self.rolling_summary(), step=trainer.global_step)
+
+    def on_train_end(self, trainer, pl_module):
+        self.train_time = time.perf_counter() - self._train_start
+        for name in TIMED_METHODS:
+            pl_module.__dict__.pop(name, None)
+        report_path = self.report_path or Path(
+            getattr(trainer, "weights_save_path", None)
+            or trainer.default_root_dir
+            or os.getcwd(),
+            "throughput.json",
+        )
+        Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def rolling_summary(self):
+        """
+        Mean time per stage (in ms) and samples/sec over the most recent `window` steps
+        """
+        summary = {
+            f"throughput/{stage}_ms": 1000 * np.mean(values)
+            for stage, values in self.recent.items()
+        }
+        total_time = sum(self.recent["data_wait"]) + sum(self.recent["step"])
+        summary["throughput/samples_per_sec"] = (
+            sum(self.recent_samples) / total_time if total_time else 0.0
+        )
+        summary["throughput/data_wait_fraction"] = (
+            sum(self.recent["data_wait"]) / total_time if total_time else 0.0
+        )
+        summary["throughput/peak_rss_mb"] = peak_rss_mb()
+        return summary
+
+    def report(self):
+        """
+        Statistics over every training step so far
+        """
+        stages = {
+            stage: {
+                "mean_ms": 1000 * float(np.mean(values)),
+                "p50_ms": 1000 * float(np.percentile(values, 50)),
+                "p99_ms": 1000 * float(np.percentile(values, 99)),
+                "total_s": float(np.sum(values)),
+            }
+            for stage, values in self.times.items()
+            if values
+        }
+        total_time = sum(self.times["data_wait"]) + sum(self.times["step"])
+        return {
+            "steps": len(self.times["step"]),
+            "samples": self.num_samples,
+            "samples_per_sec": self.num_samples / total_time if total_time else 0.0,
+            "data_wait_fraction": (
+                sum(self.times["data_wait"]) / total_time if total_time else 0.0
+            ),
+            "train_time_s": self.train_time,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": stages,
+        }
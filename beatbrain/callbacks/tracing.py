@@ -0,0 +1,67 @@
+import time
+
+from pytorch_lightning.callbacks import Callback
+
+from ..utils import registry, tracing
+
+
+@registry.register("callback", "TracingCallback")
+class TracingCallback(Callback):
+    def __init__(self):
+        """
+        Records the training loop as `utils.tracing` spans: training, each epoch, each training batch, validation,
+        and the time spent waiting on the DataLoader before each batch.
+
+        Does nothing unless tracing is enabled. `helpers.get_trainer()` adds it automatically when it is.
+        """
+        super().__init__()
+        self._starts = {}
+
+    def _start(self, name):
+        self._starts[name] = time.perf_counter()
+
+    def _end(self, name, **args):
+        start = self._starts.pop(name, None)
+        if start is not None:
+            tracing.record_span(name, start, category="train", **args)
+
+    def on_train_start(self, trainer, pl_module):
+        self._start("train")
+
+    def on_train_end(self, trainer, pl_module):
+        self._end("train")
+
+    def on_train_epoch_start(self, trainer, pl_module, *args):
+        self._start("epoch")
+        self._start("data_wait")
+
+    def on_train_epoch_end(self, trainer, pl_module, *args):
+        self._starts.pop("data_wait", None)
+        self._end("epoch", epoch=trainer.current_epoch)
+
+    # Newer Lightning versions also call these around validation epochs, but older ones only have these hooks
+    def on_epoch_start(self, trainer, pl_module):
+        if not hasattr(Callback, "on_train_epoch_start"):
+            self.on_train_epoch_start(trainer, pl_module)
+
+    def on_epoch_end(self, trainer, pl_module):
+        if not hasattr(Callback, "on_train_epoch_end"):
+            self.on_train_epoch_end(trainer, pl_module)
+
+    def on_batch_start(self, trainer, pl_module):
+        self._end("data_wait")
+        self._start("batch")
+
+    def on_batch_end(self, trainer, pl_module):
+        self._end("batch", step=trainer.global_step)
+        self._start("data_wait")
+
+    def on_validation_start(self, trainer, pl_module):
+        # Validation runs between training batches, so it isn't time spent waiting for training data
+        self._starts.pop("data_wait", None)
+        self._start("validation")
+
+    def on_validation_end(self, trainer, pl_module):
+        self._end("validation")
+        if "epoch" in self._starts:
+            self._start("data_wait")
@@ -0,0 +1,426 @@
+import logging
+import multiprocessing
+from pathlib import Path
+
+import numpy as np
+import torch
+from pytorch_lightning.callbacks import Callback
+
+from ..utils import registry
+from ..utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    # Render off-screen, and leave the CPU to the training process
+    import matplotlib
+
+    matplotlib.use("Agg")
+    torch.set_num_threads(1)
+
+
+def render(
+    name,
+    outputs,
+    png_dir,
+    raw_dir=None,
+    spectrograms=True,
+    raw_format="exr",
+    cmap="magma",
+    nrow=4,
+):
+    """
+    Render a set of model outputs to disk. Runs in a worker process of `VisualizationCallback`.
+
+    For each kind of output, writes an image grid (originals interleaved with their reconstructions, if given) and,
+    optionally, a `show_spec()` figure and a raw image (via `utils.core.save_image()`) per example.
+
+    Args:
+        name (str): When the outputs were produced (e.g. `epoch_3`), used to name the files
+        outputs (dict): Maps each kind of output (e.g. `reconstruction`) to a pair of `(N, C, H, W)` arrays: the
+            model's outputs and the inputs they were reconstructed from (or `None`)
+        png_dir: The directory to write grids and figures to
+        raw_dir: The directory to write raw images to. If `None`, raw images aren't written.
+        spectrograms (bool): Whether to draw a spectrogram figure per example
+        raw_format (str): The `imageio` format of raw images
+        cmap (str): The colormap of spectrogram figures
+        nrow (int): The number of images in each row of a grid
+
+    Returns:
+        dict: Maps each kind of output to its `(3, H, W)` image grid
+    """
+    import torchvision
+
+    grids = {}
+    for kind, (images, originals) in outputs.items():
+        kind_png, kind_raw = Path(png_dir, kind), raw_dir and Path(raw_dir, kind)
+        panels = (
+            images
+            if originals is None
+            else np.stack([originals, images], axis=1).reshape(-1, *images.shape[1:])
+        )
+        grid = torchvision.utils.make_grid(
+            torch.from_numpy(panels), nrow=nrow, normalize=False
+        )
+        torchvision.utils.save_image(grid, str(kind_png / f"{kind}@{name}.png"))
+        grids[kind] = grid.numpy()
+        if spectrograms:
+            _render_spectrograms(kind, name, images, originals, kind_png, cmap)
+        if kind_raw:
+            from ..utils.core import save_image
+            from ..utils.writer import ArtifactWriter
+
+            # Encodes the images in parallel, and never leaves partially-written ones behind
+            with ArtifactWriter(num_threads=2) as writer:
+                for i, image in enumerate(images):
+                    save_image(
+                        image[0],
+                        kind_raw / f"{kind}_{i + 1}@{name}.{raw_format}",
+                        format=raw_format,
+                        writer=writer,
+                    )
+    return grids
+
+
+def _render_spectrograms(kind, name, images, originals, output_dir, cmap):
+    import matplotlib.pyplot as plt
+    from ..utils.core import denormalize_spectrogram
+    from ..utils.visualization import show_spec
+
+    fig = plt.figure(figsize=(5 if originals is None else 10, 4))
+    for i, image in enumerate(images):
+        panels = (
+            [(kind.capitalize(), image)]
+            if originals is None
+            else [("Original", originals[i]), ("Reconstructed", image)]
+        )
+        for j, (title, spec) in enumerate(panels):
+            fig.add_subplot(1, len(panels), j + 1)
+            show_spec(denormalize_spectrogram(spec[0]), title=title, cmap=cmap)
+        title = f"{kind}_{i + 1}@{name}"
+        fig.suptitle(title)
+        fig.tight_layout()
+        fig.savefig(output_dir / f"{title}.png")
+        fig.clear()
+    plt.close(fig)
+
+
+def _last_output(outputs):
+    # Models return their reconstruction last, e.g. `(latent, recon)` or `(mean, logvar, recon)`
+    return outputs[-1] if isinstance(outputs, (list, tuple)) else outputs
+
+
+def _snapshot(tensor):
+    return tensor.detach().float().cpu().contiguous().numpy()
+
+
+def model_outputs(model, samples=None, latents=None):
+    """
+    Reconstruct `samples` and decode `latents` with an eval-mode `model`.
+
+    Returns:
+        dict: The outputs, as `render()` expects them
+    """
+    device = next(model.parameters()).device
+    outputs = {}
+    with torch.no_grad():
+        if samples is not None:
+            outputs["reconstruction"] = (
+                _snapshot(_last_output(model(samples.to(device)))),
+                _snapshot(samples),
+            )
+        if latents is not None:
+            outputs["generation"] = (_snapshot(model.decode(latents.to(device))), None)
+    return outputs
+
+
+# Each worker process builds its own copy of the model once, and loads each visualization's weights into it
+_worker_models = {}
+
+
+def visualize(
+    model_class, hparams, state_dict, samples, latents, name, png_dir, **kwargs
+):
+    """
+    Run a snapshot of a model on `samples` and `latents` and render its outputs. Runs in a worker process of
+    `VisualizationCallback`.
+
+    Args:
+        model_class: The (registered) model class, which is built from `hparams`
+        hparams (Config): The model's hyperparameters
+        state_dict (dict): The model's weights
+        samples (torch.Tensor): The inputs to reconstruct, or `None`
+        latents (torch.Tensor): The latent vectors to decode, or `None`
+        name (str): When the weights were snapshotted (e.g. `epoch_3`)
+        png_dir: The directory to write grids and figures to
+        **kwargs: Keyword arguments passed to `render()`
+    """
+    model = _worker_models.get(model_class)
+    if model is None:
+        model = _worker_models[model_class] = model_class(hparams).eval()
+    model.load_state_dict(state_dict)
+    return render(name, model_outputs(model, samples, latents), png_dir, **kwargs)
+
+
+def _is_registered_model(module):
+    return any(
+        module_class is type(module)
+        for module_class in registry.registries.get("model", {}).values()
+    )
+
+
+@registry.register("callback", "VisualizationCallback")
+class VisualizationCallback(Callback):
+
+    def __init__(
+        self,
+        output_dir=None,
+        num_examples=4,
+        frequency="epoch",
+        reconstruction=True,
+        generation=True,
+        validation=True,
+        spectrograms=True,
+        raw_format="exr",
+        heatmap=True,
+        max_pending=2,
+        num_workers=1,
+        seed=0,
+    ):
+        """
+        Periodically visualizes a model's reconstructions of a few fixed examples and its decodings of a few fixed
+        latent vectors, without slowing down training.
+
+        Visualizations are rendered by a pool of worker processes, which draw the image grids and spectrogram figures
+        and write the images to disk. Registered models (which can be rebuilt from their `hparams`) are also run in
+        the workers, on a CPU snapshot of their weights, so the training thread only copies the weights. Other models
+        are run on the training thread (batched, under `torch.no_grad()`), and only their outputs are handed over.
+
+        At most `max_pending` visualizations are queued or being rendered at a time: when the workers fall behind, new
+        visualizations are dropped (and counted in `dropped`) instead of waiting for them. Image grids are also sent to
+        the trainer's logger (if it supports `add_image`) once they've been rendered. The validation reconstructions
+        that models like `SpectrogramCVAE` keep (in `validation_examples`) are rendered and logged the same way.
+
+        Args:
+            output_dir: Where to write images (under `png/` and `raw/`). Defaults to `visualizations` in the trainer's
+                default root directory.
+            num_examples (int): The number of examples to reconstruct and latent vectors to decode
+            frequency: `"epoch"` to visualize at the end of every training epoch, or a number of training batches
+            reconstruction (bool): Whether to visualize reconstructions of the first validation (or training) examples
+            generation (bool): Whether to visualize decodings of random latent vectors. Requires the model to have
+                `encode()` and `decode()` methods.
+            validation (bool): Whether to visualize the `(recon, x)` batch a model leaves in `validation_examples` at
+                the end of each validation epoch
+            spectrograms (bool): Whether to draw a spectrogram figure (with `utils.visualization.show_spec()`) per example
+            raw_format (str): The `imageio` format to write raw outputs in, or `None` to not write them
+            heatmap (bool): Whether to draw spectrograms with a heatmap (rather than greyscale) colormap
+            max_pending (int): The maximum number of visualizations waiting to be rendered
+            num_workers (int): The number of rendering processes
+            seed (int): Seeds the random latent vectors
+        """
+        super().__init__()
+        if frequency != "epoch" and (not isinstance(frequency, int) or frequency < 1):
+            raise ValueError(
+                f"frequency must be 'epoch' or a positive number of batches, got {frequency!r}"
+            )
+        self.output_dir = output_dir
+        self.num_examples = num_examples
+        self.frequency = frequency
+        self.reconstruction = reconstruction
+        self.generation = generation
+        self.validation = validation
+        self.spectrograms = spectrograms
+        self.raw_format = raw_format
+        self.cmap = "magma" if heatmap else "Greys"
+        self.max_pending = max(1, max_pending)
+        self.num_workers = num_workers
+        self.seed = seed
+        self.samples = None
+        self.latents = None
+        self.pending = []
+        self.submitted = 0
+        self.rendered = 0
+        self.dropped = 0
+        self.failed = 0
+        self._pool = None
+        self._offload_model = False
+        self._num_batches = 0
+
+    def on_train_start(self, trainer, pl_module):
+        output_dir = Path(
+            self.output_dir or Path(trainer.default_root_dir, "visualizations")
+        )
+        self.png_dir, self.raw_dir = (
+            output_dir / "png",
+            self.raw_format and output_dir / "raw",
+        )
+        kinds = [
+            kind
+            for kind, enabled in [
+                ("reconstruction", self.reconstruction),
+                ("generation", self.generation),
+                ("validation", self.validation),
+            ]
+            if enabled
+        ]
+        for directory in filter(None, [self.png_dir, self.raw_dir]):
+            for kind in kinds:
+                directory.joinpath(kind).mkdir(parents=True, exist_ok=True)
+        self.samples = self._example_inputs(trainer)
+        if (
+            self.generation
+            and self.samples is not None
+            and hasattr(pl_module, "decode")
+        ):
+            with torch.no_grad():
+                latent_shape = (
+                    getattr(pl_module, "latent_shape", None)
+                    or pl_module.encode(self.samples[:1].to(pl_module.device)).shape[1:]
+                )
+            generator = torch.Generator().manual_seed(self.seed)
+            self.latents = torch.randn(
+                self.num_examples, *latent_shape, generator=generator
+            )
+        self._offload_model = _is_registered_model(pl_module)
+        # Forked workers could inherit locks held by torch's or the DataLoader's threads, so start them from scratch
+        self._pool = multiprocessing.get_context("spawn").Pool(
+            self.num_workers, initializer=_init_worker
+        )
+
+    def on_batch_end(self, trainer, pl_module):
+        self._num_batches += 1
+        if self.frequency != "epoch" and self._num_batches % self.frequency == 0:
+            self.visualize(trainer, pl_module, f"batch_{self._num_batches}")
+        else:
+            self._collect(trainer)
+
+    def on_train_epoch_end(self, trainer, pl_module, *args):
+        if self.frequency == "epoch":
+            self.visualize(trainer, pl_module, f"epoch_{trainer.current_epoch}")
+
+    def on_epoch_end(self, trainer, pl_module):
+        # Newer Lightning versions also call this after validation epochs, but older ones only have this hook
+        if not hasattr(Callback, "on_train_epoch_end"):
+            self.on_train_epoch_end(trainer, pl_module)
+
+    def on_validation_end(self, trainer, pl_module):
+        examples = getattr(pl_module, "validation_examples", None)
+        if not self.validation or examples is None or self._pool is None:
+            return
+        pl_module.validation_examples = None
+        name = f"epoch_{trainer.current_epoch}"
+        if not self._reserve(trainer, name):
+            return
+        images, originals = examples
+        outputs = {"validation": (_snapshot(images), _snapshot(originals))}
+        render_kwargs = {"spectrograms": self.spectrograms, "cmap": self.cmap}
+        result = self._pool.apply_async(
+            render, (name, outputs, self.png_dir), render_kwargs
+        )
+        self.pending.append((result, trainer.global_step))
+        self.submitted += 1
+
+    def on_train_end(self, trainer, pl_module):
+        if self._pool is None:
+            return
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+        self._collect(trainer)
+        logger.info(
+            f"Rendered {self.rendered} of {self.submitted + self.dropped} visualizations "
+            f"({self.dropped} dropped, {self.failed} failed)"
+        )
+
+    def visualize(self, trainer, pl_module, name):
+        """
+        Queue the model's reconstructions of the fixed examples and decodings of the fixed latent vectors to be
+        rendered (unless `max_pending` visualizations are already queued, in which case this one is dropped).
+        """
+        if not self._reserve(trainer, name):
+            return
+        render_kwargs = {
+            "raw_dir": self.raw_dir,
+            "spectrograms": self.spectrograms,
+            "raw_format": self.raw_format,
+            "cmap": self.cmap,
+        }
+        samples = self.samples if self.reconstruction else None
+        if samples is None and self.latents is None:
+            return
+        if self._offload_model:
+            # The weights keep changing in-place during training, so they're copied before being handed over
+            state_dict = {
+                key: value.detach().cpu().clone()
+                for key, value in pl_module.state_dict().items()
+            }
+            hparams = Config(dict(pl_module.hparams))
+            result = self._pool.apply_async(
+                visualize,
+                (
+                    type(pl_module),
+                    hparams,
+                    state_dict,
+                    samples,
+                    self.latents,
+                    name,
+                    self.png_dir,
+                ),
+                render_kwargs,
+            )
+        else:
+            was_training = pl_module.training
+            pl_module.eval()
+            outputs = model_outputs(pl_module, samples, self.latents)
+            pl_module.train(was_training)
+            result = self._pool.apply_async(
+                render, (name, outputs, self.png_dir), render_kwargs
+            )
+        self.pending.append((result, trainer.global_step))
+        self.submitted += 1
+
+    def _reserve(self, trainer, name):
+        """
+        Collect finished visualizations, and check whether there's room to queue another one (counting it as dropped
+        if there isn't).
+        """
+        self._collect(trainer)
+        if self._pool is None:
+            return False
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            logger.debug(
+                f"Dropped visualization {name}: {len(self.pending)} visualizations are still being rendered"
+            )
+            return False
+        return True
+
+    def _collect(self, trainer):
+        """
+        Log the grids of finished visualizations, without waiting for unfinished ones.
+        """
+        for result, step in [
+            (result, step) for result, step in self.pending if result.ready()
+        ]:
+            self.pending.remove((result, step))
+            try:
+                grids = result.get()
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Failed to render visualization: {e!r}")
+                continue
+            self.rendered += 1
+            experiment = getattr(trainer.logger, "experiment", None)
+            if hasattr(experiment, "add_image"):
+                for kind, grid in grids.items():
+                    experiment.add_image(kind, grid, step)
+
+    def _example_inputs(self, trainer):
+        loaders = trainer.val_dataloaders or [trainer.train_dataloader]
+        if not loaders or loaders[0] is None:
+            return None
+        batch = next(iter(loaders[0]))
+        if isinstance(batch, (list, tuple)):
+            batch = batch[0]
+        return batch[: self.num_examples].detach().cpu().clone()
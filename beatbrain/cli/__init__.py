@@ -1,17 +1,58 @@
+import json
+import shutil
+
 from pyfiglet import Figlet
 import click
 
-from . import convert, models
+from . import convert, data, models, serve
+from ..utils import memory, tracing
 
 
 @click.group(invoke_without_command=True)
+@click.option(
+    "--trace",
+    type=click.Path(dir_okay=False),
+    help="Record timing spans and write them to this file as a Chrome trace",
+)
+@click.option(
+    "--profile-memory",
+    type=click.Path(dir_okay=False),
+    help="Profile memory usage (RSS and allocation sites) of every process and write a JSON report to this file",
+)
 @click.pass_context
-def main(ctx):
+def main(ctx, trace, profile_memory):
     f = Figlet(font="doom")
     click.echo(click.style(f.renderText("BeatBrain"), fg="bright_blue", bold=True))
+    if profile_memory:
+        profile_dir = memory.enable()
+
+        def write_memory_report():
+            memory.disable()
+            report = memory.build_report(profile_dir)
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            with open(profile_memory, "w") as f:
+                json.dump(report, f)
+            click.echo(memory.format_report(report))
+            click.echo(
+                f"Wrote a memory profile of {len(report['processes'])} processes to {profile_memory}"
+            )
+
+        ctx.call_on_close(write_memory_report)
+    if trace:
+        trace_dir = tracing.enable()
+
+        def export_trace():
+            num_spans = tracing.export_chrome_trace(trace, trace_dir)
+            tracing.disable()
+            shutil.rmtree(trace_dir, ignore_errors=True)
+            click.echo(f"Wrote {num_spans} spans to {trace}")
+
+        ctx.call_on_close(export_trace)
     if ctx.invoked_subcommand is None:
         click.echo(ctx.get_help())
 
 
 main.add_command(convert.convert)
+main.add_command(data.data_group, name="data")
 main.add_command(models.models_group, name="models")
+main.add_command(serve.serve)
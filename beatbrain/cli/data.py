@@ -0,0 +1,195 @@
+import json
+
+import click
+
+from .. import helpers
+from ..utils import synth
+
+
+@click.group(invoke_without_command=True, short_help="Dataset Utilities")
+@click.pass_context
+def data_group(ctx):
+    click.echo(
+        click.style(
+            "--------------\n" "BeatBrain Data\n" "--------------\n",
+            fg="green",
+            bold=True,
+        )
+    )
+    if ctx.invoked_subcommand is None:
+        click.echo(ctx.get_help())
+
+
+@data_group.command(name="synth", short_help="Generate a synthetic audio corpus")
+@click.argument("output")
+@click.option(
+    "-n",
+    "--num_files",
+    default=1000,
+    show_default=True,
+    help="Number of files to generate",
+)
+@click.option("--seed", default=0, show_default=True)
+@click.option(
+    "--format",
+    "formats",
+    multiple=True,
+    type=click.Choice(list(synth.FORMATS)),
+    default=["wav", "flac", "ogg"],
+    show_default=True,
+)
+@click.option(
+    "--sr",
+    "sample_rates",
+    multiple=True,
+    type=int,
+    default=synth.SAMPLE_RATES,
+    show_default=True,
+)
+@click.option("--channels", multiple=True, type=int, default=[1, 2], show_default=True)
+@click.option(
+    "--min_duration",
+    default=1.0,
+    show_default=True,
+    help="Minimum duration of each file (in seconds)",
+)
+@click.option(
+    "--max_duration",
+    default=10.0,
+    show_default=True,
+    help="Maximum duration of each file (in seconds)",
+)
+@click.option(
+    "--max_depth", default=3, show_default=True, help="Maximum directory nesting depth"
+)
+@click.option("--files_per_dir", default=100, show_default=True)
+@click.option(
+    "--corrupt_fraction",
+    default=0.01,
+    show_default=True,
+    help="Fraction of files that are deliberately corrupt",
+)
+@click.option("--overwrite", is_flag=True, help="Regenerate files that already exist")
+@click.option(
+    "-j",
+    "--n_jobs",
+    default=-2,
+    show_default=True,
+    help="Number of worker processes (as in joblib)",
+)
+def synthesize(output, **kwargs):
+    """
+    Deterministically generate a corpus of synthetic audio (tones, noise and drum-like transients) in OUTPUT,
+    in a mix of formats, sample rates, channel counts, durations and directory depths, with some corrupt files.
+    """
+    synth.synthesize_corpus(output, **kwargs)
+
+
+@data_group.command(
+    name="profile", short_help="Profile each stage of the data pipeline"
+)
+@click.option(
+    "-c",
+    "--config",
+    help="Path to config YAML file (e.g. a training config)",
+    required=True,
+)
+@click.option(
+    "-d",
+    "--dataset",
+    default="train",
+    show_default=True,
+    help="The config's `data` section to profile",
+)
+@click.option(
+    "-i",
+    "--paths",
+    help="Audio file or directory to profile (overrides the dataset's paths)",
+)
+@click.option(
+    "-n",
+    "--num_samples",
+    default=256,
+    show_default=True,
+    help="Number of segments to load",
+)
+@click.option("--batch_size", type=int, help="Overrides the config's data.batch_size")
+@click.option("--num_workers", type=int, help="Overrides the config's data.num_workers")
+@click.option(
+    "--warmup",
+    default=1,
+    show_default=True,
+    help="Number of batches to exclude from the results",
+)
+@click.option(
+    "--seed", default=0, show_default=True, help="Seeds the choice of segments"
+)
+@click.option("-o", "--output", help="Also write the profile to this JSON file")
+def profile(output, **kwargs):
+    """
+    Load a random sample of a dataset the way training would, and report the latency of each stage (file open, seek,
+    decode, resample, downmix, spectrogram, normalization, padding and collation), throughput and CPU utilization.
+    """
+    result = helpers.profiling.profile_data(**kwargs)
+    click.echo(helpers.profiling.format_profile(result))
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+@data_group.command(
+    name="dedupe", short_help="Find near-duplicate tracks and list canonical files"
+)
+@click.argument("paths", nargs=-1, required=True)
+@click.option(
+    "-o",
+    "--output",
+    required=True,
+    help="Text file to write the canonical files' paths to",
+)
+@click.option(
+    "-s",
+    "--store",
+    help="Directory to keep fingerprints in, so that later runs can reuse or resume them",
+)
+@click.option(
+    "--max_distance",
+    default=24,
+    show_default=True,
+    help="Maximum fingerprint distance (in bits) between duplicates",
+)
+@click.option(
+    "--duration_tolerance",
+    default=0.05,
+    show_default=True,
+    help="Maximum relative difference in duration between duplicates",
+)
+@click.option(
+    "--groups",
+    "groups_path",
+    help="Also write the groups of duplicates to this JSON file",
+)
+@click.option(
+    "--recursive/--no-recursive",
+    default=True,
+    show_default=True,
+    help="Search directories recursively",
+)
+@click.option(
+    "-j",
+    "--n_jobs",
+    default=-2,
+    show_default=True,
+    help="Number of worker processes (as in joblib)",
+)
+def dedupe(paths, **kwargs):
+    """
+    Fingerprint every audio file in PATHS (directories, `.txt` file lists or audio files), find groups of near-duplicates
+    (re-encodes, resampled copies, the same track in several formats) and write a list with the best-quality file of
+    each group and every unique file, which datasets can load as their `paths`.
+    """
+    summary = helpers.dedupe.dedupe_files(list(paths), **kwargs)
+    click.echo(
+        f"{summary['num_valid']} readable files (of {summary['num_files']}): {summary['num_duplicates']} duplicates "
+        f"in {summary['num_groups']} groups, {summary['num_canonical']} canonical files written to {kwargs['output']}"
+    )
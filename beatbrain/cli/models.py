@@ -40,6 +40,218 @@ def train_model(*args, **kwargs):
     return helpers.train.train_model(*args, **kwargs)
 
 
+@models_group.command(name="export", short_help="Export a model for fast inference")
+@click.option(
+    "-c",
+    "--config",
+    help="Path to config YAML file",
+    show_default=True,
+)
+@click.option(
+    "-w",
+    "--weights_path",
+    help="Checkpoint to load (overrides the config's model.weights_path)",
+)
+@click.option(
+    "-o", "--output", help="Directory to write exported artifacts to", required=True
+)
+@click.option(
+    "-f",
+    "--format",
+    "formats",
+    type=click.Choice(["torchscript", "onnx"]),
+    multiple=True,
+    default=["torchscript", "onnx"],
+    show_default=True,
+)
+@click.option(
+    "--batch_size", default=1, show_default=True, help="Batch size used for tracing"
+)
+def export_model(*args, **kwargs):
+    """
+    Export a model's encoder and decoder as TorchScript/ONNX artifacts, with BatchNorm folded into convolutions.
+
+    Load the artifacts with `beatbrain.runtime.ExportedModel`.
+    """
+    return helpers.export.export_model(*args, **kwargs)
+
+
+@models_group.command(name="encode", short_help="Encode a dataset into a latent store")
+@click.option(
+    "-c",
+    "--config",
+    help="Path to config YAML file",
+    show_default=True,
+)
+@click.option(
+    "-w",
+    "--weights_path",
+    help="Checkpoint to load (overrides the config's model.weights_path)",
+)
+@click.option(
+    "-o", "--output", help="Directory to write the latent store to", required=True
+)
+@click.option(
+    "-d",
+    "--dataset",
+    default="train",
+    show_default=True,
+    help="The config's `data` section to encode",
+)
+@click.option(
+    "-i",
+    "--paths",
+    help="Audio file or directory to encode (overrides the dataset's paths)",
+)
+@click.option("--batch_size", type=int, help="Overrides the config's data.batch_size")
+@click.option("--num_workers", type=int, help="Overrides the config's data.num_workers")
+@click.option(
+    "--commit_every",
+    default=20,
+    show_default=True,
+    help="Number of batches between saving progress",
+)
+@click.option(
+    "--resume/--overwrite",
+    default=True,
+    show_default=True,
+    help="Whether to resume an interrupted run",
+)
+def encode_dataset(*args, **kwargs):
+    """
+    Encode every segment of a dataset with a trained model's encoder.
+
+    Latents are written to a memory-mapped store along with the (track, segment) each one was encoded from.
+    Rerunning an interrupted command resumes where it left off.
+    """
+    helpers.encode.encode_dataset(*args, **kwargs)
+
+
+@models_group.command(name="sample", short_help="Generate random samples to disk")
+@click.option(
+    "-c",
+    "--config",
+    help="Path to config YAML file",
+    show_default=True,
+)
+@click.option(
+    "-w",
+    "--weights_path",
+    help="Checkpoint to load (overrides the config's model.weights_path)",
+)
+@click.option("-o", "--output", help="Directory to write the samples to", required=True)
+@click.option(
+    "-n", "--num_samples", type=int, help="Number of samples to generate", required=True
+)
+@click.option("--seed", default=0, show_default=True, help="Random seed")
+@click.option(
+    "--batch_size",
+    default=64,
+    show_default=True,
+    help="Number of latents decoded at once",
+)
+@click.option(
+    "--spectrograms/--no-spectrograms",
+    default=True,
+    show_default=True,
+    help="Whether to store the decoded spectrograms",
+)
+@click.option(
+    "--dtype",
+    type=click.Choice(["float32", "float16"]),
+    default="float32",
+    show_default=True,
+    help="Dtype of stored spectrograms",
+)
+@click.option(
+    "--audio_format",
+    type=click.Choice(["wav", "flac", "ogg"]),
+    help="Also invert samples to audio files in this format",
+)
+@click.option(
+    "--num_workers",
+    type=int,
+    help="Number of audio inversion processes (defaults to the number of CPUs minus one)",
+)
+@click.option(
+    "--quantize",
+    flag_value="static",
+    help="Decode with a statically int8-quantized copy of the decoder",
+)
+@click.option(
+    "--commit_every",
+    default=20,
+    show_default=True,
+    help="Number of batches between saving progress",
+)
+@click.option(
+    "--resume/--overwrite",
+    default=True,
+    show_default=True,
+    help="Whether to resume an interrupted run",
+)
+def sample(*args, **kwargs):
+    """
+    Decode random latents with a trained model's decoder, into a memory-mapped spectrogram store and/or audio files.
+
+    Samples are generated a batch at a time (in constant memory) and only depend on the seed.
+    Rerunning an interrupted command resumes where it left off.
+    """
+    helpers.sample.sample_to_disk(*args, **kwargs)
+
+
+@models_group.command(
+    name="search", short_help="Find similar segments in a latent store"
+)
+@click.option(
+    "-s",
+    "--store",
+    help="Latent store written by `beatbrain models encode`",
+    required=True,
+)
+@click.option(
+    "-r",
+    "--row",
+    "rows",
+    type=int,
+    multiple=True,
+    help="Latent store row(s) to query with",
+)
+@click.option("-t", "--track", help="Path or id of a track to query with")
+@click.option(
+    "--segment",
+    type=int,
+    help="Segment of the track to query with (defaults to every segment)",
+)
+@click.option("-k", default=10, show_default=True, help="Number of results per query")
+@click.option(
+    "--index", type=click.Choice(["exact", "ivf"]), default="exact", show_default=True
+)
+@click.option(
+    "--metric", type=click.Choice(["cosine", "l2"]), default="cosine", show_default=True
+)
+@click.option(
+    "--num_lists", type=int, help="Number of IVF clusters (defaults to 4 * sqrt(N))"
+)
+@click.option(
+    "--num_probes", type=int, help="Number of IVF clusters to search per query"
+)
+@click.option(
+    "--exclude_same_track/--include_same_track", default=True, show_default=True
+)
+@click.option("--rebuild", is_flag=True, help="Rebuild a saved IVF index")
+def search_latents(*args, **kwargs):
+    """
+    Find the segments that sound most like a query segment (or track), by the distance between their latents.
+    """
+    for query in helpers.search.search_latents(*args, **kwargs):
+        click.echo(f"{query['path'] or query['track']} [segment {query['segment']}]:")
+        for rank, match in enumerate(query["matches"]):
+            click.echo(
+                f"{rank + 1:>4}. {match['path'] or match['track']} [segment {match['segment']}] (distance {match['distance']:.4f})"
+            )
+
+
 @models_group.command(name="list", short_help="List available models")
 def list_models():
     """
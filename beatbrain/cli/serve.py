@@ -0,0 +1,57 @@
+import click
+
+from .. import helpers
+
+
+@click.command(name="serve", short_help="Serve a model's decoder over HTTP")
+@click.option("-c", "--config", help="Path to config YAML file", show_default=True)
+@click.option(
+    "-w",
+    "--weights_path",
+    help="Checkpoint to load (overrides the config's model.weights_path)",
+)
+@click.option(
+    "-e",
+    "--export_dir",
+    help="Serve artifacts from `beatbrain models export` instead of the Lightning model",
+)
+@click.option(
+    "--backend",
+    type=click.Choice(["torchscript", "onnx"]),
+    default="torchscript",
+    show_default=True,
+)
+@click.option(
+    "--quantize",
+    flag_value="static",
+    help="Decode with a statically int8-quantized decoder",
+)
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8080, show_default=True)
+@click.option(
+    "--socket", "socket_path", help="Listen on a Unix socket instead of a TCP port"
+)
+@click.option(
+    "--max_batch_size",
+    default=64,
+    show_default=True,
+    help="Maximum number of latents decoded at once",
+)
+@click.option(
+    "--max_latency_ms",
+    default=2.0,
+    show_default=True,
+    help="Maximum time a request waits for other requests to batch with",
+)
+@click.option("--num_threads", type=int, help="Number of threads used per batch")
+def serve(*args, **kwargs):
+    """
+    Serve generation requests over HTTP, decoding concurrent requests together in micro-batches.
+
+    \b
+    Endpoints:
+        GET  /health
+        POST /decode   {"latents": [...], "audio": false}
+        POST /sample   {"num_samples": 1, "seed": null, "audio": false}
+    """
+    helpers.serve.serve(*args, **kwargs)
@@ -2,4 +2,9 @@
 Defines datasets
 """
 from .fma import FMADataset
-from .audio import AudioClipDataset
+from .audio import AudioClipDataset, SpectrogramClipDataset, AudioClipCollator
+from .samplers import IndexBatchSampler
+from .latents import LatentStore
+from .windows import SpectrogramWindowDataset
+from .samples import SampleStore
+from .fingerprints import FingerprintStore
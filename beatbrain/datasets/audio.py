@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 from joblib import Parallel, delayed
 from natsort import natsorted
@@ -6,10 +7,51 @@ import soundfile as sf
 import resampy
 import numpy as np
 
-from torch.utils.data import Dataset
-from ..utils import registry
+import torch
+from torch.utils.data import Dataset, get_worker_info
+from ..utils import registry, tracing
+from ..utils.core import audio_to_spectrogram
+from ..utils.writer import write_atomic
 
+# The number of frames read at a time when measuring segment levels, so memory use doesn't depend on file length
+LEVEL_BLOCK_FRAMES = 1 << 16
+# Added to the mean square before taking its log, so that digital silence has a finite level (-100 dBFS)
+LEVEL_EPS = 1e-10
 
+
+def list_audio_files(paths, recursive=True):
+    """
+    Find audio files to load.
+
+    Args:
+        paths: A directory to search for files, a `.txt` file listing one path per line (e.g. as written by
+            `beatbrain data dedupe`; relative paths are relative to the list's directory), a single audio file, or a
+            collection of file paths.
+        recursive (bool): Whether to recursively search for files in a directory
+
+    Returns:
+        np.ndarray: The naturally sorted paths
+    """
+    try:  # Single file or directory
+        paths = Path(paths)
+        if paths.is_dir():
+            files = list(
+                filter(
+                    lambda f: f.is_file(),
+                    paths.rglob("*") if recursive else paths.iterdir(),
+                )
+            )
+        elif paths.suffix == ".txt":
+            with open(paths) as f:
+                files = [paths.parent / line.strip() for line in f if line.strip()]
+        else:
+            files = [paths]
+    except TypeError:  # Collection of files
+        files = list(map(Path, paths))
+    return np.asarray(natsorted(files))
+
+
+@tracing.traced
 def get_num_segments(path, max_segment_length, min_segment_length):
     """
     Calculate the number of audio segments of sufficient length contained within an audio file.
@@ -33,21 +75,182 @@ def get_num_segments(path, max_segment_length, min_segment_length):
             if duration % max_segment_length >= min_segment_length:
                 num_segments += 1
             return num_segments
-    except RuntimeError:  # SoundFile raises a `RuntimeError` when it fails to read a file :(
+    except RuntimeError:
+        # SoundFile raises a `RuntimeError` when it fails to read a file :(
         return 0
 
 
+@tracing.traced
+def get_segment_levels(
+    path, max_segment_length, min_segment_length, block_frames=LEVEL_BLOCK_FRAMES
+):
+    """
+    Measure the RMS level of each audio segment (as counted by `get_num_segments`) within an audio file.
+    The file is decoded in blocks of `block_frames` frames, so memory use doesn't depend on its length.
+
+    Args:
+        path: Path to a single audio file
+        max_segment_length (float): The maximum length (in seconds) of each audio segment. If `None`, 1 segment is assumed.
+        min_segment_length (float): The minimum length (in seconds) of each audio segment.
+        block_frames (int): The number of frames to decode at a time
+
+    Returns:
+        np.ndarray: A `float32` array holding the RMS level (in dBFS, over all channels) of each segment. Empty if the file can't be read.
+    """
+    num_segments = get_num_segments(path, max_segment_length, min_segment_length)
+    if num_segments == 0:
+        return np.zeros(0, dtype=np.float32)
+    power, counts = np.zeros(num_segments), np.zeros(num_segments)
+    try:
+        with sf.SoundFile(str(path)) as file:
+            if max_segment_length is None:
+                segment_frames = max(file.frames, 1)
+            else:
+                segment_frames = int(round(file.samplerate * max_segment_length))
+            position = 0
+            for block in file.blocks(block_frames, dtype=np.float32, always_2d=True):
+                segments = (position + np.arange(len(block))) // segment_frames
+                # Frames past the last segment (i.e. a remainder shorter than `min_segment_length`) are ignored
+                keep = segments < num_segments
+                power += np.bincount(
+                    segments[keep],
+                    weights=np.square(block[keep]).mean(1),
+                    minlength=num_segments,
+                )
+                counts += np.bincount(segments[keep], minlength=num_segments)
+                position += len(block)
+                if position >= num_segments * segment_frames:
+                    break
+    except RuntimeError:
+        return np.zeros(0, dtype=np.float32)
+    return (10 * np.log10(power / np.maximum(counts, 1) + LEVEL_EPS)).astype(np.float32)
+
+
+def scan_segment_levels(
+    paths, max_segment_length, min_segment_length, cache_path=None, n_jobs=-1
+):
+    """
+    Measure the RMS level of each segment of several audio files (see `get_segment_levels`), in parallel.
+
+    Files are decoded in a pool of threads (libsndfile and numpy release the GIL). If `cache_path` is given, levels are
+    loaded from (and saved to) an `.npz` file there, so that only new or modified files are decoded on later scans.
+
+    Args:
+        paths: A collection of audio file paths
+        max_segment_length (float): The maximum length (in seconds) of each audio segment. If `None`, 1 segment is assumed.
+        min_segment_length (float): The minimum length (in seconds) of each audio segment.
+        cache_path: The `.npz` file to cache levels in
+        n_jobs (int): The number of threads (as in `joblib.Parallel`)
+
+    Returns:
+        list: An array of segment levels (in dBFS) for each file
+    """
+    paths = [str(path) for path in paths]
+    keys = [_file_key(path) for path in paths]
+    cached = (
+        _load_levels(cache_path, max_segment_length, min_segment_length)
+        if cache_path
+        else {}
+    )
+    missing = [i for i, key in enumerate(keys) if key not in cached]
+    logger.debug(
+        f"Measuring segment levels of {len(missing)} files ({len(paths) - len(missing)} cached)"
+    )
+    with tracing.span("scan_segment_levels", files=len(missing)):
+        measured = Parallel(n_jobs=n_jobs, backend="threading")(
+            delayed(get_segment_levels)(
+                paths[i], max_segment_length, min_segment_length
+            )
+            for i in missing
+        )
+    cached.update((keys[i], levels) for i, levels in zip(missing, measured))
+    if cache_path and missing:
+        _save_levels(
+            cache_path,
+            max_segment_length,
+            min_segment_length,
+            {key: cached[key] for key in keys},
+        )
+    return [cached[key] for key in keys]
+
+
+def _file_key(path):
+    """
+    Identifies a file's contents by its path, size and modification time, so that modified files are measured again.
+    """
+    try:
+        stat = Path(path).stat()
+    except OSError:
+        return path, -1, -1
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+def _load_levels(cache_path, max_segment_length, min_segment_length):
+    if not Path(cache_path).exists():
+        return {}
+    with np.load(str(cache_path)) as cache:
+        if str(cache["segment_lengths"]) != json.dumps(
+            [max_segment_length, min_segment_length]
+        ):
+            logger.info(
+                f"Ignoring segment levels cached in {cache_path}, which were measured with different segment lengths"
+            )
+            return {}
+        keys = zip(
+            cache["paths"].tolist(), cache["sizes"].tolist(), cache["mtimes"].tolist()
+        )
+        return dict(zip(keys, np.split(cache["levels"], cache["offsets"][1:-1])))
+
+
+def _save_levels(cache_path, max_segment_length, min_segment_length, levels):
+    paths, sizes, mtimes = zip(*levels) if levels else ((), (), ())
+    lengths = [len(track_levels) for track_levels in levels.values()]
+
+    def save(temp_path):
+        with open(
+            temp_path, "wb"
+        ) as f:  # A file object, so `np.savez` doesn't add an extension to the path
+            np.savez(
+                f,
+                paths=np.array(paths, dtype=str),
+                sizes=np.array(sizes, dtype=np.int64),
+                mtimes=np.array(mtimes, dtype=np.int64),
+                offsets=np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]),
+                levels=np.concatenate(
+                    [np.zeros(0, dtype=np.float32), *levels.values()]
+                ),
+                segment_lengths=json.dumps([max_segment_length, min_segment_length]),
+            )
+
+    write_atomic(save, cache_path)
+
+
 @registry.register("dataset", "AudioClipDataset")
 class AudioClipDataset(Dataset):
-    def __init__(self, paths, recursive=True, max_segment_length=5, min_segment_length=1, sample_rate=22050, mono=True, pad=True):
+
+    def __init__(
+        self,
+        paths,
+        recursive=True,
+        max_segment_length=5,
+        min_segment_length=1,
+        sample_rate=22050,
+        mono=True,
+        pad=True,
+        min_level=None,
+        level_cache=None,
+    ):
         """
         Args:
-            paths: A path (file or directory) or a collection of file paths.
+            paths: A path (file, directory or `.txt` file list) or a collection of file paths. See `list_audio_files`.
             recursive (bool): Whether to recursively search for audio files when a directory is provided
             max_segment_length (float): The maximum length (in seconds) of each audio segment.
             min_segment_length (float): The minimum length (in seconds) of each audio segment. Shorter segments are discarded.
             sample_rate (int): The rate at which to resample audio. If `None`, no resampling is performed.
             mono (bool): Whether to downmix multichannel audio clips to a single channel.
+            min_level (float): If given, segments quieter than this RMS level (in dBFS) are discarded (e.g. -60 for silence).
+                Every file is decoded once while scanning to measure its segments' levels (see `scan_segment_levels`).
+            level_cache: An `.npz` file to cache segment levels in, so that later scans only decode new or modified files.
         """
         super().__init__()
         # Store params
@@ -57,22 +260,37 @@ class AudioClipDataset(Dataset):
         self.sample_rate = sample_rate
         self.mono = mono
         self.pad = pad
+        self.min_level = min_level
+        self.level_cache = level_cache
 
         # Scan for files
-        try:  # Single file or directory
-            paths = Path(paths)
-            if paths.is_dir():
-                self.paths = list(filter(lambda f: f.is_file(), paths.rglob("*") if self.recursive else paths.iterdir()))
-            else:
-                self.paths = [paths]
-        except TypeError:  # Collection of files
-            self.paths = list(map(Path, paths))
-        self.paths = np.asarray(natsorted(self.paths))
+        with tracing.span("AudioClipDataset.scan_files"):
+            self.paths = list_audio_files(paths, recursive=self.recursive)
         if len(self.paths) == 0:
             raise ValueError(f"Couldn't find any valid audio files in {paths}")
 
         # Count the number of segments in each audio file
-        self.num_track_segments = np.array(Parallel(n_jobs=-1, backend="threading")(delayed(get_num_segments)(str(path), self.max_segment_length, self.min_segment_length) for path in self.paths))
+        with tracing.span("AudioClipDataset.count_segments", files=len(self.paths)):
+            if self.min_level is None:
+                track_levels = None
+                self.num_track_segments = np.array(
+                    Parallel(n_jobs=-1, backend="threading")(
+                        delayed(get_num_segments)(
+                            str(path), self.max_segment_length, self.min_segment_length
+                        )
+                        for path in self.paths
+                    )
+                )
+            else:
+                track_levels = scan_segment_levels(
+                    self.paths,
+                    self.max_segment_length,
+                    self.min_segment_length,
+                    cache_path=self.level_cache,
+                )
+                self.num_track_segments = np.array(
+                    [len(levels) for levels in track_levels]
+                )
         # Find and exclude unusable tracks (either unreadable or too short)
         valid_tracks_mask = self.num_track_segments > 0
         invalid_tracks_mask = ~valid_tracks_mask
@@ -85,6 +303,26 @@ class AudioClipDataset(Dataset):
         self.cumulative_num_track_segments = np.cumsum(self.num_track_segments)
         self.num_total_segments = self.cumulative_num_track_segments[-1]
 
+        # Find and exclude quiet segments. `segment_levels` holds the level (in dBFS) of every segment of every valid
+        # track, and `segment_index` maps each kept segment to its index among all segments.
+        self.segment_levels = None
+        self.segment_index = None
+        if track_levels is not None:
+            self.segment_levels = np.concatenate(
+                [np.zeros(0, dtype=np.float32), *track_levels]
+            )
+            self.segment_index = np.flatnonzero(self.segment_levels >= self.min_level)
+            num_quiet = self.num_total_segments - len(self.segment_index)
+            logger.info(
+                f"Excluding {num_quiet} of {self.num_total_segments} segments ({num_quiet / self.num_total_segments:.1%}) quieter than {self.min_level} dBFS"
+            )
+            self.num_total_segments = len(self.segment_index)
+            if self.num_total_segments == 0:
+                raise ValueError(
+                    f"Every audio segment in {paths} is quieter than {self.min_level} dBFS"
+                )
+
+    @tracing.traced
     def __getitem__(self, index):
         """
         Fetches an audio segment as a numpy array.
@@ -97,25 +335,25 @@ class AudioClipDataset(Dataset):
             tuple: A 2D `np.float32` array of raw audio, and the audio's sample rate
         """
         # TODO: Fix crash when using a DataLoader with several workers
-        if index < 0:
-            index = self.num_total_segments + index
-        if index >= len(self):
-            raise IndexError(f"Sample index out of range. Max index is {len(self) - 1}")
-        track_index = np.min(np.where(self.cumulative_num_track_segments > index))
-        if track_index == 0:
-            index_remainder = index
-        else:
-            index_remainder = index - self.cumulative_num_track_segments[track_index - 1]
+        track_index, index_remainder = self.locate(index)
         track_path = self.paths[track_index]
-        with sf.SoundFile(str(track_path)) as file:
+        with tracing.span("read", path=str(track_path)), sf.SoundFile(
+            str(track_path)
+        ) as file:
             # Get track info
             track_sample_rate = file.samplerate
-            start_pos = track_sample_rate * self.max_segment_length * index_remainder
-            num_samples = track_sample_rate * self.max_segment_length
+            start_pos, num_samples = self.segment_bounds(
+                track_sample_rate, index_remainder
+            )
 
             # Load raw audio
             file.seek(start_pos)
-            audio = file.read(num_samples, dtype=np.float32, fill_value=0 if self.pad else None, always_2d=True)
+            audio = file.read(
+                num_samples,
+                dtype=np.float32,
+                fill_value=0 if self.pad else None,
+                always_2d=True,
+            )
 
         # Channel-first index order
         audio = audio.T
@@ -125,12 +363,185 @@ class AudioClipDataset(Dataset):
             output_sr = track_sample_rate
         else:
             output_sr = self.sample_rate
-            audio = resampy.resample(audio, track_sample_rate, output_sr, filter="kaiser_fast")
+            with tracing.span("resample"):
+                audio = resampy.resample(
+                    audio, track_sample_rate, output_sr, filter="kaiser_fast"
+                )
 
         # Optionally downmix to mono
         if self.mono and audio.ndim > 1:
             audio = audio.mean(0, keepdims=True)
         return audio, output_sr
 
+    def locate(self, index):
+        """
+        Find the track containing a segment.
+
+        Args:
+            index (int): The index of a segment
+
+        Returns:
+            tuple: The index of the segment's track, and the index of the segment within that track
+        """
+        if index < 0:
+            index = self.num_total_segments + index
+        if index >= len(self):
+            raise IndexError(f"Sample index out of range. Max index is {len(self) - 1}")
+        if self.segment_index is not None:
+            index = self.segment_index[index]
+        track_index = np.min(np.where(self.cumulative_num_track_segments > index))
+        if track_index == 0:
+            return track_index, index
+        return track_index, index - self.cumulative_num_track_segments[track_index - 1]
+
+    def segment_bounds(self, sample_rate, segment):
+        """
+        Returns:
+            tuple: The first sample of a track's segment, and the segment's length (in samples)
+        """
+        if self.max_segment_length is None:
+            return 0, -1
+        num_samples = int(round(sample_rate * self.max_segment_length))
+        return num_samples * int(segment), num_samples
+
     def __len__(self):
         return self.num_total_segments
+
+
+@registry.register("dataset", "SpectrogramClipDataset")
+class SpectrogramClipDataset(AudioClipDataset):
+    def __init__(
+        self,
+        paths,
+        n_fft=2048,
+        hop_length=512,
+        n_mels=128,
+        n_frames=None,
+        normalize=True,
+        top_db=80,
+        **kwargs,
+    ):
+        """
+        An `AudioClipDataset` that converts each audio segment to a mel spectrogram on the fly.
+
+        Args:
+            paths: A path (file or directory) or a collection of file paths.
+            n_fft (int): FFT window size
+            hop_length (int): Number of samples between successive frames
+            n_mels (int): Number of mel bands
+            n_frames (int): If given, spectrograms are truncated or zero-padded to exactly this many frames.
+            normalize (bool): Whether to log and normalize spectrograms to [0, 1]
+            top_db (float): The dynamic range (in dB) kept by normalization
+            **kwargs: Passed to `AudioClipDataset`
+        """
+        super().__init__(paths, **kwargs)
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.n_frames = n_frames
+        self.normalize = normalize
+        self.top_db = top_db
+
+    @tracing.traced
+    def __getitem__(self, index):
+        """
+        Fetches an audio segment as a mel spectrogram.
+
+        Returns:
+            tuple: A 3D `np.float32` array of shape `(channels, n_mels, frames)`, and the sample rate of the source audio
+        """
+        audio, sr = super().__getitem__(index)
+        spec = np.stack(
+            [
+                audio_to_spectrogram(
+                    channel,
+                    normalize=self.normalize,
+                    norm_kwargs={"top_db": self.top_db},
+                    sr=sr,
+                    n_fft=self.n_fft,
+                    hop_length=self.hop_length,
+                    n_mels=self.n_mels,
+                )
+                for channel in audio
+            ]
+        ).astype(np.float32, copy=False)
+        return self.fit_frames(spec), sr
+
+    def fit_frames(self, spec):
+        """
+        Truncate or zero-pad a `(channels, n_mels, frames)` spectrogram to `n_frames` frames (if set).
+        """
+        if self.n_frames is not None:
+            if spec.shape[-1] >= self.n_frames:
+                spec = spec[..., : self.n_frames]
+            else:
+                spec = np.pad(
+                    spec,
+                    ((0, 0), (0, 0), (0, self.n_frames - spec.shape[-1])),
+                    mode="constant",
+                )
+        return spec
+
+
+def _empty_batch(shape, dtype=torch.float32):
+    """
+    Allocate an uninitialized batch tensor.
+    Inside a DataLoader worker the tensor is created directly in shared memory, so sending it to the main process doesn't require another copy.
+    """
+    if get_worker_info() is None:
+        return torch.empty(shape, dtype=dtype)
+    elem = torch.empty(0, dtype=dtype)
+    numel = int(np.prod(shape))
+    if hasattr(elem, "_typed_storage"):
+        storage = elem._typed_storage()._new_shared(numel, device=elem.device)
+    else:
+        storage = elem.storage()._new_shared(numel)
+    return elem.new(storage).resize_(shape)
+
+
+@registry.register("collate_fn", "AudioClipCollator")
+class AudioClipCollator:
+    def __init__(self, pad=True):
+        """
+        Collates a list of `(audio, sr)` samples from an `AudioClipDataset` into a single `(B, C, T)` batch.
+
+        Each clip is written straight into a preallocated batch tensor (in shared memory when running in a DataLoader worker),
+        so the main process receives a ready-to-use tensor instead of stacking the samples itself.
+
+        Args:
+            pad (bool): Whether to zero-pad clips shorter than the longest clip in the batch. If False, clips of unequal length raise a `ValueError`.
+        """
+        self.pad = pad
+
+    def __call__(self, batch):
+        """
+        Args:
+            batch (list): A sequence of `(audio, sr)` tuples as returned by `AudioClipDataset.__getitem__`
+
+        Returns:
+            tuple: A `(B, C, T)` `torch.float32` tensor of audio, and the batch's (single) sample rate
+        """
+        audios, sample_rates = zip(*batch)
+        sample_rate = sample_rates[0]
+        if any(sr != sample_rate for sr in sample_rates):
+            raise ValueError(
+                f"All clips in a batch must share a sample rate. Got {sorted(set(sample_rates))}"
+            )
+        num_channels = audios[0].shape[0]
+        lengths = [audio.shape[-1] for audio in audios]
+        max_length = max(lengths)
+        if not self.pad and min(lengths) != max_length:
+            raise ValueError(
+                f"Got clips of unequal length ({min(lengths)} to {max_length} samples) with padding disabled"
+            )
+
+        output = _empty_batch((len(audios), num_channels, max_length))
+        for i, (audio, length) in enumerate(zip(audios, lengths)):
+            if audio.shape[0] != num_channels:
+                raise ValueError(
+                    f"Expected {num_channels} channels in every clip, got {audio.shape[0]}"
+                )
+            output[i, :, :length] = torch.from_numpy(audio)
+            if length < max_length:
+                output[i, :, length:] = 0
+        return output, sample_rate
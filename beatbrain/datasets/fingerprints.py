@@ -0,0 +1,104 @@
+import json
+from pathlib import Path
+
+import numpy as np
+from torch.utils.data import Dataset
+
+from ..utils import registry
+from ..utils.fingerprint import NUM_BYTES
+
+FINGERPRINTS_FILE = "fingerprints.npy"
+INFO_FILE = "info.npy"
+COMPLETED_FILE = "completed.npy"
+METADATA_FILE = "metadata.json"
+INFO_DTYPE = np.dtype(
+    [
+        ("valid", bool),
+        ("duration", np.float64),
+        ("sample_rate", np.int32),
+        ("channels", np.int32),
+        ("lossless", bool),
+        ("size", np.int64),
+    ]
+)
+
+
+@registry.register("dataset", "FingerprintStore")
+class FingerprintStore(Dataset):
+    def __init__(self, path, mode="r"):
+        """
+        A directory of audio fingerprints (see `utils.fingerprint`), as written by `beatbrain data dedupe`:
+            - fingerprints.npy: A memory-mapped `(N, NUM_BYTES)` `uint8` array of packed fingerprints
+            - info.npy: A `(N,)` structured array of each file's properties (see `INFO_DTYPE`). Unreadable files aren't `valid`.
+            - completed.npy: A `(N,)` boolean array marking which files have been fingerprinted, so interrupted runs can be resumed
+            - metadata.json: The file paths (indexed like the arrays)
+
+        Args:
+            path: The store's directory
+            mode (str): The mode to memory-map the arrays with ("r" or "r+")
+        """
+        super().__init__()
+        self.path = Path(path)
+        self.mode = mode
+        self.fingerprints = np.load(str(self.path / FINGERPRINTS_FILE), mmap_mode=mode)
+        self.info = np.load(str(self.path / INFO_FILE), mmap_mode=mode)
+        self.completed = np.load(str(self.path / COMPLETED_FILE), mmap_mode=mode)
+        with open(self.path / METADATA_FILE) as f:
+            self.metadata = json.load(f)
+
+    @classmethod
+    def create(cls, path, paths, metadata=None):
+        """
+        Preallocate an empty store on disk.
+
+        Args:
+            path: The directory to create the store in
+            paths: The audio files to fingerprint
+            metadata (dict): Any other JSON-serializable information to store alongside the fingerprints
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.lib.format.open_memmap(
+            str(path / FINGERPRINTS_FILE),
+            mode="w+",
+            dtype=np.uint8,
+            shape=(len(paths), NUM_BYTES),
+        ).flush()
+        np.lib.format.open_memmap(
+            str(path / INFO_FILE), mode="w+", dtype=INFO_DTYPE, shape=(len(paths),)
+        ).flush()
+        np.save(str(path / COMPLETED_FILE), np.zeros(len(paths), dtype=bool))
+        with open(path / METADATA_FILE, "w") as f:
+            json.dump({**(metadata or {}), "paths": [str(p) for p in paths]}, f)
+        return cls(path, mode="r+")
+
+    @property
+    def paths(self):
+        return self.metadata["paths"]
+
+    @property
+    def is_complete(self):
+        return bool(self.completed.all())
+
+    def commit(self, indices):
+        """
+        Write pending fingerprints to disk, and only then mark them as completed.
+        This way, an interruption can't leave fingerprints marked as completed without having been written.
+
+        Args:
+            indices: The indices of the fingerprints to mark as completed
+        """
+        self.fingerprints.flush()
+        self.info.flush()
+        self.completed[indices] = True
+        self.completed.flush()
+
+    def __getitem__(self, index):
+        """
+        Returns:
+            tuple: A fingerprint, and the file's info
+        """
+        return np.asarray(self.fingerprints[index]), self.info[index]
+
+    def __len__(self):
+        return len(self.fingerprints)
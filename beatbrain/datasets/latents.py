@@ -0,0 +1,101 @@
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+from torch.utils.data import Dataset
+
+from ..utils import registry
+
+LATENTS_FILE = "latents.npy"
+IDS_FILE = "ids.npy"
+COMPLETED_FILE = "completed.npy"
+METADATA_FILE = "metadata.json"
+
+
+@registry.register("dataset", "LatentStore")
+class LatentStore(Dataset):
+    def __init__(self, path, mode="r"):
+        """
+        A directory of memory-mapped latents, as written by `beatbrain models encode`:
+            - latents.npy: A `(N, *latent_shape)` array of latents
+            - ids.npy: A `(N, 2)` array of the `(track, segment)` that each latent was encoded from
+            - completed.npy: A `(N,)` boolean array marking which latents have been written, so interrupted runs can be resumed
+            - metadata.json: The track paths (indexed by track id) and any other information about how the latents were created
+
+        Args:
+            path: The store's directory
+            mode (str): The mode to memory-map the arrays with ("r" or "r+")
+        """
+        super().__init__()
+        self.path = Path(path)
+        self.mode = mode
+        self.latents = np.load(str(self.path / LATENTS_FILE), mmap_mode=mode)
+        self.ids = np.load(str(self.path / IDS_FILE), mmap_mode=mode)
+        self.completed = np.load(str(self.path / COMPLETED_FILE), mmap_mode=mode)
+        with open(self.path / METADATA_FILE) as f:
+            self.metadata = json.load(f)
+
+    @classmethod
+    def create(cls, path, ids, latent_shape, dtype=np.float32, metadata=None):
+        """
+        Preallocate an empty store on disk. Search indexes saved in an earlier store at `path` (see
+        `helpers.search.get_index()`) are deleted, since they index the old latents.
+
+        Args:
+            path: The directory to create the store in
+            ids (np.ndarray): A `(N, 2)` array of `(track, segment)` ids, one per latent
+            latent_shape (tuple): The shape of a single latent
+            dtype: The latents' dtype
+            metadata (dict): JSON-serializable information to store alongside the latents (e.g. `{"paths": [...]}`)
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for index_dir in path.glob("ivf_*"):
+            shutil.rmtree(str(index_dir))
+        ids = np.asarray(ids, dtype=np.int64)
+        np.lib.format.open_memmap(
+            str(path / LATENTS_FILE),
+            mode="w+",
+            dtype=dtype,
+            shape=(len(ids), *latent_shape),
+        ).flush()
+        np.save(str(path / IDS_FILE), ids)
+        np.save(str(path / COMPLETED_FILE), np.zeros(len(ids), dtype=bool))
+        with open(path / METADATA_FILE, "w") as f:
+            json.dump(metadata or {}, f, indent=2)
+        return cls(path, mode="r+")
+
+    @property
+    def latent_shape(self):
+        return self.latents.shape[1:]
+
+    @property
+    def paths(self):
+        return self.metadata.get("paths", [])
+
+    @property
+    def is_complete(self):
+        return bool(self.completed.all())
+
+    def commit(self, indices):
+        """
+        Write pending latents to disk, and only then mark them as completed.
+        This way, an interruption can't leave latents marked as completed without having been written.
+
+        Args:
+            indices: The indices of the latents to mark as completed
+        """
+        self.latents.flush()
+        self.completed[indices] = True
+        self.completed.flush()
+
+    def __getitem__(self, index):
+        """
+        Returns:
+            tuple: A latent, and the `(track, segment)` id it was encoded from
+        """
+        return np.asarray(self.latents[index]), tuple(self.ids[index])
+
+    def __len__(self):
+        return len(self.latents)
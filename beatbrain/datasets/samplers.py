@@ -0,0 +1,38 @@
+import torch
+from torch.utils.data import Sampler
+
+
+class IndexBatchSampler(Sampler):
+    def __init__(self, num_samples, batch_size, shuffle=True, drop_last=False):
+        """
+        Yields whole batches of sample indices as `torch.LongTensor`s.
+
+        Meant for tensor-backed datasets (like `torch.utils.data.TensorDataset`) used with `DataLoader(batch_size=None)`:
+        each batch is then fetched with a single index-gather instead of one `__getitem__` call per sample.
+
+        Args:
+            num_samples (int): The number of samples in the dataset
+            batch_size (int): The number of indices in each batch
+            shuffle (bool): Whether to draw a new random permutation of the indices every epoch
+            drop_last (bool): Whether to drop the last batch if it's smaller than `batch_size`
+        """
+        self.num_samples = num_samples
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+    def __iter__(self):
+        indices = (
+            torch.randperm(self.num_samples)
+            if self.shuffle
+            else torch.arange(self.num_samples)
+        )
+        batches = indices.split(self.batch_size)
+        if self.drop_last and len(batches) and len(batches[-1]) < self.batch_size:
+            batches = batches[:-1]
+        return iter(batches)
+
+    def __len__(self):
+        if self.drop_last:
+            return self.num_samples // self.batch_size
+        return (self.num_samples + self.batch_size - 1) // self.batch_size
@@ -0,0 +1,150 @@
+import json
+from pathlib import Path
+
+import numpy as np
+from torch.utils.data import Dataset
+
+from ..utils import registry
+
+SPECTROGRAMS_FILE = "spectrograms.npy"
+COMPLETED_FILE = "completed.npy"
+METADATA_FILE = "metadata.json"
+AUDIO_DIR = "audio"
+# Audio files are spread over subdirectories of this many files, since directories of millions of files are slow to list
+AUDIO_FILES_PER_DIR = 10000
+
+
+@registry.register("dataset", "SampleStore")
+class SampleStore(Dataset):
+    def __init__(self, path, mode="r"):
+        """
+        A directory of samples generated by `beatbrain models sample`:
+            - spectrograms.npy: A memory-mapped `(N, *spectrogram_shape)` array of decoded spectrograms (unless only
+              audio was written)
+            - audio/: Audio inverted from the spectrograms (if requested), as `audio/<index // 10000>/<index>.<format>`
+            - completed.npy: A `(N,)` boolean array marking which samples have been written, so interrupted runs can be resumed
+            - metadata.json: How the samples were generated (the model, seed, etc.)
+
+        Each sample is decoded from the latent `generator.helpers.sample_latents(latent_shape, i, i + 1, seed)`, so
+        `latent(i)` recovers the latent any sample was decoded from.
+
+        Args:
+            path: The store's directory
+            mode (str): The mode to memory-map the arrays with ("r" or "r+")
+        """
+        super().__init__()
+        self.path = Path(path)
+        self.mode = mode
+        spectrograms_path = self.path / SPECTROGRAMS_FILE
+        self.spectrograms = (
+            np.load(str(spectrograms_path), mmap_mode=mode)
+            if spectrograms_path.exists()
+            else None
+        )
+        self.completed = np.load(str(self.path / COMPLETED_FILE), mmap_mode=mode)
+        self._file = None
+        with open(self.path / METADATA_FILE) as f:
+            self.metadata = json.load(f)
+
+    @classmethod
+    def create(
+        cls, path, num_samples, spectrogram_shape=None, dtype=np.float32, metadata=None
+    ):
+        """
+        Preallocate an empty store on disk.
+
+        Args:
+            path: The directory to create the store in
+            num_samples (int): The number of samples
+            spectrogram_shape (tuple): The shape of a single spectrogram. If `None`, spectrograms aren't stored.
+            dtype: The spectrograms' dtype
+            metadata (dict): JSON-serializable information to store alongside the samples
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        spectrograms_path = path / SPECTROGRAMS_FILE
+        if spectrogram_shape is not None:
+            np.lib.format.open_memmap(
+                str(spectrograms_path),
+                mode="w+",
+                dtype=dtype,
+                shape=(num_samples, *spectrogram_shape),
+            ).flush()
+        elif spectrograms_path.exists():
+            spectrograms_path.unlink()
+        np.save(str(path / COMPLETED_FILE), np.zeros(num_samples, dtype=bool))
+        with open(path / METADATA_FILE, "w") as f:
+            json.dump(metadata or {}, f, indent=2)
+        return cls(path, mode="r+")
+
+    @property
+    def num_completed(self):
+        return int(self.completed.sum())
+
+    @property
+    def is_complete(self):
+        return bool(self.completed.all())
+
+    def audio_path(self, index):
+        """
+        The path of the audio file of sample `index`
+        """
+        audio_format = self.metadata.get("audio_format") or "wav"
+        return (
+            self.path
+            / AUDIO_DIR
+            / f"{index // AUDIO_FILES_PER_DIR:04d}"
+            / f"{index:08d}.{audio_format}"
+        )
+
+    def latent(self, index):
+        """
+        The latent that sample `index` was decoded from
+        """
+        from ..generator.helpers import sample_latents
+
+        return sample_latents(
+            self.metadata["latent_shape"], index, index + 1, seed=self.metadata["seed"]
+        )[0].numpy()
+
+    def write(self, start, spectrograms):
+        """
+        Write a batch of consecutive spectrograms, starting at index `start`.
+
+        This writes to the file rather than through the memory map, so that the written pages don't stay in this
+        process's memory: generating millions of samples doesn't grow its resident set size.
+        """
+        spectrograms = np.ascontiguousarray(spectrograms, dtype=self.spectrograms.dtype)
+        if self._file is None:
+            self._file = open(self.path / SPECTROGRAMS_FILE, "r+b")
+        self._file.seek(self.spectrograms.offset + start * spectrograms[0].nbytes)
+        self._file.write(spectrograms.data)
+
+    def commit(self, indices):
+        """
+        Write pending spectrograms to disk, and only then mark them as completed.
+        This way, an interruption can't leave samples marked as completed without having been written.
+
+        Args:
+            indices: The indices of the samples to mark as completed
+        """
+        if self._file is not None:
+            self._file.flush()
+        if self.spectrograms is not None:
+            self.spectrograms.flush()
+        self.completed[indices] = True
+        self.completed.flush()
+
+    def __getitem__(self, index):
+        """
+        Returns:
+            np.ndarray: A spectrogram
+        """
+        if self.spectrograms is None:
+            raise ValueError(
+                f"{self.path} only holds audio: load the files from `audio_path()`"
+            )
+        return np.asarray(self.spectrograms[index], dtype=np.float32)
+
+    def __len__(self):
+        return len(self.completed)
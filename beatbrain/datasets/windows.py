@@ -0,0 +1,196 @@
+import zipfile
+import itertools
+from pathlib import Path
+
+import numpy as np
+import torch
+from loguru import logger
+from natsort import natsorted
+from torch.utils.data import IterableDataset, get_worker_info
+
+from ..utils import registry, tracing
+from ..utils.core import load_arrays
+
+CHUNK_EXTENSIONS = (".npz", ".npy")
+
+
+@registry.register("dataset", "SpectrogramWindowDataset")
+class SpectrogramWindowDataset(IterableDataset):
+    def __init__(
+        self,
+        paths,
+        recursive=True,
+        window_size=1,
+        shuffle_buffer=0,
+        cycle_length=4,
+        seed=None,
+    ):
+        """
+        Streams sliding windows of consecutive precomputed spectrogram chunks from many files.
+
+        Each file holds a sequence of equally-shaped `(n_mels, frames)` chunks: either an `.npz` file of chunks (as written
+        by `utils.core.save_arrays()`) or a `(chunks, n_mels, frames)` `.npy` array (which is memory-mapped, not read upfront).
+        Each sample is a `(window_size, n_mels, frames)` stack of consecutive chunks, as a strided view of the file's chunks
+        (so windows aren't copied until they're collated into a batch).
+
+        Files are shuffled every epoch and split between DataLoader workers, so each file is read by exactly one worker.
+        Each worker interleaves the windows of `cycle_length` files at a time, and mixes them further with a bounded
+        shuffle buffer.
+
+        Args:
+            paths: A path (file or directory) or a collection of file paths
+            recursive (bool): Whether to recursively search for chunk files when a directory is provided
+            window_size (int): The number of consecutive chunks in each sample
+            shuffle_buffer (int): The number of windows to shuffle at a time. 0 or 1 streams windows (and files) in order.
+            cycle_length (int): The number of files each worker reads windows from at a time
+            seed (int): Seeds the order of files and windows, along with the epoch (which advances every time the dataset
+                is iterated over, or can be set with `set_epoch()`). If `None`, a new order is drawn from torch's random
+                number generator every epoch.
+        """
+        super().__init__()
+        if window_size < 1:
+            raise ValueError(f"window_size must be at least 1, got {window_size}")
+        self.recursive = recursive
+        self.window_size = window_size
+        self.shuffle_buffer = shuffle_buffer
+        self.cycle_length = max(1, cycle_length)
+        self.seed = seed
+        self.epoch = 0
+        if isinstance(paths, (str, Path)):
+            paths = Path(paths)
+            if paths.is_dir():
+                pattern = "**/*" if recursive else "*"
+                paths = [
+                    p
+                    for p in paths.glob(pattern)
+                    if p.suffix in CHUNK_EXTENSIONS and p.is_file()
+                ]
+            else:
+                paths = [paths]
+        self.paths = natsorted(Path(p) for p in paths)
+        with tracing.span("count_windows", num_files=len(self.paths)):
+            self.num_windows = np.array(
+                [self._count_windows(path) for path in self.paths], dtype=np.int64
+            )
+        logger.info(
+            f"Found {self.num_windows.sum()} windows of {window_size} chunks in {len(self.paths)} files"
+        )
+
+    @property
+    def shuffle(self):
+        return self.shuffle_buffer > 1
+
+    def set_epoch(self, epoch):
+        """
+        Set the epoch, which (along with `seed`) determines the order of files and windows.
+        """
+        self.epoch = epoch
+
+    def __len__(self):
+        return int(self.num_windows.sum())
+
+    def __iter__(self):
+        worker_info = get_worker_info()
+        worker_id, num_workers = (
+            (worker_info.id, worker_info.num_workers) if worker_info else (0, 1)
+        )
+        seed = self._epoch_seed(worker_info)
+        order = np.flatnonzero(self.num_windows)
+        if self.shuffle:
+            # Every worker shuffles the files the same way, so that their shards don't overlap
+            order = np.random.default_rng([seed, self.epoch]).permutation(order)
+        windows = self._interleave(order[worker_id::num_workers])
+        if self.shuffle:
+            # ...but shuffles its windows differently
+            windows = _shuffle(
+                windows,
+                self.shuffle_buffer,
+                np.random.default_rng([seed, self.epoch, worker_id + 1]),
+            )
+        # Persistent workers keep their copy of the dataset between epochs, so they move on to the next epoch's order
+        # themselves (other workers get a fresh copy of the dataset every epoch: call `set_epoch()` when using a seed)
+        self.epoch += 1
+        return windows
+
+    def load_windows(self, path):
+        """
+        Returns:
+            np.ndarray: A `(windows, window_size, n_mels, frames)` strided view of the file's chunks
+        """
+        with tracing.span("load_chunks", path=path):
+            if path.suffix == ".npy":
+                # Copy-on-write, so that windows are writeable (as torch expects) without ever modifying the file
+                chunks = np.load(str(path), mmap_mode="c")
+            else:
+                chunks = load_arrays(str(path), stack=True).astype(
+                    np.float32, copy=False
+                )
+        num_windows = max(0, len(chunks) - self.window_size + 1)
+        # Consecutive windows overlap, so each is a view (rather than a copy) of `window_size` chunks
+        return np.lib.stride_tricks.as_strided(
+            chunks,
+            shape=(num_windows, self.window_size, *chunks.shape[1:]),
+            strides=(chunks.strides[0], *chunks.strides),
+        )
+
+    def _interleave(self, indices):
+        """
+        Yield the windows of the given files, cycling between `cycle_length` open files at a time.
+        """
+        indices = iter(indices)
+        active = []
+        while True:
+            while len(active) < self.cycle_length:
+                index = next(indices, None)
+                if index is None:
+                    break
+                try:
+                    active.append(iter(self.load_windows(self.paths[index])))
+                except (OSError, ValueError, zipfile.BadZipFile) as e:
+                    logger.warning(f"Skipping {self.paths[index]}: {e}")
+            if not active:
+                return
+            for windows in list(active):
+                window = next(windows, None)
+                if window is None:
+                    active.remove(windows)
+                else:
+                    yield _as_float32(window)
+
+    def _epoch_seed(self, worker_info):
+        if self.seed is not None:
+            return self.seed
+        if worker_info is not None:
+            # DataLoader draws a new base seed every epoch, and gives worker `i` the seed `base_seed + i`
+            return worker_info.seed - worker_info.id
+        return int(torch.empty((), dtype=torch.int64).random_().item())
+
+    def _count_windows(self, path):
+        try:
+            if path.suffix == ".npy":
+                num_chunks = len(np.load(str(path), mmap_mode="r"))
+            else:
+                with np.load(str(path)) as npz:  # Only reads the archive's directory
+                    num_chunks = len(npz.files)
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            logger.warning(f"Skipping {path}: {e}")
+            return 0
+        return max(0, num_chunks - self.window_size + 1)
+
+
+def _as_float32(window):
+    # Memory-mapped chunks are only converted (i.e. read) one window at a time
+    return window if window.dtype == np.float32 else window.astype(np.float32)
+
+
+def _shuffle(items, buffer_size, rng):
+    """
+    Shuffle a stream of items with a bounded buffer: each incoming item replaces a randomly chosen buffered item, which is yielded.
+    """
+    buffer = list(itertools.islice(items, buffer_size))
+    for item in items:
+        index = rng.integers(len(buffer))
+        yield buffer[index]
+        buffer[index] = item
+    rng.shuffle(buffer)
+    yield from buffer
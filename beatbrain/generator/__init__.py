@@ -3,7 +3,7 @@ from inspect import isclass, ismodule
 from functools import lru_cache
 
 import torch
-from . import helpers, metrics
+from . import helpers, metrics, quantization
 
 logger = logging.getLogger(__name__)
 
@@ -1,38 +1,286 @@
+import math
+from functools import lru_cache
+from typing import Optional
+
 import numpy as np
 import torch
+import torch.nn.functional as F
 
+from . import quantization
 
-def reparameterize(mean, logvar, training=True):
-    if training:
-        std = torch.exp(0.5 * logvar)
-        eps = torch.randn_like(std)
-        return eps.mul(std).add_(mean)
-    else:
+LOG_2PI = math.log(2 * math.pi)
+
+
+def reparameterize(
+    mean, logvar, training: bool = True, eps: Optional[torch.Tensor] = None
+):
+    """
+    Draw `z = mean + eps * exp(logvar / 2)` with the reparameterization trick, so gradients flow to `mean` and `logvar`.
+
+    Args:
+        mean (torch.Tensor): The latent means
+        logvar (torch.Tensor): The latent log-variances
+        training (bool): If False, return `mean` unchanged
+        eps (torch.Tensor): Standard normal noise to use. Drawn with `torch.randn_like` if not given.
+    """
+    if not training:
         return mean
+    std = torch.exp(0.5 * logvar)
+    if eps is None:
+        eps = torch.randn_like(std)
+    # One fused multiply-add instead of separate multiply and add kernels
+    return torch.addcmul(mean, eps, std)
 
 
 def log_normal_pdf(sample, mean, logvar, raxis=1):
-    log2pi = torch.log(2.0 * np.pi)
+    """
+    The log-density of `sample` under a diagonal Gaussian, summed over `raxis`. `mean` and `logvar` may be floats.
+    """
+    mean = torch.as_tensor(mean, dtype=sample.dtype, device=sample.device)
+    logvar = torch.as_tensor(logvar, dtype=sample.dtype, device=sample.device)
     return torch.sum(
-        -0.5 * ((sample - mean) ** 2.0 * torch.exp(-logvar) + logvar + log2pi),
+        -0.5 * ((sample - mean) ** 2.0 * torch.exp(-logvar) + logvar + LOG_2PI),
         dim=raxis,
     )
 
 
-def sample(latent_dim, decoder, eps=None):
+def kl_divergence(mean, logvar, reduction: str = "mean"):
+    """
+    The KL divergence from a standard normal prior to the diagonal Gaussian posterior `N(mean, exp(logvar))`, in closed form.
+
+    This is the expectation of the single-sample estimate `log_normal_pdf(z, mean, logvar) - log_normal_pdf(z, 0, 0)`
+    (used by the old `KLLoss`), without its sampling noise and at a fraction of the cost.
+
+    Args:
+        mean (torch.Tensor): The latent means, with the batch along the first dimension
+        logvar (torch.Tensor): The latent log-variances
+        reduction (str): "none" for the KL divergence of each sample, or its "sum" or "mean" over the batch
+    """
+    kl = (
+        torch.addcmul(torch.exp(logvar) - logvar, mean, mean)
+        .sub_(1)
+        .flatten(1)
+        .sum(1)
+        .mul_(0.5)
+    )
+    if reduction == "none":
+        return kl
+    if reduction == "sum":
+        return kl.sum()
+    return kl.mean()
+
+
+def reconstruction_loss(recon, target, logits: bool = False, reduction: str = "mean"):
+    """
+    The squared reconstruction error of a batch of `(N, C, ...)` images, averaged over channels and summed over pixels
+    (like the old `ReconstructionLoss`).
+
+    Args:
+        recon (torch.Tensor): The reconstructions (or the decoder's logits if `logits` is True)
+        target (torch.Tensor): The images being reconstructed
+        logits (bool): Whether to apply a sigmoid to `recon` first
+        reduction (str): "none" for each sample's loss, or their "sum" or "mean" over the batch
+    """
+    if logits:
+        recon = torch.sigmoid(recon)
+    num_channels = target.shape[1]
+    if reduction == "none":
+        return (
+            F.mse_loss(recon, target, reduction="none").flatten(1).sum(1) / num_channels
+        )
+    # A single fused kernel in each direction, instead of a chain of elementwise ops and partial reductions
+    loss = F.mse_loss(recon, target, reduction="sum") / num_channels
+    if reduction == "sum":
+        return loss
+    return loss / target.shape[0]
+
+
+def vae_loss(recon, target, mean, logvar, beta: float = 1.0, logits: bool = False):
+    """
+    The negative ELBO of a batch: `reconstruction_loss + beta * kl_divergence`, averaged over the batch.
+
+    Returns:
+        tuple: The total loss, the reconstruction loss and the KL divergence
+    """
+    recon_loss = reconstruction_loss(recon, target, logits=logits)
+    kl = kl_divergence(mean, logvar)
+    return recon_loss + beta * kl, recon_loss, kl
+
+
+def sample(
+    latent_dim,
+    decoder,
+    eps=None,
+    num_samples=100,
+    quantize=None,
+    calibration_data=None,
+    seed=None,
+):
+    """
+    Decode random latent vectors.
+
+    Args:
+        latent_dim: The size (or shape) of a single latent
+        decoder: The decoder to sample with
+        eps (torch.Tensor): The latents to decode. If `None`, `num_samples` standard normal latents are drawn.
+        num_samples (int): The number of latents to draw if `eps` isn't given
+        quantize (str): If given, decode with an int8-quantized copy of the decoder: "static", or "dynamic" for
+            decoders with linear layers (see `quantization.quantize_decoder()`)
+        calibration_data (torch.Tensor): A held-out batch of latents to calibrate static quantization with
+        seed (int): If given, draw the first `num_samples` latents of `sample_latents()` for this seed
+    """
     if eps is None:
-        eps = torch.normal(0, 1, (100, latent_dim))
-    return decode(decoder, eps, apply_sigmoid=True)
+        latent_shape = _latent_shape(latent_dim)
+        if seed is None:
+            eps = torch.normal(0, 1, (num_samples, *latent_shape))
+        else:
+            eps = sample_latents(latent_shape, 0, num_samples, seed=seed)
+    return decode(
+        decoder,
+        eps,
+        apply_sigmoid=True,
+        quantize=quantize,
+        calibration_data=calibration_data,
+    )
+
+
+def sample_chunks(
+    latent_dim,
+    decoder,
+    num_samples,
+    seed=0,
+    batch_size=64,
+    start=0,
+    apply_sigmoid=True,
+    quantize=None,
+    calibration_data=None,
+):
+    """
+    Decode `num_samples` random latent vectors, a batch at a time, so that memory use doesn't grow with `num_samples`.
+
+    Samples are reproducible: the `i`-th sample of a seed is decoded from the same latent, whatever the batch size
+    (see `sample_latents()`), so sampling can be resumed from any `start`.
+
+    Args:
+        latent_dim: The size (or shape) of a single latent
+        decoder: The decoder to sample with
+        num_samples (int): The total number of samples
+        seed (int): The random seed
+        batch_size (int): The number of latents to decode at once
+        start (int): The index of the first sample to decode
+        apply_sigmoid (bool): Whether to apply a sigmoid to the decoder's output
+        quantize (str): If given, decode with an int8-quantized copy of the decoder (see `decode()`)
+        calibration_data (torch.Tensor): A held-out batch of latents to calibrate static quantization with
+
+    Yields:
+        tuple: The index of the batch's first sample, and the decoded batch
+    """
+    latent_shape = _latent_shape(latent_dim)
+    if quantize:
+        # Quantize once, rather than for every batch
+        decoder = quantization.get_quantized_decoder(
+            decoder,
+            mode=quantize,
+            calibration_data=calibration_data,
+            latent_shape=latent_shape,
+        )
+    with torch.no_grad():
+        for batch_start in range(start, num_samples, batch_size):
+            eps = sample_latents(
+                latent_shape,
+                batch_start,
+                min(batch_start + batch_size, num_samples),
+                seed=seed,
+            )
+            yield batch_start, decode(decoder, eps, apply_sigmoid=apply_sigmoid)
+
+
+def sample_latents(latent_dim, start, stop, seed=0):
+    """
+    Standard normal latents `start` to `stop` of the infinite sequence determined by `seed`.
+
+    Latents are drawn in fixed-size blocks, each from a generator seeded with `(seed, block)`, so any range of latents
+    can be drawn without drawing the ones before it.
+
+    Returns:
+        torch.Tensor: A `(stop - start, *latent_shape)` tensor
+    """
+    latent_shape = _latent_shape(latent_dim)
+    if stop <= start:
+        return torch.empty((0, *latent_shape))
+    block_size = _latent_block_size(latent_shape)
+    blocks = []
+    for block in range(start // block_size, (stop - 1) // block_size + 1):
+        offset = block * block_size
+        blocks.append(
+            _latent_block(latent_shape, seed, block)[
+                max(start - offset, 0) : stop - offset
+            ]
+        )
+    return torch.from_numpy(np.concatenate(blocks))
+
+
+# Each block of latents holds about this many numbers, so a block is a few MB whatever the latent shape
+LATENT_BLOCK_ELEMENTS = 1 << 20
+
+
+def _latent_block_size(latent_shape):
+    return max(1, LATENT_BLOCK_ELEMENTS // int(np.prod(latent_shape)))
+
+
+@lru_cache(maxsize=2)
+def _latent_block(latent_shape, seed, block):
+    # Consecutive batches usually come from the same block, so the last couple of blocks are cached
+    latents = np.random.default_rng([seed, block]).standard_normal(
+        (_latent_block_size(latent_shape), *latent_shape), dtype=np.float32
+    )
+    latents.flags.writeable = False
+    return latents
+
+
+def _latent_shape(latent_dim):
+    return (
+        tuple(latent_dim)
+        if isinstance(latent_dim, (tuple, list, torch.Size))
+        else (latent_dim,)
+    )
 
 
 def encode(encoder, x):
+    """
+    Run an encoder that outputs latent means and log-variances concatenated along the channel dimension.
+
+    Returns:
+        tuple: The means and log-variances
+    """
     inference = encoder(x)
-    mean, logvar = torch.split(inference, 2, dim=1)
+    mean, logvar = torch.chunk(inference, 2, dim=1)
     return mean, logvar
 
 
-def decode(decoder, z, apply_sigmoid=False):
-    logits = decoder(z)
+def decode(decoder, z, apply_sigmoid=False, quantize=None, calibration_data=None):
+    """
+    Args:
+        decoder: The decoder to run
+        z (torch.Tensor): A batch of latents
+        apply_sigmoid (bool): Whether to apply a sigmoid to the decoder's output
+        quantize (str): If given, decode with an int8-quantized copy of the decoder: "static", or "dynamic" for
+            decoders with linear layers.
+            Unless `calibration_data` is given, the quantized copy is cached (see `quantization.get_quantized_decoder()`).
+        calibration_data (torch.Tensor): A held-out batch of latents to calibrate static quantization with.
+            If `None`, standard normal latents are used.
+    """
+    if quantize:
+        decoder = quantization.get_quantized_decoder(
+            decoder,
+            mode=quantize,
+            calibration_data=calibration_data,
+            latent_shape=z.shape[1:],
+        )
+        with torch.no_grad():
+            logits = decoder(z)
+    else:
+        logits = decoder(z)
     if apply_sigmoid:
         probs = torch.sigmoid(logits)
         return probs
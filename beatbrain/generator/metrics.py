@@ -1,15 +1,17 @@
-import scipy
+import scipy.fft
+import scipy.signal
 import numpy as np
 
+EPS = np.finfo(np.float64).eps
+
 
 def ncc(a, b, sweep=False):
     """
     Compute the normalized cross-correlation between two signals:
     https://www.ncbi.nlm.nih.gov/pmc/articles/PMC6147431/#sec001title
-    
+
     Be careful when using this function with zero-arrays (returns 0)
     """
-    eps = np.finfo(np.float).eps
     corr = scipy.signal.correlate(a, b)
     if not sweep:
         mid = ()
@@ -17,5 +19,138 @@ def ncc(a, b, sweep=False):
             i = np.floor((d - 1) / 2).astype(int)
             mid += ((slice(i, i + 2) if d % 2 == 0 else [i]),)
         corr = corr[mid].mean(axis=0)
-    norm = np.sqrt((a ** 2).sum() * (b ** 2).sum()) + eps
+    norm = np.sqrt((a**2).sum() * (b**2).sum()) + EPS
     return corr / norm
+
+
+def batch_ncc(a, b, sweep=False, chunk_size=64):
+    """
+    Compute the normalized cross-correlation between each pair of signals `(a[i], b[i])`.
+    Equivalent to `np.stack([ncc(x, y, sweep=sweep) for x, y in zip(a, b)])` for equally-shaped signals.
+
+    The zero-lag correlation is computed as a direct dot product, and sweeps use FFT-based correlation.
+
+    Args:
+        a (np.ndarray): A batch of signals of shape `(N, ...)`
+        b (np.ndarray): A batch of signals with the same shape as `a`
+        sweep (bool): If True, return the NCC at every lag (shape `(N, *(2 * np.array(a.shape[1:]) - 1))`). Otherwise, only the zero-lag NCC (shape `(N,)`).
+        chunk_size (int): The maximum number of pairs to process at once. Bounds the memory used by intermediate arrays.
+    """
+    a, b = _as_batches(a, b)
+    if a.shape != b.shape:
+        raise ValueError(
+            f"Expected batches of the same shape, got {a.shape} and {b.shape}"
+        )
+    norms = (np.sqrt(_sum_squares(a) * _sum_squares(b)) + EPS).astype(
+        a.dtype, copy=False
+    )
+    if not sweep:
+        corr = np.concatenate(
+            [
+                np.einsum(
+                    "ij,ij->i",
+                    _flatten(a[i : i + chunk_size]),
+                    _flatten(b[i : i + chunk_size]),
+                )
+                for i in range(0, len(a), chunk_size)
+            ]
+        )
+        return corr / norms
+    signal_shape = a.shape[1:]
+    fft_shape, axes = _fft_shape(signal_shape), _signal_axes(signal_shape)
+    corr = np.empty((len(a), *_full_shape(signal_shape)), dtype=a.dtype)
+    for i in range(0, len(a), chunk_size):
+        spectra = scipy.fft.rfftn(a[i : i + chunk_size], fft_shape, axes=axes)
+        spectra *= np.conj(scipy.fft.rfftn(b[i : i + chunk_size], fft_shape, axes=axes))
+        corr[i : i + chunk_size] = _correlation_from_spectra(spectra, signal_shape)
+    return corr / norms.reshape(-1, *[1] * len(signal_shape))
+
+
+def pairwise_ncc(a, b=None, sweep=False, chunk_size=64):
+    """
+    Compute the normalized cross-correlation between every pair of signals `(a[i], b[j])`.
+
+    Without `sweep`, this is a (chunked) matrix product of the flattened signals.
+    With `sweep`, correlations at every lag are computed with FFTs, and the peak NCC over all lags is returned for each pair.
+
+    Args:
+        a (np.ndarray): A batch of signals of shape `(N, ...)`
+        b (np.ndarray): A batch of signals of shape `(M, ...)`. If `None`, `a` is compared against itself.
+        sweep (bool): Whether to return the maximum NCC over all lags instead of the zero-lag NCC
+        chunk_size (int): The maximum number of signals (or signal pairs, when sweeping) to process at once
+
+    Returns:
+        np.ndarray: An `(N, M)` matrix of NCC values
+    """
+    a, b = _as_batches(a, a if b is None else b)
+    if a.shape[1:] != b.shape[1:]:
+        raise ValueError(
+            f"Expected signals of the same shape, got {a.shape[1:]} and {b.shape[1:]}"
+        )
+    norms = (np.sqrt(np.outer(_sum_squares(a), _sum_squares(b))) + EPS).astype(
+        a.dtype, copy=False
+    )
+    corr = np.empty((len(a), len(b)), dtype=a.dtype)
+    if not sweep:
+        flat_b = _flatten(b)
+        for i in range(0, len(a), chunk_size):
+            corr[i : i + chunk_size] = _flatten(a[i : i + chunk_size]) @ flat_b.T
+        return corr / norms
+
+    signal_shape = a.shape[1:]
+    fft_shape, axes = _fft_shape(signal_shape), _signal_axes(signal_shape)
+    # Each step correlates `a_chunk` rows against `b_chunk` columns, so keep the number of pairs near `chunk_size`
+    b_chunk = min(len(b), chunk_size)
+    a_chunk = max(1, chunk_size // b_chunk)
+    for j in range(0, len(b), b_chunk):
+        b_spectra = np.conj(scipy.fft.rfftn(b[j : j + b_chunk], fft_shape, axes=axes))
+        for i in range(0, len(a), a_chunk):
+            a_spectra = scipy.fft.rfftn(a[i : i + a_chunk], fft_shape, axes=axes)
+            full = _correlation_from_spectra(
+                a_spectra[:, None] * b_spectra[None, :], signal_shape
+            )
+            corr[i : i + a_chunk, j : j + b_chunk] = full.reshape(
+                *full.shape[:2], -1
+            ).max(axis=-1)
+    return corr / norms
+
+
+def _as_batches(a, b):
+    a, b = np.asarray(a), np.asarray(b)
+    # Keep single precision inputs in single precision
+    dtype = np.result_type(a, b, np.float32)
+    return a.astype(dtype, copy=False), b.astype(dtype, copy=False)
+
+
+def _flatten(x):
+    return x.reshape(len(x), -1)
+
+
+def _sum_squares(x):
+    flat = _flatten(x)
+    return np.einsum("ij,ij->i", flat, flat)
+
+
+def _signal_axes(signal_shape):
+    # Signals occupy the trailing axes, after one or more batch axes
+    return list(range(-len(signal_shape), 0))
+
+
+def _full_shape(signal_shape):
+    return tuple(2 * n - 1 for n in signal_shape)
+
+
+def _fft_shape(signal_shape):
+    # Zero-padding to at least the full correlation length avoids circular wrap-around
+    return [scipy.fft.next_fast_len(n, real=True) for n in _full_shape(signal_shape)]
+
+
+def _correlation_from_spectra(spectra, signal_shape):
+    """
+    Invert cross-power spectra into full cross-correlations laid out like `scipy.signal.correlate`'s output
+    """
+    fft_shape, axes = _fft_shape(signal_shape), _signal_axes(signal_shape)
+    corr = scipy.fft.irfftn(spectra, fft_shape, axes=axes)
+    # Index 0 holds lag 0 and negative lags wrap around to the end: roll them to the front and crop the padding
+    corr = np.roll(corr, [n - 1 for n in signal_shape], axis=axes)
+    return corr[(Ellipsis, *[slice(0, n) for n in _full_shape(signal_shape)])]
@@ -0,0 +1,247 @@
+import copy
+import itertools
+import time
+import weakref
+
+import torch
+import torch.nn as nn
+import torch.nn.intrinsic as nni
+import torch.quantization as tq
+
+from ..models.export import fold_batchnorm
+from .metrics import batch_ncc
+
+MODES = ["dynamic", "static"]
+# Layers with int8 weights
+QUANTIZABLE = (
+    nn.Conv1d,
+    nn.Conv2d,
+    nn.Linear,
+    nni.ConvReLU1d,
+    nni.ConvReLU2d,
+    nni.LinearReLU,
+)
+# Layers with int8 kernels, which can sit between quantized layers without converting back to float
+QUANTIZED_PASSTHROUGH = (
+    nn.ReLU,
+    nn.MaxPool2d,
+    nn.AvgPool2d,
+    nn.Upsample,
+    nn.UpsamplingNearest2d,
+    nn.Identity,
+)
+FUSABLE_PATTERNS = [(nn.Conv1d, nn.ReLU), (nn.Conv2d, nn.ReLU), (nn.Linear, nn.ReLU)]
+
+_cache = weakref.WeakKeyDictionary()
+
+
+def quantize_decoder(
+    decoder, mode="static", calibration_data=None, calibration_batch_size=64
+):
+    """
+    Create an int8-quantized copy of a decoder for fast CPU inference. The original decoder isn't modified.
+
+    Modes:
+        - "dynamic": `nn.Linear` weights are stored in int8 and activations are quantized on the fly.
+          Needs no calibration, but PyTorch has no dynamically quantized convolutions, so conv layers stay in float32
+          (and decoders without linear layers, like the convolutional decoders in `beatbrain.models`, are rejected).
+        - "static": Conv and linear layers (fused with following ReLUs, and with BatchNorm folded in) run in int8.
+          Consecutive layers that have int8 kernels (ReLU, pooling, nearest upsampling) stay quantized in between.
+          Activation ranges are calibrated by running `calibration_data` through the decoder.
+
+    Args:
+        decoder (nn.Module): The decoder to quantize
+        mode (str): One of "dynamic", "static"
+        calibration_data (torch.Tensor): A held-out batch of latents to calibrate activation ranges with. Required for "static".
+        calibration_batch_size (int): The batch size to run calibration with
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown quantization mode: {mode}. Expected one of {MODES}")
+    decoder = fold_batchnorm(copy.deepcopy(decoder).eval())
+    if mode == "dynamic":
+        if not any(isinstance(m, nn.Linear) for m in decoder.modules()):
+            raise ValueError(
+                "Dynamic quantization only quantizes linear layers, and the decoder has none. Use static quantization"
+            )
+        return tq.quantize_dynamic(decoder, {nn.Linear}, dtype=torch.qint8)
+    if calibration_data is None:
+        raise ValueError("Static quantization requires a batch of `calibration_data`")
+
+    qconfig = tq.get_default_qconfig(torch.backends.quantized.engine)
+    _wrap_quantizable(decoder, qconfig)
+    tq.prepare(decoder, inplace=True)
+    with torch.no_grad():
+        for batch in calibration_data.split(calibration_batch_size):
+            decoder(batch)
+    return tq.convert(decoder, inplace=True)
+
+
+def get_quantized_decoder(
+    decoder,
+    mode="static",
+    calibration_data=None,
+    latent_shape=None,
+    num_calibration_samples=256,
+):
+    """
+    Like `quantize_decoder()`, but the quantized decoder is cached (per decoder) when it's calibrated with the default
+    calibration data.
+
+    If `calibration_data` isn't given for static quantization, a held-out batch of `num_calibration_samples`
+    standard normal latents of shape `latent_shape` is drawn (with a fixed seed) instead. Decoders quantized with the
+    given `calibration_data` aren't cached.
+
+    The decoder is quantized again whenever its weights change (through in-place updates like optimizer steps and
+    `load_state_dict()`, or by replacing a parameter or buffer).
+    """
+    if calibration_data is not None:
+        return quantize_decoder(decoder, mode=mode, calibration_data=calibration_data)
+    if mode == "static" and latent_shape is None:
+        raise ValueError(
+            "Either `calibration_data` or `latent_shape` is required for static quantization"
+        )
+    # Tensors' version counters go up with every in-place modification. The cache keeps the tensors alive, so that
+    # their ids aren't reused by tensors that replace them.
+    tensors = list(itertools.chain(decoder.parameters(), decoder.buffers()))
+    version = tuple((id(tensor), tensor._version) for tensor in tensors)
+    key = (
+        (mode, version)
+        if mode != "static"
+        else (mode, version, tuple(latent_shape), num_calibration_samples)
+    )
+    cached = _cache.get(decoder)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    if mode == "static":
+        generator = torch.Generator().manual_seed(0)
+        calibration_data = torch.randn(
+            num_calibration_samples, *latent_shape, generator=generator
+        )
+    quantized = quantize_decoder(decoder, mode=mode, calibration_data=calibration_data)
+    _cache[decoder] = (key, quantized, tensors)
+    return quantized
+
+
+def compare_decoders(
+    decoder, quantized_decoder, latents, targets=None, batch_size=100, repeats=3
+):
+    """
+    Measure the quality and throughput of a quantized decoder relative to the float32 original.
+
+    Args:
+        decoder (nn.Module): The float32 decoder
+        quantized_decoder (nn.Module): The quantized decoder
+        latents (torch.Tensor): Latents to decode
+        targets (torch.Tensor): If given (e.g. the inputs that `latents` were encoded from), also report each
+            decoder's reconstruction MSE/NCC against them.
+        batch_size (int): The batch size to decode with when measuring throughput
+        repeats (int): The number of passes over `latents` to time
+
+    Returns:
+        dict: MSE and mean NCC of the quantized outputs vs. the float32 outputs, reconstruction metrics (if `targets` is given)
+        and samples/sec of both decoders.
+    """
+    with torch.no_grad():
+        reference = decoder(latents)
+        quantized = quantized_decoder(latents)
+    report = {
+        "mse_vs_float32": torch.mean((quantized - reference) ** 2).item(),
+        "ncc_vs_float32": float(batch_ncc(quantized.numpy(), reference.numpy()).mean()),
+    }
+    if targets is not None:
+        for name, output in [("float32", reference), ("int8", quantized)]:
+            report[f"reconstruction_mse_{name}"] = torch.mean(
+                (output - targets) ** 2
+            ).item()
+            report[f"reconstruction_ncc_{name}"] = float(
+                batch_ncc(output.numpy(), targets.numpy()).mean()
+            )
+        report["reconstruction_mse_delta"] = (
+            report["reconstruction_mse_int8"] - report["reconstruction_mse_float32"]
+        )
+        report["reconstruction_ncc_delta"] = (
+            report["reconstruction_ncc_int8"] - report["reconstruction_ncc_float32"]
+        )
+    for name, model in [("float32", decoder), ("int8", quantized_decoder)]:
+        report[f"{name}_samples_per_sec"] = _throughput(
+            model, latents, batch_size, repeats
+        )
+    report["speedup"] = (
+        report["int8_samples_per_sec"] / report["float32_samples_per_sec"]
+    )
+    return report
+
+
+def _throughput(model, latents, batch_size, repeats):
+    with torch.no_grad():
+        model(latents[:batch_size])  # Warm up
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for batch in latents.split(batch_size):
+                model(batch)
+    return repeats * len(latents) / (time.perf_counter() - start)
+
+
+def _wrap_quantizable(module, qconfig):
+    """
+    Surround quantizable layers with quantize/dequantize stubs (in place), so the rest of the module keeps running in float32.
+    Within `nn.Sequential`s, runs of consecutive int8-capable layers share a single pair of stubs.
+    """
+    if isinstance(module, nn.Sequential) and not isinstance(module, QUANTIZABLE):
+        _fuse_sequential(module)
+        children, run = [], []
+
+        def flush():
+            if any(isinstance(m, QUANTIZABLE) for m in run):
+                children.append(_quant_wrapper(nn.Sequential(*run), qconfig))
+            else:
+                children.extend(run)
+            run.clear()
+
+        for child in module:
+            if isinstance(child, QUANTIZABLE) or (
+                run and isinstance(child, QUANTIZED_PASSTHROUGH)
+            ):
+                run.append(child)
+            else:
+                flush()
+                _wrap_quantizable(child, qconfig)
+                children.append(child)
+        flush()
+        for name in list(module._modules):
+            del module._modules[name]
+        for i, child in enumerate(children):
+            module.add_module(str(i), child)
+        return module
+    for name, child in module.named_children():
+        if isinstance(child, QUANTIZABLE):
+            setattr(module, name, _quant_wrapper(child, qconfig))
+        else:
+            _wrap_quantizable(child, qconfig)
+    return module
+
+
+def _quant_wrapper(module, qconfig):
+    wrapper = tq.QuantWrapper(module)
+    # Only wrapped layers get a qconfig, so that layers without int8 kernels are left alone
+    wrapper.qconfig = qconfig
+    return wrapper
+
+
+def _fuse_sequential(module):
+    # Folding BatchNorm leaves `nn.Identity`s behind, which shouldn't stop a conv from being fused with its ReLU
+    layers = [
+        (name, child)
+        for name, child in module.named_children()
+        if not isinstance(child, nn.Identity)
+    ]
+    groups, i = [], 0
+    while i < len(layers) - 1:
+        (name, child), (next_name, next_child) = layers[i], layers[i + 1]
+        if (type(child), type(next_child)) in FUSABLE_PATTERNS:
+            groups.append([name, next_name])
+            i += 2
+        else:
+            i += 1
+    if groups:
+        tq.fuse_modules(module, groups, inplace=True)
@@ -0,0 +1,401 @@
+"""
+A local HTTP server for generation requests, which decodes latents in dynamically formed micro-batches.
+
+Endpoints:
+    - GET /health: The server's latent shape, batching options and batching statistics
+    - POST /decode: Decode latents. Body: `{"latents": [...], "audio": false}`
+    - POST /sample: Decode random latents. Body: `{"num_samples": 1, "seed": null, "audio": false}`
+
+Responses are JSON, or a single `.npy` array if the request's `Accept` header is `application/x-npy`.
+"""
+import io
+import json
+import time
+import queue
+import socket
+import logging
+import threading
+import http.client
+from pathlib import Path
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NPY_CONTENT_TYPE = "application/x-npy"
+_STOP = object()
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch_size=64, max_latency=0.01):
+        """
+        Groups concurrently submitted inputs into batches, so that `fn` runs once per batch instead of once per request.
+
+        A batch is run as soon as it holds `max_batch_size` inputs, or `max_latency` seconds after its first request arrived.
+        Requests are never split across batches, so a single request larger than `max_batch_size` forms its own batch.
+
+        Args:
+            fn: A function mapping a `(N, ...)` array of inputs to a `(N, ...)` array of outputs
+            max_batch_size (int): The maximum number of inputs per batch
+            max_latency (float): The maximum time (in seconds) a request waits for other requests to batch with
+        """
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.num_batches = 0
+        self.num_inputs = 0
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="MicroBatcher", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, inputs):
+        """
+        Queue a request.
+
+        Args:
+            inputs (np.ndarray): A `(N, ...)` array of inputs
+
+        Returns:
+            Future: Resolves to the `(N, ...)` array of outputs for `inputs`
+        """
+        future = Future()
+        self._queue.put((np.asarray(inputs), future, time.perf_counter()))
+        return future
+
+    def __call__(self, inputs):
+        return self.submit(inputs).result()
+
+    @property
+    def stats(self):
+        return {
+            "batches": self.num_batches,
+            "inputs": self.num_inputs,
+            "mean_batch_size": (
+                self.num_inputs / self.num_batches if self.num_batches else 0
+            ),
+        }
+
+    def _run(self):
+        pending = None
+        while True:
+            request = pending if pending is not None else self._queue.get()
+            pending = None
+            if request is _STOP:
+                return
+            batch, size = [request], len(request[0])
+            deadline = request[2] + self.max_latency
+            while size < self.max_batch_size:
+                try:
+                    request = self._queue.get(
+                        timeout=max(0, deadline - time.perf_counter())
+                    )
+                except queue.Empty:
+                    break
+                if request is _STOP or size + len(request[0]) > self.max_batch_size:
+                    # Leave it for the next batch
+                    pending = request
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        inputs = [request[0] for request in batch]
+        try:
+            outputs = self.fn(np.concatenate(inputs) if len(inputs) > 1 else inputs[0])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        self.num_batches += 1
+        self.num_inputs += len(outputs)
+        for output, (_, future, _) in zip(
+            np.split(outputs, np.cumsum([len(x) for x in inputs])[:-1]), batch
+        ):
+            future.set_result(output)
+
+
+class GenerationServer:
+    def __init__(
+        self,
+        decode_fn,
+        latent_shape,
+        max_batch_size=64,
+        max_latency=0.01,
+        audio_options=None,
+    ):
+        """
+        Serves decoding requests over HTTP, batching concurrent requests with a `MicroBatcher`.
+
+        Args:
+            decode_fn: A function mapping a `(N, *latent_shape)` float32 array of latents to a `(N, C, n_mels, frames)` array of spectrograms
+            latent_shape (tuple): The shape of a single latent
+            max_batch_size (int): The maximum number of latents decoded at once
+            max_latency (float): The maximum time (in seconds) a request waits for other requests to batch with
+            audio_options (dict): Keyword arguments for `utils.core.spectrogram_to_audio()`, used when a request asks for audio
+        """
+        self.latent_shape = tuple(latent_shape)
+        self.batcher = MicroBatcher(
+            decode_fn, max_batch_size=max_batch_size, max_latency=max_latency
+        )
+        audio_options = dict(audio_options or {})
+        # Spectrograms are normalized relative to their peak (see `datasets.SpectrogramClipDataset`), so denormalize them to a peak power of 1.
+        # This also keeps `librosa.feature.inverse.mel_to_audio()`'s NNLS solve well-conditioned (and fast).
+        norm_kwargs = {"ref": 1.0, **audio_options.pop("norm_kwargs", {})}
+        self.audio_options = {
+            "denormalize": True,
+            "norm_kwargs": norm_kwargs,
+            **audio_options,
+        }
+        self._server = None
+
+    def decode(self, latents, audio=False):
+        """
+        Decode a batch of latents (batched together with any concurrent requests).
+
+        Returns:
+            np.ndarray: Spectrograms, or a `(N, C, samples)` array of audio if `audio` is True
+        """
+        latents = np.asarray(latents, dtype=np.float32).reshape(-1, *self.latent_shape)
+        spectrograms = self.batcher(latents)
+        if not audio:
+            return spectrograms
+        return self.to_audio(spectrograms)
+
+    def sample(self, num_samples=1, seed=None, audio=False):
+        """
+        Decode `num_samples` standard normal latents.
+        """
+        latents = np.random.default_rng(seed).standard_normal(
+            (num_samples, *self.latent_shape), dtype=np.float32
+        )
+        return self.decode(latents, audio=audio)
+
+    def to_audio(self, spectrograms):
+        # Runs in the request's thread, so concurrent requests are inverted in parallel
+        from ..utils.core import spectrogram_to_audio
+
+        return np.stack(
+            [
+                np.stack(
+                    [
+                        spectrogram_to_audio(channel, **self.audio_options)
+                        for channel in spectrogram
+                    ]
+                )
+                for spectrogram in spectrograms
+            ]
+        ).astype(np.float32, copy=False)
+
+    def serve(self, host="127.0.0.1", port=8080, socket_path=None):
+        """
+        Serve requests until interrupted, on a TCP port or (if `socket_path` is given) a Unix socket.
+        """
+        self.start(host=host, port=port, socket_path=socket_path)
+        logger.info(f"Serving on {socket_path or f'http://{host}:{self.port}'}")
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def start(self, host="127.0.0.1", port=8080, socket_path=None):
+        """
+        Bind the server and start the batcher, without handling requests yet.
+
+        Returns:
+            The underlying `socketserver` server. Call its `serve_forever()` (e.g. in a thread) to handle requests.
+        """
+        self.batcher.start()
+        if socket_path:
+            if Path(socket_path).exists():
+                Path(socket_path).unlink()
+            self._server = _ThreadingUnixHTTPServer(
+                str(socket_path), _make_handler(self, tcp=False)
+            )
+        else:
+            self._server = _ThreadingHTTPServer((host, port), _make_handler(self))
+        return self._server
+
+    @property
+    def port(self):
+        return (
+            self._server.server_address[1]
+            if isinstance(self._server, _ThreadingHTTPServer)
+            else None
+        )
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if isinstance(self._server, _ThreadingUnixHTTPServer):
+                Path(self._server.server_address).unlink()
+            self._server = None
+        self.batcher.close()
+
+    def health(self):
+        return {
+            "status": "ok",
+            "latent_shape": list(self.latent_shape),
+            "max_batch_size": self.batcher.max_batch_size,
+            "max_latency": self.batcher.max_latency,
+            **self.batcher.stats,
+        }
+
+
+class GenerationClient:
+    def __init__(self, host="127.0.0.1", port=8080, socket_path=None, timeout=60):
+        """
+        A minimal client for a `GenerationServer`, on a TCP port or a Unix socket. Responses are fetched as `.npy` arrays.
+        Each client holds a single keep-alive connection, so use one client per thread.
+        """
+        if socket_path:
+            self.connection = _UnixHTTPConnection(str(socket_path), timeout=timeout)
+        else:
+            self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def health(self):
+        self.connection.request("GET", "/health")
+        return json.loads(self._read())
+
+    def decode(self, latents, audio=False):
+        return self._post(
+            "/decode", {"latents": np.asarray(latents).tolist(), "audio": audio}
+        )
+
+    def sample(self, num_samples=1, seed=None, audio=False):
+        return self._post(
+            "/sample", {"num_samples": num_samples, "seed": seed, "audio": audio}
+        )
+
+    def close(self):
+        self.connection.close()
+
+    def _post(self, path, payload):
+        headers = {"Content-Type": "application/json", "Accept": NPY_CONTENT_TYPE}
+        self.connection.request("POST", path, body=json.dumps(payload), headers=headers)
+        return np.load(io.BytesIO(self._read()))
+
+    def _read(self):
+        response = self.connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise RuntimeError(
+                f"Request failed with status {response.status}: {body.decode()}"
+            )
+        return body
+
+
+def _make_handler(server, tcp=True):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately, which interacts badly with delayed ACKs unless Nagle's algorithm is off
+        disable_nagle_algorithm = tcp
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._respond(server.health())
+            else:
+                self._error(404, f"Unknown endpoint: {self.path}")
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/decode":
+                    output = server.decode(
+                        payload["latents"], audio=payload.get("audio", False)
+                    )
+                elif self.path == "/sample":
+                    output = server.sample(
+                        payload.get("num_samples", 1),
+                        seed=payload.get("seed"),
+                        audio=payload.get("audio", False),
+                    )
+                else:
+                    return self._error(404, f"Unknown endpoint: {self.path}")
+            except (KeyError, ValueError, TypeError) as e:
+                return self._error(400, f"Bad request: {e!r}")
+            except Exception as e:
+                logger.exception("Failed to handle request")
+                return self._error(500, repr(e))
+            if NPY_CONTENT_TYPE in self.headers.get("Accept", ""):
+                buffer = io.BytesIO()
+                np.save(buffer, output)
+                self._send(200, buffer.getvalue(), NPY_CONTENT_TYPE)
+            else:
+                key = "audio" if payload.get("audio") else "spectrograms"
+                response = {key: output.tolist(), "shape": list(output.shape)}
+                if payload.get("audio"):
+                    response["sample_rate"] = server.audio_options.get("sr", 22050)
+                self._respond(response)
+
+        def _respond(self, obj):
+            self._send(200, json.dumps(obj).encode(), "application/json")
+
+        def _error(self, status, message):
+            self._send(
+                status, json.dumps({"error": message}).encode(), "application/json"
+            )
+
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    return Handler
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def get_request(self):
+        # Unix socket clients have no address, but request handlers expect one
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=60):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
@@ -3,6 +3,19 @@ High-level helper functions and classes.
 To avoid circular imports, none of the other Pantheon-AI packages should import this package.
 """
 
-from . import train
+from . import train, inference, export, encode, search, serve, profiling, sample, dedupe
 
-from .train import get_trainer, get_pl_loggers, train_model
+from .train import (
+    get_trainer,
+    get_pl_loggers,
+    get_callbacks,
+    get_dataloader,
+    train_model,
+)
+from .inference import load_model
+from .export import export_model
+from .encode import encode_dataset
+from .sample import sample_to_disk
+from .search import search_latents
+from .profiling import profile_data
+from .dedupe import dedupe_files
@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import logging
+import tempfile
+from pathlib import Path
+from contextlib import ExitStack
+
+import numpy as np
+from joblib import Parallel, delayed
+from natsort import natsorted
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from tqdm import tqdm
+
+from ..datasets.audio import list_audio_files
+from ..datasets.fingerprints import FingerprintStore, INFO_DTYPE, METADATA_FILE
+from ..index import HammingIndex
+from ..utils.fingerprint import NUM_BYTES, fingerprint_file
+from ..utils.writer import write_atomic
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint_files(
+    paths, output, recursive=True, n_jobs=-2, chunk_size=1024, resume=True
+):
+    """
+    Fingerprint audio files (see `utils.fingerprint`) into a `FingerprintStore`.
+
+    Files are fingerprinted by `n_jobs` worker processes, `chunk_size` files at a time, and each chunk is committed once
+    it's written. If the run is interrupted, running it again resumes from the last commit.
+
+    Args:
+        paths: A path (directory, `.txt` file list or audio file), or a list of paths, to find audio files in
+        output: The directory to write the store to
+        recursive (bool): Whether to recursively search directories for files
+        n_jobs (int): The number of worker processes (as in `joblib.Parallel`)
+        chunk_size (int): The number of files between commits
+        resume (bool): Whether to resume an existing store at `output`. If False, it's overwritten.
+
+    Returns:
+        FingerprintStore: The completed store
+    """
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    files = natsorted(
+        {
+            str(file)
+            for path in paths
+            for file in list_audio_files(path, recursive=recursive)
+        }
+    )
+    output = Path(output)
+    if resume and (output / METADATA_FILE).exists():
+        store = FingerprintStore(output, mode="r+")
+        if store.paths != files:
+            raise ValueError(
+                f"The fingerprint store at {output} was created from different files. Disable `resume` to overwrite it."
+            )
+        logger.info(
+            f"Resuming {output}: {int(store.completed.sum())}/{len(store)} files already fingerprinted"
+        )
+    else:
+        store = FingerprintStore.create(output, files)
+    remaining = np.flatnonzero(~store.completed)
+
+    start = time.perf_counter()
+    with Parallel(n_jobs=n_jobs, backend="loky") as parallel, tqdm(
+        total=len(remaining), unit="files"
+    ) as progress:
+        for i in range(0, len(remaining), chunk_size):
+            indices = remaining[i : i + chunk_size]
+            fingerprints, infos = zip(
+                *parallel(delayed(_fingerprint)(files[index]) for index in indices)
+            )
+            store.fingerprints[indices] = np.stack(fingerprints)
+            store.info[indices] = np.array(list(infos), dtype=INFO_DTYPE)
+            store.commit(indices)
+            progress.update(len(indices))
+    if len(remaining):
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Fingerprinted {len(remaining)} files in {elapsed:.1f}s ({len(remaining) / elapsed:.1f} files/sec) to {output}"
+        )
+    return store
+
+
+def _fingerprint(path):
+    """
+    Returns:
+        tuple: A file's fingerprint and its `INFO_DTYPE` fields. Files that can't be read get an empty, invalid entry.
+    """
+    try:
+        fingerprint, info = fingerprint_file(path)
+    except (RuntimeError, ValueError):
+        # SoundFile raises a `RuntimeError` when it fails to read a file
+        return np.zeros(NUM_BYTES, dtype=np.uint8), (False, 0, 0, 0, False, 0)
+    return fingerprint, (
+        True,
+        info["duration"],
+        info["sample_rate"],
+        info["channels"],
+        info["lossless"],
+        os.path.getsize(path),
+    )
+
+
+def find_duplicates(
+    store, max_distance=24, duration_tolerance=0.05, band_bits=16, max_bucket_size=64
+):
+    """
+    Group the near-duplicate files in a `FingerprintStore`, and choose a canonical file from each group.
+
+    Files are near-duplicates if their fingerprints are within `max_distance` bits of each other (found with a
+    `HammingIndex`) and their durations are within `duration_tolerance` of each other. Groups are the connected
+    components of near-duplicate pairs. Each group's canonical file is the highest quality one: lossless files are
+    preferred, then higher sample rates, more channels, and larger files. Ties go to the first file.
+
+    Args:
+        store (FingerprintStore): The fingerprinted files
+        max_distance (int): The maximum Hamming distance (in bits, out of `utils.fingerprint.NUM_BITS`) between near-duplicates
+        duration_tolerance (float): The maximum difference in duration between near-duplicates, as a fraction of the longer one
+        band_bits (int): Passed to `HammingIndex`
+        max_bucket_size (int): Passed to `HammingIndex`
+
+    Returns:
+        tuple: The (sorted) store indices of the canonical file of every group and of every file without duplicates, and a
+        list of the groups of near-duplicates (as arrays of store indices, starting with the canonical file)
+    """
+    info = np.asarray(store.info)
+    valid = np.flatnonzero(info["valid"] & np.asarray(store.completed))
+    pairs, _ = HammingIndex(
+        store.fingerprints[valid], band_bits=band_bits, max_bucket_size=max_bucket_size
+    ).pairs(max_distance)
+    pairs = valid[pairs]
+    durations = info["duration"][pairs]
+    pairs = pairs[
+        np.abs(durations[:, 0] - durations[:, 1])
+        <= duration_tolerance * durations.max(axis=1, initial=0)
+    ]
+    graph = coo_matrix(
+        (np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])),
+        shape=(len(store), len(store)),
+    )
+    _, labels = connected_components(graph, directed=False)
+
+    # Sort by group, then from the best file to the worst
+    order = np.lexsort(
+        (
+            valid,
+            -info["size"][valid],
+            -info["channels"][valid],
+            -info["sample_rate"][valid],
+            ~info["lossless"][valid],
+            labels[valid],
+        )
+    )
+    tracks = valid[order]
+    starts = np.flatnonzero(np.diff(labels[tracks], prepend=-1))
+    groups = [group for group in np.split(tracks, starts[1:]) if len(group) > 1]
+    return np.sort(tracks[starts]), groups
+
+
+def dedupe_files(
+    paths,
+    output,
+    store=None,
+    recursive=True,
+    max_distance=24,
+    duration_tolerance=0.05,
+    groups_path=None,
+    n_jobs=-2,
+    resume=True,
+):
+    """
+    Find near-duplicate audio files (e.g. re-encodes or copies in several formats), and write a list of canonical files
+    (one per group of duplicates, plus every file without duplicates) that `AudioClipDataset` can load as its `paths`.
+
+    Args:
+        paths: A path (directory, `.txt` file list or audio file), or a list of paths, to find audio files in
+        output: The text file to write the canonical files' (absolute) paths to, one per line
+        store: A directory to keep fingerprints in, so that they can be reused (or an interrupted run resumed).
+            If `None`, they're discarded.
+        recursive (bool): Whether to recursively search directories for files
+        max_distance (int): See `find_duplicates`
+        duration_tolerance (float): See `find_duplicates`
+        groups_path: If given, also write the groups of duplicates to this JSON file
+        n_jobs (int): The number of worker processes computing fingerprints
+        resume (bool): Whether to reuse fingerprints from an existing store
+
+    Returns:
+        dict: The number of files found, readable files, canonical files, duplicates and groups of duplicates
+    """
+    with ExitStack() as stack:
+        store_path = store or stack.enter_context(tempfile.TemporaryDirectory())
+        store = fingerprint_files(
+            paths, store_path, recursive=recursive, n_jobs=n_jobs, resume=resume
+        )
+        canonical, groups = find_duplicates(
+            store, max_distance=max_distance, duration_tolerance=duration_tolerance
+        )
+        num_valid = int(store.info["valid"].sum())
+        files = [os.path.abspath(path) for path in store.paths]
+
+    def write_list(temp_path):
+        with open(temp_path, "w") as f:
+            f.writelines(f"{files[i]}\n" for i in canonical)
+
+    write_atomic(write_list, output)
+    if groups_path:
+        with open(groups_path, "w") as f:
+            json.dump(
+                [
+                    {
+                        "canonical": files[group[0]],
+                        "duplicates": [files[i] for i in group[1:]],
+                    }
+                    for group in groups
+                ],
+                f,
+                indent=2,
+            )
+    summary = {
+        "num_files": len(files),
+        "num_valid": num_valid,
+        "num_canonical": len(canonical),
+        "num_duplicates": num_valid - len(canonical),
+        "num_groups": len(groups),
+    }
+    logger.info(
+        f"Found {summary['num_duplicates']} duplicates of {summary['num_groups']} files. Wrote {len(canonical)} canonical files to {output}"
+    )
+    return summary
@@ -0,0 +1,170 @@
+import json
+import time
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from torch.utils.data import Subset
+from tqdm import tqdm
+
+from ..datasets.latents import LatentStore, METADATA_FILE
+from ..utils.config import Config, get_default_config
+from .inference import load_model
+from .train import get_dataloader, get_dataset
+
+logger = logging.getLogger(__name__)
+
+
+def encode_dataset(
+    config: Config,
+    output,
+    weights_path=None,
+    dataset="train",
+    paths=None,
+    batch_size=None,
+    num_workers=None,
+    commit_every=20,
+    resume=True,
+):
+    """
+    Encode every sample of a dataset with a trained model, into a memory-mapped `LatentStore`.
+
+    Samples are loaded in large batches by DataLoader workers (using the config's `data` options) while the model runs,
+    and latents are written to disk by a background thread, so throughput is bounded by the model.
+    Progress is committed every `commit_every` batches. If the run is interrupted, running it again resumes from the last commit.
+
+    Args:
+        config (Config): Either a path to a YAML file, or a dict-like object defining the model and data.
+        output: The directory to write the latent store to
+        weights_path: A checkpoint to load. Overrides `model.weights_path` in the config.
+        dataset (str): The dataset section of the config to encode (`data.<dataset>`)
+        paths: If given, overrides the dataset's `paths`
+        batch_size (int): Overrides `data.batch_size`
+        num_workers (int): Overrides `data.num_workers`
+        commit_every (int): The number of batches between commits
+        resume (bool): Whether to resume an existing store at `output`. If False, it's overwritten.
+
+    Returns:
+        LatentStore: The completed latent store
+    """
+    if isinstance(config, (str, Path)):
+        config = Config.load(config)
+    config = Config(config or get_default_config())
+    dataset_config = Config(config.data[dataset])
+    if not dataset_config:
+        raise ValueError(
+            f"The config doesn't define a `data.{dataset}` dataset to encode"
+        )
+    if paths:
+        dataset_config.paths = str(paths)
+    data_config = Config(config.data)
+    if batch_size:
+        data_config.batch_size = batch_size
+    if num_workers is not None:
+        data_config.num_workers = num_workers
+    data_config.drop_last = False
+
+    data = get_dataset(dataset_config)
+    ids = segment_ids(data)
+    metadata = {
+        "paths": [str(path) for path in getattr(data, "paths", [])],
+        "dataset": dataset_config.to_dict(),
+        "architecture": config.model.architecture,
+        "weights_path": str(weights_path or config.model.weights_path or ""),
+    }
+    output = Path(output)
+    store = None
+    if resume and (output / METADATA_FILE).exists():
+        store = LatentStore(output, mode="r+")
+        # Compare the metadata as it was stored, since JSON turns tuples into lists
+        if store.metadata != json.loads(json.dumps(metadata)) or not np.array_equal(
+            store.ids, ids
+        ):
+            raise ValueError(
+                f"The latent store at {output} was created differently. Disable `resume` to overwrite it."
+            )
+        logger.info(
+            f"Resuming {output}: {int(store.completed.sum())}/{len(store)} latents already encoded"
+        )
+    remaining = (
+        np.arange(len(ids)) if store is None else np.flatnonzero(~store.completed)
+    )
+    if len(remaining) == 0:
+        return store
+
+    model = load_model(config, weights_path=weights_path)
+    loader = get_dataloader(
+        Subset(data, remaining),
+        data_config,
+        default_batch_size=config.hparams.batch_size or 1,
+    )
+    writer = ThreadPoolExecutor(max_workers=1)
+    pending_write, uncommitted = None, []
+
+    def write(indices, latents, commit):
+        store.latents[indices] = latents
+        uncommitted.append(indices)
+        if commit:
+            store.commit(np.concatenate(uncommitted))
+            uncommitted.clear()
+
+    start, offset = time.perf_counter(), 0
+    with torch.no_grad(), tqdm(total=len(remaining), unit="samples") as progress:
+        for i, batch in enumerate(loader):
+            x = batch[0] if isinstance(batch, (tuple, list)) else batch
+            latents = model.encode(x).cpu().numpy()
+            if store is None:
+                store = LatentStore.create(
+                    output,
+                    ids,
+                    latents.shape[1:],
+                    dtype=latents.dtype,
+                    metadata=metadata,
+                )
+            elif latents.shape[1:] != store.latent_shape:
+                raise ValueError(
+                    f"Expected latents of shape {store.latent_shape}, got {latents.shape[1:]}"
+                )
+            indices = remaining[offset : offset + len(latents)]
+            offset += len(latents)
+            # Only one write is in flight at a time, which bounds memory use if the disk falls behind
+            if pending_write is not None:
+                pending_write.result()
+            pending_write = writer.submit(
+                write, indices, latents, (i + 1) % commit_every == 0
+            )
+            progress.update(len(latents))
+    if pending_write is not None:
+        pending_write.result()
+    writer.shutdown()
+    if uncommitted:
+        store.commit(np.concatenate(uncommitted))
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Encoded {len(remaining)} samples in {elapsed:.1f}s ({len(remaining) / elapsed:.1f} samples/sec) to {output}"
+    )
+    return store
+
+
+def segment_ids(dataset):
+    """
+    Returns:
+        np.ndarray: A `(N, 2)` array of the `(track, segment)` that each of a dataset's samples comes from.
+        Datasets that aren't split into segments (i.e. without a `num_track_segments` attribute) have one segment per sample.
+        Segments that a dataset excludes (see `AudioClipDataset`'s `min_level`) have no ids.
+    """
+    num_track_segments = getattr(dataset, "num_track_segments", None)
+    if num_track_segments is None:
+        return np.stack(
+            [np.arange(len(dataset)), np.zeros(len(dataset), dtype=np.int64)], axis=1
+        )
+    num_track_segments = np.asarray(num_track_segments, dtype=np.int64)
+    tracks = np.repeat(np.arange(len(num_track_segments)), num_track_segments)
+    track_starts = np.repeat(
+        np.cumsum(num_track_segments) - num_track_segments, num_track_segments
+    )
+    ids = np.stack([tracks, np.arange(len(tracks)) - track_starts], axis=1)
+    segment_index = getattr(dataset, "segment_index", None)
+    return ids if segment_index is None else ids[segment_index]
@@ -0,0 +1,45 @@
+import logging
+
+from ..models.export import FORMATS, export_modules
+from ..utils.config import Config
+from .inference import load_model
+
+logger = logging.getLogger(__name__)
+
+
+def export_model(
+    config: Config,
+    output,
+    weights_path=None,
+    formats=tuple(FORMATS),
+    input_shape=None,
+    batch_size=1,
+):
+    """
+    Export a trained model's encoder and decoder for inference with `beatbrain.runtime.ExportedModel`.
+
+    Args:
+        config (Config): Either a path to a YAML file, or a dict-like object defining the model.
+        output: The directory to write artifacts to
+        weights_path: A checkpoint to load. Overrides `model.weights_path` in the config.
+        formats: Any of "torchscript", "onnx"
+        input_shape: The shape of a single input. Defaults to the model class' `input_shape` attribute.
+        batch_size (int): The batch size of the example inputs used for tracing
+    """
+    model = load_model(config, weights_path=weights_path)
+    input_shape = input_shape or getattr(model, "input_shape", None)
+    if input_shape is None:
+        raise ValueError(
+            f"{type(model).__name__} doesn't define an `input_shape`: please specify one"
+        )
+    metadata = export_modules(
+        model.encoder,
+        model.decoder,
+        output,
+        input_shape,
+        formats=formats,
+        metadata={"architecture": type(model).__name__},
+        batch_size=batch_size,
+    )
+    logger.info(f"Exported {type(model).__name__} to {output}: {metadata}")
+    return metadata
@@ -0,0 +1,34 @@
+import logging
+from pathlib import Path
+
+import torch
+
+from .. import models
+from ..utils.config import Config, get_default_config
+from ..utils import registry
+
+logger = logging.getLogger(__name__)
+
+
+def load_model(config: Config = None, weights_path=None):
+    """
+    Instantiate a registered model from a Config and load its trained weights, in eval mode.
+
+    Args:
+        config (Config): Either a path to a YAML file, or a dict-like object. Uses `model.architecture`, `model.weights_path` and `hparams`.
+        weights_path: A checkpoint (or state dict) to load. Overrides `model.weights_path` in the config.
+    """
+    if isinstance(config, (str, Path)):
+        config = Config.load(config)
+    config = Config(config or get_default_config())
+    model = registry.get_model(config.model.architecture)(config.hparams)
+    weights_path = weights_path or config.model.weights_path
+    if weights_path:
+        logger.info(f"Loading weights from {weights_path}")
+        checkpoint = torch.load(str(weights_path), map_location="cpu")
+        model.load_state_dict(checkpoint.get("state_dict", checkpoint))
+    else:
+        logger.warning(
+            f"No weights given: {type(model).__name__} is randomly initialized"
+        )
+    return model.eval()
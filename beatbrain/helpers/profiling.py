@@ -0,0 +1,282 @@
+import os
+import time
+import logging
+from pathlib import Path
+
+import numpy as np
+import resampy
+import soundfile as sf
+from torch.utils.data import Dataset, get_worker_info
+
+from ..datasets.audio import AudioClipDataset, SpectrogramClipDataset
+from ..utils.config import Config, get_default_config
+from ..utils.core import audio_to_spectrogram, normalize_spectrogram
+from .train import get_dataloader, get_dataset
+
+logger = logging.getLogger(__name__)
+
+AUDIO_STAGES = ["open", "seek", "decode", "resample", "downmix"]
+SPECTROGRAM_STAGES = ["spectrogram", "normalize", "pad"]
+STAGES = AUDIO_STAGES + SPECTROGRAM_STAGES + ["collate"]
+
+
+def profile_data(
+    config,
+    dataset="train",
+    paths=None,
+    num_samples=256,
+    batch_size=None,
+    num_workers=None,
+    warmup=1,
+    seed=0,
+):
+    """
+    Measure how long each stage of the data pipeline takes, by loading a random sample of a dataset the way training would.
+
+    Segments are loaded by DataLoader workers (using the config's `data` options), following the same steps as
+    `AudioClipDataset` and `SpectrogramClipDataset` with each step timed: opening the file, seeking, decoding, resampling,
+    downmixing, computing the mel spectrogram, normalizing it, padding it, and collating the batch.
+
+    Args:
+        config (Config): Either a path to a YAML file, or a dict-like object with a `data` section (e.g. a training config)
+        dataset (str): The dataset section of the config to profile (`data.<dataset>`)
+        paths: If given, overrides the dataset's `paths`
+        num_samples (int): The number of segments to load
+        batch_size (int): Overrides `data.batch_size`
+        num_workers (int): Overrides `data.num_workers`
+        warmup (int): The number of batches to leave out of the results (worker startup and JIT compilation make them slow)
+        seed (int): Seeds the choice of segments
+
+    Returns:
+        dict: The profile. Stage latencies (`stages`) are in seconds per sample (or per batch for `collate`), and `wait`
+        is the time the main process spent waiting for each batch.
+    """
+    if isinstance(config, (str, Path)):
+        config = Config.load(config)
+    config = Config(config or get_default_config())
+    dataset_config = Config(config.data[dataset])
+    if not dataset_config:
+        raise ValueError(
+            f"The config doesn't define a `data.{dataset}` dataset to profile"
+        )
+    if paths:
+        dataset_config.paths = str(paths)
+    data_config = Config(config.data)
+    if batch_size:
+        data_config.batch_size = batch_size
+    if num_workers is not None:
+        data_config.num_workers = num_workers
+    data_config.drop_last = False
+
+    start = time.perf_counter()
+    data = get_dataset(dataset_config)
+    scan_time = time.perf_counter() - start
+    if not isinstance(data, AudioClipDataset):
+        raise TypeError(f"Can only profile audio datasets, not {type(data).__name__}")
+    indices = np.sort(
+        np.random.default_rng(seed).choice(
+            len(data), min(num_samples, len(data)), replace=False
+        )
+    )
+    loader = get_dataloader(
+        _ProfiledDataset(data, indices),
+        data_config,
+        default_batch_size=config.hparams.batch_size or 1,
+    )
+    loader.collate_fn = _ProfilingCollator(loader.collate_fn)
+    warmup = warmup if warmup < len(loader) else 0
+    logger.info(
+        f"Profiling {len(indices)} segments of {len(data)} with {loader.num_workers} workers (batch size {loader.batch_size})"
+    )
+
+    timings, waits, worker_cpu = {stage: [] for stage in STAGES}, [], 0
+    iterator = iter(loader)
+    start, cpu_start = time.perf_counter(), time.process_time()
+    for i in range(len(loader)):
+        wait_start = time.perf_counter()
+        _, batch_timings = next(iterator)
+        if i < warmup:
+            # Start measuring once the warmup batches are in
+            start, cpu_start = time.perf_counter(), time.process_time()
+            continue
+        waits.append(time.perf_counter() - wait_start)
+        for stage, values in batch_timings["stages"].items():
+            timings[stage].extend(values)
+        if batch_timings["worker"]:
+            worker_cpu += batch_timings["cpu"]
+    wall_time = time.perf_counter() - start
+    cpu_time = time.process_time() - cpu_start + worker_cpu
+    del iterator
+
+    num_profiled = len(timings["open"])
+    return {
+        "dataset": type(data).__name__,
+        "num_files": len(data.paths),
+        "num_segments": len(data),
+        "scan_time": scan_time,
+        "num_samples": num_profiled,
+        "num_batches": len(waits),
+        "batch_size": loader.batch_size,
+        "num_workers": loader.num_workers,
+        "wall_time": wall_time,
+        "samples_per_sec": num_profiled / wall_time if wall_time else 0,
+        "cpu_time": cpu_time,
+        "cpu_count": os.cpu_count(),
+        "cpu_utilization": (
+            cpu_time / (wall_time * (os.cpu_count() or 1)) if wall_time else 0
+        ),
+        "wait": summarize(waits),
+        "stages": {
+            stage: summarize(values) for stage, values in timings.items() if values
+        },
+    }
+
+
+def profile_item(dataset, index):
+    """
+    Load a segment of an `AudioClipDataset` (or `SpectrogramClipDataset`) like `dataset[index]` does, timing each step.
+
+    Returns:
+        tuple: The sample (as returned by `dataset[index]`), and a dictionary mapping each stage to its duration (in seconds)
+    """
+    watch = _Stopwatch()
+    track_index, segment = dataset.locate(index)
+    with sf.SoundFile(str(dataset.paths[track_index])) as file:
+        watch.lap("open")
+        sr = file.samplerate
+        start_pos, num_samples = dataset.segment_bounds(sr, segment)
+        file.seek(start_pos)
+        watch.lap("seek")
+        audio = file.read(
+            num_samples,
+            dtype=np.float32,
+            fill_value=0 if dataset.pad else None,
+            always_2d=True,
+        ).T
+        watch.lap("decode")
+    if dataset.sample_rate is not None and dataset.sample_rate != sr:
+        audio = resampy.resample(audio, sr, dataset.sample_rate, filter="kaiser_fast")
+        sr = dataset.sample_rate
+    watch.lap("resample")
+    if dataset.mono and audio.ndim > 1:
+        audio = audio.mean(0, keepdims=True)
+    watch.lap("downmix")
+    if not isinstance(dataset, SpectrogramClipDataset):
+        return (audio, sr), watch.timings
+
+    specs = [
+        audio_to_spectrogram(
+            channel,
+            sr=sr,
+            n_fft=dataset.n_fft,
+            hop_length=dataset.hop_length,
+            n_mels=dataset.n_mels,
+        )
+        for channel in audio
+    ]
+    watch.lap("spectrogram")
+    if dataset.normalize:
+        specs = [normalize_spectrogram(spec, top_db=dataset.top_db) for spec in specs]
+    spec = np.stack(specs).astype(np.float32, copy=False)
+    watch.lap("normalize")
+    spec = dataset.fit_frames(spec)
+    watch.lap("pad")
+    return (spec, sr), watch.timings
+
+
+def summarize(values):
+    """
+    Returns:
+        dict: The mean, median, 99th percentile and total of a list of durations
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return {"mean": 0.0, "p50": 0.0, "p99": 0.0, "total": 0.0}
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p99": float(np.percentile(values, 99)),
+        "total": float(values.sum()),
+    }
+
+
+def format_profile(profile):
+    """
+    Format a profile from `profile_data()` as a human-readable table.
+    """
+    stages = profile["stages"]
+    # Each stage's share of the total time spent loading samples (collation is amortized over the batch)
+    total = sum(stats["total"] for stats in stages.values()) or 1
+    lines = [
+        f"{profile['dataset']}: {profile['num_files']} files, {profile['num_segments']} segments (scanned in {profile['scan_time']:.2f}s)",
+        f"Profiled {profile['num_samples']} samples in {profile['num_batches']} batches of {profile['batch_size']} "
+        f"with {profile['num_workers']} workers",
+        "",
+        f"{'stage':<12}{'mean (ms)':>12}{'p50 (ms)':>12}{'p99 (ms)':>12}{'share':>9}",
+    ]
+    for stage, stats in stages.items():
+        lines.append(
+            f"{stage:<12}{stats['mean'] * 1e3:>12.3f}{stats['p50'] * 1e3:>12.3f}{stats['p99'] * 1e3:>12.3f}{stats['total'] / total:>9.1%}"
+        )
+    wait = profile["wait"]
+    lines += [
+        f"{'wait':<12}{wait['mean'] * 1e3:>12.3f}{wait['p50'] * 1e3:>12.3f}{wait['p99'] * 1e3:>12.3f}",
+        "",
+        f"Throughput: {profile['samples_per_sec']:.1f} samples/s ({profile['wall_time']:.2f}s)",
+        f"CPU utilization: {profile['cpu_utilization']:.1%} of {profile['cpu_count']} cores ({profile['cpu_time']:.2f}s CPU time)",
+    ]
+    return "\n".join(lines)
+
+
+class _Stopwatch:
+    def __init__(self):
+        self.timings = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = now - self._last
+        self._last = now
+
+
+class _ProfiledDataset(Dataset):
+    """
+    Loads the given segments of a dataset with `profile_item()`, returning `(sample, timings)` tuples.
+    """
+
+    def __init__(self, dataset, indices):
+        self.dataset = dataset
+        self.indices = indices
+
+    def __getitem__(self, index):
+        cpu_start = time.process_time()
+        sample, timings = profile_item(self.dataset, self.indices[index])
+        return sample, timings, time.process_time() - cpu_start
+
+    def __len__(self):
+        return len(self.indices)
+
+
+class _ProfilingCollator:
+    """
+    Wraps a collate function to time it, and gathers the timings of each sample in the batch.
+    """
+
+    def __init__(self, collate_fn):
+        self.collate_fn = collate_fn
+
+    def __call__(self, batch):
+        samples, sample_timings, sample_cpu = zip(*batch)
+        cpu_start, start = time.process_time(), time.perf_counter()
+        output = self.collate_fn(list(samples))
+        stages = {
+            stage: [timings[stage] for timings in sample_timings]
+            for stage in sample_timings[0]
+        }
+        stages["collate"] = [time.perf_counter() - start]
+        cpu = sum(sample_cpu) + time.process_time() - cpu_start
+        return output, {
+            "stages": stages,
+            "cpu": cpu,
+            "worker": get_worker_info() is not None,
+        }
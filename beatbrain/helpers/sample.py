@@ -0,0 +1,209 @@
+import time
+import logging
+import multiprocessing
+from pathlib import Path
+from collections import deque
+
+import numpy as np
+import soundfile as sf
+import torch
+from tqdm import tqdm
+
+from ..datasets.samples import SampleStore, METADATA_FILE
+from ..generator import helpers as generator_helpers
+from ..utils.config import Config, get_default_config
+from ..utils.writer import write_atomic
+from .inference import load_model
+from .serve import get_audio_options
+
+logger = logging.getLogger(__name__)
+
+AUDIO_FORMATS = ("wav", "flac", "ogg")
+# librosa's default sample rate, which `spectrogram_to_audio()` assumes when the config doesn't give one
+DEFAULT_SAMPLE_RATE = 22050
+
+
+def sample_to_disk(
+    config: Config,
+    output,
+    num_samples,
+    seed=0,
+    weights_path=None,
+    batch_size=64,
+    spectrograms=True,
+    dtype="float32",
+    audio_format=None,
+    num_workers=None,
+    quantize=None,
+    commit_every=20,
+    resume=True,
+):
+    """
+    Decode `num_samples` random latents with a trained model, into a `SampleStore` of memory-mapped spectrograms
+    and/or audio files.
+
+    Latents are drawn and decoded a batch at a time, and each batch is written out before the next one is decoded,
+    so memory use doesn't depend on `num_samples`. When audio is requested, spectrograms are inverted to audio (with
+    Griffin-Lim) by `num_workers` processes while the model decodes the next batches. At most two batches per worker
+    are waiting to be inverted, so decoding pauses if inversion falls behind.
+
+    Samples only depend on `seed` (see `generator.helpers.sample_latents()`), not on the batch size. Progress is
+    committed every `commit_every` batches: if the run is interrupted, running it again resumes from the last commit.
+
+    Args:
+        config (Config): Either a path to a YAML file, or a dict-like object defining the model. Its `data.train`
+            dataset options (sample_rate, n_fft, hop_length, top_db) are used to invert spectrograms to audio.
+        output: The directory to write the store to
+        num_samples (int): The number of samples to generate
+        seed (int): The random seed
+        weights_path: A checkpoint to load. Overrides `model.weights_path` in the config.
+        batch_size (int): The number of latents to decode at once
+        spectrograms (bool): Whether to store the decoded spectrograms
+        dtype (str): The dtype to store spectrograms as (e.g. "float16" to halve their size)
+        audio_format (str): If given, also write each sample as an audio file in this format ("wav", "flac" or "ogg")
+        num_workers (int): The number of processes inverting spectrograms to audio. If 0, audio is inverted in the
+            main process. Defaults to the number of CPUs minus one.
+        quantize (str): If given, decode with an int8-quantized copy of the decoder ("static", or "dynamic" for decoders with linear layers)
+        commit_every (int): The number of batches between commits
+        resume (bool): Whether to resume an existing store at `output`. If False, it's overwritten.
+
+    Returns:
+        SampleStore: The completed store
+    """
+    if not spectrograms and not audio_format:
+        raise ValueError(
+            "Nothing to write: enable `spectrograms` and/or give an `audio_format`"
+        )
+    if audio_format and audio_format not in AUDIO_FORMATS:
+        raise ValueError(
+            f"Unsupported audio format {audio_format!r}. Expected one of {list(AUDIO_FORMATS)}"
+        )
+    if isinstance(config, (str, Path)):
+        config = Config.load(config)
+    config = Config(config or get_default_config())
+    model = load_model(config, weights_path=weights_path)
+    input_shape = getattr(model, "input_shape", None)
+    if input_shape is None:
+        raise ValueError(
+            f"{type(model).__name__} doesn't define an `input_shape`, so its latent shape is unknown"
+        )
+    with torch.no_grad():
+        latent_shape = tuple(model.encode(torch.zeros(1, *input_shape)).shape[1:])
+        spectrogram_shape = tuple(model.decode(torch.zeros(1, *latent_shape)).shape[1:])
+    metadata = {
+        "num_samples": num_samples,
+        "seed": seed,
+        "latent_shape": list(latent_shape),
+        "spectrogram_shape": list(spectrogram_shape),
+        "dtype": dtype if spectrograms else None,
+        "audio_format": audio_format,
+        "architecture": config.model.architecture,
+        "weights_path": str(weights_path or config.model.weights_path or ""),
+        "quantize": quantize,
+    }
+
+    output = Path(output)
+    if resume and (output / METADATA_FILE).exists():
+        store = SampleStore(output, mode="r+")
+        if store.metadata != metadata:
+            raise ValueError(
+                f"The sample store at {output} was generated differently. Disable `resume` to overwrite it."
+            )
+        logger.info(
+            f"Resuming {output}: {store.num_completed}/{num_samples} samples already generated"
+        )
+    else:
+        store = SampleStore.create(
+            output,
+            num_samples,
+            spectrogram_shape if spectrograms else None,
+            dtype=dtype,
+            metadata=metadata,
+        )
+    # Samples are committed in order, so the completed samples are always the first ones
+    start = store.num_completed
+    if start == num_samples:
+        return store
+
+    audio_options = get_audio_options(config)
+    if num_workers is None:
+        num_workers = max(1, multiprocessing.cpu_count() - 1)
+    pool = None
+    if audio_format and num_workers > 0:
+        pool = multiprocessing.get_context("spawn").Pool(num_workers)
+    batches = generator_helpers.sample_chunks(
+        latent_shape,
+        model.decoder,
+        num_samples,
+        seed=seed,
+        batch_size=batch_size,
+        start=start,
+        apply_sigmoid=False,
+        quantize=quantize,
+    )
+    # Batches whose audio is still being written, in order
+    in_flight, uncommitted = deque(), []
+
+    def complete(wait):
+        while in_flight and (
+            wait or in_flight[0][1] is None or in_flight[0][1].ready()
+        ):
+            indices, result = in_flight.popleft()
+            if result is not None:
+                result.get()
+            uncommitted.append(indices)
+        if len(uncommitted) >= commit_every or (wait and uncommitted):
+            store.commit(np.concatenate(uncommitted))
+            uncommitted.clear()
+
+    start_time = time.perf_counter()
+    try:
+        with tqdm(total=num_samples - start, unit="samples") as progress:
+            for batch_start, batch in batches:
+                batch = batch.numpy()
+                indices = np.arange(batch_start, batch_start + len(batch))
+                if store.spectrograms is not None:
+                    store.write(batch_start, batch)
+                result = None
+                if audio_format:
+                    paths = [store.audio_path(i) for i in indices]
+                    if pool is None:
+                        write_audio(batch, paths, audio_options)
+                    else:
+                        # Bound the number of batches held in memory while waiting to be inverted
+                        while len(in_flight) >= 2 * num_workers:
+                            in_flight[0][1].wait()
+                            complete(wait=False)
+                        result = pool.apply_async(
+                            write_audio, (batch, paths, audio_options)
+                        )
+                in_flight.append((indices, result))
+                complete(wait=False)
+                progress.update(len(batch))
+            complete(wait=True)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - start_time
+    logger.info(
+        f"Generated {num_samples - start} samples in {elapsed:.1f}s ({(num_samples - start) / elapsed:.1f} samples/sec) to {output}"
+    )
+    return store
+
+
+def write_audio(spectrograms, paths, audio_options):
+    """
+    Invert a batch of `(channels, n_mels, frames)` spectrograms to audio, and write each one (atomically) to its path.
+    """
+    from ..utils.core import spectrogram_to_audio
+
+    sample_rate = audio_options.get("sr", DEFAULT_SAMPLE_RATE)
+    for spectrogram, path in zip(spectrograms, paths):
+        audio = np.stack(
+            [spectrogram_to_audio(channel, **audio_options) for channel in spectrogram]
+        )
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(
+            lambda temp_path: sf.write(str(temp_path), audio.T, sample_rate), path
+        )
@@ -0,0 +1,151 @@
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from ..datasets.latents import LatentStore
+from ..index import ExactIndex, IVFIndex
+
+logger = logging.getLogger(__name__)
+
+INDEXES = ["exact", "ivf"]
+
+
+def get_index(store, index="exact", metric="cosine", num_lists=None, rebuild=False):
+    """
+    Get a search index over a latent store's latents.
+
+    IVF indexes are built on first use and saved inside the store (in `ivf_<metric>/`), so later searches can reuse them.
+    Re-creating the store (e.g. with `encode_dataset(resume=False)`) deletes them.
+
+    Args:
+        store (LatentStore): The latent store to search
+        index (str): "exact" (brute force search) or "ivf" (approximate search)
+        metric (str): "cosine" or "l2"
+        num_lists (int): The number of clusters in an IVF index. A saved index with a different number of clusters is rebuilt.
+        rebuild (bool): Whether to rebuild a saved IVF index
+    """
+    if index not in INDEXES:
+        raise ValueError(f"Unknown index: {index}. Expected one of {INDEXES}")
+    if not store.is_complete:
+        raise ValueError(
+            f"The latent store at {store.path} is incomplete. Resume encoding before searching it."
+        )
+    if index == "exact":
+        return ExactIndex(store.latents, metric=metric)
+    path = store.path / f"ivf_{metric}"
+    if path.exists() and not rebuild:
+        ivf = IVFIndex.load(path)
+        if len(ivf) == len(store) and (not num_lists or ivf.num_lists == num_lists):
+            return ivf
+    logger.info(f"Building an IVF index over {len(store)} latents")
+    ivf = IVFIndex.build(store.latents, metric=metric, num_lists=num_lists)
+    ivf.save(path)
+    return ivf
+
+
+def search_latents(
+    store,
+    rows=None,
+    track=None,
+    segment=None,
+    k=10,
+    index="exact",
+    metric="cosine",
+    num_lists=None,
+    num_probes=None,
+    exclude_same_track=True,
+    rebuild=False,
+):
+    """
+    Find the segments that are most similar to some query segments, within a latent store.
+
+    Queries are given either as latent store rows, or as a track (and optionally a segment of that track).
+
+    Args:
+        store: A `LatentStore`, or the path to one
+        rows: Row indices of the query latents
+        track: The path or id of a track to query with
+        segment (int): The segment of `track` to query with. If `None`, every segment of the track is used.
+        k (int): The number of results per query
+        index (str): "exact" or "ivf"
+        metric (str): "cosine" or "l2"
+        num_lists (int): The number of clusters in an IVF index
+        num_probes (int): The number of IVF clusters to search per query
+        exclude_same_track (bool): Whether to leave out results from the query's own track
+        rebuild (bool): Whether to rebuild a saved IVF index
+
+    Returns:
+        list: For each query, a dictionary with the query's row, track, segment and path, and a list of up to `k` `matches`
+        (dictionaries with each match's row, track, segment, path and distance).
+    """
+    if not isinstance(store, LatentStore):
+        store = LatentStore(store)
+    rows = query_rows(store, rows=rows, track=track, segment=segment)
+    search_index = get_index(
+        store, index=index, metric=metric, num_lists=num_lists, rebuild=rebuild
+    )
+    # Fetch enough extra results to make up for the ones from the query's own track
+    search_k = k + (
+        int(np.bincount(store.ids[:, 0]).max()) if exclude_same_track else 0
+    )
+    search_kwargs = {"num_probes": num_probes} if index == "ivf" else {}
+    distances, indices = search_index.search(
+        store.latents[rows], min(search_k, len(store)), **search_kwargs
+    )
+
+    results = []
+    for row, row_distances, row_indices in zip(rows, distances, indices):
+        query_track = store.ids[row, 0]
+        matches = []
+        for distance, index in zip(row_distances, row_indices):
+            if index < 0 or (exclude_same_track and store.ids[index, 0] == query_track):
+                continue
+            matches.append({**_describe(store, index), "distance": float(distance)})
+            if len(matches) == k:
+                break
+        results.append({**_describe(store, row), "matches": matches})
+    return results
+
+
+def query_rows(store, rows=None, track=None, segment=None):
+    """
+    Resolve a search query to an array of latent store rows.
+
+    Args:
+        store (LatentStore): The latent store
+        rows: Row indices
+        track: A track path, or a track id
+        segment (int): A segment of `track`. If `None`, all of the track's segments are used.
+    """
+    if rows is not None and len(rows):
+        return np.asarray(rows, dtype=np.int64)
+    if track is None:
+        raise ValueError("Either query rows or a query track is required")
+    try:
+        track_id = int(track)
+    except ValueError:
+        resolved = [str(Path(path).resolve()) for path in store.paths]
+        if str(Path(track).resolve()) not in resolved:
+            raise ValueError(f"{track} isn't in the latent store")
+        track_id = resolved.index(str(Path(track).resolve()))
+    mask = store.ids[:, 0] == track_id
+    if segment is not None:
+        mask &= store.ids[:, 1] == segment
+    if not mask.any():
+        raise ValueError(
+            f"Couldn't find track {track}"
+            + (f", segment {segment}" if segment is not None else "")
+            + " in the latent store"
+        )
+    return np.flatnonzero(mask)
+
+
+def _describe(store, row):
+    track, segment = (int(i) for i in store.ids[row])
+    return {
+        "row": int(row),
+        "track": track,
+        "segment": segment,
+        "path": store.paths[track] if store.paths else None,
+    }
@@ -0,0 +1,127 @@
+import logging
+
+import numpy as np
+import torch
+
+from ..generator import helpers as generator_helpers
+from ..generator import quantization
+from ..generator.serving import GenerationServer
+from ..utils.config import Config
+from .inference import load_model
+
+logger = logging.getLogger(__name__)
+
+# Dataset options that describe how spectrograms were computed, and so how to invert them to audio
+AUDIO_OPTIONS = {"sample_rate": "sr", "n_fft": "n_fft", "hop_length": "hop_length"}
+
+
+def serve(
+    config: Config = None,
+    weights_path=None,
+    export_dir=None,
+    backend="torchscript",
+    quantize=None,
+    host="127.0.0.1",
+    port=8080,
+    socket_path=None,
+    max_batch_size=64,
+    max_latency_ms=2,
+    num_threads=None,
+):
+    """
+    Serve a model's decoder over HTTP (see `generator.serving`), decoding concurrent requests in micro-batches.
+
+    Args:
+        config (Config): Either a path to a YAML file, or a dict-like object defining the model.
+        Its `data.train` dataset options (sample_rate, n_fft, hop_length, top_db) are used to invert spectrograms to audio.
+        weights_path: A checkpoint to load. Overrides `model.weights_path` in the config.
+        export_dir: A directory of artifacts from `beatbrain models export` to serve instead of the Lightning model
+        backend (str): The backend to run exported artifacts with ("torchscript" or "onnx")
+        quantize (str): If given, decode with an int8-quantized copy of the Lightning model's decoder ("static", or "dynamic" for decoders with linear layers)
+        host (str): The host to listen on
+        port (int): The port to listen on
+        socket_path: If given, listen on this Unix socket instead of a TCP port
+        max_batch_size (int): The maximum number of latents decoded at once
+        max_latency_ms (float): The maximum time (in milliseconds) a request waits for other requests to batch with
+        num_threads (int): The number of threads PyTorch (or onnxruntime) uses per batch
+    """
+    decode_fn, latent_shape = get_decode_fn(
+        config,
+        weights_path,
+        export_dir,
+        backend=backend,
+        quantize=quantize,
+        num_threads=num_threads,
+    )
+    server = GenerationServer(
+        decode_fn,
+        latent_shape,
+        max_batch_size=max_batch_size,
+        max_latency=max_latency_ms / 1000,
+        audio_options=get_audio_options(config),
+    )
+    server.serve(host=host, port=port, socket_path=socket_path)
+
+
+def get_decode_fn(
+    config=None,
+    weights_path=None,
+    export_dir=None,
+    backend="torchscript",
+    quantize=None,
+    num_threads=None,
+):
+    """
+    Returns:
+        tuple: A function that decodes a numpy array of latents to a numpy array of spectrograms, and the shape of a single latent
+    """
+    if export_dir:
+        from ..runtime import ExportedModel
+
+        model = ExportedModel(export_dir, backend=backend, num_threads=num_threads)
+        return lambda z: model.decode(z).numpy(), model.latent_shape
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    model = load_model(config, weights_path=weights_path)
+    input_shape = getattr(model, "input_shape", None)
+    if input_shape is None:
+        raise ValueError(
+            f"{type(model).__name__} doesn't define an `input_shape`, so its latent shape is unknown"
+        )
+    with torch.no_grad():
+        latent_shape = tuple(model.encode(torch.zeros(1, *input_shape)).shape[1:])
+    decoder = model.decoder
+    if quantize:
+        decoder = quantization.get_quantized_decoder(
+            decoder, mode=quantize, latent_shape=latent_shape
+        )
+
+    def decode_fn(z):
+        with torch.no_grad():
+            return generator_helpers.decode(
+                decoder, torch.from_numpy(np.asarray(z))
+            ).numpy()
+
+    return decode_fn, latent_shape
+
+
+def get_audio_options(config=None):
+    """
+    Returns:
+        dict: Keyword arguments for `utils.core.spectrogram_to_audio()`, from the config's `data.train` dataset options
+    """
+    if config is None:
+        return {}
+    config = Config.load(config) if not isinstance(config, dict) else Config(config)
+    dataset_config = config.data.train
+    options = {
+        name: dataset_config[key]
+        for key, name in AUDIO_OPTIONS.items()
+        if dataset_config.get(key) is not None
+    }
+    if dataset_config:
+        # Spectrogram datasets normalize spectrograms by default, so models output normalized spectrograms
+        options["denormalize"] = dataset_config.get("normalize", True)
+    if dataset_config.get("top_db") is not None:
+        options["norm_kwargs"] = {"top_db": dataset_config.top_db}
+    return options
@@ -4,12 +4,13 @@ from colorama import Fore, Style
 from collections.abc import Mapping
 
 import torch
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Dataset, IterableDataset
 import pytorch_lightning as pl
 from pytorch_lightning import Trainer
 
 from .. import models
 from .. import datasets
+from .. import callbacks
 from .. import utils
 from ..utils.config import Config, get_default_config
 from ..utils import registry
@@ -18,56 +19,152 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
-# TODO: refactor out the internally computed stuff so it can be imported from outside
-def train_model(config: Config):
+DATALOADER_OPTIONS = ["batch_size", "num_workers", "pin_memory", "drop_last"]
+# Only valid when loading data in worker processes (and not available before PyTorch 1.7)
+WORKER_DATALOADER_OPTIONS = ["persistent_workers", "prefetch_factor"]
+
+
+def train_model(config: Config = None):
     """
     Train a model based on a Config.
 
+    If the config has a `data` section, training (and validation) dataloaders are built from it with `get_dataloader()`.
+    Otherwise, the model's own dataloaders are used.
+
     Args:
         config (Config): Either a path to a YAML file, or a dict-like
         object defining the training configuration.
     """
-    raise NotImplementedError
     if isinstance(config, (str, Path)):
         config = Config.load(config)
-    config = config or get_default_config()
+    config = Config(config or get_default_config())
     print(f"{Fore.GREEN}{Style.BRIGHT}Starting training...{Style.RESET_ALL}")
     logger.info(f"Training config: {config}")
 
-    model_class = models.get_model(config.model.architecture)
-    train_transform = config.data.train.transform or model_class.default_train_transform
-    model = model_class(**config.hparams)
+    model_class = registry.get_model(config.model.architecture)
+    model = model_class(config.hparams)
 
-    train_dataset = datasets.get_dataset(config.data.train.dataset)(
-        **config.data.train.options
-    )
-    train_dataloader = DataLoader(train_dataset)
-
-    val_dataset = datasets.get_dataset(config.data.val.dataset)(
-        **config.data.val.options
-    )
-    val_dataloader = DataLoader(val_dataset)
+    train_dataloader = val_dataloader = None
+    batch_size = config.hparams.batch_size or 1
+    if config.data.train:
+        train_dataloader = get_dataloader(
+            config.data.train, config.data, default_batch_size=batch_size, shuffle=True
+        )
+    if config.data.val:
+        val_dataloader = get_dataloader(
+            config.data.val, config.data, default_batch_size=batch_size
+        )
 
     trainer = get_trainer(**config.trainer)
-    trainer.fit(model, train_dataloader=train_dataloader)
+    trainer.fit(model, train_dataloader, val_dataloader)
     return model
 
 
+def get_dataloader(
+    dataset_config, data_config=None, default_batch_size=1, shuffle=False
+):
+    """
+    Creates a DataLoader over a dataset from the registry.
+
+    Args:
+        dataset_config: A dict-like object with a `dataset_class` key naming a registered dataset. All other keys are passed to the dataset.
+        An already instantiated Dataset is also accepted.
+        data_config: A dict-like object containing DataLoader options (`batch_size`, `num_workers`, `pin_memory`,
+        `persistent_workers`, `prefetch_factor`, `drop_last`) and optionally a registered `collate_fn`.
+        default_batch_size (int): The batch size to use if `data_config` doesn't specify one.
+        shuffle (bool): Whether to shuffle the dataset every epoch. Ignored for iterable datasets, which shuffle themselves.
+    """
+    data_config = Config(data_config or {})
+    options = {"batch_size": default_batch_size}
+    options.update(
+        {
+            k: data_config[k]
+            for k in DATALOADER_OPTIONS
+            if data_config.get(k) is not None
+        }
+    )
+    if options.get("num_workers", 0) > 0:
+        options.update(
+            {
+                k: data_config[k]
+                for k in WORKER_DATALOADER_OPTIONS
+                if data_config.get(k) is not None
+            }
+        )
+    if data_config.get("collate_fn"):
+        options["collate_fn"] = get_collate_fn(data_config.collate_fn)
+    dataset = (
+        dataset_config
+        if isinstance(dataset_config, Dataset)
+        else get_dataset(dataset_config)
+    )
+    logger.info(
+        f"Loading {len(dataset)} samples from {type(dataset).__name__} with options {options}"
+    )
+    if isinstance(dataset, IterableDataset):
+        # Iterable datasets shuffle themselves (if at all)
+        return DataLoader(dataset, **options)
+    return DataLoader(dataset, shuffle=shuffle, **options)
+
+
+def get_collate_fn(collate_config):
+    """
+    Instantiates a collate function from the registry.
+
+    Args:
+        collate_config: Either the name of a registered collate function, or a single-key dictionary like {"name": {**kwargs}}.
+    """
+    if isinstance(collate_config, Mapping):
+        assert (
+            len(collate_config) == 1
+        ), f"A collate_fn config must be a single-key dictionary like {{'name': {{}}}}"
+        name, options = list(collate_config.items())[0]
+    else:
+        name, options = collate_config, {}
+    return registry.get("collate_fn", name)(**(options or {}))
+
+
 def get_trainer(**kwargs):
     """
     Creates a PyTorch-Lightning Trainer based on the given config.
 
-    The value passed in the `logger` field (if any) is converted to PyTorch Lightning Logger instances.
+    The value passed in the `logger` field (if any) is converted to PyTorch Lightning Logger instances,
+    and the `callbacks` field (if any) to Callback instances.
+
+    Setting `precision: bf16` (bfloat16 autocasting on CPU) and/or `memory_format: channels_last`
+    adds a `PrecisionCallback` instead of being passed to the Trainer.
+    When tracing is enabled (see `utils.tracing`), a `TracingCallback` is added to record the training loop.
 
     Args:
         **kwargs: Arguments to pass to `pytorch_lightning.Trainer`
     """
     config = Config(kwargs)
-    config.logger = (
-        get_pl_loggers(config.logger) if "logger" in config else [pl.loggers.TestTubeLogger(save_dir="experiments/")]
-    )
-    if "weights_save_path" not in config:
-        config.weights_save_path = config.logger[0].save_dir
+    if config.get("logger") is False:  # Logging disabled
+        loggers = []
+    else:
+        loggers = (
+            get_pl_loggers(config.logger)
+            if "logger" in config
+            else [pl.loggers.TestTubeLogger(save_dir="experiments/")]
+        )
+    if "weights_save_path" not in config and loggers:
+        config.weights_save_path = loggers[0].save_dir
+    # Pass a lone logger as-is so that `LightningModule.logger.experiment` is that logger's experiment
+    config.logger = loggers[0] if len(loggers) == 1 else (loggers or False)
+    config.callbacks = get_callbacks(config.callbacks) if "callbacks" in config else []
+    # CPU bfloat16 autocasting and channels-last tensors aren't built into the Trainer, so they're applied by a callback
+    if config.get("precision") == "bf16" or "memory_format" in config:
+        precision = config.pop("precision") if config.get("precision") == "bf16" else 32
+        memory_format = config.pop("memory_format", None) or "contiguous"
+        config.callbacks.append(
+            callbacks.PrecisionCallback(
+                precision=precision, memory_format=memory_format
+            )
+        )
+    if utils.tracing.is_enabled() and not any(
+        isinstance(c, callbacks.TracingCallback) for c in config.callbacks
+    ):
+        config.callbacks.append(callbacks.TracingCallback())
     return Trainer(**config)
 
 
@@ -78,20 +175,61 @@ def get_pl_loggers(loggers_config):
     Args:
         loggers_config: A collection of any combination of dictionaries and PyTorch Lightning Logger instances.
         Dictionaries must be of the format {"LoggerName": {**logger_kwargs}}.
+        A single dictionary mapping several logger names to their kwargs is also accepted.
     """
+
     def create_logger(logger_config):
         if isinstance(logger_config, Mapping):
-            assert len(logger_config) == 1, f"Each logger config must be a single-key dictionary like {'name': {''}}"
+            assert (
+                len(logger_config) == 1
+            ), f"Each logger config must be a single-key dictionary like {'name': {''}}"
             name, options = list(logger_config.items())[0]
             return getattr(pl.loggers, name)(**options)
         elif isinstance(logger_config, pl.loggers.LightningLoggerBase):
             return logger_config
         else:
-            raise ValueError(f" Got an unrecognized logger config type. Got object of type {type(logger_config)}")
+            raise ValueError(
+                f" Got an unrecognized logger config type. Got object of type {type(logger_config)}"
+            )
 
+    if isinstance(loggers_config, Mapping):
+        loggers_config = [{name: options} for name, options in loggers_config.items()]
     return list(map(create_logger, loggers_config))
 
 
+def get_callbacks(callbacks_config):
+    """
+    Returns a list of PyTorch-Lightning callbacks based on the given config.
+
+    Args:
+        callbacks_config: A collection of any combination of dictionaries and PyTorch Lightning Callback instances.
+        Dictionaries must be of the format {"CallbackName": {**callback_kwargs}}, where "CallbackName" is a registered callback.
+        A single dictionary mapping several callback names to their kwargs is also accepted.
+    """
+
+    def create_callback(callback_config):
+        if isinstance(callback_config, Mapping):
+            assert (
+                len(callback_config) == 1
+            ), f"Each callback config must be a single-key dictionary like {'name': {''}}"
+            name, options = list(callback_config.items())[0]
+            return registry.get("callback", name)(**(options or {}))
+        elif isinstance(callback_config, pl.callbacks.Callback):
+            return callback_config
+        else:
+            raise ValueError(
+                f" Got an unrecognized callback config type. Got object of type {type(callback_config)}"
+            )
+
+    if isinstance(callbacks_config, Mapping):
+        callbacks_config = [
+            {name: options} for name, options in callbacks_config.items()
+        ]
+    return list(map(create_callback, callbacks_config))
+
+
 def get_dataset(dataset_config):
     dataset_class = registry.get("dataset", dataset_config["dataset_class"])
-    return dataset_class(**{k: v for k, v in dataset_config.items() if k != "dataset_class"})
+    return dataset_class(
+        **{k: v for k, v in dataset_config.items() if k != "dataset_class"}
+    )
@@ -0,0 +1,7 @@
+"""
+Nearest-neighbour search over latents and audio fingerprints
+"""
+from .common import METRICS
+from .exact import ExactIndex
+from .ivf import IVFIndex
+from .hamming import HammingIndex
@@ -0,0 +1,63 @@
+import numpy as np
+
+METRICS = ["cosine", "l2"]
+
+
+def check_metric(metric):
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}. Expected one of {METRICS}")
+
+
+def prepare_vectors(x, metric):
+    """
+    Flatten a batch of latents to `(N, D)` float32 vectors, normalized to unit length for cosine distances.
+    """
+    check_metric(metric)
+    x = np.asarray(x, dtype=np.float32)
+    x = x.reshape(len(x), -1)
+    if metric == "cosine":
+        x = x / (np.linalg.norm(x, axis=1, keepdims=True) + np.finfo(np.float32).eps)
+    return x
+
+
+def pairwise_distances(queries, vectors, metric):
+    """
+    Distances between every pair of (prepared) query and database vectors: cosine distances, or squared L2 distances.
+    """
+    dots = queries @ vectors.T
+    if metric == "cosine":
+        return 1 - dots
+    distances = np.einsum("ij,ij->i", queries, queries)[:, None] - 2 * dots
+    distances += np.einsum("ij,ij->i", vectors, vectors)[None]
+    return distances
+
+
+def merge_top_k(distances, indices, new_distances, new_indices, k):
+    """
+    Keep the `k` smallest distances (and their indices) of each row, out of the current and new candidates.
+    """
+    distances = np.concatenate([distances, new_distances], axis=1)
+    indices = np.concatenate(
+        [indices, np.broadcast_to(new_indices, new_distances.shape)], axis=1
+    )
+    if distances.shape[1] > k:
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        distances = np.take_along_axis(distances, top, axis=1)
+        indices = np.take_along_axis(indices, top, axis=1)
+    return distances, indices
+
+
+def empty_results(num_queries, k):
+    """
+    Placeholder results, for queries that have fewer than `k` candidates: infinite distances at index -1.
+    """
+    return np.full((num_queries, k), np.inf, dtype=np.float32), np.full(
+        (num_queries, k), -1, dtype=np.int64
+    )
+
+
+def sort_results(distances, indices):
+    order = np.argsort(distances, axis=1, kind="stable")
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(
+        indices, order, axis=1
+    )
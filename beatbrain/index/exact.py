@@ -0,0 +1,69 @@
+import numpy as np
+
+from ..utils import registry
+from .common import (
+    check_metric,
+    empty_results,
+    merge_top_k,
+    pairwise_distances,
+    prepare_vectors,
+    sort_results,
+)
+
+
+@registry.register("index", "ExactIndex")
+class ExactIndex:
+    def __init__(
+        self, vectors, metric="cosine", chunk_size=16384, query_chunk_size=1024
+    ):
+        """
+        Exact k-nearest-neighbour search by brute force.
+
+        The database is scanned in chunks (so it can be a memory-mapped array larger than memory), and each chunk's
+        distances to a block of queries are computed with a single matrix product.
+
+        Args:
+            vectors (np.ndarray): A `(N, ...)` array of latents. Each latent is flattened into a vector.
+            metric (str): "cosine" (cosine distance) or "l2" (squared euclidean distance)
+            chunk_size (int): The number of database vectors to compare against at once
+            query_chunk_size (int): The number of queries to search for at once
+        """
+        check_metric(metric)
+        self.vectors = vectors
+        self.metric = metric
+        self.chunk_size = chunk_size
+        self.query_chunk_size = query_chunk_size
+
+    def search(self, queries, k=10):
+        """
+        Find the `k` nearest database vectors to each query.
+
+        Args:
+            queries (np.ndarray): A `(Q, ...)` array of latents, shaped like the database's latents
+            k (int): The number of neighbours to return
+
+        Returns:
+            tuple: `(Q, k)` arrays of distances (in ascending order) and the corresponding database indices
+        """
+        queries = prepare_vectors(queries, self.metric)
+        results = [empty_results(0, k)]
+        for q in range(0, len(queries), self.query_chunk_size):
+            query_chunk = queries[q : q + self.query_chunk_size]
+            distances, indices = empty_results(len(query_chunk), k)
+            for start in range(0, len(self.vectors), self.chunk_size):
+                chunk = prepare_vectors(
+                    self.vectors[start : start + self.chunk_size], self.metric
+                )
+                chunk_indices = np.arange(start, start + len(chunk))
+                distances, indices = merge_top_k(
+                    distances,
+                    indices,
+                    pairwise_distances(query_chunk, chunk, self.metric),
+                    chunk_indices,
+                    k,
+                )
+            results.append(sort_results(distances, indices))
+        return tuple(np.concatenate(arrays) for arrays in zip(*results))
+
+    def __len__(self):
+        return len(self.vectors)
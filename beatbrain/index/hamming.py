@@ -0,0 +1,157 @@
+import numpy as np
+
+from ..utils import registry
+from ..utils.fingerprint import hamming_distances
+from .common import empty_results
+
+
+@registry.register("index", "HammingIndex")
+class HammingIndex:
+    def __init__(self, hashes, band_bits=16, max_bucket_size=64, chunk_size=1 << 20):
+        """
+        Near-neighbour search over binary hashes (e.g. audio fingerprints from `utils.fingerprint`) by Hamming distance.
+
+        Each hash is split into bands of `band_bits` bits, and hashes are only compared if they're identical in at least
+        one band. Hashes that differ in few bits almost always share a band (e.g. two 256-bit hashes that differ in 16
+        bits share one of their 16-bit bands with >99% probability), while unrelated hashes rarely do, so most of the
+        database is never compared against. Each band is indexed by sorting the database by its value.
+
+        Args:
+            hashes (np.ndarray): A `(N, num_bytes)` `uint8` array of packed hashes
+            band_bits (int): The number of bits per band (a multiple of 8 that divides the hashes' length)
+            max_bucket_size (int): In `pairs()`, each hash is only compared to the next `max_bucket_size` hashes that
+                share its band, so that a large group of (near-)identical hashes doesn't yield a quadratic number of
+                comparisons. Within a band, hashes are sorted by their value, so identical hashes are always compared.
+            chunk_size (int): The number of pairs of hashes to compare at once
+        """
+        self.hashes = np.ascontiguousarray(hashes, dtype=np.uint8)
+        num_bytes = self.hashes.shape[1]
+        if band_bits % 8 or num_bytes % (band_bits // 8) or band_bits > 32:
+            raise ValueError(
+                f"Can't split {num_bytes * 8}-bit hashes into bands of {band_bits} bits"
+            )
+        self.band_bits = band_bits
+        self.max_bucket_size = max_bucket_size
+        self.chunk_size = chunk_size
+        # Sort by whole hashes first, so identical hashes are adjacent within each band's buckets
+        hash_order = (
+            np.lexsort(self.hashes.T[::-1])
+            if len(self.hashes)
+            else np.zeros(0, dtype=np.int64)
+        )
+        index_dtype = (
+            np.int32 if len(self.hashes) < np.iinfo(np.int32).max else np.int64
+        )
+        self.keys = self.band_keys(self.hashes)
+        self.order = np.empty(self.keys.shape, dtype=index_dtype)
+        for band, keys in enumerate(self.keys):
+            self.order[band] = hash_order[np.argsort(keys[hash_order], kind="stable")]
+            self.keys[band] = keys[self.order[band]]
+
+    @property
+    def num_bands(self):
+        return len(self.keys)
+
+    def band_keys(self, hashes):
+        """
+        Returns:
+            np.ndarray: A `(num_bands, N)` `uint32` array of the value of each band of each hash
+        """
+        band_bytes = self.band_bits // 8
+        bands = hashes.reshape(
+            len(hashes), hashes.shape[1] // band_bytes, band_bytes
+        ).astype(np.uint32)
+        keys = np.zeros(bands.shape[:2], dtype=np.uint32)
+        for i in range(band_bytes):
+            keys = (keys << 8) | bands[..., i]
+        return np.ascontiguousarray(keys.T)
+
+    def search(self, queries, k=10, max_distance=None):
+        """
+        Find the `k` nearest database hashes to each query, among those that share a band with it.
+
+        Args:
+            queries (np.ndarray): A `(Q, num_bytes)` array of packed hashes
+            k (int): The number of neighbours to return
+            max_distance (int): If given, only return hashes within this Hamming distance
+
+        Returns:
+            tuple: `(Q, k)` arrays of Hamming distances (in ascending order) and the corresponding database indices.
+            Missing results have an infinite distance and index -1.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.uint8)
+        query_keys = self.band_keys(queries)
+        distances, indices = empty_results(len(queries), k)
+        for q, query in enumerate(queries):
+            candidates = np.unique(
+                np.concatenate(
+                    [
+                        self.order[
+                            band,
+                            np.searchsorted(keys, key, "left") : np.searchsorted(
+                                keys, key, "right"
+                            ),
+                        ]
+                        for band, (keys, key) in enumerate(
+                            zip(self.keys, query_keys[:, q])
+                        )
+                    ]
+                )
+            )
+            candidate_distances = hamming_distances(self.hashes[candidates], query)
+            if max_distance is not None:
+                close = candidate_distances <= max_distance
+                candidates, candidate_distances = (
+                    candidates[close],
+                    candidate_distances[close],
+                )
+            top = np.argsort(candidate_distances, kind="stable")[:k]
+            distances[q, : len(top)], indices[q, : len(top)] = (
+                candidate_distances[top],
+                candidates[top],
+            )
+        return distances, indices
+
+    def pairs(self, max_distance):
+        """
+        Find pairs of database hashes within a Hamming distance of each other.
+
+        Hashes that share a band are compared in vectorized chunks: with the band's hashes sorted by value, each hash is
+        compared to the one `offset` positions later, for increasing offsets until no hashes that far apart share a
+        value (or `max_bucket_size` is reached).
+
+        Args:
+            max_distance (int): The maximum Hamming distance
+
+        Returns:
+            tuple: A `(P, 2)` array of the database indices `(i, j)` (with `i < j`) of each pair, and a `(P,)` array of their distances
+        """
+        num_hashes = len(self.hashes)
+        found_pairs, found_distances = [np.zeros(0, dtype=np.int64)], [
+            np.zeros(0, dtype=np.int64)
+        ]
+        for order, keys in zip(self.order, self.keys):
+            for offset in range(1, self.max_bucket_size + 1):
+                shared = np.flatnonzero(keys[:-offset] == keys[offset:])
+                if len(shared) == 0:
+                    break
+                for start in range(0, len(shared), self.chunk_size):
+                    chunk = shared[start : start + self.chunk_size]
+                    i, j = order[chunk].astype(np.int64), order[chunk + offset].astype(
+                        np.int64
+                    )
+                    distances = hamming_distances(self.hashes[i], self.hashes[j])
+                    close = distances <= max_distance
+                    # Encode pairs as single integers, so that pairs found in several bands are easy to deduplicate
+                    found_pairs.append(
+                        np.minimum(i, j)[close] * num_hashes + np.maximum(i, j)[close]
+                    )
+                    found_distances.append(distances[close])
+        pairs, first = np.unique(np.concatenate(found_pairs), return_index=True)
+        return (
+            np.stack([pairs // max(num_hashes, 1), pairs % max(num_hashes, 1)], axis=1),
+            np.concatenate(found_distances)[first],
+        )
+
+    def __len__(self):
+        return len(self.hashes)
@@ -0,0 +1,235 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+from ..utils import registry
+from .common import (
+    empty_results,
+    merge_top_k,
+    pairwise_distances,
+    prepare_vectors,
+    sort_results,
+)
+
+ARRAYS = ["centroids", "vectors", "ids", "offsets"]
+METADATA_FILE = "index.json"
+
+
+@registry.register("index", "IVFIndex")
+class IVFIndex:
+    def __init__(self, centroids, vectors, ids, offsets, metric="cosine", num_probes=8):
+        """
+        Approximate k-nearest-neighbour search with an inverted file index.
+
+        The database is partitioned into `num_lists` clusters with k-means, and stored grouped by cluster.
+        Each query is only compared against the vectors in its `num_probes` closest clusters.
+        Build an index with `IVFIndex.build()`.
+
+        Args:
+            centroids (np.ndarray): A `(num_lists, D)` array of cluster centroids
+            vectors (np.ndarray): A `(N, D)` array of prepared database vectors, sorted by cluster
+            ids (np.ndarray): The database index of each of `vectors`
+            offsets (np.ndarray): A `(num_lists + 1,)` array. Cluster `i`'s vectors are `vectors[offsets[i]:offsets[i + 1]]`.
+            metric (str): "cosine" (cosine distance) or "l2" (squared euclidean distance)
+            num_probes (int): The default number of clusters to search per query
+        """
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.metric = metric
+        self.num_probes = num_probes
+
+    @classmethod
+    def build(
+        cls,
+        vectors,
+        metric="cosine",
+        num_lists=None,
+        num_probes=8,
+        sample_size=65536,
+        iterations=20,
+        chunk_size=16384,
+        seed=0,
+    ):
+        """
+        Cluster a database of latents and build an index over it.
+
+        Args:
+            vectors (np.ndarray): A `(N, ...)` array of latents (can be memory-mapped). Each latent is flattened into a vector.
+            metric (str): "cosine" (cosine distance) or "l2" (squared euclidean distance)
+            num_lists (int): The number of clusters. Defaults to `4 * sqrt(N)`.
+            num_probes (int): The default number of clusters to search per query
+            sample_size (int): The number of vectors to train k-means on
+            iterations (int): The number of k-means iterations
+            chunk_size (int): The number of vectors to assign to clusters at once
+            seed (int): Seeds the choice of training vectors and initial centroids
+        """
+        num_lists = num_lists or max(1, int(4 * np.sqrt(len(vectors))))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(
+            rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)
+        )
+        centroids = kmeans(
+            prepare_vectors(vectors[sample], metric),
+            num_lists,
+            metric,
+            iterations=iterations,
+            rng=rng,
+        )
+
+        assignments = np.concatenate(
+            [
+                assign(
+                    prepare_vectors(vectors[i : i + chunk_size], metric),
+                    centroids,
+                    metric,
+                )
+                for i in range(0, len(vectors), chunk_size)
+            ]
+        )
+        ids = np.argsort(assignments, kind="stable")
+        offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))]
+        )
+        sorted_vectors = np.empty((len(vectors), centroids.shape[1]), dtype=np.float32)
+        for i in range(0, len(ids), chunk_size):
+            chunk_ids = ids[i : i + chunk_size]
+            sorted_vectors[i : i + chunk_size] = prepare_vectors(
+                vectors[np.sort(chunk_ids)], metric
+            )[np.argsort(np.argsort(chunk_ids))]
+        return cls(
+            centroids,
+            sorted_vectors,
+            ids,
+            offsets,
+            metric=metric,
+            num_probes=num_probes,
+        )
+
+    def search(self, queries, k=10, num_probes=None):
+        """
+        Find (approximately) the `k` nearest database vectors to each query.
+
+        Queries are grouped by the clusters they probe, so that each probed cluster is compared against all
+        of its queries with a single matrix product.
+
+        Args:
+            queries (np.ndarray): A `(Q, ...)` array of latents, shaped like the database's latents
+            k (int): The number of neighbours to return
+            num_probes (int): The number of clusters to search per query. Overrides the index's default.
+
+        Returns:
+            tuple: `(Q, k)` arrays of distances (in ascending order) and the corresponding database indices.
+            If the probed clusters contain fewer than `k` vectors, the remaining results have an infinite distance and index -1.
+        """
+        queries = prepare_vectors(queries, self.metric)
+        num_probes = min(num_probes or self.num_probes, len(self.centroids))
+        centroid_distances = pairwise_distances(queries, self.centroids, self.metric)
+        probes = np.argpartition(centroid_distances, num_probes - 1, axis=1)[
+            :, :num_probes
+        ].ravel()
+        probing_queries = np.repeat(np.arange(len(queries)), num_probes)
+        order = np.argsort(probes, kind="stable")
+        probes, probing_queries = probes[order], probing_queries[order]
+        lists, starts = np.unique(probes, return_index=True)
+
+        distances, indices = empty_results(len(queries), k)
+        for cluster, query_ids in zip(lists, np.split(probing_queries, starts[1:])):
+            start, end = self.offsets[cluster], self.offsets[cluster + 1]
+            if start == end:
+                continue
+            distances[query_ids], indices[query_ids] = merge_top_k(
+                distances[query_ids],
+                indices[query_ids],
+                pairwise_distances(
+                    queries[query_ids], self.vectors[start:end], self.metric
+                ),
+                self.ids[start:end],
+                k,
+            )
+        return sort_results(distances, indices)
+
+    def save(self, path):
+        """
+        Save the index to a directory. Load it with `IVFIndex.load()`.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(str(path / f"{name}.npy"), getattr(self, name))
+        with open(path / METADATA_FILE, "w") as f:
+            json.dump({"metric": self.metric, "num_probes": self.num_probes}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Load an index saved with `IVFIndex.save()`. Its vectors are memory-mapped by default.
+        """
+        path = Path(path)
+        with open(path / METADATA_FILE) as f:
+            metadata = json.load(f)
+        arrays = {
+            name: np.load(
+                str(path / f"{name}.npy"),
+                mmap_mode=mmap_mode if name == "vectors" else None,
+            )
+            for name in ARRAYS
+        }
+        return cls(**arrays, **metadata)
+
+    @property
+    def num_lists(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self.vectors)
+
+
+def assign(vectors, centroids, metric):
+    """
+    Returns:
+        np.ndarray: The index of the closest centroid to each vector
+    """
+    return pairwise_distances(vectors, centroids, metric).argmin(axis=1)
+
+
+def kmeans(vectors, num_clusters, metric="cosine", iterations=20, rng=None):
+    """
+    Lloyd's k-means, initialized with randomly chosen vectors. With the cosine metric, centroids are kept at unit length (spherical k-means).
+    Clusters that become empty are re-seeded with random vectors.
+
+    Args:
+        vectors (np.ndarray): A `(N, D)` array of prepared vectors
+        num_clusters (int): The number of clusters
+        metric (str): "cosine" or "l2"
+        iterations (int): The number of iterations
+        rng (np.random.Generator): The random number generator to pick initial centroids with
+
+    Returns:
+        np.ndarray: A `(num_clusters, D)` array of centroids
+    """
+    rng = rng or np.random.default_rng()
+    num_clusters = min(num_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), num_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign(vectors, centroids, metric)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=num_clusters)
+        occupied = counts > 0
+        sums = np.add.reduceat(
+            vectors[order],
+            np.concatenate([[0], np.cumsum(counts)[:-1]])[occupied],
+            axis=0,
+        )
+        centroids[occupied] = sums / counts[occupied, None]
+        centroids[~occupied] = vectors[
+            rng.choice(len(vectors), int((~occupied).sum()), replace=False)
+        ]
+        if metric == "cosine":
+            centroids /= (
+                np.linalg.norm(centroids, axis=1, keepdims=True)
+                + np.finfo(np.float32).eps
+            )
+    return centroids.astype(np.float32, copy=False)
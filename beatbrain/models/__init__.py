@@ -2,3 +2,4 @@
 Defines model architectures
 """
 from .mnist import MNISTAutoencoder
+from .cvae import SpectrogramCVAE
@@ -0,0 +1,248 @@
+import inspect
+import contextlib
+
+import torch
+import torch.nn as nn
+import pytorch_lightning as pl
+from torch.utils.checkpoint import checkpoint
+
+from ..utils.config import Config
+from ..utils import registry
+from ..generator import helpers
+from .mnist import BasicConv2d, FusedInception
+from .precision import autocast
+
+# Newer PyTorch versions ask for the checkpointing implementation to be chosen explicitly (older ones reject the argument)
+_CHECKPOINT_KWARGS = (
+    {"use_reentrant": True}
+    if "use_reentrant" in inspect.signature(checkpoint).parameters
+    else {}
+)
+
+
+class CheckpointedBlock(nn.Module):
+    """
+    Wraps a block so that, while training with `enabled` set, its intermediate activations are recomputed during the
+    backward pass instead of being kept in memory. Only the block's input is stored, at the cost of a second forward pass.
+
+    BatchNorm running statistics are only updated by the first forward pass, so they match those of an unwrapped block.
+    """
+
+    def __init__(self, block, enabled=True):
+        super().__init__()
+        self.block = block
+        self.enabled = enabled
+
+    def forward(self, x):
+        if not (self.enabled and self.training and torch.is_grad_enabled()):
+            return self.block(x)
+        if not x.requires_grad:
+            # Gradients only flow to the block's parameters through a checkpoint whose input requires them (which the
+            # network's input doesn't)
+            x = x.detach().requires_grad_()
+        return checkpoint(self._forward, x, **_CHECKPOINT_KWARGS)
+
+    def _forward(self, x):
+        # The checkpoint's first pass runs without gradients, and its recomputation during the backward pass with them
+        if torch.is_grad_enabled():
+            with _frozen_batchnorm_stats(self.block):
+                return self.block(x)
+        return self.block(x)
+
+
+@contextlib.contextmanager
+def _frozen_batchnorm_stats(module):
+    """
+    Temporarily stop BatchNorm layers from updating their running statistics (they still normalize with batch statistics).
+    """
+    batchnorms = [
+        m for m in module.modules() if isinstance(m, nn.modules.batchnorm._BatchNorm)
+    ]
+    momenta = [bn.momentum for bn in batchnorms]
+    num_batches_tracked = [
+        bn.num_batches_tracked.clone() if bn.num_batches_tracked is not None else None
+        for bn in batchnorms
+    ]
+    for bn in batchnorms:
+        bn.momentum = 0.0
+    try:
+        yield
+    finally:
+        for bn, momentum, count in zip(batchnorms, momenta, num_batches_tracked):
+            bn.momentum = momentum
+            if count is not None:
+                bn.num_batches_tracked.copy_(count)
+
+
+@registry.register("model", "SpectrogramCVAE")
+class SpectrogramCVAE(pl.LightningModule):
+    """
+    A convolutional VAE for mel spectrograms (512 mels x 640 frames by default), built from Inception blocks.
+
+    The encoder halves the resolution at each stage (a strided `BasicConv2d` followed by a `FusedInception` block), and the
+    decoder mirrors it. Latents are spatial: `(latent_dim, n_mels / 2 ** len(channels), n_frames / 2 ** len(channels))`.
+
+    High-resolution activations take up most of a training step's memory. With `hparams.checkpointing` set, the
+    activations inside each block are recomputed during the backward pass instead of being stored, so larger batches fit in memory.
+
+    Hyperparameters (`hparams`):
+        latent_dim (int): The number of latent channels. Defaults to 64.
+        channels (list): The width of each encoder (and, reversed, decoder) stage. Defaults to [32, 64, 128, 256, 256].
+        pool_features (int): The width of each Inception block's pooling branch. Defaults to 32.
+        beta (float): The weight of the KL divergence in the loss. Defaults to 1.
+        checkpointing (bool): Whether to checkpoint activations per block. Defaults to False.
+        spec.n_mels, spec.n_frames: The input spectrogram size (both must be divisible by `2 ** len(channels)`)
+        learning_rate (float): Adam's learning rate
+    """
+
+    def __init__(self, hparams: Config):
+        super().__init__()
+        self.save_hyperparameters(hparams)
+        self.latent_dim = hparams.get("latent_dim", 64)
+        self.channels = list(hparams.get("channels", [32, 64, 128, 256, 256]))
+        self.pool_features = hparams.get("pool_features", 32)
+        self.beta = hparams.get("beta", 1.0)
+        self.input_shape = (1, hparams.spec.n_mels or 512, hparams.spec.n_frames or 640)
+        # Set by `callbacks.PrecisionCallback`
+        self.autocast_dtype = None
+        self.memory_format = torch.contiguous_format
+
+        scale = 2 ** len(self.channels)
+        if any(size % scale for size in self.input_shape[1:]):
+            raise ValueError(
+                f"The input size {self.input_shape[1:]} must be divisible by {scale} for {len(self.channels)} stages"
+            )
+        self.latent_shape = (
+            self.latent_dim,
+            self.input_shape[1] // scale,
+            self.input_shape[2] // scale,
+        )
+
+        # The width of an Inception block's output
+        inception_channels = 64 + 64 + 96 + self.pool_features
+        encoder, in_channels = [], self.input_shape[0]
+        for channels in self.channels:
+            encoder += [
+                CheckpointedBlock(
+                    BasicConv2d(
+                        in_channels, channels, kernel_size=3, stride=2, padding=1
+                    )
+                ),
+                CheckpointedBlock(FusedInception(channels, self.pool_features)),
+            ]
+            in_channels = inception_channels
+        encoder.append(nn.Conv2d(in_channels, 2 * self.latent_dim, kernel_size=1))
+        self.encoder = nn.Sequential(*encoder)
+
+        decoder, in_channels = [], self.latent_dim
+        for i, channels in enumerate(reversed(self.channels)):
+            upsample = [nn.UpsamplingNearest2d(scale_factor=2)] if i > 0 else []
+            decoder += [
+                CheckpointedBlock(
+                    nn.Sequential(
+                        *upsample,
+                        BasicConv2d(in_channels, channels, kernel_size=3, padding=1),
+                    )
+                ),
+                CheckpointedBlock(FusedInception(channels, self.pool_features)),
+            ]
+            in_channels = inception_channels
+        # Upsampling to full resolution and projecting to the output channels in one step keeps wide activations off the full-resolution grid
+        decoder += [
+            nn.ConvTranspose2d(
+                in_channels, self.input_shape[0], kernel_size=4, stride=2, padding=1
+            ),
+            nn.Sigmoid(),
+        ]
+        self.decoder = nn.Sequential(*decoder)
+        self.checkpointing = bool(hparams.get("checkpointing", False))
+
+    @property
+    def checkpointing(self):
+        return any(
+            block.enabled
+            for block in self.modules()
+            if isinstance(block, CheckpointedBlock)
+        )
+
+    @checkpointing.setter
+    def checkpointing(self, enabled):
+        for block in self.modules():
+            if isinstance(block, CheckpointedBlock):
+                block.enabled = enabled
+
+    def encode_distribution(self, x):
+        """
+        Returns:
+            tuple: The mean and log-variance of the approximate posterior over latents
+        """
+        return helpers.encode(self.encoder, x)
+
+    def encode(self, x):
+        """
+        Encode spectrograms to their posterior means
+        """
+        return self.encode_distribution(x)[0]
+
+    def decode(self, z):
+        return self.decoder(z)
+
+    def forward(self, x):
+        mean, logvar = self.encode_distribution(x)
+        z = helpers.reparameterize(mean, logvar, training=self.training)
+        return mean, logvar, self.decode(z)
+
+    def _step(self, batch):
+        x = batch[0] if isinstance(batch, (tuple, list)) else batch
+        x = x.contiguous(memory_format=self.memory_format)
+        with autocast(self.autocast_dtype):
+            mean, logvar, recon = self.forward(x)
+        loss, recon_loss, kl = helpers.vae_loss(
+            recon.float(), x, mean.float(), logvar.float(), beta=self.beta
+        )
+        return x, recon, loss, recon_loss, kl
+
+    def training_step(self, batch, batch_idx):
+        x, recon, loss, recon_loss, kl = self._step(batch)
+        output = {"loss": loss}
+        if batch_idx % 100 == 0:
+            output["log"] = {
+                "loss/train_loss": loss,
+                "loss/train_reconstruction": recon_loss,
+                "loss/train_kl": kl,
+            }
+        return output
+
+    def validation_step(self, batch, batch_idx):
+        x, recon, loss, recon_loss, kl = self._step(batch)
+        output = {"val_loss": loss, "val_reconstruction": recon_loss, "val_kl": kl}
+        if batch_idx % 100 == 0:
+            output["x"] = x[0]
+            output["recon"] = recon[0].float()
+        return output
+
+    def validation_epoch_end(self, outputs):
+        examples = [output for output in outputs if "x" in output]
+        if examples:
+            # Drawn and logged by `VisualizationCallback`'s workers, off the training thread
+            self.validation_examples = (
+                torch.stack([output["recon"] for output in examples]),
+                torch.stack([output["x"] for output in examples]),
+            )
+        logs = {
+            f"loss/{name}": torch.stack([output[name] for output in outputs]).mean()
+            for name in ["val_loss", "val_reconstruction", "val_kl"]
+        }
+        # Lightning >= 1.0 ignores returned metrics, and only monitors logged ones
+        if hasattr(self, "log"):
+            self.log("val_loss", logs["loss/val_loss"])
+        return {"val_loss": logs["loss/val_loss"], "log": logs}
+
+    def configure_optimizers(self):
+        optimizer = torch.optim.Adam(
+            self.parameters(), lr=self.hparams.get("learning_rate") or 1e-4
+        )
+        scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(
+            optimizer, patience=3, threshold=1e-3
+        )
+        return [optimizer], [{"scheduler": scheduler, "monitor": "val_loss"}]
@@ -0,0 +1,130 @@
+import json
+import copy
+import inspect
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from .mnist import BasicConv2d
+from ..runtime import METADATA_FILE, BACKENDS as FORMATS
+
+
+def fold_batchnorm(module):
+    """
+    Fold every eval-mode BatchNorm that directly follows a convolution into that convolution's weights, in place.
+    Handles `BasicConv2d` blocks and `Conv2d` -> `BatchNorm2d` pairs inside `nn.Sequential` containers.
+
+    Args:
+        module (nn.Module): The module to fold. Must be in eval mode.
+    """
+    if module.training:
+        raise ValueError(
+            "BatchNorm can only be folded in eval mode. Call `module.eval()` first."
+        )
+    for child in list(module.modules()):
+        if isinstance(child, BasicConv2d):
+            child.fold_bn()
+        elif isinstance(child, nn.Sequential):
+            for i in range(len(child) - 1):
+                if isinstance(child[i], nn.Conv2d) and isinstance(
+                    child[i + 1], nn.BatchNorm2d
+                ):
+                    child[i] = fuse_conv_bn_eval(child[i], child[i + 1])
+                    child[i + 1] = nn.Identity()
+    return module
+
+
+def export_modules(
+    encoder,
+    decoder,
+    output,
+    input_shape,
+    formats=tuple(FORMATS),
+    metadata=None,
+    batch_size=1,
+):
+    """
+    Export an encoder/decoder pair as TorchScript and/or ONNX artifacts, along with a metadata file
+    that `beatbrain.runtime.ExportedModel` uses to load them.
+
+    BatchNorm layers are folded into convolution weights before export. The original modules aren't modified.
+
+    Args:
+        encoder (nn.Module): Maps a batch of inputs to latents
+        decoder (nn.Module): Maps a batch of latents to outputs
+        output: The directory to write artifacts to
+        input_shape: The shape of a single input (excluding the batch dimension)
+        formats: Any of "torchscript", "onnx"
+        metadata (dict): Additional information to store in the metadata file
+        batch_size (int): The batch size of the example inputs used for tracing. The batch dimension remains dynamic.
+
+    Returns:
+        dict: The written metadata
+    """
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(
+            f"Unknown export format(s): {sorted(unknown)}. Expected any of {list(FORMATS)}"
+        )
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    encoder = fold_batchnorm(copy.deepcopy(encoder).eval())
+    decoder = fold_batchnorm(copy.deepcopy(decoder).eval())
+
+    example_input = torch.rand(batch_size, *input_shape)
+    with torch.no_grad():
+        example_latent = encoder(example_input)
+    for name, module, example in [
+        ("encoder", encoder, example_input),
+        ("decoder", decoder, example_latent),
+    ]:
+        if "torchscript" in formats:
+            _export_torchscript(
+                module, example, output / f"{name}.{FORMATS['torchscript']}"
+            )
+        if "onnx" in formats:
+            _export_onnx(module, example, output / f"{name}.{FORMATS['onnx']}")
+
+    metadata = dict(metadata or {})
+    metadata.update(
+        {
+            "formats": list(formats),
+            "input_shape": list(input_shape),
+            "latent_shape": list(example_latent.shape[1:]),
+            "batchnorm_folded": True,
+            "torch_version": torch.__version__,
+        }
+    )
+    with open(output / METADATA_FILE, "w") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def _export_torchscript(module, example, path):
+    with torch.no_grad():
+        traced = torch.jit.trace(module, example)
+    try:  # Inline weights as constants
+        traced = torch.jit.freeze(traced.eval())
+    except (AttributeError, RuntimeError):
+        # Freezing traced modules isn't supported before PyTorch 1.8
+        pass
+    torch.jit.save(traced, str(path))
+
+
+def _export_onnx(module, example, path):
+    kwargs = {}
+    # Newer PyTorch versions default to the dynamo-based exporter, which needs extra dependencies
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+    torch.onnx.export(
+        module,
+        example,
+        str(path),
+        input_names=["input"],
+        output_names=["output"],
+        dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+        opset_version=11,
+        **kwargs,
+    )
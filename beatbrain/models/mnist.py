@@ -1,16 +1,18 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.utils.data import DataLoader, Subset
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+from torch.utils.data import DataLoader, Subset, TensorDataset
 import torchvision
 from torchvision import transforms
 import pytorch_lightning as pl
 
 from cached_property import cached_property
-from more_itertools import interleave
 
 from ..utils.config import Config
 from ..utils import registry
+from ..datasets import IndexBatchSampler
+from .precision import autocast
 
 
 class BasicConv2d(nn.Module):
@@ -25,6 +27,16 @@ class BasicConv2d(nn.Module):
         x = self.bn(x)
         return F.relu(x, inplace=True)
 
+    def fold_bn(self):
+        """
+        Fold the (eval-mode) BatchNorm into the convolution's weights and bias, replacing it with an identity.
+        Only valid for inference, since the BatchNorm's running statistics are frozen into the convolution.
+        """
+        if not isinstance(self.bn, nn.Identity):
+            self.conv = fuse_conv_bn_eval(self.conv.eval(), self.bn.eval())
+            self.bn = nn.Identity()
+        return self
+
 
 class Inception(nn.Module):
     def __init__(self, in_channels, pool_features):
@@ -57,12 +69,132 @@ class Inception(nn.Module):
         return torch.cat(outputs, 1)
 
 
+class FusedInception(nn.Module):
+    """
+    An `Inception` block that computes the same function with fewer passes over memory:
+
+    - The three 1x1 convolutions that read the block's input (`branch1x1`, `branch5x5_1` and `branch3x3dbl_1`) are
+      computed as a single wider convolution (with a single BatchNorm, which is per-channel anyway), and its output is split.
+    - `fold_bn()` folds every BatchNorm into its convolution for inference.
+    - Optionally (`preallocate_output=True`), for inference without autograd, each branch's last ReLU writes its output
+      directly into a slice of a preallocated output tensor instead of the branches being concatenated. This measured
+      slower than `torch.cat` on CPU (see `benchmarks/inception.py`), so it's off by default.
+
+    Convert a trained `Inception` block with `FusedInception.from_inception()`.
+    """
+
+    def __init__(self, in_channels, pool_features, preallocate_output=False):
+        super().__init__()
+        self.preallocate_output = preallocate_output
+        self.split_channels = [64, 48, 64]  # branch1x1, branch5x5_1, branch3x3dbl_1
+        self.branch1x1s = BasicConv2d(
+            in_channels, sum(self.split_channels), kernel_size=1
+        )
+
+        self.branch5x5_2 = BasicConv2d(48, 64, kernel_size=5, padding=2)
+
+        self.branch3x3dbl_2 = BasicConv2d(64, 96, kernel_size=3, padding=1)
+        self.branch3x3dbl_3 = BasicConv2d(96, 96, kernel_size=3, padding=1)
+
+        self.branch_pool = BasicConv2d(in_channels, pool_features, kernel_size=1)
+        self.out_channels = 64 + 64 + 96 + pool_features
+
+    @classmethod
+    def from_inception(cls, inception, preallocate_output=False):
+        """
+        Create a `FusedInception` block with the same parameters, buffers and train/eval mode as an `Inception` block
+        """
+        weight = inception.branch1x1.conv.weight
+        fused = cls(
+            weight.shape[1],
+            inception.branch_pool.conv.out_channels,
+            preallocate_output=preallocate_output,
+        ).to(weight)
+        merged = [inception.branch1x1, inception.branch5x5_1, inception.branch3x3dbl_1]
+        with torch.no_grad():
+            for name, tensor in fused.branch1x1s.state_dict(keep_vars=True).items():
+                if name.endswith("num_batches_tracked"):
+                    tensor.copy_(inception.branch1x1.bn.num_batches_tracked)
+                else:
+                    tensor.copy_(
+                        torch.cat(
+                            [block.state_dict(keep_vars=True)[name] for block in merged]
+                        )
+                    )
+            for name in [
+                "branch5x5_2",
+                "branch3x3dbl_2",
+                "branch3x3dbl_3",
+                "branch_pool",
+            ]:
+                getattr(fused, name).load_state_dict(
+                    getattr(inception, name).state_dict()
+                )
+        return fused.train(inception.training)
+
+    def fold_bn(self):
+        """
+        Fold every (eval-mode) BatchNorm into its convolution. Only valid for inference.
+        """
+        for block in self.children():
+            block.fold_bn()
+        return self
+
+    def forward(self, x):
+        branch1x1, branch5x5, branch3x3dbl = torch.split(
+            self.branch1x1s(x), self.split_channels, dim=1
+        )
+        branch_pool = F.avg_pool2d(x, kernel_size=3, stride=1, padding=1)
+        if torch.is_grad_enabled() or not self.preallocate_output:
+            # Writing into slices of a preallocated tensor is never worth it with autograd: each in-place write makes
+            # the backward pass clone the whole output gradient, whereas `torch.cat`'s backward only takes views of it
+            branch5x5 = self.branch5x5_2(branch5x5)
+            branch3x3dbl = self.branch3x3dbl_3(self.branch3x3dbl_2(branch3x3dbl))
+            branch_pool = self.branch_pool(branch_pool)
+            return torch.cat([branch1x1, branch5x5, branch3x3dbl, branch_pool], 1)
+
+        n, _, h, w = x.shape
+        channels_last = (
+            x.is_contiguous(memory_format=torch.channels_last) and not x.is_contiguous()
+        )
+        memory_format = (
+            torch.channels_last if channels_last else torch.contiguous_format
+        )
+        out = torch.empty(
+            (n, self.out_channels, h, w),
+            dtype=x.dtype,
+            device=x.device,
+            memory_format=memory_format,
+        )
+        out.narrow(1, 0, 64).copy_(branch1x1)
+        # Each branch's last ReLU writes its result straight into the output
+        self._relu_into(out.narrow(1, 64, 64), self.branch5x5_2, branch5x5)
+        self._relu_into(
+            out.narrow(1, 128, 96),
+            self.branch3x3dbl_3,
+            self.branch3x3dbl_2(branch3x3dbl),
+        )
+        self._relu_into(
+            out.narrow(1, 224, self.out_channels - 224), self.branch_pool, branch_pool
+        )
+        return out
+
+    @staticmethod
+    def _relu_into(out, block, x):
+        torch.clamp(block.bn(block.conv(x)), min=0, out=out)
+
+
 @registry.register("model", "MNISTAutoencoder")
 class MNISTAutoencoder(pl.LightningModule):
+    input_shape = (1, 28, 28)
+
     def __init__(self, hparams: Config):
         super().__init__()
-        self.hparams = hparams
+        self.save_hyperparameters(hparams)
         self.latent_dim = hparams.latent_dim
+        # Set by `callbacks.PrecisionCallback`
+        self.autocast_dtype = None
+        self.memory_format = torch.contiguous_format
 
         self.encoder = nn.Sequential(
             nn.Conv2d(1, 16, 5, padding=2),
@@ -103,8 +235,10 @@ class MNISTAutoencoder(pl.LightningModule):
 
     def training_step(self, batch, batch_idx):
         x, y = batch
-        latent, recon = self.forward(x)
-        loss = F.binary_cross_entropy(recon, x)
+        x = x.contiguous(memory_format=self.memory_format)
+        with autocast(self.autocast_dtype):
+            latent, recon = self.forward(x)
+        loss = F.binary_cross_entropy(recon.float(), x)
         output = {"loss": loss}
         if batch_idx % 100 == 0:
             tensorboard_logs = {"loss/train_loss": loss}
@@ -113,7 +247,10 @@ class MNISTAutoencoder(pl.LightningModule):
 
     def validation_step(self, batch, batch_idx):
         x, y = batch
-        latent, recon = self.forward(x)
+        x = x.contiguous(memory_format=self.memory_format)
+        with autocast(self.autocast_dtype):
+            latent, recon = self.forward(x)
+        latent, recon = latent.float(), recon.float()
         loss = F.binary_cross_entropy(recon, x)
         output = {"val_loss": loss}
         if batch_idx % 100 == 0:
@@ -123,22 +260,18 @@ class MNISTAutoencoder(pl.LightningModule):
         return output
 
     def validation_epoch_end(self, outputs):
-        recon_images = list(
-            interleave(
-                filter(
-                    lambda x: x is not None, [output.get("x") for output in outputs]
-                ),
-                filter(
-                    lambda x: x is not None, [output.get("recon") for output in outputs]
-                ),
+        examples = [output for output in outputs if "x" in output]
+        if examples:
+            # Drawn and logged by `VisualizationCallback`'s workers, off the training thread
+            self.validation_examples = (
+                torch.stack([output["recon"] for output in examples]),
+                torch.stack([output["x"] for output in examples]),
             )
-        )
-        recon_grid = torchvision.utils.make_grid(recon_images, nrow=4, normalize=False)
-        self.logger.experiment.add_image(
-            f"reconstruction", recon_grid, self.current_epoch
-        )
         avg_loss = torch.stack([x["val_loss"] for x in outputs]).mean()
         tensorboard_logs = {"loss/val_loss": avg_loss}
+        # Lightning >= 1.0 ignores returned metrics, and only monitors logged ones
+        if hasattr(self, "log"):
+            self.log("val_loss", avg_loss)
         return {"val_loss": avg_loss, "log": tensorboard_logs}
 
     @cached_property
@@ -153,8 +286,26 @@ class MNISTAutoencoder(pl.LightningModule):
     def prepare_data(self):
         """
         Split train dataset into train and val (80-20)
+
+        If `hparams.in_memory` is set, the whole dataset is instead decoded once into contiguous float tensors
+        and split by slicing, which skips the per-sample PIL -> `ToTensor` conversion.
+
+        If `hparams.data_root` is empty, FashionMNIST isn't loaded and the model must be given dataloaders externally.
         """
+        if not self.hparams.get("data_root"):
+            return
         train_ratio = 0.8
+        if self.hparams.get("in_memory"):
+            images, targets = self._load_tensors(train=True)
+            num_train_samples = int(train_ratio * len(images))
+            self.train_dataset = TensorDataset(
+                images[:num_train_samples], targets[:num_train_samples]
+            )
+            self.val_dataset = TensorDataset(
+                images[num_train_samples:], targets[num_train_samples:]
+            )
+            self.test_dataset = TensorDataset(*self._load_tensors(train=False))
+            return
         train_dataset = torchvision.datasets.FashionMNIST(
             self.hparams.data_root,
             train=True,
@@ -175,7 +326,28 @@ class MNISTAutoencoder(pl.LightningModule):
             transform=self.default_train_transform,
         )
 
+    def _load_tensors(self, train=True):
+        """
+        Load FashionMNIST as an `(N, 1, 28, 28)` float tensor of images in [0, 1] and a tensor of labels
+        """
+        dataset = torchvision.datasets.FashionMNIST(
+            self.hparams.data_root,
+            train=train,
+            download=True,
+        )
+        # Same result as applying `transforms.ToTensor()` to every image
+        images = dataset.data.unsqueeze(1).float().div_(255)
+        return images, dataset.targets
+
+    def _tensor_dataloader(self, dataset, shuffle):
+        sampler = IndexBatchSampler(
+            len(dataset), self.hparams.batch_size, shuffle=shuffle
+        )
+        return DataLoader(dataset, sampler=sampler, batch_size=None, pin_memory=True)
+
     def train_dataloader(self):
+        if self.hparams.get("in_memory"):
+            return self._tensor_dataloader(self.train_dataset, shuffle=True)
         return DataLoader(
             self.train_dataset,
             batch_size=self.hparams.batch_size,
@@ -184,6 +356,8 @@ class MNISTAutoencoder(pl.LightningModule):
         )
 
     def val_dataloader(self):
+        if self.hparams.get("in_memory"):
+            return self._tensor_dataloader(self.val_dataset, shuffle=False)
         return DataLoader(
             self.val_dataset,
             batch_size=self.hparams.batch_size,
@@ -194,6 +368,6 @@ class MNISTAutoencoder(pl.LightningModule):
     def configure_optimizers(self):
         optimizer = torch.optim.Adam(self.parameters(), lr=self.hparams.learning_rate)
         scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(
-            optimizer, patience=3, threshold=1e-3, verbose=True,
+            optimizer, patience=3, threshold=1e-3
         )
-        return [optimizer], [scheduler]
+        return [optimizer], [{"scheduler": scheduler, "monitor": "val_loss"}]
@@ -0,0 +1,54 @@
+import contextlib
+
+import torch
+
+PRECISIONS = {
+    32: None,
+    "32": None,
+    "bf16": torch.bfloat16,
+}
+
+MEMORY_FORMATS = {
+    "contiguous": torch.contiguous_format,
+    "channels_last": torch.channels_last,
+}
+
+
+def get_autocast_dtype(precision):
+    """
+    Get the dtype to autocast to for a precision setting (one of `PRECISIONS`). Returns `None` for full precision.
+    """
+    try:
+        return PRECISIONS[precision]
+    except KeyError as e:
+        raise ValueError(
+            f"Unknown precision: {precision}. Expected one of {list(PRECISIONS)}"
+        ) from e
+
+
+def get_memory_format(memory_format):
+    """
+    Get the `torch.memory_format` for a memory format setting (one of `MEMORY_FORMATS`).
+    """
+    try:
+        return MEMORY_FORMATS[memory_format]
+    except KeyError as e:
+        raise ValueError(
+            f"Unknown memory format: {memory_format}. Expected one of {list(MEMORY_FORMATS)}"
+        ) from e
+
+
+def autocast(dtype=None):
+    """
+    Context manager that runs eligible CPU ops (convolutions, matmuls) in `dtype`. Does nothing if `dtype` is `None`.
+
+    Args:
+        dtype: The lower-precision dtype to autocast to. Only `torch.bfloat16` is supported on CPU.
+    """
+    if dtype is None:
+        return contextlib.suppress()  # No-op context manager
+    if not hasattr(torch, "autocast"):
+        raise RuntimeError(
+            f"Autocasting to {dtype} on CPU requires PyTorch >= 1.10 (found {torch.__version__})"
+        )
+    return torch.autocast("cpu", dtype=dtype)
@@ -0,0 +1,97 @@
+"""
+Lightweight inference runtime for models exported with `beatbrain models export`.
+
+Only depends on PyTorch (and optionally onnxruntime): importing this module doesn't import
+PyTorch Lightning, torchvision or any of BeatBrain's training code.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import torch
+
+METADATA_FILE = "metadata.json"
+BACKENDS = {"torchscript": "pt", "onnx": "onnx"}
+
+
+class ExportedModel:
+    def __init__(self, path, backend="torchscript", num_threads=None):
+        """
+        Loads an exported encoder/decoder pair for inference.
+
+        Args:
+            path: The directory containing the exported artifacts
+            backend (str): Either "torchscript" or "onnx" (requires `onnxruntime`)
+            num_threads (int): The number of threads to use for intra-op parallelism. Defaults to the backend's default.
+        """
+        self.path = Path(path)
+        self.backend = backend
+        with open(self.path / METADATA_FILE) as f:
+            self.metadata = json.load(f)
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown backend: {backend}. Expected one of {list(BACKENDS)}"
+            )
+        if backend not in self.metadata["formats"]:
+            raise ValueError(
+                f"No {backend} artifacts in {self.path}. Found: {self.metadata['formats']}"
+            )
+        paths = {
+            name: str(self.path / f"{name}.{BACKENDS[backend]}")
+            for name in ["encoder", "decoder"]
+        }
+        if backend == "torchscript":
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            self._encoder, self._decoder = [
+                torch.jit.load(paths[name], map_location="cpu").eval()
+                for name in ["encoder", "decoder"]
+            ]
+        else:
+            try:
+                import onnxruntime
+            except ImportError as e:
+                raise ImportError(
+                    "The onnx backend requires onnxruntime: `pip install onnxruntime`"
+                ) from e
+            options = onnxruntime.SessionOptions()
+            if num_threads:
+                options.intra_op_num_threads = num_threads
+            self._encoder, self._decoder = [
+                onnxruntime.InferenceSession(
+                    paths[name], options, providers=["CPUExecutionProvider"]
+                )
+                for name in ["encoder", "decoder"]
+            ]
+
+    @property
+    def input_shape(self):
+        return tuple(self.metadata["input_shape"])
+
+    @property
+    def latent_shape(self):
+        return tuple(self.metadata["latent_shape"])
+
+    def _run(self, module, x):
+        if self.backend == "onnx":
+            x = np.ascontiguousarray(
+                x.numpy() if isinstance(x, torch.Tensor) else x, dtype=np.float32
+            )
+            return torch.from_numpy(module.run(None, {"input": x})[0])
+        with torch.no_grad():
+            return module(torch.as_tensor(x, dtype=torch.float32))
+
+    def encode(self, x):
+        """
+        Encode a batch of inputs of shape `(batch, *input_shape)` to latents
+        """
+        return self._run(self._encoder, x)
+
+    def decode(self, z):
+        """
+        Decode a batch of latents of shape `(batch, *latent_shape)`
+        """
+        return self._run(self._decoder, z)
+
+    def reconstruct(self, x):
+        return self.decode(self.encode(x))
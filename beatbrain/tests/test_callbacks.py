@@ -0,0 +1,196 @@
+import json
+
+import pytest
+
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, TensorDataset
+import pytorch_lightning as pl
+
+from beatbrain.callbacks import ThroughputMonitor, VisualizationCallback
+from beatbrain.helpers import get_callbacks
+from beatbrain.models import SpectrogramCVAE
+from beatbrain.utils.config import Config
+
+
+class TinyModel(pl.LightningModule):
+    def __init__(self):
+        super().__init__()
+        self.layer = torch.nn.Linear(4, 1)
+
+    def forward(self, x):
+        return self.layer(x)
+
+    def training_step(self, batch, batch_idx):
+        x, y = batch
+        return {"loss": F.mse_loss(self(x), y)}
+
+    def train_dataloader(self):
+        return DataLoader(
+            TensorDataset(torch.randn(50, 4), torch.randn(50, 1)), batch_size=8
+        )
+
+    def configure_optimizers(self):
+        return torch.optim.SGD(self.parameters(), lr=0.1)
+
+
+def test_throughput_monitor(tmp_path):
+    report_path = tmp_path / "report.json"
+    monitor = ThroughputMonitor(log_every_n_steps=2, report_path=report_path)
+    trainer = pl.Trainer(
+        max_epochs=2,
+        callbacks=[monitor],
+        logger=False,
+        checkpoint_callback=False,
+        weights_summary=None,
+        default_root_dir=str(tmp_path),
+    )
+    model = TinyModel()
+    trainer.fit(model)
+
+    report = json.loads(report_path.read_text())
+    assert report["steps"] == 14
+    assert report["samples"] == 100
+    assert report["samples_per_sec"] > 0
+    assert report["peak_rss_mb"] > 0
+    assert set(report["stages"]) == set(ThroughputMonitor.STAGES)
+    stages = report["stages"]
+    assert (
+        stages["forward"]["total_s"]
+        + stages["backward"]["total_s"]
+        + stages["optimizer"]["total_s"]
+        <= stages["step"]["total_s"]
+    )
+    # Newer Lightning versions run the forward and backward passes inside `optimizer_step()`, which mustn't count them twice
+    timed_stages = ["forward", "backward", "optimizer", "step"]
+    for forward, backward, optimizer, step in zip(
+        *map(monitor.times.get, timed_stages)
+    ):
+        assert forward > 0 and backward > 0 and forward + backward + optimizer <= step
+    assert set(monitor.rolling_summary()) >= {
+        "throughput/data_wait_ms",
+        "throughput/samples_per_sec",
+    }
+    # The module's methods are restored after training
+    assert "training_step" not in vars(model)
+
+
+def test_get_callbacks():
+    monitor = ThroughputMonitor()
+    callbacks = get_callbacks(
+        [{"ThroughputMonitor": {"log_every_n_steps": 5}}, monitor]
+    )
+    assert callbacks[0].log_every_n_steps == 5 and callbacks[1] is monitor
+    assert isinstance(get_callbacks({"ThroughputMonitor": None})[0], ThroughputMonitor)
+
+
+class TinyAutoencoder(pl.LightningModule):
+    def __init__(self):
+        super().__init__()
+        self.encoder = torch.nn.Sequential(torch.nn.Flatten(), torch.nn.Linear(64, 4))
+        self.decoder = torch.nn.Sequential(
+            torch.nn.Linear(4, 64), torch.nn.Sigmoid(), torch.nn.Unflatten(1, (1, 8, 8))
+        )
+
+    def encode(self, x):
+        return self.encoder(x)
+
+    def decode(self, z):
+        return self.decoder(z)
+
+    def forward(self, x):
+        z = self.encode(x)
+        return z, self.decode(z)
+
+    def training_step(self, batch, batch_idx):
+        x, _ = batch
+        return {"loss": F.mse_loss(self(x)[1], x)}
+
+    def train_dataloader(self):
+        return DataLoader(
+            TensorDataset(torch.rand(48, 1, 8, 8), torch.zeros(48)), batch_size=4
+        )
+
+    def configure_optimizers(self):
+        return torch.optim.SGD(self.parameters(), lr=0.1)
+
+
+def fit(callback, tmp_path, max_epochs=1, model=None, **kwargs):
+    trainer = pl.Trainer(
+        max_epochs=max_epochs,
+        callbacks=[callback],
+        logger=False,
+        checkpoint_callback=False,
+        weights_summary=None,
+        default_root_dir=str(tmp_path),
+    )
+    trainer.fit(model or TinyAutoencoder(), **kwargs)
+
+
+def test_visualization_callback(tmp_path):
+    # Spectrogram figures depend on librosa's plotting (whose compatibility with matplotlib varies), so aren't drawn here
+    callback = VisualizationCallback(
+        num_examples=3, spectrograms=False, raw_format="tiff", max_pending=10
+    )
+    fit(callback, tmp_path, max_epochs=2)
+    assert (
+        callback.submitted,
+        callback.rendered,
+        callback.dropped,
+        callback.failed,
+    ) == (2, 2, 0, 0)
+    png, raw = tmp_path / "visualizations" / "png", tmp_path / "visualizations" / "raw"
+    for epoch in range(2):
+        assert (png / "reconstruction" / f"reconstruction@epoch_{epoch}.png").exists()
+        assert (png / "generation" / f"generation@epoch_{epoch}.png").exists()
+        assert (
+            raw / "reconstruction" / f"reconstruction_3@epoch_{epoch}.tiff"
+        ).exists()
+    assert callback.latents.shape == (3, 4) and callback.samples.shape == (3, 1, 8, 8)
+
+
+def test_visualization_callback_drops(tmp_path):
+    # Rendering can't keep up with a visualization every batch, so visualizations are dropped rather than waited for
+    callback = VisualizationCallback(
+        frequency=1,
+        generation=False,
+        spectrograms=False,
+        raw_format=None,
+        max_pending=1,
+    )
+    fit(callback, tmp_path)
+    assert callback.dropped > 0 and callback.rendered >= 1
+    assert callback.submitted + callback.dropped == 12
+    assert callback.rendered == callback.submitted and not callback.pending
+    with pytest.raises(ValueError):
+        VisualizationCallback(frequency="step")
+
+
+def test_visualization_callback_offloads_registered_models(tmp_path):
+    # Registered models are rebuilt in the worker and run on a snapshot of the weights there
+    model = SpectrogramCVAE(
+        Config(
+            {
+                "latent_dim": 4,
+                "channels": [4, 4, 4, 4, 4],
+                "pool_features": 4,
+                "spec": {"n_mels": 32, "n_frames": 32},
+            }
+        )
+    )
+    data = DataLoader(
+        TensorDataset(torch.rand(8, 1, 32, 32), torch.zeros(8)), batch_size=4
+    )
+    callback = VisualizationCallback(
+        num_examples=2, spectrograms=False, raw_format=None
+    )
+    fit(callback, tmp_path, model=model, train_dataloader=data, val_dataloaders=data)
+    assert callback._offload_model
+    # The model's validation examples are also drawn by the workers, rather than in `validation_epoch_end()`
+    assert (callback.rendered, callback.failed) == (
+        2,
+        0,
+    ) and model.validation_examples is None
+    png = tmp_path / "visualizations" / "png"
+    assert (png / "generation" / "generation@epoch_0.png").exists()
+    assert (png / "validation" / "validation@epoch_0.png").exists()
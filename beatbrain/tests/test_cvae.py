@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import pytest
+import torch
+
+from beatbrain.helpers import train_model
+from beatbrain.models import SpectrogramCVAE
+from beatbrain.tests.test_train import make_corpus
+from beatbrain.utils.config import Config
+
+SAMPLE_CONFIG = Path(__file__).parents[2].joinpath("configs", "spectrogram_cvae.yaml")
+
+
+def make_model(**hparams):
+    torch.manual_seed(0)
+    return SpectrogramCVAE(
+        Config(
+            {
+                "latent_dim": 4,
+                "channels": [8, 16],
+                "spec": {"n_mels": 32, "n_frames": 48},
+                **hparams,
+            }
+        )
+    )
+
+
+def test_shapes():
+    model = make_model().eval()
+    x = torch.rand(2, *model.input_shape)
+    with torch.no_grad():
+        assert model.encode(x).shape == (2, *model.latent_shape) == (2, 4, 8, 12)
+        mean, logvar, recon = model(x)
+    assert recon.shape == x.shape and 0 <= recon.min() and recon.max() <= 1
+    # Evaluation is deterministic
+    assert torch.equal(model.decode(mean), recon)
+    with pytest.raises(ValueError):
+        make_model(spec={"n_mels": 30, "n_frames": 48})
+
+
+def test_checkpointing_matches_uncheckpointed():
+    model = make_model().train()
+    checkpointed = make_model(checkpointing=True).train()
+    assert checkpointed.checkpointing and not model.checkpointing
+    x = torch.rand(3, *model.input_shape)
+    losses = []
+    for m in [model, checkpointed]:
+        torch.manual_seed(1)
+        loss = m.training_step((x, None), 0)["loss"]
+        loss.backward()
+        losses.append(loss)
+    assert torch.allclose(losses[0], losses[1])
+    for (name, p), p_checkpointed in zip(
+        model.named_parameters(), checkpointed.parameters()
+    ):
+        assert torch.allclose(p.grad, p_checkpointed.grad, rtol=1e-4, atol=1e-6), name
+    # BatchNorm running statistics aren't updated again when activations are recomputed
+    for b, b_checkpointed in zip(model.buffers(), checkpointed.buffers()):
+        assert torch.allclose(b.float(), b_checkpointed.float())
+
+
+def test_train_cvae(tmp_path):
+    config = Config.load(SAMPLE_CONFIG)
+    config.hparams.update(
+        latent_dim=4, channels=[8, 8], spec={"n_mels": 32, "n_frames": 32}
+    )
+    config.data.update(
+        batch_size=4, num_workers=0, persistent_workers=None, prefetch_factor=None
+    )
+    for split in ["train", "val"]:
+        config.data[split].update(
+            paths=str(make_corpus(tmp_path / split)),
+            sample_rate=8000,
+            n_fft=512,
+            max_segment_length=1,
+            min_segment_length=1,
+            n_mels=32,
+            n_frames=32,
+        )
+    config.trainer.max_epochs = 1
+    # VisualizationCallback writes its images under the default root directory
+    config.trainer.default_root_dir = str(tmp_path)
+    config.trainer.logger = {
+        "TestTubeLogger": {"save_dir": str(tmp_path / "experiments"), "name": "test"}
+    }
+    model = train_model(config)
+    assert isinstance(model, SpectrogramCVAE) and model.checkpointing
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from beatbrain.utils.data import convert_audio
+
+
+@pytest.fixture
+def audio_dir(tmp_path):
+    root = tmp_path / "audio"
+    (root / "album").mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    for path, duration in [(root / "long.wav", 25), (root / "album" / "short.flac", 3)]:
+        sf.write(
+            str(path), rng.uniform(-0.5, 0.5, duration * 8000).astype(np.float32), 8000
+        )
+    return root
+
+
+def test_convert_audio_split(audio_dir, tmp_path):
+    output = tmp_path / "chunks"
+    convert_audio(
+        audio_dir,
+        output,
+        format="flac",
+        split=True,
+        chunk_duration=10,
+        discard_shorter=4,
+        sr=None,
+    )
+    # The last chunk of `long.wav` is kept (5s), while `short.flac` is shorter than `discard_shorter`
+    assert sorted(str(path.relative_to(output)) for path in output.rglob("*.flac")) == [
+        "long_1.flac",
+        "long_2.flac",
+        "long_3.flac",
+    ]
+    for i, duration in enumerate([10, 10, 5]):
+        audio, sr = sf.read(str(output / f"long_{i + 1}.flac"))
+        assert sr == 8000 and len(audio) == duration * 8000
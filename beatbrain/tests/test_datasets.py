@@ -0,0 +1,266 @@
+import numpy as np
+import pytest
+import soundfile as sf
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from beatbrain.datasets import (
+    AudioClipDataset,
+    AudioClipCollator,
+    IndexBatchSampler,
+    SpectrogramWindowDataset,
+)
+from beatbrain.datasets import audio as audio_datasets
+from beatbrain.utils.core import save_arrays
+
+
+@pytest.fixture
+def audio_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    for i, (sr, channels, seconds) in enumerate(
+        [(8000, 1, 3.5), (16000, 2, 2.2), (8000, 2, 4.0)]
+    ):
+        audio = rng.uniform(-0.5, 0.5, (int(sr * seconds), channels)).astype(np.float32)
+        sf.write(str(tmp_path / f"{i}.wav"), audio, sr)
+    (tmp_path / "not_audio.txt").write_text("definitely not audio")
+    return tmp_path
+
+
+def test_audio_clip_dataset(audio_dir):
+    dataset = AudioClipDataset(
+        audio_dir, max_segment_length=1, min_segment_length=0.5, sample_rate=8000
+    )
+    assert len(dataset) == 4 + 2 + 4
+    audio, sr = dataset[-1]
+    assert sr == 8000
+    assert audio.shape == (1, 8000)
+    with pytest.raises(IndexError):
+        dataset[len(dataset)]
+
+
+def test_audio_clip_collator(audio_dir):
+    dataset = AudioClipDataset(
+        audio_dir, max_segment_length=1, min_segment_length=0.5, sample_rate=8000
+    )
+    collate = AudioClipCollator()
+    audio, sr = collate([dataset[i] for i in range(3)])
+    assert sr == 8000
+    assert audio.shape == (3, 1, 8000)
+    np.testing.assert_array_equal(audio[1].numpy(), dataset[1][0])
+
+    # Short clips are zero-padded to the longest clip in the batch
+    audio, _ = collate(
+        [(np.ones((1, 5), np.float32), 8000), (np.ones((1, 3), np.float32), 8000)]
+    )
+    assert audio[1].tolist() == [[1, 1, 1, 0, 0]]
+    with pytest.raises(ValueError):
+        AudioClipCollator(pad=False)(
+            [(np.ones((1, 5), np.float32), 8000), (np.ones((1, 3), np.float32), 8000)]
+        )
+    with pytest.raises(ValueError):
+        collate(
+            [(np.ones((1, 5), np.float32), 8000), (np.ones((1, 5), np.float32), 16000)]
+        )
+
+
+def test_audio_clip_collator_workers(audio_dir):
+    dataset = AudioClipDataset(
+        audio_dir, max_segment_length=1, min_segment_length=0.5, sample_rate=8000
+    )
+    loader = DataLoader(
+        dataset, batch_size=4, num_workers=2, collate_fn=AudioClipCollator()
+    )
+    batches = list(loader)
+    assert [tuple(audio.shape) for audio, sr in batches] == [
+        (4, 1, 8000),
+        (4, 1, 8000),
+        (2, 1, 8000),
+    ]
+    expected = torch.from_numpy(np.stack([dataset[i][0] for i in range(4)]))
+    assert torch.equal(batches[0][0], expected)
+
+
+def test_index_batch_sampler():
+    sampler = IndexBatchSampler(10, 4)
+    batches = list(sampler)
+    assert len(sampler) == len(batches) == 3
+    assert sorted(torch.cat(batches).tolist()) == list(range(10))
+    assert [
+        b.tolist() for b in IndexBatchSampler(10, 4, shuffle=False, drop_last=True)
+    ] == [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+    dataset = TensorDataset(torch.arange(10).float(), torch.arange(10))
+    loader = DataLoader(
+        dataset, sampler=IndexBatchSampler(10, 4, shuffle=False), batch_size=None
+    )
+    x, y = next(iter(loader))
+    assert x.tolist() == [0, 1, 2, 3] and y.tolist() == [0, 1, 2, 3]
+
+
+def test_audio_clip_dataset_fractional_segments(audio_dir):
+    dataset = AudioClipDataset(
+        audio_dir, max_segment_length=0.25, min_segment_length=0.25, sample_rate=None
+    )
+    assert len(dataset) == 14 + 8 + 16
+    audio, sr = dataset[15]
+    assert (sr, audio.shape) == (16000, (1, 4000))
+
+
+@pytest.fixture
+def quiet_dir(tmp_path):
+    # 1s segments at 8kHz: silent intro, two loud segments, a near-silent gap, a loud segment and a 0.4s remainder
+    root = tmp_path / "audio"
+    root.mkdir()
+    rng = np.random.default_rng(0)
+    levels = [0, 0.5, 0.5, 1e-4, 0.5, 0.5]
+    audio = np.concatenate(
+        [rng.uniform(-level, level, (8000, 2)) for level in levels[:-1]]
+        + [rng.uniform(-0.5, 0.5, (3200, 2))]
+    )
+    sf.write(str(root / "0.wav"), audio.astype(np.float32), 8000)
+    sf.write(str(root / "1.wav"), np.zeros((16000, 1), np.float32), 8000)
+    (root / "not_audio.txt").write_text("definitely not audio")
+    return root
+
+
+def test_segment_levels(quiet_dir):
+    levels = audio_datasets.get_segment_levels(quiet_dir / "0.wav", 1, 0.5)
+    assert levels.shape == (5,)
+    # Uniform noise in [-0.5, 0.5] has an RMS of 1 / sqrt(12)
+    np.testing.assert_allclose(levels[[1, 2, 4]], 10 * np.log10(1 / 12), atol=0.1)
+    assert levels[0] == -100 and -90 < levels[3] < -80
+    # Levels don't depend on how the file is split into blocks
+    np.testing.assert_allclose(
+        audio_datasets.get_segment_levels(
+            quiet_dir / "0.wav", 1, 0.5, block_frames=3000
+        ),
+        levels,
+        atol=1e-4,
+    )
+    assert audio_datasets.get_segment_levels(
+        quiet_dir / "not_audio.txt", 1, 0.5
+    ).shape == (0,)
+    assert audio_datasets.get_segment_levels(quiet_dir / "0.wav", None, 0).shape == (1,)
+
+
+def test_audio_clip_dataset_min_level(tmp_path, quiet_dir, monkeypatch):
+    cache = tmp_path / "levels.cache"
+    dataset = AudioClipDataset(
+        quiet_dir,
+        max_segment_length=1,
+        min_segment_length=0.5,
+        sample_rate=None,
+        min_level=-60,
+        level_cache=cache,
+    )
+    assert len(dataset.segment_levels) == 5 + 2
+    assert len(dataset) == 3
+    assert [dataset.locate(i) for i in range(-3, 3)] == [(0, 1), (0, 2), (0, 4)] * 2
+    audio, _ = dataset[2]
+    assert np.abs(audio).max() > 0.4
+
+    # Cached levels are reused without decoding any audio, unless a file changes
+    monkeypatch.setattr(
+        audio_datasets,
+        "get_segment_levels",
+        lambda *args: pytest.fail("Decoded a cached file"),
+    )
+    cached = AudioClipDataset(
+        quiet_dir,
+        max_segment_length=1,
+        min_segment_length=0.5,
+        sample_rate=None,
+        min_level=-90,
+        level_cache=cache,
+    )
+    np.testing.assert_array_equal(cached.segment_levels, dataset.segment_levels)
+    assert len(cached) == 4
+    monkeypatch.undo()
+    sf.write(str(quiet_dir / "1.wav"), np.full((16000, 1), 0.5, np.float32), 8000)
+    assert (
+        len(
+            AudioClipDataset(
+                quiet_dir,
+                max_segment_length=1,
+                min_segment_length=0.5,
+                min_level=-60,
+                level_cache=cache,
+            )
+        )
+        == 3 + 2
+    )
+    with pytest.raises(ValueError):
+        AudioClipDataset(
+            quiet_dir / "0.wav",
+            max_segment_length=1,
+            min_segment_length=0.5,
+            min_level=0,
+        )
+
+
+@pytest.fixture
+def chunk_dir(tmp_path):
+    # Every value in chunk `c` of file `f` is `1000 * f + c`, so windows can be traced back to where they came from
+    for f, num_chunks in enumerate([5, 3, 8, 1, 6]):
+        chunks = [
+            np.full((4, 6), 1000 * f + c, dtype=np.float32) for c in range(num_chunks)
+        ]
+        if f == 2:
+            np.save(str(tmp_path / f"{f}.npy"), np.stack(chunks))
+        else:
+            save_arrays(chunks, tmp_path / f"{f}.npz")
+    (tmp_path / "corrupt.npz").write_bytes(b"not an archive")
+    return tmp_path
+
+
+def window_ids(windows):
+    return [tuple(int(chunk[0, 0]) for chunk in window) for window in windows]
+
+
+def test_spectrogram_window_dataset(chunk_dir):
+    dataset = SpectrogramWindowDataset(chunk_dir, window_size=3, cycle_length=1)
+    # File 3 is too short for a single window, and the corrupt file is skipped
+    assert len(dataset) == 3 + 1 + 6 + 0 + 4
+    windows = list(dataset)
+    assert all(
+        window.shape == (3, 4, 6) and window.dtype == np.float32 for window in windows
+    )
+    assert window_ids(windows[:4]) == [
+        (0, 1, 2),
+        (1, 2, 3),
+        (2, 3, 4),
+        (1000, 1001, 1002),
+    ]
+    # Windows are views of their file's chunks
+    assert np.shares_memory(windows[0], windows[1])
+    # Windows from several files are interleaved
+    interleaved = window_ids(
+        SpectrogramWindowDataset(chunk_dir, window_size=3, cycle_length=2)
+    )
+    assert interleaved[:3] == [(0, 1, 2), (1000, 1001, 1002), (1, 2, 3)]
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_spectrogram_window_dataset_shuffling(chunk_dir, num_workers):
+    dataset = SpectrogramWindowDataset(
+        chunk_dir, window_size=2, shuffle_buffer=4, seed=0
+    )
+    loader = DataLoader(dataset, batch_size=3, num_workers=num_workers)
+    epochs = []
+    for epoch in range(2):
+        dataset.set_epoch(epoch)
+        batches = list(loader)
+        assert all(
+            isinstance(batch, torch.Tensor) and batch.shape[1:] == (2, 4, 6)
+            for batch in batches
+        )
+        epochs.append(window_ids(torch.cat(batches).numpy()))
+    # Every window is loaded exactly once per epoch (i.e. worker shards don't overlap), in a different order each epoch
+    expected = window_ids(SpectrogramWindowDataset(chunk_dir, window_size=2))
+    assert len(epochs[0]) == len(dataset) and sorted(epochs[0]) == sorted(
+        expected
+    ) == sorted(epochs[1])
+    assert epochs[0] != expected and epochs[0] != epochs[1]
+    # The order is reproducible
+    dataset.set_epoch(0)
+    assert window_ids(torch.cat(list(loader)).numpy()) == epochs[0]
@@ -0,0 +1,150 @@
+import json
+
+import numpy as np
+import pytest
+import resampy
+import soundfile as sf
+from click.testing import CliRunner
+
+from beatbrain.cli import main
+from beatbrain.datasets import AudioClipDataset, FingerprintStore
+from beatbrain.helpers import dedupe
+from beatbrain.helpers.dedupe import dedupe_files
+from beatbrain.index import HammingIndex
+from beatbrain.utils import fingerprint
+from beatbrain.utils.synth import synthesize_audio
+
+
+@pytest.fixture(scope="module")
+def tracks():
+    rng = np.random.default_rng(0)
+    return [
+        synthesize_audio(duration, 16000, channels=2, rng=rng) for duration in (4, 5, 6)
+    ]
+
+
+@pytest.fixture
+def corpus(tmp_path, tracks):
+    root = tmp_path / "corpus"
+    (root / "copies").mkdir(parents=True)
+    for i, audio in enumerate(tracks):
+        sf.write(str(root / f"{i}.flac"), audio, 16000)
+    # Near-duplicates of track 0: a resampled, quieter mono re-encode and a lossy copy
+    sf.write(
+        str(root / "copies" / "0_quiet.wav"),
+        resampy.resample(tracks[0].mean(1), 16000, 11025) * 0.5,
+        11025,
+    )
+    sf.write(str(root / "copies" / "0.ogg"), tracks[0], 16000)
+    (root / "corrupt.wav").write_bytes(b"not audio")
+    return root
+
+
+def test_fingerprint(corpus):
+    fingerprints = {
+        path.name: fingerprint.fingerprint_file(path)
+        for path in corpus.rglob("*.*")
+        if path.name != "corrupt.wav"
+    }
+    original, info = fingerprints["0.flac"]
+    assert original.shape == (fingerprint.NUM_BYTES,) and original.dtype == np.uint8
+    assert (
+        info["lossless"]
+        and info["channels"] == 2
+        and info["duration"] == pytest.approx(4)
+    )
+    assert fingerprints["0.ogg"][1]["lossless"] is False
+    for name in ["0_quiet.wav", "0.ogg"]:
+        assert fingerprint.hamming_distances(original, fingerprints[name][0]) <= 24
+    for name in ["1.flac", "2.flac"]:
+        assert fingerprint.hamming_distances(original, fingerprints[name][0]) > 48
+    # Fingerprints barely depend on how the file is split into blocks
+    assert (
+        fingerprint.hamming_distances(
+            fingerprint.fingerprint_file(corpus / "0.flac", block_seconds=1.5)[0],
+            original,
+        )
+        <= 4
+    )
+    with pytest.raises(RuntimeError):
+        fingerprint.fingerprint_file(corpus / "corrupt.wav")
+
+
+def test_hamming_index():
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 256, (300, 32), dtype=np.uint8)
+    near = np.unpackbits(hashes[:50], axis=1)
+    for bits in near:
+        bits[rng.choice(256, rng.integers(0, 20), replace=False)] ^= 1
+    hashes = np.concatenate(
+        [hashes, np.packbits(near, axis=1), np.repeat(hashes[:1], 3, axis=0)]
+    )
+
+    index = HammingIndex(hashes)
+    pairs, distances = index.pairs(24)
+    all_distances = fingerprint.hamming_distances(hashes[:, None], hashes[None])
+    np.testing.assert_array_equal(pairs, np.argwhere(np.triu(all_distances <= 24, 1)))
+    np.testing.assert_array_equal(distances, all_distances[pairs[:, 0], pairs[:, 1]])
+
+    distances, indices = index.search(hashes[[300, 1]], k=2, max_distance=24)
+    assert indices.tolist() == [[300, 0], [1, 301]]
+    assert distances[0, 0] == 0 and distances[0, 1] == all_distances[300, 0]
+    assert len(HammingIndex(hashes[:0]).pairs(24)[0]) == 0
+    with pytest.raises(ValueError):
+        HammingIndex(hashes, band_bits=12)
+
+
+def test_dedupe(tmp_path, corpus, monkeypatch):
+    output, store = tmp_path / "lists" / "canonical.txt", tmp_path / "fingerprints"
+    output.parent.mkdir()
+    summary = dedupe_files(
+        corpus, output, store=store, groups_path=tmp_path / "groups.json", n_jobs=2
+    )
+    assert summary == {
+        "num_files": 6,
+        "num_valid": 5,
+        "num_canonical": 3,
+        "num_duplicates": 2,
+        "num_groups": 1,
+    }
+    assert sorted(
+        path.rsplit("/", 1)[-1] for path in output.read_text().splitlines()
+    ) == ["0.flac", "1.flac", "2.flac"]
+    groups = json.loads((tmp_path / "groups.json").read_text())
+    # Lossless copies are preferred
+    assert groups == [
+        {
+            "canonical": str(corpus / "0.flac"),
+            "duplicates": [
+                str(corpus / "copies" / "0_quiet.wav"),
+                str(corpus / "copies" / "0.ogg"),
+            ],
+        }
+    ]
+    assert FingerprintStore(store).is_complete
+
+    # Datasets load the canonical files
+    dataset = AudioClipDataset(output, max_segment_length=1, min_segment_length=1)
+    assert [path.name for path in dataset.paths] == ["0.flac", "1.flac", "2.flac"]
+    assert len(dataset) == 4 + 5 + 6
+
+    # The CLI reuses the stored fingerprints
+    monkeypatch.setattr(
+        dedupe, "_fingerprint", lambda path: pytest.fail(f"Fingerprinted {path} again")
+    )
+    result = CliRunner().invoke(
+        main,
+        [
+            "data",
+            "dedupe",
+            str(corpus),
+            "-o",
+            str(tmp_path / "cli.txt"),
+            "-s",
+            str(store),
+            "-j",
+            "1",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "cli.txt").read_text() == output.read_text()
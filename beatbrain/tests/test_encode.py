@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+import soundfile as sf
+import torch
+from click.testing import CliRunner
+
+from beatbrain.cli import main
+from beatbrain.datasets import LatentStore
+from beatbrain.helpers import encode_dataset, load_model
+from beatbrain.utils.config import Config
+from beatbrain.tests.test_train import SAMPLE_CONFIG, make_corpus
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = Config.load(SAMPLE_CONFIG)
+    config.data.train.paths = str(
+        make_corpus(tmp_path / "corpus", num_files=3, duration=3)
+    )
+    config.data.num_workers = 0
+    # Resuming needs the same weights as the original run
+    torch.save(
+        {"state_dict": load_model(config).state_dict()}, tmp_path / "weights.ckpt"
+    )
+    config.model.weights_path = str(tmp_path / "weights.ckpt")
+    return config
+
+
+def test_encode_dataset(tmp_path, config):
+    store = encode_dataset(config, tmp_path / "latents", batch_size=4, commit_every=1)
+    assert store.is_complete
+    assert store.latents.shape == (9, 3, 4, 4)
+    assert store.ids.tolist() == [
+        [track, segment] for track in range(3) for segment in range(3)
+    ]
+    assert len(store.paths) == 3
+
+    # Simulate an interruption by discarding the last few latents, then resume
+    expected = np.array(store.latents)
+    store.latents[5:] = 0
+    store.commit([])
+    store.completed[5:] = False
+    store.completed.flush()
+    resumed = encode_dataset(config, tmp_path / "latents", batch_size=4)
+    assert resumed.is_complete
+    np.testing.assert_allclose(
+        LatentStore(tmp_path / "latents").latents, expected, rtol=1e-5, atol=1e-6
+    )
+
+    # Stores can only be resumed with the same dataset and model
+    with pytest.raises(ValueError):
+        encode_dataset(
+            config, tmp_path / "latents", weights_path=tmp_path / "other.ckpt"
+        )
+    config.data.train.n_fft = 256
+    with pytest.raises(ValueError):
+        encode_dataset(config, tmp_path / "latents")
+
+
+def test_encode_filtered_dataset(tmp_path, config):
+    # Segments quieter than `min_level` aren't encoded, and the rest keep their `(track, segment)` ids
+    corpus = tmp_path / "quiet"
+    corpus.mkdir()
+    rng = np.random.default_rng(0)
+    for i, silent in enumerate([1, 0]):
+        audio = rng.uniform(-0.5, 0.5, (3, 8000)).astype(np.float32)
+        audio[silent] = 0
+        sf.write(str(corpus / f"{i}.wav"), audio.reshape(-1), 8000)
+    config.data.train.min_level = -60
+    filtered = encode_dataset(config, tmp_path / "filtered", paths=corpus)
+    assert filtered.ids.tolist() == [[0, 0], [0, 2], [1, 1], [1, 2]]
+    config.data.train.min_level = None
+    unfiltered = encode_dataset(config, tmp_path / "unfiltered", paths=corpus)
+    np.testing.assert_allclose(
+        filtered.latents, unfiltered.latents[[0, 2, 4, 5]], rtol=1e-5, atol=1e-6
+    )
+
+
+def test_encode_cli(tmp_path, config):
+    config_path = tmp_path / "config.yaml"
+    config.dump(config_path)
+    result = CliRunner().invoke(
+        main,
+        [
+            "models",
+            "encode",
+            "-c",
+            str(config_path),
+            "-o",
+            str(tmp_path / "latents"),
+            "--batch_size",
+            "8",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert LatentStore(tmp_path / "latents").is_complete
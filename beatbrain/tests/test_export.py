@@ -0,0 +1,81 @@
+import sys
+import subprocess
+
+import pytest
+import torch
+import torch.nn as nn
+
+from beatbrain.helpers import export_model, load_model
+from beatbrain.models.export import fold_batchnorm
+from beatbrain.models.mnist import BasicConv2d, Inception
+from beatbrain.runtime import ExportedModel
+from beatbrain.utils.config import get_default_config
+
+
+def test_fold_batchnorm():
+    torch.manual_seed(0)
+    model = nn.Sequential(
+        BasicConv2d(1, 8, kernel_size=3),
+        Inception(8, pool_features=4),
+        nn.Conv2d(228, 4, 1),
+        nn.BatchNorm2d(4),
+    )
+    for _ in range(3):
+        model(torch.randn(4, 1, 16, 16))
+    model.eval()
+    x = torch.randn(2, 1, 16, 16)
+    expected = model(x)
+    fold_batchnorm(model)
+    assert not any(isinstance(m, nn.BatchNorm2d) for m in model.modules())
+    torch.testing.assert_allclose(model(x), expected, rtol=1e-4, atol=1e-5)
+    with pytest.raises(ValueError):
+        fold_batchnorm(model.train())
+
+
+@pytest.fixture
+def config():
+    config = get_default_config()
+    config.hparams.data_root = None
+    return config
+
+
+def test_export_model(tmp_path, config):
+    checkpoint = tmp_path / "weights.ckpt"
+    model = load_model(config)
+    torch.save({"state_dict": model.state_dict()}, checkpoint)
+    metadata = export_model(
+        config, tmp_path / "export", weights_path=checkpoint, batch_size=2
+    )
+    assert metadata["architecture"] == "MNISTAutoencoder"
+    assert metadata["input_shape"] == [1, 28, 28]
+
+    x = torch.rand(5, 1, 28, 28)
+    with torch.no_grad():
+        expected_latent, expected_recon = model(x)
+    for backend in ["torchscript", "onnx"]:
+        if backend == "onnx":
+            pytest.importorskip("onnxruntime")
+        exported = ExportedModel(tmp_path / "export", backend=backend)
+        assert exported.latent_shape == tuple(expected_latent.shape[1:])
+        torch.testing.assert_allclose(
+            exported.encode(x), expected_latent, rtol=1e-4, atol=1e-5
+        )
+        torch.testing.assert_allclose(
+            exported.reconstruct(x), expected_recon, rtol=1e-4, atol=1e-5
+        )
+
+
+def test_runtime_is_lightweight(tmp_path, config):
+    export_model(config, tmp_path, formats=["torchscript"])
+    code = (
+        "import sys, torch; from beatbrain.runtime import ExportedModel; "
+        f"model = ExportedModel({str(tmp_path)!r}); model.reconstruct(torch.rand(2, 1, 28, 28)); "
+        "print(sorted(m for m in ['pytorch_lightning', 'torchvision', 'librosa'] if m in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    assert output.strip() == "[]"
@@ -0,0 +1,75 @@
+import pytest
+import torch
+
+from beatbrain.models.mnist import FusedInception, Inception
+
+MERGED = ["branch1x1", "branch5x5_1", "branch3x3dbl_1"]
+UNMERGED = ["branch5x5_2", "branch3x3dbl_2", "branch3x3dbl_3", "branch_pool"]
+
+
+@pytest.fixture
+def blocks():
+    torch.manual_seed(0)
+    inception = Inception(16, pool_features=8).double()
+    # Run a few batches through to get non-trivial BatchNorm statistics
+    for _ in range(3):
+        inception(torch.randn(4, 16, 12, 10, dtype=torch.float64))
+    return inception, FusedInception.from_inception(inception)
+
+
+def assert_equivalent(a, b):
+    assert a.shape == b.shape
+    torch.testing.assert_allclose(a, b, rtol=1e-12, atol=1e-12)
+
+
+def test_training_equivalence(blocks):
+    inception, fused = blocks
+    assert fused.training and fused.out_channels == 232
+    x = torch.randn(3, 16, 12, 10, dtype=torch.float64, requires_grad=True)
+    output, fused_output = inception(x), fused(x)
+    assert_equivalent(fused_output, output)
+    grad_output = torch.randn_like(output)
+    output.backward(grad_output)
+    fused_output.backward(grad_output)
+    assert_equivalent(
+        fused.branch1x1s.conv.weight.grad,
+        torch.cat([getattr(inception, name).conv.weight.grad for name in MERGED]),
+    )
+    assert_equivalent(
+        fused.branch1x1s.bn.weight.grad,
+        torch.cat([getattr(inception, name).bn.weight.grad for name in MERGED]),
+    )
+    for name in UNMERGED:
+        for p, fused_p in zip(
+            getattr(inception, name).parameters(), getattr(fused, name).parameters()
+        ):
+            assert_equivalent(fused_p.grad, p.grad)
+    # The merged BatchNorm tracks the same running statistics as the three separate ones
+    assert_equivalent(
+        fused.branch1x1s.bn.running_var,
+        torch.cat([getattr(inception, name).bn.running_var for name in MERGED]),
+    )
+
+
+@pytest.mark.parametrize("preallocate_output", [False, True])
+@pytest.mark.parametrize(
+    "memory_format", [torch.contiguous_format, torch.channels_last]
+)
+def test_inference_equivalence(blocks, memory_format, preallocate_output):
+    inception, fused = (block.eval() for block in blocks)
+    fused.preallocate_output = preallocate_output
+    x = torch.randn(2, 16, 12, 10, dtype=torch.float64).contiguous(
+        memory_format=memory_format
+    )
+    with torch.no_grad():
+        expected = inception(x)
+        output = fused(x)
+        # `torch.cat` only keeps the memory format in newer PyTorch versions
+        if preallocate_output:
+            assert output.is_contiguous(memory_format=memory_format)
+        assert_equivalent(output, expected)
+        fused.fold_bn()
+        assert not any(isinstance(m, torch.nn.BatchNorm2d) for m in fused.modules())
+        assert_equivalent(fused(x), expected)
+    # The differentiable path gives the same result
+    assert_equivalent(fused(x.requires_grad_()), expected)
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+from click.testing import CliRunner
+
+from beatbrain.cli import main
+from beatbrain.datasets import LatentStore
+from beatbrain.helpers import search_latents
+from beatbrain.index import ExactIndex, IVFIndex
+
+
+def make_latents(num_latents=500, num_clusters=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, 3, 4, 4))
+    return (
+        centers[rng.integers(0, num_clusters, num_latents)]
+        + 0.3 * rng.normal(size=(num_latents, 3, 4, 4))
+    ).astype(np.float32)
+
+
+@pytest.mark.parametrize("metric", ["cosine", "l2"])
+def test_exact_index(metric):
+    latents = make_latents()
+    queries = latents[:7] + 0.01
+    distances, indices = ExactIndex(
+        latents, metric=metric, chunk_size=64, query_chunk_size=3
+    ).search(queries, k=5)
+    flat, flat_queries = latents.reshape(len(latents), -1), queries.reshape(
+        len(queries), -1
+    )
+    if metric == "cosine":
+        flat = flat / np.linalg.norm(flat, axis=1, keepdims=True)
+        flat_queries = flat_queries / np.linalg.norm(
+            flat_queries, axis=1, keepdims=True
+        )
+        expected = 1 - flat_queries @ flat.T
+    else:
+        expected = ((flat_queries[:, None] - flat[None]) ** 2).sum(-1)
+    np.testing.assert_array_equal(indices, np.argsort(expected, axis=1)[:, :5])
+    np.testing.assert_allclose(
+        distances, np.sort(expected, axis=1)[:, :5], rtol=1e-4, atol=1e-4
+    )
+    with pytest.raises(ValueError):
+        ExactIndex(latents, metric="hamming")
+
+
+@pytest.mark.parametrize("metric", ["cosine", "l2"])
+def test_ivf_index(tmp_path, metric):
+    latents = make_latents()
+    queries = latents[::50]
+    exact_distances, exact_indices = ExactIndex(latents, metric=metric).search(
+        queries, k=10
+    )
+    ivf = IVFIndex.build(
+        latents, metric=metric, num_lists=8, num_probes=2, chunk_size=100
+    )
+    assert len(ivf) == len(latents) and sorted(ivf.ids) == list(range(len(latents)))
+    # Probing every cluster is an exhaustive search
+    distances, indices = ivf.search(queries, k=10, num_probes=8)
+    np.testing.assert_array_equal(indices, exact_indices)
+    np.testing.assert_allclose(distances, exact_distances, rtol=1e-4, atol=1e-4)
+
+    ivf.save(tmp_path / "ivf")
+    loaded = IVFIndex.load(tmp_path / "ivf")
+    distances, indices = loaded.search(queries, k=10)
+    recall = np.mean(
+        [len(set(a) & set(b)) / 10 for a, b in zip(indices, exact_indices)]
+    )
+    assert recall > 0.8
+
+
+def test_search_latents(tmp_path):
+    latents = make_latents(num_latents=60)
+    ids = [[track, segment] for track in range(20) for segment in range(3)]
+    paths = [str(tmp_path / f"{track}.wav") for track in range(20)]
+    store = LatentStore.create(
+        tmp_path / "latents", ids, latents.shape[1:], metadata={"paths": paths}
+    )
+    store.latents[:] = latents
+    store.commit(np.arange(len(latents)))
+
+    [query] = search_latents(tmp_path / "latents", track=paths[4], segment=1, k=5)
+    assert (query["row"], query["track"], query["segment"]) == (13, 4, 1)
+    assert len(query["matches"]) == 5
+    assert all(match["track"] != 4 for match in query["matches"])
+    [query] = search_latents(
+        tmp_path / "latents", rows=[13], k=5, exclude_same_track=False
+    )
+    assert query["matches"][0]["row"] == 13
+    assert (
+        len(search_latents(tmp_path / "latents", track=4, index="ivf", num_lists=4))
+        == 3
+    )
+    assert (tmp_path / "latents" / "ivf_cosine").exists()
+
+    # Re-creating the store discards the saved index, rather than searching the old latents with it
+    store = LatentStore.create(
+        tmp_path / "latents",
+        ids[:30],
+        latents.shape[1:],
+        metadata={"paths": paths[:10]},
+    )
+    assert not (tmp_path / "latents" / "ivf_cosine").exists()
+    store.latents[:] = latents[30:]
+    store.commit(np.arange(30))
+    [query] = search_latents(
+        tmp_path / "latents",
+        rows=[13],
+        k=1,
+        index="ivf",
+        num_lists=4,
+        exclude_same_track=False,
+    )
+    assert query["matches"][0]["row"] == 13
+
+    result = CliRunner().invoke(
+        main,
+        [
+            "models",
+            "search",
+            "-s",
+            str(tmp_path / "latents"),
+            "-r",
+            "0",
+            "-k",
+            "3",
+            "--index",
+            "ivf",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert "3. " in result.output
@@ -0,0 +1,144 @@
+import math
+
+import pytest
+import torch
+
+from beatbrain.generator import helpers
+
+
+def reference_log_normal_pdf(sample, mean, logvar):
+    return torch.sum(
+        -0.5
+        * ((sample - mean) ** 2 * torch.exp(-logvar) + logvar + math.log(2 * math.pi)),
+        dim=1,
+    )
+
+
+def reference_reconstruction_loss(logits, target):
+    # `tf.losses.mse` over channels (last in TF, second here), summed over pixels, averaged over the batch
+    return ((torch.sigmoid(logits) - target) ** 2).mean(1).sum([1, 2]).mean()
+
+
+def reference_kl_divergence(mean, logvar):
+    var = torch.exp(logvar)
+    return (0.5 * (mean**2 + var - 1 - logvar)).flatten(1).sum(1).mean()
+
+
+def make_latents(shape=(4, 8, 2, 3)):
+    torch.manual_seed(0)
+    mean = torch.randn(shape, dtype=torch.float64, requires_grad=True)
+    logvar = (0.5 * torch.randn(shape, dtype=torch.float64)).requires_grad_()
+    return mean, logvar
+
+
+def test_log_normal_pdf():
+    sample = torch.randn(5, 3)
+    mean, logvar = torch.randn(5, 3), torch.randn(5, 3)
+    assert torch.allclose(
+        helpers.log_normal_pdf(sample, mean, logvar),
+        reference_log_normal_pdf(sample, mean, logvar),
+    )
+    # A standard normal prior can be given as floats
+    expected = torch.distributions.Normal(0.0, 1.0).log_prob(sample).sum(1)
+    assert torch.allclose(helpers.log_normal_pdf(sample, 0.0, 0.0), expected, atol=1e-6)
+
+
+def test_reparameterize():
+    mean, logvar = make_latents()
+    eps = torch.randn_like(mean)
+    z = helpers.reparameterize(mean, logvar, eps=eps)
+    assert torch.allclose(z, mean + eps * torch.exp(0.5 * logvar))
+    assert helpers.reparameterize(mean, logvar, training=False) is mean
+    grads = torch.autograd.grad(z.sum(), [mean, logvar])
+    assert torch.allclose(grads[0], torch.ones_like(mean))
+    assert torch.allclose(grads[1], 0.5 * eps * torch.exp(0.5 * logvar))
+
+
+def test_kl_divergence():
+    mean, logvar = make_latents()
+    kl = helpers.kl_divergence(mean, logvar)
+    expected = reference_kl_divergence(mean, logvar)
+    assert torch.allclose(kl, expected)
+    assert torch.allclose(
+        helpers.kl_divergence(mean, logvar, reduction="sum"), expected * len(mean)
+    )
+    assert helpers.kl_divergence(mean, logvar, reduction="none").shape == (len(mean),)
+    for grad, expected_grad in zip(
+        torch.autograd.grad(kl, [mean, logvar]),
+        torch.autograd.grad(expected, [mean, logvar]),
+    ):
+        assert torch.allclose(grad, expected_grad)
+    assert helpers.kl_divergence(torch.zeros(2, 3), torch.zeros(2, 3)).item() == 0
+
+
+def test_kl_divergence_matches_sampled_estimate():
+    # The closed form is the expectation of the single-sample estimate the old `KLLoss` used
+    mean, logvar = (t.detach()[:1, :, 0, 0] for t in make_latents())
+    mean, logvar = mean.expand(20000, -1), logvar.expand(20000, -1)
+    z = helpers.reparameterize(mean, logvar)
+    sampled = (
+        helpers.log_normal_pdf(z, mean, logvar) - helpers.log_normal_pdf(z, 0.0, 0.0)
+    ).mean()
+    assert sampled.item() == pytest.approx(
+        helpers.kl_divergence(mean, logvar).item(), rel=0.05
+    )
+
+
+@pytest.mark.parametrize("num_channels", [1, 2])
+def test_reconstruction_loss(num_channels):
+    torch.manual_seed(0)
+    logits = torch.randn(
+        3, num_channels, 16, 20, dtype=torch.float64, requires_grad=True
+    )
+    target = torch.rand(3, num_channels, 16, 20, dtype=torch.float64)
+    loss = helpers.reconstruction_loss(logits, target, logits=True)
+    expected = reference_reconstruction_loss(logits, target)
+    assert torch.allclose(loss, expected)
+    assert torch.allclose(
+        helpers.reconstruction_loss(torch.sigmoid(logits), target), expected
+    )
+    assert torch.allclose(
+        helpers.reconstruction_loss(
+            logits, target, logits=True, reduction="none"
+        ).mean(),
+        expected,
+    )
+    assert torch.allclose(
+        torch.autograd.grad(loss, logits)[0], torch.autograd.grad(expected, logits)[0]
+    )
+    assert torch.autograd.gradcheck(
+        lambda x: helpers.reconstruction_loss(x, target, logits=True), [logits]
+    )
+
+
+def test_vae_loss():
+    mean, logvar = make_latents()
+    logits, target = torch.randn(4, 1, 8, 8, dtype=torch.float64), torch.rand(
+        4, 1, 8, 8, dtype=torch.float64
+    )
+    loss, recon_loss, kl = helpers.vae_loss(
+        logits, target, mean, logvar, beta=0.5, logits=True
+    )
+    assert torch.allclose(recon_loss, reference_reconstruction_loss(logits, target))
+    assert torch.allclose(kl, reference_kl_divergence(mean, logvar))
+    assert torch.allclose(loss, recon_loss + 0.5 * kl)
+
+
+def test_losses_are_scriptable():
+    mean, logvar = (t.detach() for t in make_latents())
+    logits, target = torch.randn(4, 1, 8, 8, dtype=torch.float64), torch.rand(
+        4, 1, 8, 8, dtype=torch.float64
+    )
+    eps = torch.randn_like(mean)
+    scripted = torch.jit.script(helpers.reparameterize)
+    assert torch.allclose(
+        scripted(mean, logvar, True, eps), helpers.reparameterize(mean, logvar, eps=eps)
+    )
+    assert torch.allclose(
+        torch.jit.script(helpers.kl_divergence)(mean, logvar),
+        helpers.kl_divergence(mean, logvar),
+    )
+    assert torch.allclose(
+        torch.jit.script(helpers.reconstruction_loss)(logits, target, True),
+        helpers.reconstruction_loss(logits, target, logits=True),
+    )
@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+from torch.utils.data import DataLoader, Dataset
+
+from beatbrain.cli import main
+from beatbrain.tests.test_train import make_corpus
+from beatbrain.utils import memory
+
+RETAINED = []
+
+
+class LeakyDataset(Dataset):
+    """
+    Keeps a reference to every buffer it returns
+    """
+
+    def __getitem__(self, index):
+        buffer = np.ones(64 * 1024, dtype=np.float64)  # 512 KB
+        RETAINED.append(buffer)
+        return buffer[:4]
+
+    def __len__(self):
+        return 16
+
+
+LEAK_SITE = f"test_memory.py:{LeakyDataset.__getitem__.__code__.co_firstlineno + 1}"
+
+
+@pytest.fixture
+def profile_dir(tmp_path):
+    profile_dir = memory.enable(tmp_path / "memory", interval=0.05, report_interval=0.2)
+    yield profile_dir
+    memory.disable()
+    RETAINED.clear()
+
+
+def test_memory_profile(profile_dir):
+    dataset = LeakyDataset()
+    for i in range(len(dataset)):
+        dataset[i]
+    memory.disable()
+    report = memory.build_report(profile_dir)
+    (process,) = report["processes"]
+    assert process["name"].startswith("MainProcess")
+    assert process["peak_rss"] > 0 and len(process["samples"]) >= 2
+    # The retained buffers are attributed to the line that allocated them
+    leak = report["top_growth"][0]
+    assert leak["site"].endswith(LEAK_SITE)
+    assert leak["size_diff"] >= 16 * 512 * 1024
+    assert report["top_allocations"][0]["site"] == leak["site"]
+    text = memory.format_report(report)
+    assert "MainProcess" in text and leak["site"] in text
+
+
+def test_worker_memory_profile(profile_dir):
+    for _ in DataLoader(LeakyDataset(), batch_size=4, num_workers=2):
+        pass
+    memory.disable()
+    report = memory.build_report(profile_dir)
+    workers = [
+        process
+        for process in report["processes"]
+        if not process["name"].startswith("MainProcess")
+    ]
+    assert len(workers) == 2
+    for worker in workers:
+        assert worker["top_growth"][0]["site"].endswith(LEAK_SITE)
+        assert worker["top_growth"][0]["size_diff"] >= 8 * 512 * 1024
+
+
+def test_profile_memory_cli(tmp_path):
+    corpus = make_corpus(tmp_path / "corpus", num_files=2)
+    output = tmp_path / "memory.json"
+    result = CliRunner().invoke(
+        main,
+        [
+            "--profile-memory",
+            str(output),
+            "convert",
+            "audio",
+            str(corpus),
+            str(tmp_path / "converted"),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert not memory.is_enabled()
+    report = json.loads(output.read_text())
+    assert report["processes"] and report["top_allocations"]
+    assert "peak RSS" in result.output
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from beatbrain.generator.metrics import ncc, batch_ncc, pairwise_ncc
+
+
+@pytest.fixture
+def signals():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(5, 6, 7)), rng.normal(size=(5, 6, 7))
+
+
+@pytest.mark.parametrize("sweep", [False, True])
+def test_batch_ncc(signals, sweep):
+    a, b = signals
+    expected = np.stack([ncc(x, y, sweep=sweep) for x, y in zip(a, b)])
+    np.testing.assert_allclose(
+        batch_ncc(a, b, sweep=sweep, chunk_size=2), expected, atol=1e-10
+    )
+    np.testing.assert_allclose(batch_ncc(a, a)[0], 1)
+
+
+def test_batch_ncc_float32(signals):
+    a, b = (x.astype(np.float32) for x in signals)
+    result = batch_ncc(a, b, sweep=True)
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, batch_ncc(*signals, sweep=True), atol=1e-5)
+
+
+def test_pairwise_ncc(signals):
+    a, b = signals
+    expected = np.array([[ncc(x, y) for y in b[:3]] for x in a])
+    np.testing.assert_allclose(
+        pairwise_ncc(a, b[:3], chunk_size=2), expected, atol=1e-10
+    )
+    expected = np.array([[ncc(x, y, sweep=True).max() for y in b[:3]] for x in a])
+    np.testing.assert_allclose(
+        pairwise_ncc(a, b[:3], sweep=True, chunk_size=4), expected, atol=1e-10
+    )
+    np.testing.assert_allclose(np.diag(pairwise_ncc(a)), 1)
+    # The peak over lags mustn't pick up the FFT's zero-padding when every correlation is negative
+    assert pairwise_ncc(np.ones((1, 4)), -np.ones((1, 4)), sweep=True)[0, 0] < 0
+    with pytest.raises(ValueError):
+        pairwise_ncc(a, b[:, :3])
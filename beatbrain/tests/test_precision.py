@@ -0,0 +1,92 @@
+import pytest
+import torch
+import torch.nn as nn
+
+from beatbrain.callbacks import PrecisionCallback
+from beatbrain.helpers import get_trainer
+from beatbrain.models.mnist import BasicConv2d, Inception
+from beatbrain.models.precision import autocast, get_autocast_dtype
+
+requires_autocast = pytest.mark.skipif(
+    not hasattr(torch, "autocast"), reason="CPU autocast requires PyTorch >= 1.10"
+)
+
+
+@pytest.fixture
+def conv_stack():
+    torch.manual_seed(0)
+    model = nn.Sequential(
+        BasicConv2d(1, 32, kernel_size=3, padding=1),
+        Inception(32, pool_features=32),
+        Inception(256, pool_features=64),
+    )
+    # Run a few batches through to get non-trivial BatchNorm statistics
+    for _ in range(3):
+        model(torch.randn(8, 1, 32, 40))
+    return model.eval()
+
+
+def test_channels_last_parity(conv_stack):
+    x = torch.randn(4, 1, 32, 40)
+    expected = conv_stack(x)
+    conv_stack.to(memory_format=torch.channels_last)
+    result = conv_stack(x.contiguous(memory_format=torch.channels_last))
+    torch.testing.assert_allclose(result, expected, rtol=1e-4, atol=1e-5)
+
+
+@requires_autocast
+@pytest.mark.parametrize("channels_last", [False, True])
+def test_bf16_parity(conv_stack, channels_last):
+    x = torch.randn(4, 1, 32, 40)
+    expected = conv_stack(x)
+    if channels_last:
+        conv_stack.to(memory_format=torch.channels_last)
+        x = x.contiguous(memory_format=torch.channels_last)
+    with autocast(torch.bfloat16):
+        result = conv_stack(x)
+    assert result.dtype == torch.bfloat16
+    relative_error = (result.float() - expected).norm() / expected.norm()
+    assert relative_error < 2e-2
+
+
+@requires_autocast
+def test_bf16_gradient_parity(conv_stack):
+    conv_stack.train()
+    x = torch.randn(4, 1, 32, 40)
+    grads = []
+    for dtype in [None, torch.bfloat16]:
+        conv_stack.zero_grad()
+        with autocast(dtype):
+            loss = conv_stack(x).float().pow(2).mean()
+        loss.backward()
+        grads.append(torch.cat([p.grad.flatten() for p in conv_stack.parameters()]))
+    assert (grads[1] - grads[0]).norm() / grads[0].norm() < 5e-2
+
+
+def test_precision_config():
+    assert get_autocast_dtype(32) is None
+    with pytest.raises(ValueError):
+        get_autocast_dtype("fp8")
+    with pytest.raises(ValueError):
+        PrecisionCallback(memory_format="NHWC")
+    trainer = get_trainer(
+        max_epochs=1,
+        memory_format="channels_last",
+        logger=False,
+        checkpoint_callback=False,
+    )
+    callback = next(c for c in trainer.callbacks if isinstance(c, PrecisionCallback))
+    assert (
+        callback.memory_format == torch.channels_last
+        and callback.autocast_dtype is None
+    )
+
+
+@requires_autocast
+def test_precision_callback_configures_module():
+    module = nn.Sequential(nn.Conv2d(1, 2, 3))
+    PrecisionCallback(precision="bf16", memory_format="channels_last").on_train_start(
+        None, module
+    )
+    assert module.autocast_dtype == torch.bfloat16
+    assert module[0].weight.is_contiguous(memory_format=torch.channels_last)
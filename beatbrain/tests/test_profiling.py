@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+from click.testing import CliRunner
+
+from beatbrain.cli import main
+from beatbrain.datasets import AudioClipDataset, SpectrogramClipDataset
+from beatbrain.helpers.profiling import STAGES, profile_data, profile_item
+from beatbrain.tests.test_train import SAMPLE_CONFIG, make_corpus
+from beatbrain.utils.config import Config
+
+
+def test_profile_item(tmp_path):
+    corpus = make_corpus(tmp_path / "corpus", num_files=2)
+    for dataset in [
+        AudioClipDataset(corpus, max_segment_length=1, sample_rate=4000),
+        SpectrogramClipDataset(
+            corpus,
+            max_segment_length=1,
+            sample_rate=4000,
+            n_fft=256,
+            hop_length=128,
+            n_mels=16,
+            n_frames=20,
+        ),
+    ]:
+        (sample, sr), timings = profile_item(dataset, 4)
+        expected, expected_sr = dataset[4]
+        np.testing.assert_array_equal(sample, expected)
+        assert sr == expected_sr
+        assert set(timings) <= set(STAGES) and all(t >= 0 for t in timings.values())
+    assert list(timings) == [stage for stage in STAGES if stage != "collate"]
+
+
+def test_profile_data(tmp_path):
+    config = Config.load(SAMPLE_CONFIG)
+    config.data.train.paths = str(make_corpus(tmp_path / "corpus"))
+    profile = profile_data(config, num_samples=10, batch_size=4, num_workers=0)
+    assert profile["dataset"] == "SpectrogramClipDataset"
+    # The first batch is a warmup batch
+    assert (profile["num_samples"], profile["num_batches"]) == (6, 2)
+    assert set(profile["stages"]) == set(STAGES)
+    assert profile["samples_per_sec"] > 0 and profile["cpu_time"] > 0
+
+    output = tmp_path / "profile.json"
+    result = CliRunner().invoke(
+        main,
+        [
+            "data",
+            "profile",
+            "-c",
+            str(SAMPLE_CONFIG),
+            "-i",
+            config.data.train.paths,
+            "-n",
+            "4",
+            "--num_workers",
+            "0",
+            "-o",
+            str(output),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert "resample" in result.output and "Throughput" in result.output
+    assert json.loads(output.read_text())["num_samples"] == 4
@@ -0,0 +1,104 @@
+import pytest
+import torch
+import torch.nn as nn
+
+from beatbrain.generator import helpers
+from beatbrain.generator.quantization import (
+    compare_decoders,
+    get_quantized_decoder,
+    quantize_decoder,
+)
+
+
+def make_decoder(latent_dim=8):
+    torch.manual_seed(0)
+    decoder = nn.Sequential(
+        nn.Conv2d(latent_dim, 16, 3, padding=1),
+        nn.BatchNorm2d(16),
+        nn.ReLU(),
+        nn.UpsamplingNearest2d(scale_factor=2),
+        nn.Conv2d(16, 1, 3, padding=1),
+        nn.Sigmoid(),
+    )
+    for _ in range(3):
+        decoder(torch.randn(16, latent_dim, 4, 4))
+    return decoder.eval()
+
+
+def test_static_quantization():
+    decoder = make_decoder()
+    quantized = quantize_decoder(
+        decoder, "static", calibration_data=torch.randn(64, 8, 4, 4)
+    )
+    assert any(isinstance(m, nn.quantized.Conv2d) for m in quantized.modules())
+    # The original decoder is left untouched
+    assert not any(isinstance(m, nn.quantized.Conv2d) for m in decoder.modules())
+    report = compare_decoders(
+        decoder, quantized, torch.randn(32, 8, 4, 4), batch_size=16, repeats=1
+    )
+    assert report["mse_vs_float32"] < 1e-3
+    assert report["ncc_vs_float32"] > 0.99
+    with pytest.raises(ValueError):
+        quantize_decoder(decoder, "static")
+    with pytest.raises(ValueError):
+        quantize_decoder(decoder, "float16")
+
+
+def test_dynamic_quantization():
+    torch.manual_seed(0)
+    decoder = nn.Sequential(nn.Linear(8, 64), nn.ReLU(), nn.Linear(64, 32)).eval()
+    quantized = quantize_decoder(decoder, "dynamic")
+    assert any(isinstance(m, nn.quantized.dynamic.Linear) for m in quantized.modules())
+    z = torch.randn(16, 8)
+    targets = decoder(z).detach()
+    report = compare_decoders(
+        decoder, quantized, z, targets=targets, batch_size=8, repeats=1
+    )
+    assert report["reconstruction_mse_float32"] == 0
+    assert abs(report["reconstruction_ncc_delta"]) < 1e-2
+    # Convolutions aren't dynamically quantized, so conv decoders would be left in float32
+    with pytest.raises(ValueError):
+        quantize_decoder(make_decoder(), "dynamic")
+
+
+def test_quantized_decoder_cache():
+    decoder = make_decoder()
+    quantized = get_quantized_decoder(decoder, "static", latent_shape=(8, 4, 4))
+    assert get_quantized_decoder(decoder, "static", latent_shape=(8, 4, 4)) is quantized
+    # Different calibration latents, or new weights, quantize the decoder again
+    assert (
+        get_quantized_decoder(
+            decoder, "static", latent_shape=(8, 4, 4), num_calibration_samples=32
+        )
+        is not quantized
+    )
+    assert (
+        get_quantized_decoder(
+            decoder, "static", calibration_data=torch.randn(32, 8, 4, 4)
+        )
+        is not quantized
+    )
+    z = torch.randn(8, 8, 4, 4)
+    with torch.no_grad():
+        before = quantized(z)
+        decoder[4].weight.mul_(-1)
+        requantized = get_quantized_decoder(decoder, "static", latent_shape=(8, 4, 4))
+        assert requantized is not quantized
+        assert not torch.allclose(requantized(z), before)
+        assert torch.allclose(requantized(z), decoder(z), atol=0.05)
+        # Loading weights counts as a change too
+        decoder.load_state_dict(make_decoder().state_dict())
+        assert torch.allclose(
+            helpers.decode(decoder, z, quantize="static"), before, atol=1e-6
+        )
+
+
+def test_sample_quantized():
+    decoder = make_decoder()
+    eps = torch.randn(10, 8, 4, 4)
+    expected = helpers.sample((8, 4, 4), decoder, eps=eps)
+    samples = helpers.sample((8, 4, 4), decoder, eps=eps, quantize="static")
+    assert samples.shape == (10, 1, 8, 8)
+    assert torch.mean((samples - expected) ** 2) < 1e-3
+    with pytest.raises(ValueError):
+        helpers.sample((8, 4, 4), decoder, num_samples=3, quantize="dynamic")
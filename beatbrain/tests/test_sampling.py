@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+import soundfile as sf
+import torch
+from click.testing import CliRunner
+
+from beatbrain.cli import main
+from beatbrain.datasets import SampleStore
+from beatbrain.generator import helpers
+from beatbrain.helpers import load_model, sample_to_disk
+from beatbrain.utils.config import Config
+from beatbrain.tests.test_train import SAMPLE_CONFIG
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = Config.load(SAMPLE_CONFIG)
+    # Resuming needs the same weights as the original run
+    torch.save(
+        {"state_dict": load_model(config).state_dict()}, tmp_path / "weights.ckpt"
+    )
+    config.model.weights_path = str(tmp_path / "weights.ckpt")
+    return config
+
+
+def test_sample_latents():
+    # Large enough latents that a block only holds 4 of them
+    latent_shape = (helpers.LATENT_BLOCK_ELEMENTS // 4,)
+    expected = helpers.sample_latents(latent_shape, 0, 10, seed=3)
+    assert expected.shape == (10, *latent_shape)
+    chunks = [
+        helpers.sample_latents(latent_shape, start, stop, seed=3)
+        for start, stop in [(0, 3), (3, 9), (9, 10)]
+    ]
+    torch.testing.assert_allclose(torch.cat(chunks), expected, rtol=0, atol=0)
+    assert not torch.equal(
+        helpers.sample_latents(latent_shape, 0, 10, seed=4), expected
+    )
+    assert helpers.sample_latents(latent_shape, 5, 5).shape == (0, *latent_shape)
+    assert 0.9 < float(helpers.sample_latents((8,), 0, 10000).std()) < 1.1
+
+    decoder = torch.nn.Linear(8, 2)
+    chunks = list(helpers.sample_chunks(8, decoder, 10, seed=1, batch_size=4, start=2))
+    assert [start for start, _ in chunks] == [2, 6]
+    torch.testing.assert_allclose(
+        torch.cat([batch for _, batch in chunks]),
+        helpers.sample(8, decoder, num_samples=10, seed=1)[2:],
+    )
+
+
+def test_sample_to_disk(tmp_path, config):
+    store = sample_to_disk(
+        config,
+        tmp_path / "samples",
+        10,
+        seed=1,
+        batch_size=4,
+        audio_format="wav",
+        num_workers=0,
+        commit_every=1,
+    )
+    assert store.is_complete
+    assert store.spectrograms.shape == (10, 1, 28, 28)
+    audio, sr = sf.read(str(store.audio_path(9)))
+    assert sr == 8000 and len(audio) > 0
+    assert store.audio_path(9).parent.name == "0000"
+    assert store.latent(3).shape == tuple(store.metadata["latent_shape"])
+    expected = np.array(store.spectrograms)
+
+    # Samples don't depend on the batch size
+    other = sample_to_disk(config, tmp_path / "other", 10, seed=1, batch_size=3)
+    np.testing.assert_allclose(other.spectrograms, expected, rtol=1e-5, atol=1e-6)
+    assert (
+        other.spectrograms is not None and not (tmp_path / "other" / "audio").exists()
+    )
+
+    # Simulate an interruption by discarding the last few samples, then resume
+    store.spectrograms[6:] = 0
+    store.commit([])
+    store.completed[6:] = False
+    store.completed.flush()
+    resumed = sample_to_disk(
+        config,
+        tmp_path / "samples",
+        10,
+        seed=1,
+        batch_size=4,
+        audio_format="wav",
+        num_workers=0,
+    )
+    assert resumed.is_complete
+    np.testing.assert_allclose(
+        SampleStore(tmp_path / "samples")[6], expected[6], rtol=1e-5, atol=1e-6
+    )
+
+    with pytest.raises(ValueError):
+        sample_to_disk(config, tmp_path / "samples", 10, seed=2)
+    with pytest.raises(ValueError):
+        sample_to_disk(config, tmp_path / "nothing", 10, spectrograms=False)
+
+
+def test_sample_cli(tmp_path, config):
+    config_path = tmp_path / "config.yaml"
+    config.dump(config_path)
+    output = tmp_path / "samples"
+    args = [
+        "models",
+        "sample",
+        "-c",
+        str(config_path),
+        "-o",
+        str(output),
+        "-n",
+        "6",
+        "--batch_size",
+        "2",
+    ]
+    # Audio is inverted by a worker process while the next batches are decoded
+    result = CliRunner().invoke(
+        main,
+        args + ["--no-spectrograms", "--audio_format", "flac", "--num_workers", "1"],
+    )
+    assert result.exit_code == 0, result.output
+    store = SampleStore(output)
+    assert store.is_complete and store.spectrograms is None
+    assert sorted(path.name for path in output.joinpath("audio").rglob("*.flac")) == [
+        f"{i:08d}.flac" for i in range(6)
+    ]
+    assert not list(output.joinpath("audio").rglob(".*"))
@@ -0,0 +1,101 @@
+import json
+import threading
+import http.client
+
+import numpy as np
+import pytest
+
+from beatbrain.generator.serving import GenerationClient, GenerationServer, MicroBatcher
+
+
+def test_micro_batcher():
+    batch_sizes = []
+
+    def double(x):
+        batch_sizes.append(len(x))
+        return x * 2
+
+    with MicroBatcher(double, max_batch_size=8, max_latency=0.5) as batcher:
+        futures = [batcher.submit(np.full((1, 3), i)) for i in range(10)]
+        outputs = [future.result(timeout=5) for future in futures]
+        # Oversized requests form their own batch
+        np.testing.assert_array_equal(batcher(np.ones((20, 3))), 2 * np.ones((20, 3)))
+    for i, output in enumerate(outputs):
+        np.testing.assert_array_equal(output, np.full((1, 3), 2 * i))
+    assert batch_sizes == [8, 2, 20]
+    assert batcher.stats["mean_batch_size"] == 10
+
+    def fail(x):
+        raise RuntimeError("Decoding failed")
+
+    with MicroBatcher(fail, max_latency=0) as batcher:
+        with pytest.raises(RuntimeError):
+            batcher(np.ones((1, 3)))
+
+
+@pytest.fixture(params=["tcp", "unix"])
+def client(request, tmp_path):
+    latent_shape = (2, 4, 4)
+    # Maps latents to (1, 28, 28) "spectrograms" in [0, 1]
+    weights = np.random.default_rng(0).normal(size=(32, 28 * 28)).astype(np.float32)
+    decode = lambda z: 1 / (1 + np.exp(-z.reshape(len(z), -1) @ weights)).reshape(
+        len(z), 1, 28, 28
+    )
+    server = GenerationServer(
+        decode,
+        latent_shape,
+        max_batch_size=16,
+        max_latency=0.01,
+        audio_options={"sr": 8000, "n_fft": 512, "hop_length": 256},
+    )
+    socket_path = tmp_path / "serve.sock" if request.param == "unix" else None
+    httpd = server.start(port=0, socket_path=socket_path)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    client = GenerationClient(port=server.port, socket_path=socket_path)
+    yield client
+    client.close()
+    server.shutdown()
+    thread.join()
+
+
+def test_generation_server(client):
+    assert client.health()["latent_shape"] == [2, 4, 4]
+    latents = np.random.default_rng(0).normal(size=(3, 2, 4, 4))
+    spectrograms = client.decode(latents)
+    assert spectrograms.shape == (3, 1, 28, 28)
+    np.testing.assert_array_equal(client.sample(2, seed=1), client.sample(2, seed=1))
+    audio = client.sample(1, seed=1, audio=True)
+    assert audio.shape == (1, 1, 27 * 256)
+
+    # Concurrent requests are decoded together
+    results = [None] * 8
+
+    def request(i):
+        results[i] = GenerationClient(
+            port=client.connection.port,
+            socket_path=getattr(client.connection, "socket_path", None),
+        ).decode(latents[:1])
+
+    threads = [threading.Thread(target=request, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for result in results:
+        np.testing.assert_allclose(result, spectrograms[:1], rtol=1e-5)
+
+    with pytest.raises(RuntimeError, match="400"):
+        client.decode(np.zeros((1, 3)))
+
+
+def test_generation_server_json(client):
+    if getattr(client.connection, "socket_path", None):
+        pytest.skip("Covered over TCP")
+    connection = http.client.HTTPConnection("127.0.0.1", client.connection.port)
+    connection.request("POST", "/sample", body=json.dumps({"num_samples": 2}))
+    response = json.loads(connection.getresponse().read())
+    assert response["shape"] == [2, 1, 28, 28]
+    assert np.asarray(response["spectrograms"]).shape == (2, 1, 28, 28)
+    connection.request("GET", "/missing")
+    assert connection.getresponse().status == 404
@@ -0,0 +1,101 @@
+import csv
+
+import numpy as np
+import soundfile as sf
+from click.testing import CliRunner
+
+from beatbrain.cli import main
+from beatbrain.datasets import AudioClipDataset
+from beatbrain.utils.synth import MANIFEST_FILE, synthesize_audio, synthesize_corpus
+
+OPTIONS = {
+    "min_duration": 0.2,
+    "max_duration": 0.6,
+    "files_per_dir": 4,
+    "corrupt_fraction": 0.2,
+}
+
+
+def read_files(path):
+    return {
+        str(f.relative_to(path)): f.read_bytes()
+        for f in sorted(path.rglob("*"))
+        if f.is_file()
+    }
+
+
+def test_synthesize_audio():
+    audio = synthesize_audio(1.5, 16000, channels=2, rng=np.random.default_rng(0))
+    assert audio.shape == (24000, 2)
+    assert audio.dtype == np.float32
+    assert 0 < np.abs(audio).max() <= 1
+    np.testing.assert_array_equal(
+        audio, synthesize_audio(1.5, 16000, channels=2, rng=np.random.default_rng(0))
+    )
+
+
+def test_synthesize_corpus(tmp_path):
+    manifest = synthesize_corpus(
+        tmp_path / "serial", 30, seed=3, formats=["wav", "flac"], n_jobs=1, **OPTIONS
+    )
+    assert len(manifest) == 30
+    assert {entry["format"] for entry in manifest} == {"wav", "flac"}
+    assert any(entry["corruption"] for entry in manifest)
+    assert any("/" in entry["path"] for entry in manifest)
+    with open(tmp_path / "serial" / MANIFEST_FILE) as f:
+        assert [row["path"] for row in csv.DictReader(f)] == [
+            entry["path"] for entry in manifest
+        ]
+    for entry in manifest:
+        if not entry["corruption"]:
+            info = sf.info(str(tmp_path / "serial" / entry["path"]))
+            assert (info.samplerate, info.channels) == (
+                entry["sample_rate"],
+                entry["channels"],
+            )
+            assert abs(info.duration - entry["duration"]) < 1e-3
+
+    # Lossless corpora are byte-for-byte reproducible, regardless of the number of workers
+    synthesize_corpus(
+        tmp_path / "parallel", 30, seed=3, formats=["wav", "flac"], n_jobs=2, **OPTIONS
+    )
+    assert read_files(tmp_path / "serial") == read_files(tmp_path / "parallel")
+    synthesize_corpus(
+        tmp_path / "reseeded", 30, seed=4, formats=["wav", "flac"], n_jobs=1, **OPTIONS
+    )
+    assert read_files(tmp_path / "serial") != read_files(tmp_path / "reseeded")
+
+    # Corrupt files are skipped when scanning a dataset
+    dataset = AudioClipDataset(
+        tmp_path / "serial",
+        max_segment_length=0.2,
+        min_segment_length=0.1,
+        sample_rate=8000,
+    )
+    num_readable = sum(not entry["corruption"] for entry in manifest)
+    assert num_readable <= len(dataset.paths) < len(manifest)
+
+
+def test_synth_cli(tmp_path):
+    result = CliRunner().invoke(
+        main,
+        [
+            "data",
+            "synth",
+            str(tmp_path),
+            "-n",
+            "5",
+            "--format",
+            "ogg",
+            "--sr",
+            "8000",
+            "--min_duration",
+            "0.2",
+            "--max_duration",
+            "0.5",
+            "-j",
+            "1",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert len(list(tmp_path.rglob("*.ogg"))) == 5
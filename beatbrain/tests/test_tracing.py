@@ -0,0 +1,152 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+from joblib.externals.loky import get_reusable_executor
+from torch.utils.data import DataLoader
+
+from beatbrain.cli import main
+from beatbrain.datasets import SpectrogramClipDataset
+from beatbrain.helpers import train_model
+from beatbrain.tests.test_train import SAMPLE_CONFIG, make_corpus
+from beatbrain.utils import tracing
+from beatbrain.utils.config import Config
+
+
+@pytest.fixture
+def trace_dir(tmp_path):
+    trace_dir = tracing.enable(tmp_path / "spans")
+    yield trace_dir
+    tracing.disable()
+
+
+def load_trace(path):
+    events = json.loads(path.read_text())["traceEvents"]
+    return [event for event in events if event["ph"] == "X"], events
+
+
+def test_disabled(tmp_path):
+    assert not tracing.is_enabled()
+    with tracing.span("ignored") as span:
+        pass
+    assert span is tracing._NULL_SPAN
+    tracing.record_span("ignored", 0.0)
+
+
+def test_spans(trace_dir, tmp_path):
+    @tracing.traced
+    def inner():
+        with tracing.span("leaf", value=1, obj=object()):
+            pass
+
+    with tracing.span("outer", category="test"):
+        inner()
+    tracing.record_span("separate", 0.0, 1.0)
+    assert tracing.export_chrome_trace(tmp_path / "trace.json") == 4
+    spans, events = load_trace(tmp_path / "trace.json")
+    by_name = {span["name"]: span for span in spans}
+    assert set(by_name) == {"outer", "test_spans.<locals>.inner", "leaf", "separate"}
+    assert by_name["outer"]["cat"] == "test"
+    assert by_name["leaf"]["args"]["value"] == 1 and isinstance(
+        by_name["leaf"]["args"]["obj"], str
+    )
+    # Nested spans lie within their parents
+    outer, leaf = by_name["outer"], by_name["leaf"]
+    assert (
+        outer["ts"] <= leaf["ts"]
+        and leaf["ts"] + leaf["dur"] <= outer["ts"] + outer["dur"]
+    )
+    assert by_name["separate"]["dur"] == pytest.approx(1e6)
+    assert any(event["name"] == "process_name" for event in events)
+
+
+def test_dataloader_worker_spans(trace_dir, tmp_path):
+    corpus = make_corpus(tmp_path / "corpus", num_files=2)
+    dataset = SpectrogramClipDataset(
+        corpus,
+        max_segment_length=1,
+        sample_rate=4000,
+        n_fft=256,
+        hop_length=128,
+        n_mels=16,
+    )
+    for _ in DataLoader(dataset, batch_size=2, num_workers=2):
+        pass
+    tracing.export_chrome_trace(tmp_path / "trace.json")
+    spans, _ = load_trace(tmp_path / "trace.json")
+    names = {span["name"] for span in spans}
+    assert {
+        "AudioClipDataset.count_segments",
+        "SpectrogramClipDataset.__getitem__",
+        "read",
+        "resample",
+        "audio_to_spectrogram",
+    } <= names
+    # Samples were loaded by the two worker processes
+    assert (
+        len(
+            {
+                span["pid"]
+                for span in spans
+                if span["name"] == "SpectrogramClipDataset.__getitem__"
+            }
+        )
+        == 2
+    )
+    assert sum(
+        span["name"] == "SpectrogramClipDataset.__getitem__" for span in spans
+    ) == len(dataset)
+
+
+def test_trace_cli(tmp_path):
+    corpus = make_corpus(tmp_path / "corpus", num_files=3)
+    # Workers started before tracing was enabled wouldn't record spans
+    get_reusable_executor().shutdown(wait=True)
+    output = tmp_path / "trace.json"
+    result = CliRunner().invoke(
+        main,
+        [
+            "--trace",
+            str(output),
+            "convert",
+            "audio",
+            str(corpus),
+            str(tmp_path / "converted"),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert not tracing.is_enabled()
+    spans, _ = load_trace(output)
+    convert_spans = [span for span in spans if span["name"] == "convert_one"]
+    assert len(convert_spans) == 3
+    (parent,) = [span for span in spans if span["name"] == "convert_audio"]
+    # Spans from worker processes line up with the parent's
+    assert all(
+        parent["ts"] <= span["ts"]
+        and span["ts"] + span["dur"] <= parent["ts"] + parent["dur"]
+        for span in convert_spans
+    )
+    assert {"load", "write"} <= {span["name"] for span in spans}
+
+
+def test_training_spans(trace_dir, tmp_path):
+    config = Config.load(SAMPLE_CONFIG)
+    for split in ["train", "val"]:
+        config.data[split].paths = str(make_corpus(tmp_path / split, num_files=2))
+    config.data.num_workers = 0
+    config.data.persistent_workers = None
+    config.data.prefetch_factor = None
+    config.trainer.max_epochs = 1
+    config.trainer.logger = {
+        "TestTubeLogger": {"save_dir": str(tmp_path / "experiments"), "name": "test"}
+    }
+    config.trainer.callbacks = {}
+    train_model(config)
+    tracing.export_chrome_trace(tmp_path / "trace.json")
+    spans, _ = load_trace(tmp_path / "trace.json")
+    counts = {
+        name: sum(span["name"] == name for span in spans)
+        for name in ["train", "epoch", "batch", "data_wait", "validation"]
+    }
+    assert counts["train"] == counts["epoch"] == 1 and counts["validation"] >= 1
+    assert counts["batch"] == counts["data_wait"] > 0
@@ -0,0 +1,68 @@
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from beatbrain.helpers import get_dataloader, train_model
+from beatbrain.utils.config import Config
+
+SAMPLE_CONFIG = Path(__file__).parents[2].joinpath("configs", "synthetic_audio.yaml")
+
+
+def make_corpus(root, num_files=4, duration=3, sr=8000):
+    root.mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    t = np.arange(duration * sr) / sr
+    for i in range(num_files):
+        audio = 0.5 * np.sin(2 * np.pi * rng.uniform(100, 2000) * t) + 0.1 * rng.normal(
+            size=t.shape
+        )
+        sf.write(str(root / f"{i}.wav"), audio.astype(np.float32), sr)
+    return root
+
+
+def test_get_dataloader(tmp_path):
+    corpus = make_corpus(tmp_path / "corpus")
+    dataset_config = {
+        "dataset_class": "SpectrogramClipDataset",
+        "paths": str(corpus),
+        "max_segment_length": 1,
+        "n_mels": 28,
+        "n_frames": 28,
+    }
+    data_config = {
+        "batch_size": 5,
+        "num_workers": 2,
+        "persistent_workers": True,
+        "prefetch_factor": 4,
+        "collate_fn": None,
+    }
+    loader = get_dataloader(dataset_config, data_config)
+    assert (
+        loader.batch_size == 5
+        and loader.num_workers == 2
+        and loader.prefetch_factor == 4
+    )
+    spec, sr = next(iter(loader))
+    assert spec.shape == (5, 1, 28, 28)
+    assert 0 <= spec.min() and spec.max() <= 1
+
+    # Worker-only options are dropped when loading in the main process
+    loader = get_dataloader(
+        {"dataset_class": "AudioClipDataset", "paths": str(corpus)},
+        {"num_workers": 0, "prefetch_factor": 4, "collate_fn": "AudioClipCollator"},
+    )
+    audio, sr = next(iter(loader))
+    assert audio.shape == (1, 1, 5 * 22050) and sr == 22050
+
+
+def test_train_model(tmp_path):
+    config = Config.load(SAMPLE_CONFIG)
+    for split in ["train", "val"]:
+        config.data[split].paths = str(make_corpus(tmp_path / split))
+    config.trainer.max_epochs = 1
+    config.trainer.logger = {
+        "TestTubeLogger": {"save_dir": str(tmp_path / "experiments"), "name": "test"}
+    }
+    model = train_model(config)
+    assert model.trainer.global_step > 0
@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+import pytest
+
+from beatbrain.utils.core import load_arrays, load_image, save_arrays, save_image
+from beatbrain.utils.writer import ArtifactWriter, write_atomic
+
+
+def test_writer_round_trip(tmp_path):
+    chunks = [np.random.rand(8, 6).astype(np.float32) for _ in range(3)]
+    with ArtifactWriter(num_threads=2) as writer:
+        for i in range(10):
+            save_arrays(chunks, tmp_path / f"{i}.npz", writer=writer)
+        save_arrays(chunks, tmp_path / "no_extension", compress=False, writer=writer)
+        # EXR (which `save_images()` writes) needs FreeImage, which isn't always available
+        for i, chunk in enumerate(chunks):
+            save_image(chunk, tmp_path / f"{i}.tiff", format="tiff", writer=writer)
+    assert writer.closed and writer.written == 14 and writer.pending == 0
+    for i in range(10):
+        np.testing.assert_array_equal(
+            load_arrays(tmp_path / f"{i}.npz", stack=True), np.stack(chunks)
+        )
+    np.testing.assert_array_equal(
+        load_arrays(tmp_path / "no_extension.npz", stack=True), np.stack(chunks)
+    )
+    np.testing.assert_array_equal(
+        load_image(tmp_path / "2.tiff", format="tiff"), chunks[2]
+    )
+    # No temporary files are left behind
+    assert not list(tmp_path.glob(".*"))
+    with pytest.raises(ValueError):
+        save_image(chunks[0], tmp_path / "closed.tiff", format="tiff", writer=writer)
+
+
+def test_writer_batches_while_busy(tmp_path):
+    release = threading.Event()
+    written = []
+
+    def blocking_write(path):
+        release.wait(10)
+        path.write_text("blocked")
+
+    def write(path, text):
+        written.append(text)
+        path.write_text(text)
+
+    with ArtifactWriter(num_threads=1, max_pending=20, batch_size=4) as writer:
+        writer.submit(blocking_write, tmp_path / "first.txt")
+        # The only thread is busy, so these are grouped into batches of 4, then a batch with the remaining 2
+        for i in range(10):
+            writer.submit(write, tmp_path / f"{i}.txt", str(i))
+        assert writer.pending == 11 and not written
+        release.set()
+    assert writer.num_batches == 4
+    assert written == [str(i) for i in range(10)]
+    assert (tmp_path / "9.txt").read_text() == "9"
+
+
+def test_writer_errors(tmp_path):
+    def failing_write(path):
+        path.write_text("partial")
+        raise RuntimeError("disk full")
+
+    writer = ArtifactWriter(num_threads=2)
+    writer.submit(failing_write, tmp_path / "failed.txt")
+    save_arrays([np.zeros(3)], tmp_path / "ok.npz", writer=writer)
+    with pytest.raises(OSError, match="disk full"):
+        writer.flush()
+    # Failures don't stop other writes, and don't leave anything at (or next to) the destination
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["ok.npz"]
+    writer.close()
+
+    with pytest.raises(RuntimeError):
+        write_atomic(failing_write, tmp_path / "sync.txt")
+    assert not (tmp_path / "sync.txt").exists()
+
+
+def test_writer_bounded_queue(tmp_path):
+    release = threading.Event()
+    writer = ArtifactWriter(num_threads=1, max_pending=2)
+    for i in range(2):
+        writer.submit(
+            lambda path: release.wait(10) and path.write_text("done"),
+            tmp_path / f"{i}.txt",
+        )
+    submitted = threading.Event()
+    submitter = threading.Thread(
+        target=lambda: (
+            writer.submit(lambda path: path.write_text("done"), tmp_path / "2.txt"),
+            submitted.set(),
+        )
+    )
+    submitter.start()
+    # The queue is full, so the third write waits for a slot
+    assert not submitted.wait(0.2)
+    release.set()
+    assert submitted.wait(10)
+    submitter.join()
+    writer.close()
+    assert writer.written == 3
@@ -4,4 +4,16 @@ Low-level utility classes and functions.
 NOTE: Modules in `utils` shouldn't import from other Pantheon-AI packages.
 Try to limit imports to within this package.
 """
-from . import data, config, visualization, misc, core, registry
+from . import (
+    tracing,
+    memory,
+    data,
+    config,
+    visualization,
+    misc,
+    core,
+    registry,
+    synth,
+    writer,
+    fingerprint,
+)
@@ -5,6 +5,7 @@ import imageio
 import numpy as np
 from natsort import natsorted
 
+from . import tracing
 from .misc import DataType, EXTENSIONS
 
 
@@ -75,6 +76,7 @@ def load_arrays(path, concatenate=False, stack=False):
     return chunks
 
 
+@tracing.traced
 def audio_to_spectrogram(audio, normalize=False, norm_kwargs=None, **kwargs):
     """
     Convert an array of audio samples to a mel spectrogram
@@ -85,12 +87,13 @@ def audio_to_spectrogram(audio, normalize=False, norm_kwargs=None, **kwargs):
         norm_kwargs (dict): Additional keyword arguments to pass to the spectrogram normalization function
     """
     norm_kwargs = norm_kwargs or {}
-    spec = librosa.feature.melspectrogram(audio, **kwargs)
+    spec = librosa.feature.melspectrogram(y=audio, **kwargs)
     if normalize:
         spec = normalize_spectrogram(spec, **norm_kwargs)
     return spec
 
 
+@tracing.traced
 def spectrogram_to_audio(spec, denormalize=False, norm_kwargs=None, **kwargs):
     """
     Convert a mel spectrogram to audio
@@ -108,9 +111,7 @@ def spectrogram_to_audio(spec, denormalize=False, norm_kwargs=None, **kwargs):
 
 
 # TODO: Remove dependency on settings.TOP_DB
-def normalize_spectrogram(
-    spec, scale_fn=None, top_db=80, ref=np.max, **kwargs
-):
+def normalize_spectrogram(spec, scale_fn=None, top_db=80, ref=np.max, **kwargs):
     """
     Log and normalize a mel spectrogram using `librosa.power_to_db()`
     """
@@ -118,9 +119,7 @@ def normalize_spectrogram(
     return (scale_fn(spec, top_db=top_db, ref=ref, **kwargs) / top_db) + 1
 
 
-def denormalize_spectrogram(
-    spec, scale_fn=None, top_db=80, ref=32768, **kwargs
-):
+def denormalize_spectrogram(spec, scale_fn=None, top_db=80, ref=32768, **kwargs):
     """
     Exp and denormalize a mel spectrogram using `librosa.db_to_power()`
     """
@@ -128,7 +127,7 @@ def denormalize_spectrogram(
     return scale_fn((spec - 1) * top_db, ref=ref, **kwargs)
 
 
-def save_arrays(chunks, output, compress=True):
+def save_arrays(chunks, output, compress=True, writer=None):
     """
     Save a sequence of arrays to a npy or npz file.
 
@@ -136,12 +135,25 @@ def save_arrays(chunks, output, compress=True):
         chunks (list): A sequence of arrays to save
         output (str): The file to save the arrays to'
         compress (bool): Whether to use `np.savez` to compress the output file
+        writer (ArtifactWriter): If given, the file is written (atomically) by one of the writer's background threads,
+            and this returns immediately. See `utils.writer`.
     """
+    if writer is not None:
+        output = Path(output)
+        # `np.savez` appends the extension to a path that doesn't already have it
+        if output.suffix != ".npz":
+            output = output.with_name(f"{output.name}.npz")
+        writer.submit(_write_arrays, output, list(chunks), compress=compress)
+        return
+    _write_arrays(output, chunks, compress=compress)
+
+
+def _write_arrays(output, chunks, compress=True):
     save = np.savez_compressed if compress else np.savez
     save(str(output), *chunks)
 
 
-def save_image(spec, output, flip=True, **kwargs):
+def save_image(spec, output, flip=True, writer=None, **kwargs):
     """
     Save an array as an image.
 
@@ -149,14 +161,23 @@ def save_image(spec, output, flip=True, **kwargs):
         spec (np.ndarray): A array to save as an image
         output (str): The path to save the image to
         flip (bool): Whether to flip the array vertically
+        writer (ArtifactWriter): If given, the image is written (atomically) by one of the writer's background threads,
+            and this returns immediately. See `utils.writer`.
     """
     if flip:
         spec = spec[::-1]
     kwargs["format"] = kwargs.get("format") or "exr"
-    imageio.imwrite(output, spec, **kwargs)
+    if writer is not None:
+        writer.submit(_write_image, output, spec, **kwargs)
+        return
+    _write_image(output, spec, **kwargs)
+
 
+def _write_image(output, spec, **kwargs):
+    imageio.imwrite(str(output), spec, **kwargs)
 
-def save_images(chunks, output: str, flip=True, **kwargs):
+
+def save_images(chunks, output: str, flip=True, writer=None, **kwargs):
     """
     Save a sequence of arrays as images.
 
@@ -164,10 +185,13 @@ def save_images(chunks, output: str, flip=True, **kwargs):
         chunks (list): A sequence of arrays to save as images
         output (str): The directory to save the images to
         flip (bool): Whether to flip the images vertically
+        writer (ArtifactWriter): If given, the images are written by the writer's background threads (see `save_image()`)
     """
     output = Path(output)
     for j, chunk in enumerate(chunks):
-        save_image(chunk, output.joinpath(f"{j}.exr"), flip=flip, **kwargs)
+        save_image(
+            chunk, output.joinpath(f"{j}.exr"), flip=flip, writer=writer, **kwargs
+        )
 
 
 def load_images(path, flip=True, concatenate=False, stack=False, **kwargs):
@@ -11,6 +11,7 @@ from pathlib import Path
 from colorama import Fore
 from audioread import DecodeError, NoBackendError
 
+from . import tracing
 from .config import get_default_config
 
 default_config = get_default_config()
@@ -47,33 +48,53 @@ def convert_audio(inp, out, recursive=True, format="wav", split=False, chunk_dur
             os.makedirs(os.path.dirname(output_file), exist_ok=True)
     subtype = {"flac": "PCM_24", "wav": "PCM_24", "ogg": "VORBIS"}.get(format)
 
-    def convert_one(src, dst):
-        with warnings.catch_warnings():
+    def load(src):
+        with tracing.span("load", path=src), warnings.catch_warnings():
             warnings.filterwarnings("ignore", module="librosa")
             try:
-                audio, sr = librosa.load(src, mono=True, **kwargs)
+                return librosa.load(src, mono=True, **kwargs)
             except (NoBackendError, DecodeError):
+                return None, None
+
+    def convert_one(src, dst):
+        with tracing.span("convert_one", path=src):
+            audio, sr = load(src)
+            if audio is None:
                 return
-            sf.write(dst, audio, sr, subtype=subtype)
+            with tracing.span("write"):
+                sf.write(dst, audio, sr, subtype=subtype)
 
     def split_one(src, dst):
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", module="librosa")
-            try:
-                audio, sr = librosa.load(src, mono=True, **kwargs)
-            except (NoBackendError, DecodeError):
+        with tracing.span("split_one", path=src):
+            audio, sr = load(src)
+            if audio is None:
                 return
-        chunk_samples = chunk_duration * sr
-        for i, start in enumerate(range(0, len(audio), chunk_samples)):
-            chunk = audio[start: start + chunk_samples]
-            if discard_shorter and len(chunk) < discard_shorter * sr:
-                break
-            dst_i = os.path.splitext(dst)[0] + f"_{i + 1}"
-            sf.write(dst_i, chunk, sr, subtype=subtype)
+            chunk_samples = chunk_duration * sr
+            for i, start in enumerate(range(0, len(audio), chunk_samples)):
+                chunk = audio[start : start + chunk_samples]
+                if discard_shorter and len(chunk) < discard_shorter * sr:
+                    break
+                stem, extension = os.path.splitext(dst)
+                dst_i = f"{stem}_{i + 1}{extension}"
+                with tracing.span("write", chunk=i):
+                    sf.write(dst_i, chunk, sr, subtype=subtype)
 
-    if split:
-        logger.info(f"Splitting {len(input_files)} audio file(s): {Fore.YELLOW}{inp}{Fore.RESET} -> {Fore.YELLOW}{out}{Fore.RESET}")
-        Parallel(n_jobs=-2, backend="loky")(delayed(split_one)(i, o) for i, o in tqdm(zip(input_files, output_files), total=len(input_files)))
-    else:
-        logger.info(f"Converting {len(input_files)} file(s) to {format.upper()}: {Fore.YELLOW}{inp}{Fore.RESET} -> {Fore.YELLOW}{out}{Fore.RESET}")
-        Parallel(n_jobs=-2, backend="loky")(delayed(convert_one)(i, o) for i, o in tqdm(zip(input_files, output_files), total=len(input_files)))
+    with tracing.span(
+        "convert_audio", input=str(inp), files=len(input_files), split=split
+    ):
+        if split:
+            logger.info(
+                f"Splitting {len(input_files)} audio file(s): {Fore.YELLOW}{inp}{Fore.RESET} -> {Fore.YELLOW}{out}{Fore.RESET}"
+            )
+            Parallel(n_jobs=-2, backend="loky")(
+                delayed(split_one)(i, o)
+                for i, o in tqdm(zip(input_files, output_files), total=len(input_files))
+            )
+        else:
+            logger.info(
+                f"Converting {len(input_files)} file(s) to {format.upper()}: {Fore.YELLOW}{inp}{Fore.RESET} -> {Fore.YELLOW}{out}{Fore.RESET}"
+            )
+            Parallel(n_jobs=-2, backend="loky")(
+                delayed(convert_one)(i, o)
+                for i, o in tqdm(zip(input_files, output_files), total=len(input_files))
+            )
@@ -0,0 +1,97 @@
+"""
+Compact spectral fingerprints of audio tracks, for finding near-duplicates (re-encodes, resampled or remastered copies).
+
+A track's mel spectrogram (from `core.audio_to_spectrogram()`) is averaged over `NUM_TIME_BINS` equal fractions of the
+track, into a `(NUM_BANDS + 1, NUM_TIME_BINS)` grid of band levels. Each bit of the fingerprint records whether a mel band
+is louder than the band below it, in one of the time bins. Since bits only compare neighbouring bands at the same time,
+they don't depend on gain, sample rate, channel count or encoding, and barely change with mild EQ, noise or offsets.
+
+Fingerprints are `NUM_BITS`-bit hashes (packed into `NUM_BYTES` bytes), compared by their Hamming distance.
+"""
+import numpy as np
+import soundfile as sf
+
+from . import tracing
+from .core import audio_to_spectrogram
+
+NUM_BANDS = 16
+NUM_TIME_BINS = 16
+NUM_BITS = NUM_BANDS * NUM_TIME_BINS
+NUM_BYTES = NUM_BITS // 8
+# Only frequencies below this are used, since they're least affected by lossy encoding and resampling
+FMAX = 4000
+# The spectrogram's window and hop lengths (in seconds). FFT sizes are scaled to each file's sample rate, so that files
+# don't need to be resampled.
+WINDOW_SECONDS = 0.128
+HOP_SECONDS = 0.064
+# The number of seconds of audio decoded at a time, so memory use doesn't depend on track length
+BLOCK_SECONDS = 60
+LOSSLESS_FORMATS = {"WAV", "WAVEX", "FLAC", "AIFF", "W64", "RF64", "CAF"}
+
+# The number of set bits in each byte
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+@tracing.traced
+def fingerprint_file(path, block_seconds=BLOCK_SECONDS):
+    """
+    Compute the fingerprint of an audio file, decoding it a block at a time.
+
+    Args:
+        path: Path to a single audio file
+        block_seconds (float): The number of seconds of audio to decode at a time
+
+    Returns:
+        tuple: A `(NUM_BYTES,)` `uint8` fingerprint, and a dict of the file's `duration`, `sample_rate`, `channels`,
+        `format` and whether it's `lossless`
+
+    Raises:
+        RuntimeError: If the file can't be read
+        ValueError: If the file is empty
+    """
+    with sf.SoundFile(str(path)) as file:
+        if file.frames <= 0:
+            raise ValueError(f"{path} is empty")
+        info = {
+            "duration": file.frames / file.samplerate,
+            "sample_rate": file.samplerate,
+            "channels": file.channels,
+            "format": file.format,
+            "lossless": file.format in LOSSLESS_FORMATS,
+        }
+        sr = file.samplerate
+        spectrogram_options = {
+            "sr": sr,
+            "n_fft": 2 ** int(np.ceil(np.log2(WINDOW_SECONDS * sr))),
+            "hop_length": int(round(HOP_SECONDS * sr)),
+            "n_mels": NUM_BANDS + 1,
+            "fmax": min(FMAX, sr / 2),
+        }
+        levels = np.zeros((NUM_BANDS + 1, NUM_TIME_BINS))
+        counts = np.zeros(NUM_TIME_BINS)
+        position = 0
+        for block in file.blocks(
+            int(block_seconds * sr), dtype=np.float32, always_2d=True
+        ):
+            spec = audio_to_spectrogram(block.mean(1), **spectrogram_options)
+            # The time bin of each spectrogram frame, by its position within the whole file
+            frame_positions = position + np.arange(spec.shape[1]) * (
+                len(block) / spec.shape[1]
+            )
+            bins = np.minimum(
+                (frame_positions * NUM_TIME_BINS / file.frames).astype(np.int64),
+                NUM_TIME_BINS - 1,
+            )
+            levels += spec @ np.eye(NUM_TIME_BINS)[bins]
+            counts += np.bincount(bins, minlength=NUM_TIME_BINS)
+            position += len(block)
+    levels = np.log(levels / np.maximum(counts, 1) + 1e-10)
+    return np.packbits(levels[1:] > levels[:-1]), info
+
+
+def hamming_distances(a, b):
+    """
+    The number of differing bits between packed fingerprints `a` and `b` (broadcast against each other, along all but
+    their last axis).
+    """
+    return _POPCOUNT[np.bitwise_xor(a, b)].sum(-1, dtype=np.int64)
@@ -0,0 +1,344 @@
+"""
+Memory profiling across the main process and its joblib/DataLoader worker processes.
+
+While profiling is enabled (with `enable()`, or the `beatbrain --profile-memory` option), every process traces its
+allocations with `tracemalloc` and a background thread samples its resident set size (RSS). Each process periodically writes
+a report to the profile directory (so processes that get OOM-killed still leave one behind) with its RSS over time,
+its peak RSS, its top allocation sites, and the allocation sites that grew the most since the process started profiling.
+
+The profile directory is passed down through the `BEATBRAIN_MEMORY_PROFILE_DIR` environment variable, so worker processes
+(forked or spawned) profile themselves too. Merge every process's report with `build_report()`.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import resource
+import sysconfig
+import tempfile
+import threading
+import tracemalloc
+import multiprocessing
+import multiprocessing.util
+from pathlib import Path
+
+ENV_VAR = "BEATBRAIN_MEMORY_PROFILE_DIR"
+SETTINGS_FILE = "settings.json"
+DEFAULT_SETTINGS = {"interval": 0.5, "report_interval": 10.0, "top_n": 25, "frames": 8}
+# Allocations are attributed to the most recent stack frame outside of these (unless it's in beatbrain itself)
+_LIBRARY_PATHS = tuple(
+    {
+        sysconfig.get_paths()[name]
+        for name in ["stdlib", "platstdlib", "purelib", "platlib"]
+    }
+)
+_PACKAGE_PATH = str(Path(__file__).resolve().parents[1])
+# Allocations made by the profiler itself, or without any Python frame, are left out of reports
+_IGNORED = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+_profile_dir = None
+_settings = dict(DEFAULT_SETTINGS)
+_state = None
+_lock = threading.Lock()
+
+
+def enable(profile_dir=None, **settings):
+    """
+    Start profiling memory, in this process and in worker processes started from now on.
+
+    Args:
+        profile_dir: The directory to write per-process reports to. Defaults to a new temporary directory.
+        interval (float): The time (in seconds) between RSS samples
+        report_interval (float): The time (in seconds) between report updates (each takes a `tracemalloc` snapshot)
+        top_n (int): The number of allocation sites in each report
+        frames (int): The number of stack frames `tracemalloc` records per allocation. Each allocation is attributed to
+            its most recent frame in beatbrain or your own code, so allocations made deep inside libraries need more frames.
+
+    Returns:
+        Path: The profile directory
+    """
+    global _profile_dir
+    unknown = set(settings) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise TypeError(f"Unknown memory profiling settings: {sorted(unknown)}")
+    profile_dir = (
+        Path(profile_dir)
+        if profile_dir
+        else Path(tempfile.mkdtemp(prefix="beatbrain-memory-"))
+    )
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    with open(profile_dir / SETTINGS_FILE, "w") as f:
+        json.dump({**DEFAULT_SETTINGS, **settings}, f)
+    _profile_dir = os.environ[ENV_VAR] = str(profile_dir)
+    _start()
+    return profile_dir
+
+
+def disable():
+    """
+    Stop profiling, and write this process's final report.
+
+    Idle joblib (loky) workers are shut down so that they write their final reports too.
+    """
+    global _profile_dir
+    if _profile_dir is None:
+        return
+    _stop()
+    try:
+        from joblib.externals.loky import reusable_executor
+
+        executor = getattr(reusable_executor, "_executor", None)
+        if executor is not None:
+            executor.shutdown(wait=True)
+    except ImportError:
+        pass
+    _profile_dir = None
+    os.environ.pop(ENV_VAR, None)
+
+
+def is_enabled():
+    return _profile_dir is not None
+
+
+def current_rss():
+    """
+    The current resident set size of this process (in bytes). Falls back to the peak RSS where `/proc` isn't available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        return peak_rss()
+
+
+def peak_rss():
+    """
+    The peak resident set size of this process (in bytes)
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def build_report(profile_dir=None, top_n=25):
+    """
+    Merge the reports written by every profiled process.
+
+    Args:
+        profile_dir: The profile directory. Defaults to the current one.
+        top_n (int): The number of allocation sites to keep
+
+    Returns:
+        dict: `processes` (each process's report, by descending peak RSS), and the `top_allocations` and `top_growth` sites
+        summed over all processes
+    """
+    profile_dir = Path(profile_dir or _profile_dir)
+    processes = []
+    for path in sorted(profile_dir.glob("memory-*.json")):
+        with open(path) as f:
+            processes.append(json.load(f))
+    processes.sort(key=lambda process: process["peak_rss"], reverse=True)
+    return {
+        "processes": processes,
+        "top_allocations": _merge_sites(
+            [site for process in processes for site in process["top_allocations"]],
+            "size",
+            top_n,
+        ),
+        "top_growth": _merge_sites(
+            [site for process in processes for site in process["top_growth"]],
+            "size_diff",
+            top_n,
+        ),
+    }
+
+
+def format_report(report, top_n=10):
+    """
+    Format a report from `build_report()` as human-readable text.
+    """
+    mb = 1024**2
+    lines = [
+        f"{'process':<32}{'peak RSS (MB)':>15}{'final RSS (MB)':>16}{'growth (MB)':>13}{'duration (s)':>14}"
+    ]
+    for process in report["processes"]:
+        samples = process["samples"]
+        growth = samples[-1][1] - samples[0][1] if samples else 0
+        duration = samples[-1][0] if samples else 0
+        final = samples[-1][1] if samples else 0
+        lines.append(
+            f"{process['name']:<32}{process['peak_rss'] / mb:>15.1f}{final / mb:>16.1f}{growth / mb:>13.1f}{duration:>14.1f}"
+        )
+    lines += ["", "Top allocation sites (live memory at the end of profiling):"]
+    lines += [
+        f"{site['size'] / mb:>10.2f} MB {site['count']:>9} blocks  {site['site']}"
+        for site in report["top_allocations"][:top_n]
+    ]
+    lines += [
+        "",
+        "Top growing allocation sites (since each process started profiling):",
+    ]
+    lines += [
+        f"{site['size_diff'] / mb:>+10.2f} MB {site['count_diff']:>+9} blocks  {site['site']}"
+        for site in report["top_growth"][:top_n]
+    ]
+    return "\n".join(lines)
+
+
+class _ProcessState:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.name = f"{multiprocessing.current_process().name} ({self.pid})"
+        self.start = time.time()
+        self.samples = []
+        self.baseline = _snapshot()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, name="MemoryProfiler", daemon=True
+        )
+
+    def _run(self):
+        last_report = time.perf_counter()
+        while not self.stopped.wait(_settings["interval"]):
+            self.sample()
+            if time.perf_counter() - last_report >= _settings["report_interval"]:
+                self.write_report()
+                last_report = time.perf_counter()
+
+    def sample(self):
+        self.samples.append(
+            [
+                time.time() - self.start,
+                current_rss(),
+                tracemalloc.get_traced_memory()[0],
+            ]
+        )
+
+    def write_report(self):
+        snapshot = _snapshot()
+        top_n = _settings["top_n"]
+        report = {
+            "pid": self.pid,
+            "name": self.name,
+            "start": self.start,
+            "peak_rss": max([peak_rss()] + [sample[1] for sample in self.samples]),
+            "peak_traced": tracemalloc.get_traced_memory()[1],
+            "samples": self.samples,
+            "top_allocations": _merge_sites(
+                [_site_stats(stat) for stat in snapshot.statistics("traceback")],
+                "size",
+                top_n,
+            ),
+            "top_growth": [
+                site
+                for site in _merge_sites(
+                    [
+                        _site_stats(stat)
+                        for stat in snapshot.compare_to(self.baseline, "traceback")
+                    ],
+                    "size_diff",
+                    top_n,
+                )
+                if site["size_diff"] > 0
+            ],
+        }
+        path = Path(_profile_dir) / f"memory-{self.pid}.json"
+        # Write atomically, so a process killed mid-write still leaves its previous report behind
+        with open(path.with_suffix(".tmp"), "w") as f:
+            json.dump(report, f)
+        os.replace(path.with_suffix(".tmp"), path)
+
+
+def _start():
+    """
+    Start profiling this process (if it isn't already).
+    """
+    global _state
+    with _lock:
+        if _state is not None and _state.pid == os.getpid():
+            return
+        with open(Path(_profile_dir) / SETTINGS_FILE) as f:
+            _settings.update(json.load(f))
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(_settings["frames"])
+        _state = _ProcessState()
+        _state.sample()
+        _state.thread.start()
+    # Worker processes started by `multiprocessing` exit without running `atexit` handlers, but do run its finalizers
+    atexit.register(_stop)
+    multiprocessing.util.Finalize(None, _stop, exitpriority=100)
+    # The sampling thread doesn't survive a fork, so forked workers (e.g. DataLoader workers) start their own
+    multiprocessing.util.register_after_fork(_state, _after_fork)
+
+
+def _stop():
+    global _state
+    with _lock:
+        state, _state = _state, None
+    if state is None or state.pid != os.getpid() or _profile_dir is None:
+        return
+    state.stopped.set()
+    if state.thread.is_alive():
+        state.thread.join()
+    state.sample()
+    state.write_report()
+    tracemalloc.stop()
+
+
+def _after_fork(_):
+    global _state, _lock
+    _state, _lock = None, threading.Lock()
+    if _profile_dir is not None:
+        _start()
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+
+def _site(traceback):
+    """
+    The `file:line` an allocation is attributed to: its most recent frame in beatbrain or non-library code
+    """
+    frames = list(traceback)
+    for frame in reversed(frames):  # Most recent first
+        filename = frame.filename
+        if filename.startswith(_PACKAGE_PATH) or not (
+            filename.startswith(_LIBRARY_PATHS) or filename.startswith("<")
+        ):
+            return f"{filename}:{frame.lineno}"
+    return f"{frames[-1].filename}:{frames[-1].lineno}"
+
+
+def _site_stats(stat):
+    stats = {"site": _site(stat.traceback), "size": stat.size, "count": stat.count}
+    if hasattr(stat, "size_diff"):
+        stats.update(size_diff=stat.size_diff, count_diff=stat.count_diff)
+    return stats
+
+
+def _merge_sites(sites, key, top_n):
+    """
+    Sum the statistics of identical sites, and keep the `top_n` largest by `key`.
+    """
+    merged = {}
+    for site in sites:
+        total = merged.setdefault(
+            site["site"], {name: 0 for name in site if name != "site"}
+        )
+        for name, value in site.items():
+            if name != "site":
+                total[name] += value
+    ranked = sorted(merged.items(), key=lambda item: item[1][key], reverse=True)[:top_n]
+    return [{"site": site, **values} for site, values in ranked]
+
+
+if os.environ.get(ENV_VAR):
+    # A worker process started by a profiled parent
+    _profile_dir = os.environ[ENV_VAR]
+    _start()
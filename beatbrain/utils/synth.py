@@ -0,0 +1,235 @@
+import os
+import csv
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+from joblib import Parallel, delayed
+from loguru import logger
+from tqdm.auto import tqdm
+
+from .writer import write_atomic
+
+# Output formats and the subtype each is encoded with
+FORMATS = {
+    "wav": "PCM_16",
+    "flac": "PCM_16",
+    "ogg": "VORBIS",
+    "mp3": "MPEG_LAYER_III",
+    "aiff": "PCM_16",
+}
+SAMPLE_RATES = (8000, 16000, 22050, 44100, 48000)
+CORRUPTIONS = ["truncated", "garbage", "empty"]
+MANIFEST_FILE = "manifest.csv"
+MANIFEST_FIELDS = [
+    "path",
+    "format",
+    "sample_rate",
+    "channels",
+    "duration",
+    "corruption",
+]
+
+
+def synthesize_corpus(
+    output,
+    num_files=1000,
+    seed=0,
+    formats=("wav", "flac", "ogg"),
+    sample_rates=SAMPLE_RATES,
+    channels=(1, 2),
+    min_duration=1,
+    max_duration=10,
+    max_depth=3,
+    files_per_dir=100,
+    corrupt_fraction=0.01,
+    overwrite=False,
+    n_jobs=-2,
+):
+    """
+    Generate a corpus of synthetic audio files (tones, noise and drum-like transients) for testing and benchmarking.
+
+    Every file's properties and contents are derived from `seed` and the file's index alone, so a corpus is the same
+    no matter how many workers generate it, and an interrupted run can be resumed (existing files are skipped).
+    Lossy formats contain the same audio on every run, but their bytes may differ (e.g. Ogg stream serial numbers are random).
+
+    Args:
+        output: The directory to write the corpus to
+        num_files (int): The number of files to generate
+        seed (int): The random seed
+        formats: The formats to choose from (any of "wav", "flac", "ogg", "mp3", "aiff")
+        sample_rates: The sample rates to choose from
+        channels: The channel counts to choose from
+        min_duration (float): The minimum duration (in seconds) of each file
+        max_duration (float): The maximum duration (in seconds) of each file
+        max_depth (int): The maximum depth of nested directories
+        files_per_dir (int): The approximate number of files per directory
+        corrupt_fraction (float): The fraction of files that are corrupt (truncated, random bytes, or empty)
+        overwrite (bool): Whether to regenerate files that already exist
+        n_jobs (int): The number of worker processes (as in `joblib.Parallel`)
+
+    Returns:
+        list: The manifest of generated files (also written to `manifest.csv` in `output`)
+    """
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(
+            f"Unsupported formats: {sorted(unknown)}. Expected any of {list(FORMATS)}"
+        )
+    unavailable = [fmt for fmt in formats if fmt.upper() not in sf.available_formats()]
+    if unavailable:
+        raise ValueError(f"This build of libsndfile can't write {unavailable}")
+    if not 0 < min_duration <= max_duration:
+        raise ValueError(
+            f"Expected 0 < min_duration <= max_duration, got {min_duration} and {max_duration}"
+        )
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    options = {
+        "formats": list(formats),
+        "sample_rates": list(sample_rates),
+        "channels": list(channels),
+        "min_duration": min_duration,
+        "max_duration": max_duration,
+        "max_depth": max_depth,
+        "files_per_dir": files_per_dir,
+        "corrupt_fraction": corrupt_fraction,
+    }
+    logger.info(f"Synthesizing {num_files} audio files in {output}")
+    # Files are generated in batches to amortize inter-process overhead, with a few batches per worker for load balancing
+    batch_size = int(np.clip(np.ceil(num_files / (8 * (os.cpu_count() or 1))), 1, 1000))
+    batches = [
+        range(start, min(start + batch_size, num_files))
+        for start in range(0, num_files, batch_size)
+    ]
+    results = Parallel(n_jobs=n_jobs, backend="loky")(
+        delayed(_synthesize_batch)(output, indices, seed, options, overwrite)
+        for indices in tqdm(batches, unit="batch")
+    )
+    manifest = [entry for batch in results for entry in batch]
+    with open(output / MANIFEST_FILE, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS)
+        writer.writeheader()
+        writer.writerows(manifest)
+    num_corrupt = sum(bool(entry["corruption"]) for entry in manifest)
+    logger.info(
+        f"Wrote {len(manifest)} files ({num_corrupt} corrupt) and {MANIFEST_FILE} to {output}"
+    )
+    return manifest
+
+
+def file_spec(index, seed, options):
+    """
+    Deterministically choose the properties of the `index`th file in a corpus.
+    """
+    # Consecutive files are grouped into directories of `files_per_dir`, each nested up to `max_depth` levels deep
+    group = index // options["files_per_dir"]
+    depth = int(
+        np.random.default_rng([seed, group, 2]).integers(0, options["max_depth"] + 1)
+    )
+    parts = [f"group_{group:05d}"][:depth] + [
+        f"level_{level}" for level in range(1, depth)
+    ]
+    rng = np.random.default_rng([seed, index])
+    fmt = options["formats"][int(rng.integers(len(options["formats"])))]
+    corrupt = rng.random() < options["corrupt_fraction"]
+    return {
+        "path": str(Path(*parts, f"track_{index:07d}.{fmt}")),
+        "format": fmt,
+        "sample_rate": int(
+            options["sample_rates"][int(rng.integers(len(options["sample_rates"])))]
+        ),
+        "channels": int(
+            options["channels"][int(rng.integers(len(options["channels"])))]
+        ),
+        "duration": round(
+            float(rng.uniform(options["min_duration"], options["max_duration"])), 3
+        ),
+        "corruption": (
+            CORRUPTIONS[int(rng.integers(len(CORRUPTIONS)))] if corrupt else ""
+        ),
+    }
+
+
+def synthesize_audio(duration, sample_rate, channels=1, rng=None):
+    """
+    Synthesize a clip of music-like audio: a few harmonic tones, some noise and drum-like transients at a random tempo.
+
+    Returns:
+        np.ndarray: A `(samples, channels)` float32 array in [-1, 1]
+    """
+    rng = rng or np.random.default_rng()
+    num_samples = max(1, int(duration * sample_rate))
+    t = np.arange(num_samples) / sample_rate
+    audio = np.zeros(num_samples)
+    # Harmonic tones
+    for _ in range(int(rng.integers(1, 4))):
+        frequency = rng.uniform(55, min(2000, sample_rate / 4))
+        for harmonic in range(1, 4):
+            if frequency * harmonic < sample_rate / 2:
+                audio += (
+                    rng.uniform(0.05, 0.3)
+                    / harmonic
+                    * np.sin(
+                        2 * np.pi * frequency * harmonic * t + rng.uniform(0, 2 * np.pi)
+                    )
+                )
+    # Background noise
+    audio += rng.uniform(0.001, 0.05) * rng.standard_normal(num_samples)
+    # Drum-like transients: decaying noise bursts and pitch-swept kicks, on a beat grid
+    beat = int(sample_rate * 60 / rng.uniform(70, 180))
+    hit_length = min(num_samples, int(0.15 * sample_rate))
+    envelope = np.exp(-np.arange(hit_length) / (0.02 * sample_rate))
+    kick = (
+        np.sin(2 * np.pi * np.cumsum(np.linspace(150, 40, hit_length)) / sample_rate)
+        * envelope
+    )
+    for start in range(int(rng.integers(0, beat)), num_samples - hit_length, beat):
+        hit = (
+            kick
+            if rng.random() < 0.5
+            else rng.standard_normal(hit_length) * envelope * 0.5
+        )
+        audio[start : start + hit_length] += rng.uniform(0.3, 0.8) * hit
+    audio = audio[:, None] * rng.uniform(0.6, 1, channels)[None]
+    audio /= max(1, np.abs(audio).max() / 0.99)
+    return audio.astype(np.float32)
+
+
+def _synthesize_batch(output, indices, seed, options, overwrite):
+    manifest = []
+    for index in indices:
+        spec = file_spec(index, seed, options)
+        path = output / spec["path"]
+        manifest.append(spec)
+        if path.exists() and not overwrite:
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Files that exist are skipped when resuming, so an interrupted write mustn't leave a partial one behind
+        write_atomic(_write_file, path, spec, np.random.default_rng([seed, index, 1]))
+    return manifest
+
+
+def _write_file(path, spec, rng):
+    path = Path(path)
+    if spec["corruption"] == "empty":
+        path.write_bytes(b"")
+        return
+    if spec["corruption"] == "garbage":
+        path.write_bytes(
+            rng.integers(0, 256, int(rng.integers(64, 4096)), dtype=np.uint8).tobytes()
+        )
+        return
+    audio = synthesize_audio(
+        spec["duration"], spec["sample_rate"], spec["channels"], rng=rng
+    )
+    sf.write(
+        str(path),
+        audio,
+        spec["sample_rate"],
+        format=spec["format"].upper(),
+        subtype=FORMATS[spec["format"]],
+    )
+    if spec["corruption"] == "truncated":
+        with open(path, "r+b") as f:
+            f.truncate(max(1, path.stat().st_size // 3))
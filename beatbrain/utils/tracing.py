@@ -0,0 +1,273 @@
+"""
+Lightweight timing spans, exported as a Chrome trace (open it in https://ui.perfetto.dev or chrome://tracing).
+
+Tracing is off by default, and a span costs a single global lookup while it's off. Turn it on with `enable()`
+(or the `beatbrain --trace` option), then time code with the `span()` context manager or the `traced()` decorator.
+
+Each process buffers its spans and appends them to its own file in the trace directory. The directory is also put in the
+`BEATBRAIN_TRACE_DIR` environment variable, so joblib and DataLoader worker processes record their spans there too.
+Merge every process's spans into a single trace with `export_chrome_trace()`.
+"""
+import os
+import json
+import time
+import pickle
+import atexit
+import tempfile
+import functools
+import threading
+import multiprocessing
+import multiprocessing.util
+from pathlib import Path
+
+ENV_VAR = "BEATBRAIN_TRACE_DIR"
+# Buffered spans are written out when the outermost span in a thread ends, or when the buffer fills up
+MAX_BUFFERED_EVENTS = 4096
+
+# Offset from `time.perf_counter()` to the Unix epoch, so that timestamps from different processes line up
+_EPOCH_OFFSET = time.time() - time.perf_counter()
+_trace_dir = os.environ.get(ENV_VAR) or None
+_events = []
+_pid = None
+_threads = set()
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def enable(trace_dir=None):
+    """
+    Start recording spans, in this process and in worker processes started from now on.
+
+    Args:
+        trace_dir: The directory to record spans in. Defaults to a new temporary directory.
+
+    Returns:
+        Path: The trace directory
+    """
+    global _trace_dir
+    trace_dir = (
+        Path(trace_dir)
+        if trace_dir
+        else Path(tempfile.mkdtemp(prefix="beatbrain-trace-"))
+    )
+    trace_dir.mkdir(parents=True, exist_ok=True)
+    _trace_dir = os.environ[ENV_VAR] = str(trace_dir)
+    return trace_dir
+
+
+def disable():
+    """
+    Stop recording spans, and write out any spans this process has buffered.
+    """
+    global _trace_dir
+    flush()
+    _trace_dir = None
+    os.environ.pop(ENV_VAR, None)
+
+
+def is_enabled():
+    return _trace_dir is not None
+
+
+class Span:
+    __slots__ = ("name", "category", "args", "start")
+
+    def __init__(self, name, category="beatbrain", args=None):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        if os.getpid() != _pid:
+            _start_process(os.getpid())
+        _local.depth = getattr(_local, "depth", 0) + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        _local.depth -= 1
+        _record(self.name, self.category, self.start, end, self.args)
+        if _local.depth == 0 or len(_events) >= MAX_BUFFERED_EVENTS:
+            flush()
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, category="beatbrain", **args):
+    """
+    Time a block of code.
+
+    Usage:
+        with tracing.span("decode", path=path):
+            ...
+
+    Args:
+        name (str): The span's name
+        category (str): The span's category (used to filter spans in trace viewers)
+        **args: Extra information shown with the span. Values that aren't JSON scalars are converted to strings.
+    """
+    if _trace_dir is None:
+        return _NULL_SPAN
+    return Span(name, category, args)
+
+
+def traced(name=None, category="beatbrain"):
+    """
+    Decorator that times each call to a function. The span is named after the function unless `name` is given.
+    Can be used with or without arguments (`@traced` or `@traced("name")`).
+    """
+    if callable(name):
+        return traced()(name)
+
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _trace_dir is None:
+                return fn(*args, **kwargs)
+            with Span(span_name, category):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_span(name, start, end=None, category="beatbrain", **args):
+    """
+    Record a span that was timed separately, e.g. one that starts and ends in different callbacks.
+
+    Args:
+        name (str): The span's name
+        start (float): The span's start time, from `time.perf_counter()`
+        end (float): The span's end time, from `time.perf_counter()`. Defaults to now.
+        category (str): The span's category
+        **args: Extra information shown with the span
+    """
+    if _trace_dir is None:
+        return
+    end = time.perf_counter() if end is None else end
+    if os.getpid() != _pid:
+        _start_process(os.getpid())
+    _record(name, category, start, end, args)
+    if not getattr(_local, "depth", 0) or len(_events) >= MAX_BUFFERED_EVENTS:
+        flush()
+
+
+def flush():
+    """
+    Append this process's buffered spans to its file in the trace directory.
+    """
+    global _events
+    with _lock:
+        events, _events = _events, []
+    if events and _trace_dir is not None:
+        # Events are only converted to JSON on export, which keeps recording cheap
+        with open(Path(_trace_dir) / f"trace-{os.getpid()}.pkl", "ab") as f:
+            pickle.dump(events, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def export_chrome_trace(output, trace_dir=None):
+    """
+    Merge the spans recorded by every process into a single Chrome trace JSON file.
+
+    Args:
+        output: The path to write the trace to
+        trace_dir: The trace directory. Defaults to the current one.
+
+    Returns:
+        int: The number of spans in the trace
+    """
+    flush()
+    trace_dir = Path(trace_dir or _trace_dir)
+    events = []
+    for path in sorted(trace_dir.glob("trace-*.pkl")):
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    events.extend(_to_chrome_event(*event) for event in pickle.load(f))
+                except EOFError:
+                    break
+    # Metadata (process and thread names) first, then spans in chronological order
+    events.sort(key=lambda event: (event["ph"] != "M", event.get("ts", 0)))
+    with open(output, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return sum(event["ph"] == "X" for event in events)
+
+
+def _record(name, category, start, end, args):
+    tid = threading.get_ident()
+    if tid not in _threads:
+        _threads.add(tid)
+        _events.append(
+            (
+                "thread_name",
+                None,
+                _pid,
+                tid,
+                None,
+                None,
+                {"name": threading.current_thread().name},
+            )
+        )
+    if args:
+        args = {
+            k: v if isinstance(v, (str, int, float, bool)) or v is None else str(v)
+            for k, v in args.items()
+        }
+    _events.append(
+        (name, category, _pid, tid, start + _EPOCH_OFFSET, end - start, args)
+    )
+
+
+def _to_chrome_event(name, category, pid, tid, timestamp, duration, args):
+    if category is None:  # Metadata
+        return {"name": name, "ph": "M", "pid": pid, "tid": tid, "args": args}
+    event = {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": timestamp * 1e6,
+        "dur": duration * 1e6,
+        "pid": pid,
+        "tid": tid,
+    }
+    if args:
+        event["args"] = args
+    return event
+
+
+def _start_process(pid):
+    """
+    Set up recording in a new process. Forked processes inherit their parent's buffer and open spans, which are discarded.
+    """
+    global _pid
+    _pid = pid
+    _events.clear()
+    _threads.clear()
+    _local.depth = 0
+    _events.append(
+        (
+            "process_name",
+            None,
+            pid,
+            0,
+            None,
+            None,
+            {"name": f"{multiprocessing.current_process().name} ({pid})"},
+        )
+    )
+    # Worker processes started by `multiprocessing` exit without running `atexit` handlers, but do run its finalizers
+    atexit.register(flush)
+    multiprocessing.util.Finalize(None, flush, exitpriority=100)
@@ -0,0 +1,190 @@
+"""
+Asynchronous, atomic file writes.
+
+`ArtifactWriter` writes files (e.g. `.npz` chunks with `core.save_arrays()` or EXR images with `core.save_image()`) in a
+pool of background threads, so that the code producing them can carry on computing. Compression (zlib) and image
+encoding release the GIL, so several files are compressed in parallel.
+
+Every file is first written to a hidden temporary file next to its destination and only renamed to the destination
+once it's complete, so readers never see partially-written files, even if the process dies mid-write.
+"""
+import os
+import uuid
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import tracing
+
+
+def write_atomic(write_fn, path, *args, **kwargs):
+    """
+    Write a file with `write_fn(temp_path, *args, **kwargs)`, then atomically rename it to `path`.
+
+    The temporary file is in the same directory as `path` (so the rename doesn't cross filesystems) and has the same
+    extension (since writers like `np.savez` and `imageio` go by it). It's removed if the write fails.
+    """
+    path = Path(path)
+    temp_path = path.with_name(f".{path.stem}.{uuid.uuid4().hex[:8]}.tmp{path.suffix}")
+    with tracing.span("write_atomic", path=str(path)):
+        try:
+            write_fn(temp_path, *args, **kwargs)
+            os.replace(str(temp_path), str(path))
+        except BaseException:
+            try:
+                temp_path.unlink()
+            except FileNotFoundError:
+                pass
+            raise
+
+
+class ArtifactWriter:
+    def __init__(
+        self, num_threads=4, max_pending=64, batch_size=16, batch_bytes=1 << 20
+    ):
+        """
+        Writes files in a pool of background threads, atomically (see `write_atomic()`).
+
+        While a thread is idle, each write is handed to it straight away. While every thread is busy, small writes are
+        grouped into batches of up to `batch_size` writes or `batch_bytes` bytes of arrays, which are each written by a
+        single task, so that many small files don't each pay for a round trip through the pool.
+
+        At most `max_pending` writes can be waiting or in progress at a time: `submit()` blocks while the queue is
+        full, which bounds the memory held by pending writes when the disk can't keep up.
+
+        Errors don't interrupt other writes: they're raised by the next `flush()` (or `close()`).
+        Use as a context manager to wait for every write when leaving the block:
+
+            with ArtifactWriter() as writer:
+                for i, chunks in enumerate(spectrograms):
+                    save_arrays(chunks, f"{i}.npz", writer=writer)
+
+        Args:
+            num_threads (int): The number of writer threads
+            max_pending (int): The maximum number of queued writes
+            batch_size (int): The maximum number of writes per batch
+            batch_bytes (int): The maximum number of array bytes per batch
+        """
+        if num_threads < 1 or max_pending < 1 or batch_size < 1:
+            raise ValueError(
+                "num_threads, max_pending and batch_size must all be at least 1"
+            )
+        self.num_threads = num_threads
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.written = 0
+        self.num_batches = 0
+        self.closed = False
+        self._executor = ThreadPoolExecutor(
+            num_threads, thread_name_prefix="ArtifactWriter"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._condition = threading.Condition()
+        self._batch = []
+        self._batch_nbytes = 0
+        self._running = 0
+        self._pending = 0
+        self._errors = []
+
+    @property
+    def pending(self):
+        """
+        The number of writes that haven't completed yet
+        """
+        return self._pending
+
+    def submit(self, write_fn, path, *args, **kwargs):
+        """
+        Queue a write of `path` with `write_fn(temp_path, *args, **kwargs)`.
+
+        Arrays passed as arguments are written as they are when the write runs, not when it's submitted: don't modify
+        them in the meantime.
+        """
+        if self.closed:
+            raise ValueError("Can't write with a closed ArtifactWriter")
+        self._slots.acquire()
+        with self._condition:
+            self._pending += 1
+            self._batch.append((write_fn, path, args, kwargs))
+            self._batch_nbytes += _nbytes(args)
+            if (
+                self._running < self.num_threads
+                or len(self._batch) >= self.batch_size
+                or self._batch_nbytes >= self.batch_bytes
+            ):
+                self._dispatch()
+
+    def flush(self):
+        """
+        Wait for every submitted write to complete.
+
+        Raises:
+            OSError: If any write failed since the last flush (chained from the first failure)
+        """
+        with self._condition:
+            if self._batch:
+                self._dispatch()
+            self._condition.wait_for(lambda: self._pending == 0)
+            errors, self._errors = self._errors, []
+        if errors:
+            path, error = errors[0]
+            raise OSError(
+                f"Failed to write {len(errors)} file(s), starting with {path}: {error!r}"
+            ) from error
+
+    def close(self):
+        """
+        Wait for every submitted write to complete and stop the writer threads.
+        """
+        if self.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.closed = True
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _dispatch(self):
+        # Must be called with `_condition` held
+        batch, self._batch, self._batch_nbytes = self._batch, [], 0
+        self._running += 1
+        self.num_batches += 1
+        self._executor.submit(self._write_batch, batch)
+
+    def _write_batch(self, batch):
+        for write_fn, path, args, kwargs in batch:
+            error = None
+            try:
+                write_atomic(write_fn, path, *args, **kwargs)
+            except Exception as e:
+                error = e
+            self._slots.release()
+            with self._condition:
+                if error is None:
+                    self.written += 1
+                else:
+                    self._errors.append((path, error))
+                self._pending -= 1
+                self._condition.notify_all()
+        with self._condition:
+            self._running -= 1
+            # Writes that were batched up while every thread was busy
+            if self._batch:
+                self._dispatch()
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(item) for item in value)
+    return 0
@@ -0,0 +1,94 @@
+"""
+Compares writing spectrogram chunks synchronously with `utils.core.save_arrays()` / `save_image()` against writing them
+with an `ArtifactWriter`, while the main thread keeps computing (simulated with a matrix multiplication per file).
+
+Reports the total time and the time the main thread spent blocked on writes (which, with the writer, is only the time
+spent queueing writes and waiting for them to finish at the end).
+
+Usage: python benchmarks/artifact_writer.py --files 100 --chunks 10 --n_mels 512 --frames 64 --threads 4
+"""
+import time
+import tempfile
+from pathlib import Path
+
+import click
+import numpy as np
+
+from beatbrain.utils.core import save_arrays, save_image
+from beatbrain.utils.writer import ArtifactWriter
+
+
+def make_chunks(rng, num_chunks, n_mels, frames):
+    # Smooth, spectrogram-like values compress roughly as well as real spectrograms do
+    return list(
+        np.cumsum(
+            rng.standard_normal((num_chunks, n_mels, frames), dtype=np.float32), axis=-1
+        )
+        / frames
+    )
+
+
+def run(output, files, shape, compute, write, writer=None):
+    rng = np.random.default_rng(0)
+    work = rng.standard_normal((compute, compute), dtype=np.float32)
+    blocked = 0.0
+    start = time.perf_counter()
+    for i in range(files):
+        work @ work  # Stand-in for computing the next file's spectrograms
+        chunks = make_chunks(rng, *shape)
+        write_start = time.perf_counter()
+        write(chunks, Path(output, str(i)), writer)
+        blocked += time.perf_counter() - write_start
+    if writer is not None:
+        flush_start = time.perf_counter()
+        writer.close()
+        blocked += time.perf_counter() - flush_start
+    return time.perf_counter() - start, blocked
+
+
+def write_arrays(chunks, path, writer):
+    save_arrays(chunks, path.with_suffix(".npz"), writer=writer)
+
+
+def write_images(chunks, path, writer):
+    path.mkdir(exist_ok=True)
+    for j, chunk in enumerate(chunks):
+        save_image(chunk, path / f"{j}.tiff", format="tiff", writer=writer)
+
+
+@click.command()
+@click.option("--files", default=100, show_default=True)
+@click.option("--chunks", default=10, show_default=True, help="Chunks per file")
+@click.option("--n_mels", default=512, show_default=True)
+@click.option("--frames", default=64, show_default=True, help="Frames per chunk")
+@click.option(
+    "--compute",
+    default=512,
+    show_default=True,
+    help="Size of the matrix multiplied between files",
+)
+@click.option("--threads", default=4, show_default=True, help="Writer threads")
+def main(files, chunks, n_mels, frames, compute, threads):
+    print(
+        f"{files} files of {chunks} x ({n_mels}, {frames}) chunks, {threads} writer threads"
+    )
+    print(f"{'write':<44}{'total (s)':>12}{'blocked (s)':>14}")
+    for name, write in [
+        ("save_arrays (compressed npz)", write_arrays),
+        ("save_image (tiff per chunk)", write_images),
+    ]:
+        for mode in ["synchronous", "ArtifactWriter"]:
+            with tempfile.TemporaryDirectory() as output:
+                writer = (
+                    ArtifactWriter(num_threads=threads)
+                    if mode == "ArtifactWriter"
+                    else None
+                )
+                total, blocked = run(
+                    output, files, (chunks, n_mels, frames), compute, write, writer
+                )
+            print(f"{name + ', ' + mode:<44}{total:>12.2f}{blocked:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
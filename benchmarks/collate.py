@@ -0,0 +1,80 @@
+"""
+Measures main-process time spent receiving collated `AudioClipDataset` batches,
+using PyTorch's default collate function vs. `AudioClipCollator`.
+
+Usage: python benchmarks/collate.py --num_files 64 --batch_size 32 --num_workers 4
+"""
+import time
+import tempfile
+from pathlib import Path
+
+import click
+import numpy as np
+import soundfile as sf
+from torch.utils.data import DataLoader
+
+from beatbrain.datasets import AudioClipDataset, AudioClipCollator
+
+
+def make_corpus(root, num_files, duration, sample_rate):
+    rng = np.random.default_rng(0)
+    for i in range(num_files):
+        audio = rng.uniform(-0.5, 0.5, (int(duration * sample_rate), 2)).astype(
+            np.float32
+        )
+        sf.write(str(Path(root, f"{i}.wav")), audio, sample_rate)
+
+
+def time_main_process(loader):
+    """
+    Returns the total main-process CPU time and wall time spent in `next()` over one epoch.
+    """
+    cpu_time = wall_time = 0.0
+    iterator = iter(loader)
+    while True:
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        try:
+            next(iterator)
+        except StopIteration:
+            break
+        cpu_time += time.process_time() - cpu_start
+        wall_time += time.perf_counter() - wall_start
+    return cpu_time, wall_time
+
+
+@click.command()
+@click.option("--num_files", default=64, show_default=True)
+@click.option(
+    "--duration",
+    default=30.0,
+    show_default=True,
+    help="Length of each synthetic file (seconds)",
+)
+@click.option("--sample_rate", default=22050, show_default=True)
+@click.option("--batch_size", default=32, show_default=True)
+@click.option("--num_workers", default=4, show_default=True)
+def main(num_files, duration, sample_rate, batch_size, num_workers):
+    with tempfile.TemporaryDirectory() as root:
+        make_corpus(root, num_files, duration, sample_rate)
+        dataset = AudioClipDataset(root, sample_rate=sample_rate, mono=False)
+        for name, collate_fn in [
+            ("default_collate", None),
+            ("AudioClipCollator", AudioClipCollator()),
+        ]:
+            loader = DataLoader(
+                dataset,
+                batch_size=batch_size,
+                num_workers=num_workers,
+                collate_fn=collate_fn,
+            )
+            time_main_process(loader)  # Warm up the page cache
+            cpu_time, wall_time = time_main_process(loader)
+            num_batches = len(loader)
+            print(
+                f"{name:>18}: {1000 * cpu_time / num_batches:.2f} ms CPU / {1000 * wall_time / num_batches:.2f} ms wall "
+                f"per batch in the main process ({num_batches} batches)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Synthetic audio and spectrogram fixtures for the benchmark suite (`benchmarks/test_*.py`).
+The suite requires `pytest-benchmark`. See `benchmarks/regression.py` for comparing runs against saved baselines.
+"""
+import numpy as np
+import pytest
+import soundfile as sf
+
+pytest.importorskip("pytest_benchmark")
+
+SAMPLE_RATE = 22050
+
+
+def make_audio(duration, sr=SAMPLE_RATE, channels=1, seed=0):
+    """
+    A deterministic mix of harmonic tones and noise, of shape `(samples, channels)`
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    tones = sum(
+        np.sin(2 * np.pi * f * t) / (i + 1)
+        for i, f in enumerate(rng.uniform(100, 2000, 4))
+    )
+    audio = 0.3 * tones[:, None] + 0.05 * rng.normal(size=(len(t), channels))
+    return audio.astype(np.float32)
+
+
+@pytest.fixture(scope="session")
+def audio():
+    return make_audio(10)[:, 0]
+
+
+@pytest.fixture(scope="session")
+def short_audio():
+    return make_audio(2)[:, 0]
+
+
+@pytest.fixture(scope="session")
+def spectrogram(audio):
+    from beatbrain.utils.core import audio_to_spectrogram
+
+    return audio_to_spectrogram(audio, normalize=True, sr=SAMPLE_RATE)
+
+
+@pytest.fixture(scope="session")
+def audio_dir(tmp_path_factory):
+    """
+    A nested directory of 16 tracks (30s each) with a mix of sample rates and channel counts, plus a few non-audio files
+    """
+    root = tmp_path_factory.mktemp("audio")
+    for i in range(16):
+        sr = [SAMPLE_RATE, 44100][i % 2]
+        channels = [1, 2][(i // 2) % 2]
+        directory = root / f"album_{i // 4}"
+        directory.mkdir(exist_ok=True)
+        sf.write(
+            str(directory / f"{i}.wav"),
+            make_audio(30, sr=sr, channels=channels, seed=i),
+            sr,
+        )
+    for i in range(3):
+        (root / f"notes_{i}.txt").write_text("not audio")
+    return root
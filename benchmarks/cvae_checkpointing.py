@@ -0,0 +1,80 @@
+"""
+Measures the peak memory and step time of training a `SpectrogramCVAE` with and without activation checkpointing.
+
+Each configuration runs in a fresh process, so that its peak resident set size (RSS) isn't hidden by an earlier run's.
+The reported memory is the peak RSS minus the RSS before the first training step (i.e. excluding the interpreter,
+the model's weights and the input batch).
+
+Usage: python benchmarks/cvae_checkpointing.py --batch_size 2 --n_mels 512 --n_frames 640 --steps 3
+"""
+import time
+import multiprocessing
+
+import click
+import torch
+
+from beatbrain.models import SpectrogramCVAE
+from beatbrain.utils import memory
+from beatbrain.utils.config import Config
+
+
+def run(hparams, batch_size, steps, checkpointing):
+    torch.manual_seed(0)
+    model = SpectrogramCVAE(Config({**hparams, "checkpointing": checkpointing})).train()
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
+    x = torch.rand(batch_size, *model.input_shape)
+    baseline = memory.current_rss()
+    times = []
+    # The first step allocates the optimizer's state, so it isn't timed
+    for _ in range(steps + 1):
+        start = time.perf_counter()
+        optimizer.zero_grad()
+        model.training_step((x, None), 0)["loss"].backward()
+        optimizer.step()
+        times.append(time.perf_counter() - start)
+    return {
+        "peak_memory": memory.peak_rss() - baseline,
+        "step_time": sorted(times[1:])[len(times[1:]) // 2],
+    }
+
+
+@click.command()
+@click.option("--batch_size", default=2, show_default=True)
+@click.option("--n_mels", default=512, show_default=True)
+@click.option("--n_frames", default=640, show_default=True)
+@click.option("--latent_dim", default=64, show_default=True)
+@click.option("--steps", default=3, show_default=True)
+@click.option(
+    "--threads",
+    type=int,
+    help="Number of intra-op threads (defaults to torch's default)",
+)
+def main(batch_size, n_mels, n_frames, latent_dim, steps, threads):
+    if threads:
+        torch.set_num_threads(threads)
+    hparams = {
+        "latent_dim": latent_dim,
+        "spec": {"n_mels": n_mels, "n_frames": n_frames},
+    }
+    context = multiprocessing.get_context("spawn")
+    print(
+        f"SpectrogramCVAE, batch of {batch_size} x (1, {n_mels}, {n_frames}), {threads or torch.get_num_threads()} threads"
+    )
+    print(f"{'checkpointing':<16}{'peak memory (MB)':>18}{'step time (s)':>15}")
+    results = {}
+    for checkpointing in [False, True]:
+        with context.Pool(1) as pool:
+            results[checkpointing] = pool.apply(
+                run, (hparams, batch_size, steps, checkpointing)
+            )
+        print(
+            f"{'on' if checkpointing else 'off':<16}{results[checkpointing]['peak_memory'] / 1024 ** 2:>18.0f}{results[checkpointing]['step_time']:>15.2f}"
+        )
+    print(
+        f"Checkpointing uses {results[True]['peak_memory'] / results[False]['peak_memory']:.0%} of the memory "
+        f"and takes {results[True]['step_time'] / results[False]['step_time']:.2f}x as long per step"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Measures how `beatbrain data dedupe` scales to large libraries:
+    - Fingerprinting throughput (files/sec per worker process) on a few synthetic tracks
+    - The time and peak memory of finding all near-duplicate pairs with a `HammingIndex`, for increasing numbers of
+      random fingerprints, a tenth of which have 1-2 near-duplicates (copies with up to `--max_flips` bits flipped),
+      and the fraction of those duplicates that are found (recall)
+
+Each index run happens in a fresh process, so that its peak resident set size (RSS) isn't hidden by an earlier run's.
+
+Usage: python benchmarks/dedupe.py -n 10000 -n 100000 -n 1000000 --num_files 8 --duration 180
+"""
+import time
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+import click
+import numpy as np
+import soundfile as sf
+
+from beatbrain.index import HammingIndex
+from beatbrain.utils import fingerprint, memory
+from beatbrain.utils.synth import synthesize_audio
+
+
+def make_fingerprints(num_fingerprints, max_flips, seed=0):
+    """
+    Returns:
+        tuple: A `(N, NUM_BYTES)` array of fingerprints, and a `(D, 2)` array of the indices of each planted duplicate pair
+    """
+    rng = np.random.default_rng(seed)
+    num_originals = int(num_fingerprints / 1.15)
+    originals = rng.integers(
+        0, 256, (num_originals, fingerprint.NUM_BYTES), dtype=np.uint8
+    )
+    # A tenth of the originals get a near-duplicate, and half of those get a second one
+    sources = rng.choice(num_originals, num_fingerprints - num_originals, replace=True)
+    bits = np.unpackbits(originals[sources], axis=1)
+    for row in bits:
+        row[
+            rng.choice(
+                fingerprint.NUM_BITS, rng.integers(0, max_flips + 1), replace=False
+            )
+        ] ^= 1
+    fingerprints = np.concatenate([originals, np.packbits(bits, axis=1)])
+    return fingerprints, np.stack(
+        [sources, np.arange(num_originals, num_fingerprints)], axis=1
+    )
+
+
+def run_index(num_fingerprints, max_flips, max_distance):
+    fingerprints, planted = make_fingerprints(num_fingerprints, max_flips)
+    start = time.perf_counter()
+    index = HammingIndex(fingerprints)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    pairs, _ = index.pairs(max_distance)
+    pairs_time = time.perf_counter() - start
+    found = np.isin(
+        planted[:, 0] * num_fingerprints + planted[:, 1],
+        pairs[:, 0] * num_fingerprints + pairs[:, 1],
+    )
+    return {
+        "build": build_time,
+        "pairs": pairs_time,
+        "num_pairs": len(pairs),
+        "recall": found.mean(),
+        "peak_rss": memory.peak_rss(),
+    }
+
+
+def fingerprint_throughput(num_files, duration, sample_rate=44100):
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as root:
+        paths = [Path(root, f"{i}.flac") for i in range(num_files)]
+        for path in paths:
+            sf.write(
+                str(path),
+                synthesize_audio(duration, sample_rate, channels=2, rng=rng),
+                sample_rate,
+            )
+        start = time.perf_counter()
+        for path in paths:
+            fingerprint.fingerprint_file(path)
+        return num_files / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option(
+    "-n",
+    "--num_fingerprints",
+    type=int,
+    multiple=True,
+    default=[10000, 100000, 1000000],
+    show_default=True,
+)
+@click.option(
+    "--max_flips",
+    default=16,
+    show_default=True,
+    help="Maximum number of bits flipped in each planted duplicate",
+)
+@click.option("--max_distance", default=24, show_default=True)
+@click.option(
+    "--num_files",
+    default=8,
+    show_default=True,
+    help="Number of tracks to measure fingerprinting throughput on",
+)
+@click.option(
+    "--duration",
+    default=180.0,
+    show_default=True,
+    help="Duration (in seconds) of each track",
+)
+def main(num_fingerprints, max_flips, max_distance, num_files, duration):
+    if num_files:
+        rate = fingerprint_throughput(num_files, duration)
+        print(
+            f"Fingerprinting {duration:.0f}s 44.1kHz stereo FLAC tracks: {rate:.2f} files/sec per process"
+        )
+        print(f"  -> 1M tracks take {1e6 / rate / 3600:.1f} CPU-hours\n")
+
+    context = multiprocessing.get_context("spawn")
+    print(
+        f"{'fingerprints':>12}{'build (s)':>11}{'pairs (s)':>11}{'pairs':>10}{'recall':>9}{'peak RSS (MB)':>16}"
+    )
+    for n in num_fingerprints:
+        with context.Pool(1) as pool:
+            result = pool.apply(run_index, (n, max_flips, max_distance))
+        print(
+            f"{n:>12}{result['build']:>11.2f}{result['pairs']:>11.2f}{result['num_pairs']:>10}"
+            f"{result['recall']:>9.4f}{result['peak_rss'] / 1024 ** 2:>16.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
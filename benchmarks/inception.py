@@ -0,0 +1,130 @@
+"""
+Compares the CPU latency of `Inception` blocks against equivalent `FusedInception` blocks (from `models/mnist.py`),
+for training steps (forward and backward) and for inference, with and without BatchNorm folding. Inference is also
+timed with `FusedInception(preallocate_output=True)`, which writes branch outputs into a preallocated tensor rather than
+concatenating them.
+
+Usage: python benchmarks/inception.py --batch_size 8 --in_channels 64 --height 128 --width 160 --repeats 10
+"""
+
+import copy
+import time
+
+import click
+import torch
+
+from beatbrain.models.export import fold_batchnorm
+from beatbrain.models.mnist import FusedInception, Inception
+
+
+def time_interleaved(fns, repeats, warmup=2):
+    """
+    The fastest time (in milliseconds) of calls to each of `fns`, which are run in turn so that they're equally
+    affected by any background load
+    """
+    times = [[] for _ in fns]
+    for i in range(warmup + repeats):
+        for fn, fn_times in zip(fns, times):
+            start = time.perf_counter()
+            fn()
+            if i >= warmup:
+                fn_times.append(time.perf_counter() - start)
+    return [min(fn_times) * 1e3 for fn_times in times]
+
+
+def training_step(block, x):
+    def step():
+        block.zero_grad()
+        block(x).sum().backward()
+
+    return step
+
+
+def inference(block, x):
+    def run():
+        with torch.no_grad():
+            block(x)
+
+    return run
+
+
+@click.command()
+@click.option("--batch_size", default=8, show_default=True)
+@click.option("--in_channels", default=64, show_default=True)
+@click.option("--pool_features", default=32, show_default=True)
+@click.option("--height", default=128, show_default=True)
+@click.option("--width", default=160, show_default=True)
+@click.option("--channels_last", is_flag=True, help="Use channels-last inputs")
+@click.option("--repeats", default=10, show_default=True)
+@click.option(
+    "--threads",
+    type=int,
+    help="Number of intra-op threads (defaults to torch's default)",
+)
+def main(
+    batch_size,
+    in_channels,
+    pool_features,
+    height,
+    width,
+    channels_last,
+    repeats,
+    threads,
+):
+    if threads:
+        torch.set_num_threads(threads)
+    torch.manual_seed(0)
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    x = torch.randn(batch_size, in_channels, height, width).contiguous(
+        memory_format=memory_format
+    )
+    inception = Inception(in_channels, pool_features)
+    for _ in range(3):  # Populate the BatchNorm running statistics
+        inception(x)
+    fused = FusedInception.from_inception(inception)
+    blocks = [inception, fused]
+
+    print(
+        f"Input {tuple(x.shape)}{' (channels last)' if channels_last else ''}, {torch.get_num_threads()} threads"
+    )
+    print(f"{'':<30}{'Inception (ms)':>16}{'FusedInception (ms)':>21}{'speedup':>9}")
+    results = {
+        "training step": time_interleaved(
+            [training_step(block.train(), x) for block in blocks], repeats
+        )
+    }
+    results["inference"] = time_interleaved(
+        [inference(block.eval(), x) for block in blocks], repeats
+    )
+    folded = [fold_batchnorm(copy.deepcopy(block)) for block in blocks]
+    # Converted after the training steps, which update the BatchNorm running statistics
+    preallocated = [
+        inception,
+        FusedInception.from_inception(inception, preallocate_output=True),
+    ]
+    results["inference (folded BN)"] = time_interleaved(
+        [inference(block, x) for block in folded], repeats
+    )
+    results["inference (prealloc)"] = time_interleaved(
+        [inference(block.eval(), x) for block in preallocated], repeats
+    )
+    folded += [fold_batchnorm(copy.deepcopy(preallocated[1]))]
+    results["inference (prealloc, folded)"] = time_interleaved(
+        [inference(block, x) for block in [folded[0], folded[2]]], repeats
+    )
+    for name, (baseline, fused_time) in results.items():
+        print(
+            f"{name:<30}{baseline:>16.2f}{fused_time:>21.2f}{baseline / fused_time:>8.2f}x"
+        )
+    with torch.no_grad():
+        # Sanity check: fusing branches and folding BatchNorm don't change the output (beyond float rounding)
+        expected = inception(x)
+        error = max(
+            (block(x) - expected).abs().max().item()
+            for block in [fused, preallocated[1]] + folded
+        )
+    print(f"Max absolute difference from Inception: {error:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Compares cold-start time (imports + model loading + first batch) and per-batch latency of the Lightning module
+against the exported TorchScript/ONNX artifacts loaded through `beatbrain.runtime`.
+
+Each measurement runs in a fresh interpreter so that import costs are counted.
+
+Usage: python benchmarks/inference.py -c config.yaml -w weights.ckpt --batch_size 32
+"""
+import sys
+import json
+import tempfile
+import subprocess
+from pathlib import Path
+
+import click
+
+LIGHTNING = """
+from beatbrain.helpers import load_model
+model = load_model({config!r}, weights_path={weights_path!r})
+run = lambda x: model(x)
+"""
+
+RUNTIME = """
+from beatbrain.runtime import ExportedModel
+model = ExportedModel({export_dir!r}, backend={backend!r})
+run = model.reconstruct
+"""
+
+TEMPLATE = """
+import json
+import time
+start = time.perf_counter()
+import torch
+{setup}
+x = torch.rand({batch_size}, *{input_shape})
+with torch.no_grad():
+    run(x)
+    cold_start = time.perf_counter() - start
+    latencies = []
+    for _ in range({batches}):
+        batch_start = time.perf_counter()
+        run(x)
+        latencies.append(time.perf_counter() - batch_start)
+latencies.sort()
+print(json.dumps({{"cold_start": cold_start, "p50": latencies[len(latencies) // 2], "p99": latencies[int(0.99 * (len(latencies) - 1))]}}))
+"""
+
+
+def measure(setup, batch_size, input_shape, batches):
+    code = TEMPLATE.format(
+        setup=setup,
+        batch_size=batch_size,
+        input_shape=tuple(input_shape),
+        batches=batches,
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@click.command()
+@click.option(
+    "-c",
+    "--config",
+    default=None,
+    help="Path to config YAML file (defaults to the default config)",
+)
+@click.option("-w", "--weights_path", default=None)
+@click.option("--batch_size", default=32, show_default=True)
+@click.option("--batches", default=50, show_default=True)
+def main(config, weights_path, batch_size, batches):
+    from beatbrain.helpers import export_model
+    from beatbrain.utils.config import get_default_config
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if config is None:
+            default_config = get_default_config()
+            default_config.hparams.data_root = None
+            config = Path(tmp, "config.yaml")
+            default_config.dump(config)
+        export_dir = Path(tmp, "export")
+        metadata = export_model(config, export_dir, weights_path=weights_path)
+        setups = {
+            "lightning": LIGHTNING.format(config=str(config), weights_path=weights_path)
+        }
+        for backend in metadata["formats"]:
+            setups[backend] = RUNTIME.format(
+                export_dir=str(export_dir), backend=backend
+            )
+        for name, setup in setups.items():
+            result = measure(setup, batch_size, metadata["input_shape"], batches)
+            print(
+                f"{name:>12}: cold start {result['cold_start']:.2f}s | "
+                f"batch of {batch_size}: p50 {1000 * result['p50']:.2f}ms, p99 {1000 * result['p99']:.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compares MNISTAutoencoder training throughput (samples/sec) between the default
+per-sample FashionMNIST pipeline and the preloaded tensor-backed path (`hparams.in_memory`).
+
+Usage: python benchmarks/mnist_loading.py --steps 200 --batch_size 32
+"""
+import time
+
+import click
+import torch
+
+from beatbrain.models import MNISTAutoencoder
+from beatbrain.utils.config import get_default_config
+
+
+def training_throughput(model, steps):
+    """
+    Run `steps` optimization steps on the model's train dataloader and return the number of samples processed per second.
+    """
+    optimizer = torch.optim.Adam(model.parameters(), lr=model.hparams.learning_rate)
+    num_samples = step = 0
+    start = time.perf_counter()
+    while step < steps:
+        for batch in model.train_dataloader():
+            if step >= steps:
+                break
+            optimizer.zero_grad()
+            loss = model.training_step(batch, step)["loss"]
+            loss.backward()
+            optimizer.step()
+            num_samples += len(batch[0])
+            step += 1
+    return num_samples / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option("--steps", default=200, show_default=True)
+@click.option("--batch_size", default=32, show_default=True)
+@click.option(
+    "--data_root",
+    default=None,
+    help="Where to download FashionMNIST to (defaults to the config's data_root)",
+)
+def main(steps, batch_size, data_root):
+    torch.manual_seed(0)
+    for in_memory in [False, True]:
+        hparams = get_default_config().hparams
+        hparams.batch_size = batch_size
+        hparams.in_memory = in_memory
+        if data_root:
+            hparams.data_root = data_root
+        model = MNISTAutoencoder(hparams)
+        model.prepare_data()
+        throughput = training_throughput(model, steps)
+        print(f"in_memory={str(in_memory):>5}: {throughput:,.0f} training samples/sec")
+
+
+if __name__ == "__main__":
+    main()
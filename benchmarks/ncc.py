@@ -0,0 +1,62 @@
+"""
+Compares the per-pair `ncc` metric against `batch_ncc`/`pairwise_ncc` on (512 x 640) spectrograms.
+
+Usage: python benchmarks/ncc.py --num_pairs 16
+"""
+import time
+
+import click
+import numpy as np
+
+from beatbrain.generator.metrics import ncc, batch_ncc, pairwise_ncc
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+@click.command()
+@click.option("--num_pairs", default=16, show_default=True)
+@click.option("--height", default=512, show_default=True)
+@click.option("--width", default=640, show_default=True)
+@click.option("--chunk_size", default=8, show_default=True)
+@click.option(
+    "--sweep_pairs",
+    default=2,
+    show_default=True,
+    help="Number of pairs to use for the (slow) lag sweep comparison",
+)
+def main(num_pairs, height, width, chunk_size, sweep_pairs):
+    rng = np.random.default_rng(0)
+    a = rng.random((num_pairs, height, width), dtype=np.float32)
+    b = rng.random((num_pairs, height, width), dtype=np.float32)
+
+    expected, per_pair = timed(lambda: np.array([ncc(x, y) for x, y in zip(a, b)]))
+    result, batched = timed(batch_ncc, a, b, chunk_size=chunk_size)
+    assert np.allclose(result, expected, atol=1e-4)
+    print(
+        f"zero-lag, {num_pairs} pairs: per-pair {per_pair:.3f}s | batch_ncc {batched:.3f}s ({per_pair / batched:.1f}x)"
+    )
+
+    expected, per_pair = timed(lambda: np.array([[ncc(x, y) for y in b] for x in a]))
+    result, batched = timed(pairwise_ncc, a, b, chunk_size=chunk_size)
+    assert np.allclose(result, expected, atol=1e-4)
+    print(
+        f"zero-lag, {num_pairs}x{num_pairs} matrix: per-pair {per_pair:.3f}s | pairwise_ncc {batched:.3f}s ({per_pair / batched:.1f}x)"
+    )
+
+    a, b = a[:sweep_pairs], b[:sweep_pairs]
+    expected, per_pair = timed(
+        lambda: np.stack([ncc(x, y, sweep=True) for x, y in zip(a, b)])
+    )
+    result, batched = timed(batch_ncc, a, b, sweep=True, chunk_size=chunk_size)
+    assert np.allclose(result, expected, atol=1e-4)
+    print(
+        f"sweep, {sweep_pairs} pairs: per-pair {per_pair:.3f}s | batch_ncc {batched:.3f}s ({per_pair / batched:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compares training throughput of Inception-style conv stacks (from `models/mnist.py`) in float32 vs. bfloat16 autocast,
+with contiguous (NCHW) vs. channels-last (NHWC) tensors and weights.
+
+Usage: python benchmarks/precision.py --batch_size 16 --height 128 --width 160
+"""
+import time
+
+import click
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from beatbrain.models.mnist import BasicConv2d, Inception
+from beatbrain.models.precision import autocast
+
+
+def make_stack():
+    return nn.Sequential(
+        BasicConv2d(1, 64, kernel_size=3, padding=1),
+        Inception(64, pool_features=32),
+        nn.MaxPool2d(2),
+        Inception(256, pool_features=64),
+        nn.MaxPool2d(2),
+        Inception(288, pool_features=64),
+    )
+
+
+def samples_per_sec(model, x, dtype, steps):
+    optimizer = torch.optim.SGD(model.parameters(), lr=1e-3)
+
+    def step():
+        optimizer.zero_grad()
+        with autocast(dtype):
+            out = model(x)
+        loss = F.mse_loss(out.float(), torch.zeros_like(out, dtype=torch.float32))
+        loss.backward()
+        optimizer.step()
+
+    step()  # Warm up
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    return steps * len(x) / (time.perf_counter() - start)
+
+
+@click.command()
+@click.option("--batch_size", default=16, show_default=True)
+@click.option("--height", default=128, show_default=True)
+@click.option("--width", default=160, show_default=True)
+@click.option("--steps", default=10, show_default=True)
+def main(batch_size, height, width, steps):
+    modes = [(None, torch.contiguous_format), (None, torch.channels_last)]
+    if hasattr(torch, "autocast"):
+        modes += [
+            (torch.bfloat16, torch.contiguous_format),
+            (torch.bfloat16, torch.channels_last),
+        ]
+    else:
+        print(f"PyTorch {torch.__version__} has no CPU autocast: skipping bfloat16")
+    baseline = None
+    for dtype, memory_format in modes:
+        torch.manual_seed(0)
+        model = make_stack().to(memory_format=memory_format)
+        x = torch.randn(batch_size, 1, height, width).contiguous(
+            memory_format=memory_format
+        )
+        throughput = samples_per_sec(model, x, dtype, steps)
+        baseline = baseline or throughput
+        name = f"{'bf16' if dtype else 'fp32'} + {'channels_last' if memory_format == torch.channels_last else 'contiguous'}"
+        print(
+            f"{name:>22}: {throughput:8.1f} samples/sec ({throughput / baseline:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
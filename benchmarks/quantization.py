@@ -0,0 +1,78 @@
+"""
+Compares bulk-generation throughput and output quality of float32 decoders against their int8-quantized copies.
+
+Decoders benchmarked:
+    - "mnist": The `MNISTAutoencoder` decoder (from a config and optional checkpoint)
+    - "spectrogram": A wider conv/upsampling stack decoding to 128x160 spectrograms
+
+Usage: python benchmarks/quantization.py -c config.yaml -w weights.ckpt --num_samples 1000 --batch_size 100
+"""
+import click
+import torch
+import torch.nn as nn
+
+from beatbrain.generator.quantization import MODES, compare_decoders, quantize_decoder
+from beatbrain.helpers import load_model
+from beatbrain.utils.config import get_default_config
+
+
+def make_spectrogram_decoder(latent_channels=32):
+    layers, channels = [], latent_channels
+    for out_channels in [256, 128, 64, 32]:
+        layers += [
+            nn.UpsamplingNearest2d(scale_factor=2),
+            nn.Conv2d(channels, out_channels, 3, padding=1),
+            nn.BatchNorm2d(out_channels),
+            nn.ReLU(),
+        ]
+        channels = out_channels
+    return nn.Sequential(
+        *layers, nn.Conv2d(channels, 1, 3, padding=1), nn.Sigmoid()
+    ).eval()
+
+
+@click.command()
+@click.option(
+    "-c",
+    "--config",
+    help="Model config for the MNIST decoder (defaults to the default config)",
+)
+@click.option(
+    "-w", "--weights_path", help="Checkpoint to load the MNIST decoder's weights from"
+)
+@click.option("--num_samples", default=1000, show_default=True)
+@click.option("--batch_size", default=100, show_default=True)
+@click.option("--repeats", default=3, show_default=True)
+def main(config, weights_path, num_samples, batch_size, repeats):
+    torch.manual_seed(0)
+    if config is None:
+        config = get_default_config()
+        config.hparams.data_root = None
+    model = load_model(config, weights_path=weights_path)
+    decoders = {
+        "mnist": (model.decoder, (model.latent_dim, 4, 4)),
+        "spectrogram": (make_spectrogram_decoder(), (32, 8, 10)),
+    }
+    for name, (decoder, latent_shape) in decoders.items():
+        # Calibrate on a held-out batch, separate from the latents being measured
+        calibration = torch.randn(256, *latent_shape)
+        latents = torch.randn(num_samples, *latent_shape)
+        print(f"{name} decoder, latents of shape {latent_shape}:")
+        # Dynamic quantization only covers linear layers, and rejects decoders without any
+        has_linear = any(isinstance(m, nn.Linear) for m in decoder.modules())
+        for mode in MODES if has_linear else ["static"]:
+            quantized = quantize_decoder(
+                decoder, mode=mode, calibration_data=calibration
+            )
+            report = compare_decoders(
+                decoder, quantized, latents, batch_size=batch_size, repeats=repeats
+            )
+            print(
+                f"  {mode:>8}: {report['float32_samples_per_sec']:9.1f} -> {report['int8_samples_per_sec']:9.1f} samples/sec "
+                f"({report['speedup']:.2f}x), MSE vs float32 {report['mse_vs_float32']:.2e}, "
+                f"NCC vs float32 {report['ncc_vs_float32']:.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
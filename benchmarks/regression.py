@@ -0,0 +1,113 @@
+"""
+Runs the benchmark suite (`benchmarks/test_*.py`, requires `pytest-benchmark`) and saves the results as a named baseline,
+or compares them against a saved baseline and fails if any benchmark slowed down by more than a given percentage.
+
+Baselines are stored per machine/interpreter in `.benchmarks/`, so only compare runs from the same machine.
+
+Usage:
+    python benchmarks/regression.py save --name main
+    python benchmarks/regression.py check --baseline main --max_slowdown 20 --stat median
+"""
+import sys
+from pathlib import Path
+
+import click
+import pytest
+
+BENCHMARKS_DIR = Path(__file__).parent
+STORAGE = BENCHMARKS_DIR.parent / ".benchmarks"
+STATS = ["min", "max", "mean", "median"]
+
+
+def run_suite(*args, select=None):
+    """
+    Run the benchmark suite with pytest, passing `args` through to pytest-benchmark.
+    """
+    args = [
+        str(BENCHMARKS_DIR),
+        "--no-cov",
+        "-p",
+        "no:cacheprovider",
+        "--benchmark-only",
+        f"--benchmark-storage={STORAGE}",
+        "--benchmark-columns=min,median,mean,stddev,rounds",
+        *(["-k", select] if select else []),
+        *args,
+    ]
+    return pytest.main(args)
+
+
+def find_baseline(name):
+    """
+    Returns:
+        str: The ID of the most recent run saved under `name` (e.g. "0003_main")
+    """
+    runs = sorted(STORAGE.rglob(f"*_{name}.json"), key=lambda path: path.stem)
+    if not runs:
+        raise click.ClickException(
+            f"No saved baseline named '{name}' in {STORAGE}. Create one with `save --name {name}`"
+        )
+    return runs[-1].stem
+
+
+@click.group()
+def main():
+    pass
+
+
+@main.command(short_help="Run the suite and save the results as a baseline")
+@click.option(
+    "--name",
+    default="baseline",
+    show_default=True,
+    help="Name to save the results under",
+)
+@click.option(
+    "-k", "select", help="Only run benchmarks matching this pytest expression"
+)
+def save(name, select):
+    sys.exit(run_suite(f"--benchmark-save={name}", select=select))
+
+
+@main.command(short_help="Run the suite and compare against a baseline")
+@click.option(
+    "--baseline",
+    default="baseline",
+    show_default=True,
+    help="Name of the baseline to compare against",
+)
+@click.option(
+    "--max_slowdown",
+    type=click.IntRange(1, 99),
+    default=20,
+    show_default=True,
+    help="Maximum allowed slowdown (in percent)",
+)
+@click.option(
+    "--stat",
+    type=click.Choice(STATS),
+    default="median",
+    show_default=True,
+    help="The statistic to compare",
+)
+@click.option(
+    "-k", "select", help="Only run benchmarks matching this pytest expression"
+)
+def check(baseline, max_slowdown, stat, select):
+    from pytest_benchmark.session import PerformanceRegression
+
+    try:
+        exit_code = run_suite(
+            f"--benchmark-compare={find_baseline(baseline)}",
+            f"--benchmark-compare-fail={stat}:{max_slowdown}%",
+            select=select,
+        )
+    except PerformanceRegression:
+        raise click.ClickException(
+            f"Benchmarks regressed by more than {max_slowdown}% ({stat}) relative to '{baseline}'"
+        )
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Measures the throughput and peak memory of generating samples to disk with `helpers.sample_to_disk()` (i.e.
+`beatbrain models sample`) for increasing numbers of samples, to check that memory use doesn't grow with them.
+
+Each run happens in a fresh process, so that its peak resident set size (RSS) isn't hidden by an earlier run's.
+The model is randomly initialized from the config (decoding cost doesn't depend on the weights).
+
+Usage: python benchmarks/sampling.py -c configs/synthetic_audio.yaml -n 1000 -n 10000 -n 100000 --batch_size 256
+"""
+import time
+import tempfile
+import multiprocessing
+
+import click
+
+from beatbrain.helpers import sample_to_disk
+from beatbrain.utils import memory
+
+
+def run(config, num_samples, batch_size, audio_format, num_workers):
+    with tempfile.TemporaryDirectory() as output:
+        start = time.perf_counter()
+        sample_to_disk(
+            config,
+            output,
+            num_samples,
+            batch_size=batch_size,
+            audio_format=audio_format,
+            num_workers=num_workers,
+        )
+        elapsed = time.perf_counter() - start
+    return {"samples_per_sec": num_samples / elapsed, "peak_rss": memory.peak_rss()}
+
+
+@click.command()
+@click.option(
+    "-c",
+    "--config",
+    default="configs/synthetic_audio.yaml",
+    show_default=True,
+    help="Path to config YAML file",
+)
+@click.option(
+    "-n",
+    "--num_samples",
+    type=int,
+    multiple=True,
+    default=[1000, 10000, 100000],
+    show_default=True,
+)
+@click.option("--batch_size", default=256, show_default=True)
+@click.option(
+    "--audio_format",
+    type=click.Choice(["wav", "flac", "ogg"]),
+    help="Also invert samples to audio",
+)
+@click.option("--num_workers", type=int, help="Number of audio inversion processes")
+def main(config, num_samples, batch_size, audio_format, num_workers):
+    context = multiprocessing.get_context("spawn")
+    print(f"{'samples':>10}{'samples/sec':>14}{'peak RSS (MB)':>16}")
+    for n in num_samples:
+        with context.Pool(1) as pool:
+            result = pool.apply(run, (config, n, batch_size, audio_format, num_workers))
+        print(
+            f"{n:>10}{result['samples_per_sec']:>14.0f}{result['peak_rss'] / 1024 ** 2:>16.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
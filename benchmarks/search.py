@@ -0,0 +1,93 @@
+"""
+Measures queries/sec of exact and IVF latent search, and the recall@k of IVF search relative to exact search,
+on synthetic clustered latents stored in a memory-mapped array.
+
+Usage: python benchmarks/search.py --num_latents 200000 --dim 48 --num_queries 500 -k 10 -p 1 -p 4 -p 16
+"""
+import time
+import tempfile
+from pathlib import Path
+
+import click
+import numpy as np
+
+from beatbrain.index import ExactIndex, IVFIndex
+
+
+def make_latents(path, num_latents, dim, num_clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dim)).astype(np.float32)
+    latents = np.lib.format.open_memmap(
+        str(path), mode="w+", dtype=np.float32, shape=(num_latents, dim)
+    )
+    for i in range(0, num_latents, 65536):
+        n = len(latents[i : i + 65536])
+        latents[i : i + n] = centers[
+            rng.integers(0, num_clusters, n)
+        ] + 0.5 * rng.normal(size=(n, dim))
+    latents.flush()
+    return np.load(str(path), mmap_mode="r")
+
+
+def recall_at_k(indices, exact_indices):
+    k = exact_indices.shape[1]
+    return np.mean([len(set(a) & set(b)) / k for a, b in zip(indices, exact_indices)])
+
+
+@click.command()
+@click.option("--num_latents", default=200000, show_default=True)
+@click.option("--dim", default=48, show_default=True)
+@click.option(
+    "--num_clusters",
+    default=500,
+    show_default=True,
+    help="Number of clusters in the synthetic data",
+)
+@click.option("--num_queries", default=500, show_default=True)
+@click.option("-k", default=10, show_default=True)
+@click.option(
+    "--metric", type=click.Choice(["cosine", "l2"]), default="cosine", show_default=True
+)
+@click.option(
+    "--num_lists", type=int, help="Number of IVF clusters (defaults to 4 * sqrt(N))"
+)
+@click.option(
+    "-p",
+    "--num_probes",
+    multiple=True,
+    type=int,
+    default=[1, 4, 16, 64],
+    show_default=True,
+)
+def main(num_latents, dim, num_clusters, num_queries, k, metric, num_lists, num_probes):
+    with tempfile.TemporaryDirectory() as tmp:
+        latents = make_latents(
+            Path(tmp) / "latents.npy", num_latents, dim, num_clusters
+        )
+        rng = np.random.default_rng(1)
+        queries = latents[
+            np.sort(rng.choice(num_latents, num_queries, replace=False))
+        ] + 0.1 * rng.normal(size=(num_queries, dim))
+
+        start = time.perf_counter()
+        exact_distances, exact_indices = ExactIndex(latents, metric=metric).search(
+            queries, k=k
+        )
+        print(f"exact: {num_queries / (time.perf_counter() - start):9.1f} queries/sec")
+
+        start = time.perf_counter()
+        ivf = IVFIndex.build(latents, metric=metric, num_lists=num_lists)
+        print(
+            f"IVF index with {ivf.num_lists} lists built in {time.perf_counter() - start:.1f}s"
+        )
+        for probes in num_probes:
+            start = time.perf_counter()
+            distances, indices = ivf.search(queries, k=k, num_probes=probes)
+            qps = num_queries / (time.perf_counter() - start)
+            print(
+                f"ivf, {probes:>3} probes: {qps:9.1f} queries/sec, recall@{k} {recall_at_k(indices, exact_indices):.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
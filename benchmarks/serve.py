@@ -0,0 +1,142 @@
+"""
+Load generator for `beatbrain serve`: sends concurrent single-sample generation requests and reports
+p50/p99 latency and throughput at each concurrency level.
+
+Without `--port`/`--socket`, servers are started in-process (with a model from `--config`), with and without micro-batching.
+
+Usage: python benchmarks/serve.py --port 8080 -n 16 -n 64 --requests 500
+"""
+import time
+import threading
+
+import click
+import numpy as np
+
+from beatbrain.generator.serving import GenerationClient, GenerationServer
+from beatbrain.helpers.serve import get_decode_fn
+from beatbrain.utils.config import get_default_config
+
+
+def run_load(concurrency, num_requests, num_samples, port=None, socket_path=None):
+    latencies = []
+    lock = threading.Lock()
+    per_client = max(1, num_requests // concurrency)
+
+    def worker():
+        client = GenerationClient(port=port, socket_path=socket_path)
+        client.sample(num_samples)  # Connect before timing
+        client_latencies = []
+        barrier.wait()
+        for _ in range(per_client):
+            start = time.perf_counter()
+            client.sample(num_samples)
+            client_latencies.append(time.perf_counter() - start)
+        client.close()
+        with lock:
+            latencies.extend(client_latencies)
+
+    barrier = threading.Barrier(concurrency + 1)
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return {
+        "p50_ms": np.percentile(latencies, 50),
+        "p99_ms": np.percentile(latencies, 99),
+        "requests_per_sec": len(latencies) / elapsed,
+    }
+
+
+def report(
+    name, concurrency_levels, num_requests, num_samples, port=None, socket_path=None
+):
+    print(name)
+    for concurrency in concurrency_levels:
+        stats = run_load(
+            concurrency, num_requests, num_samples, port=port, socket_path=socket_path
+        )
+        print(
+            f"  concurrency {concurrency:>3}: p50 {stats['p50_ms']:7.2f}ms, p99 {stats['p99_ms']:7.2f}ms, "
+            f"{stats['requests_per_sec']:8.1f} requests/sec"
+        )
+
+
+@click.command()
+@click.option("--port", type=int, help="Port of a running server")
+@click.option("--socket", "socket_path", help="Unix socket of a running server")
+@click.option(
+    "-c",
+    "--config",
+    help="Model config for in-process servers (defaults to the default config)",
+)
+@click.option("-w", "--weights_path", help="Checkpoint for in-process servers")
+@click.option(
+    "-n",
+    "--concurrency",
+    multiple=True,
+    type=int,
+    default=[1, 4, 16, 64],
+    show_default=True,
+)
+@click.option(
+    "--requests",
+    "num_requests",
+    default=512,
+    show_default=True,
+    help="Number of requests per concurrency level",
+)
+@click.option(
+    "--num_samples", default=1, show_default=True, help="Number of samples per request"
+)
+@click.option("--max_batch_size", default=64, show_default=True)
+@click.option("--max_latency_ms", default=2.0, show_default=True)
+def main(
+    port,
+    socket_path,
+    config,
+    weights_path,
+    concurrency,
+    num_requests,
+    num_samples,
+    max_batch_size,
+    max_latency_ms,
+):
+    if port or socket_path:
+        return report(
+            "server",
+            concurrency,
+            num_requests,
+            num_samples,
+            port=port,
+            socket_path=socket_path,
+        )
+    if config is None:
+        config = get_default_config()
+        config.hparams.data_root = None
+    decode_fn, latent_shape = get_decode_fn(config, weights_path=weights_path)
+    for name, batch_size in [
+        ("no batching", 1),
+        (f"micro-batching (up to {max_batch_size})", max_batch_size),
+    ]:
+        server = GenerationServer(
+            decode_fn,
+            latent_shape,
+            max_batch_size=batch_size,
+            max_latency=max_latency_ms / 1000,
+        )
+        httpd = server.start(port=0)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        report(name, concurrency, num_requests, num_samples, port=server.port)
+        print(f"  {server.health()}")
+        server.shutdown()
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Measures how much data loading compute `AudioClipDataset(min_level=...)` saves by excluding quiet segments, on a corpus
+of synthetic tracks with silent intros and outros, quiet gaps and a few silent (e.g. hidden-track padding) files.
+
+Reports the extra time spent measuring segment levels while scanning (once, then cached), the time spent loading an
+epoch of `SpectrogramClipDataset` segments with and without filtering, and the fraction of that time saved.
+
+Usage: python benchmarks/silence_filtering.py --num_files 40 --duration 30 --min_level -60
+"""
+import time
+import tempfile
+from pathlib import Path
+
+import click
+import numpy as np
+import soundfile as sf
+
+from beatbrain.datasets import SpectrogramClipDataset
+from beatbrain.utils.synth import synthesize_audio
+
+
+def make_corpus(root, num_files, duration, sample_rate, seed=0):
+    """
+    Write tracks of synthetic music with silent intros/outros and gaps (each up to a few seconds long), where every
+    tenth track is entirely silent
+    """
+    rng = np.random.default_rng(seed)
+    for i in range(num_files):
+        num_samples = int(duration * sample_rate)
+        if i % 10 == 9:
+            audio = np.zeros((num_samples, 2), np.float32)
+        else:
+            audio = synthesize_audio(duration, sample_rate, channels=2, rng=rng)
+            intro, outro = rng.uniform(0, 4, 2) * sample_rate
+            audio[: int(intro)] = 0
+            audio[num_samples - int(outro) :] = 0
+            for _ in range(rng.integers(0, 3)):
+                start, length = int(rng.uniform(0, num_samples)), int(
+                    rng.uniform(1, 4) * sample_rate
+                )
+                audio[start : start + length] *= 1e-4
+        sf.write(str(Path(root, f"{i}.flac")), audio, sample_rate)
+
+
+def load_epoch(dataset):
+    start = time.perf_counter()
+    for i in range(len(dataset)):
+        dataset[i]
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option("--num_files", default=40, show_default=True)
+@click.option(
+    "--duration",
+    default=30.0,
+    show_default=True,
+    help="Duration (in seconds) of each track",
+)
+@click.option("--sample_rate", default=22050, show_default=True)
+@click.option("--segment_length", default=2.0, show_default=True)
+@click.option(
+    "--min_level",
+    default=-60.0,
+    show_default=True,
+    help="Segments quieter than this (in dBFS) are excluded",
+)
+def main(num_files, duration, sample_rate, segment_length, min_level):
+    options = dict(
+        max_segment_length=segment_length,
+        min_segment_length=segment_length,
+        sample_rate=16000,
+        n_fft=1024,
+        hop_length=256,
+        n_mels=128,
+    )
+    with tempfile.TemporaryDirectory() as root:
+        audio_dir, cache = Path(root, "audio"), Path(root, "levels.npz")
+        audio_dir.mkdir()
+        make_corpus(audio_dir, num_files, duration, sample_rate)
+
+        start = time.perf_counter()
+        unfiltered = SpectrogramClipDataset(audio_dir, **options)
+        scan_time = time.perf_counter() - start
+        start = time.perf_counter()
+        filtered = SpectrogramClipDataset(
+            audio_dir, min_level=min_level, level_cache=cache, **options
+        )
+        level_scan_time = time.perf_counter() - start
+        start = time.perf_counter()
+        SpectrogramClipDataset(
+            audio_dir, min_level=min_level, level_cache=cache, **options
+        )
+        cached_scan_time = time.perf_counter() - start
+
+        unfiltered_time, filtered_time = load_epoch(unfiltered), load_epoch(filtered)
+
+    saved = unfiltered_time - filtered_time
+    print(
+        f"Segments: {len(filtered)} of {len(unfiltered)} kept ({1 - len(filtered) / len(unfiltered):.1%} quieter than {min_level} dBFS)"
+    )
+    print(
+        f"Scan: {scan_time:.2f}s without levels, {level_scan_time:.2f}s measuring levels, {cached_scan_time:.2f}s with cached levels"
+    )
+    print(
+        f"Epoch: {unfiltered_time:.2f}s unfiltered, {filtered_time:.2f}s filtered ({saved / unfiltered_time:.1%} saved)"
+    )
+    print(
+        f"Measuring levels costs {(level_scan_time - scan_time) / unfiltered_time:.1%} of an unfiltered epoch, once"
+    )
+
+
+if __name__ == "__main__":
+    main()
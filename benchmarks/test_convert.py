@@ -0,0 +1,21 @@
+"""
+Benchmarks for `beatbrain convert audio`.
+
+Usage: pytest benchmarks/test_convert.py --no-cov
+"""
+import itertools
+
+import pytest
+
+from beatbrain.utils.data import convert_audio
+
+
+@pytest.mark.parametrize("split", [False, True], ids=["whole", "split"])
+def test_convert_audio(benchmark, audio_dir, tmp_path, split):
+    # Convert into a fresh directory every round
+    outputs = (tmp_path / str(i) for i in itertools.count())
+    benchmark.pedantic(
+        lambda: convert_audio(audio_dir, next(outputs), format="flac", split=split),
+        rounds=3,
+    )
+    assert len(list((tmp_path / "0").rglob("*.flac"))) >= 16
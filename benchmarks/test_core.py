@@ -0,0 +1,43 @@
+"""
+Benchmarks for the spectrogram and array utilities in `beatbrain.utils.core`.
+
+Usage: pytest benchmarks/test_core.py --no-cov
+"""
+import numpy as np
+import pytest
+
+from beatbrain.utils import core
+
+from conftest import SAMPLE_RATE
+
+
+def test_audio_to_spectrogram(benchmark, audio):
+    spec = benchmark(core.audio_to_spectrogram, audio, normalize=True, sr=SAMPLE_RATE)
+    assert spec.shape[0] == 128
+
+
+def test_spectrogram_to_audio(benchmark, short_audio):
+    spec = core.audio_to_spectrogram(short_audio, sr=SAMPLE_RATE)
+    audio = benchmark.pedantic(
+        core.spectrogram_to_audio, args=(spec,), kwargs={"sr": SAMPLE_RATE}, rounds=3
+    )
+    assert len(audio) > 0
+
+
+def test_split_spectrogram(benchmark, spectrogram):
+    chunks = benchmark(core.split_spectrogram, spectrogram, 64)
+    assert all(chunk.shape[1] == 64 for chunk in chunks)
+
+
+@pytest.mark.parametrize("compress", [True, False], ids=["compressed", "uncompressed"])
+def test_save_arrays(benchmark, tmp_path, spectrogram, compress):
+    chunks = core.split_spectrogram(spectrogram, 64)
+    benchmark(core.save_arrays, chunks, tmp_path / "chunks.npz", compress=compress)
+
+
+@pytest.mark.parametrize("compress", [True, False], ids=["compressed", "uncompressed"])
+def test_load_arrays(benchmark, tmp_path, spectrogram, compress):
+    chunks = core.split_spectrogram(spectrogram, 64)
+    core.save_arrays(chunks, tmp_path / "chunks.npz", compress=compress)
+    loaded = benchmark(core.load_arrays, str(tmp_path / "chunks.npz"), concatenate=True)
+    np.testing.assert_array_equal(loaded, np.concatenate(chunks, axis=1))
@@ -0,0 +1,30 @@
+"""
+Benchmarks for scanning and indexing audio datasets.
+
+Usage: pytest benchmarks/test_datasets.py --no-cov
+"""
+import itertools
+
+import pytest
+
+from beatbrain.datasets import AudioClipDataset, SpectrogramClipDataset
+
+
+def test_scan(benchmark, audio_dir):
+    dataset = benchmark(AudioClipDataset, audio_dir)
+    assert len(dataset.paths) == 16
+
+
+@pytest.mark.parametrize("sample_rate", [None, 22050], ids=["native", "resampled"])
+def test_getitem(benchmark, audio_dir, sample_rate):
+    dataset = AudioClipDataset(audio_dir, sample_rate=sample_rate)
+    indices = itertools.cycle(range(len(dataset)))
+    audio, sr = benchmark(lambda: dataset[next(indices)])
+    assert audio.shape[0] == 1
+
+
+def test_spectrogram_getitem(benchmark, audio_dir):
+    dataset = SpectrogramClipDataset(audio_dir, max_segment_length=2, n_frames=64)
+    indices = itertools.cycle(range(len(dataset)))
+    spec, sr = benchmark(lambda: dataset[next(indices)])
+    assert spec.shape == (1, 128, 64)
@@ -0,0 +1,132 @@
+"""
+Compares the per-step cost (forward and backward) of the VAE reparameterization and loss functions in
+`beatbrain.generator.helpers` against the formulas they replace, on spectrogram-sized batches.
+
+Reference formulas:
+    - reparameterize: `eps * exp(0.5 * logvar) + mean`, as separate kernels
+    - kl: the single-sample estimate `log_normal_pdf(z, mean, logvar) - log_normal_pdf(z, 0, 0)` (the old `KLLoss`)
+    - reconstruction: sigmoid, squared error, mean over channels, sum over pixels, mean over the batch (the old `ReconstructionLoss`)
+
+Usage: python benchmarks/vae_losses.py --batch_size 8 --height 512 --width 640 --repeats 50
+"""
+import math
+import time
+
+import click
+import torch
+
+from beatbrain.generator import helpers
+
+
+def reference_reparameterize(mean, logvar, eps):
+    return eps * torch.exp(0.5 * logvar) + mean
+
+
+def reference_log_normal_pdf(sample, mean, logvar):
+    return torch.sum(
+        -0.5
+        * ((sample - mean) ** 2 * torch.exp(-logvar) + logvar + math.log(2 * math.pi)),
+        dim=1,
+    )
+
+
+def reference_kl(z, mean, logvar):
+    zeros = torch.zeros_like(z)
+    return (
+        (
+            reference_log_normal_pdf(z, mean, logvar)
+            - reference_log_normal_pdf(z, zeros, zeros)
+        )
+        .flatten(1)
+        .sum(1)
+        .mean()
+    )
+
+
+def reference_reconstruction(logits, target):
+    return ((torch.sigmoid(logits) - target) ** 2).mean(1).flatten(1).sum(1).mean()
+
+
+def time_step(fn, inputs, repeats, warmup=3):
+    """
+    The median time (in milliseconds) of a forward and backward pass of `fn(*inputs)`
+    """
+    times = []
+    for i in range(warmup + repeats):
+        start = time.perf_counter()
+        fn(*inputs).backward()
+        if i >= warmup:
+            times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2] * 1e3
+
+
+@click.command()
+@click.option("--batch_size", default=8, show_default=True)
+@click.option("--height", default=512, show_default=True)
+@click.option("--width", default=640, show_default=True)
+@click.option("--latent_channels", default=64, show_default=True)
+@click.option(
+    "--downsampling",
+    default=32,
+    show_default=True,
+    help="Spatial downsampling from spectrogram to latent",
+)
+@click.option("--repeats", default=50, show_default=True)
+@click.option(
+    "--threads",
+    type=int,
+    help="Number of intra-op threads (defaults to torch's default)",
+)
+def main(batch_size, height, width, latent_channels, downsampling, repeats, threads):
+    if threads:
+        torch.set_num_threads(threads)
+    torch.manual_seed(0)
+    latent_shape = (
+        batch_size,
+        latent_channels,
+        height // downsampling,
+        width // downsampling,
+    )
+    mean = torch.randn(latent_shape, requires_grad=True)
+    logvar = (0.1 * torch.randn(latent_shape)).requires_grad_()
+    eps = torch.randn(latent_shape)
+    logits = torch.randn(batch_size, 1, height, width, requires_grad=True)
+    target = torch.rand(batch_size, 1, height, width)
+
+    benchmarks = {
+        "reparameterize": (
+            lambda m, lv: reference_reparameterize(m, lv, eps).sum(),
+            lambda m, lv: helpers.reparameterize(m, lv, eps=eps).sum(),
+            (mean, logvar),
+        ),
+        "kl": (
+            lambda m, lv: reference_kl(reference_reparameterize(m, lv, eps), m, lv),
+            lambda m, lv: helpers.kl_divergence(m, lv),
+            (mean, logvar),
+        ),
+        "reconstruction": (
+            reference_reconstruction,
+            lambda x, y: helpers.reconstruction_loss(x, y, logits=True),
+            (logits, target),
+        ),
+    }
+    print(
+        f"Latents {tuple(latent_shape)}, spectrograms {(batch_size, 1, height, width)}, {torch.get_num_threads()} threads"
+    )
+    print(f"{'':<16}{'reference (ms)':>16}{'fused (ms)':>12}{'speedup':>9}")
+    total_reference = total_fused = 0
+    for name, (reference, fused, inputs) in benchmarks.items():
+        reference_time = time_step(reference, inputs, repeats)
+        fused_time = time_step(fused, inputs, repeats)
+        total_reference += reference_time
+        total_fused += fused_time
+        print(
+            f"{name:<16}{reference_time:>16.2f}{fused_time:>12.2f}{reference_time / fused_time:>8.2f}x"
+        )
+    print(
+        f"{'total':<16}{total_reference:>16.2f}{total_fused:>12.2f}{total_reference / total_fused:>8.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Measures how visualizing a `SpectrogramCVAE`'s outputs every few batches affects its training step time, when the
+model calls and rendering run inline on the training thread, when only rendering runs in `VisualizationCallback`'s
+background processes, and when both do.
+
+Step times are measured by a `ThroughputMonitor`, and include the time spent in the visualization callback. The time
+each visualization blocks the training thread for is reported separately: with a single CPU core, the background
+processes compete with training for it, so step times only benefit from offloading when there are cores to spare.
+
+Usage: python benchmarks/visualization.py --batch_size 4 --n_mels 128 --n_frames 160 --steps 40 --every 1 --every 5
+"""
+
+import time
+import tempfile
+
+import click
+import matplotlib
+import numpy as np
+import pytorch_lightning as pl
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from beatbrain.callbacks import ThroughputMonitor, VisualizationCallback
+from beatbrain.models import SpectrogramCVAE
+from beatbrain.utils.config import Config
+
+
+class InlineResult:
+    def __init__(self, value):
+        self.value = value
+
+    def ready(self):
+        return True
+
+    def get(self):
+        return self.value
+
+
+class InlinePool:
+    """
+    Runs submitted functions immediately, on the calling thread
+    """
+
+    def apply_async(self, fn, args=(), kwds=None):
+        return InlineResult(fn(*args, **(kwds or {})))
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+
+class InlineVisualizationCallback(VisualizationCallback):
+    def on_train_start(self, trainer, pl_module):
+        super().on_train_start(trainer, pl_module)
+        self._pool.terminate()
+        self._pool = InlinePool()
+        self._offload_model = False
+
+
+class InlineModelVisualizationCallback(VisualizationCallback):
+    def on_train_start(self, trainer, pl_module):
+        super().on_train_start(trainer, pl_module)
+        self._offload_model = False
+
+
+def timed(method, times):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        method(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+
+    return wrapper
+
+
+def run(hparams, batch_size, steps, callback):
+    torch.manual_seed(0)
+    blocking_times = []
+    if callback:
+        callback.visualize = timed(callback.visualize, blocking_times)
+    model = SpectrogramCVAE(Config(hparams))
+    data = TensorDataset(
+        torch.rand(batch_size * steps, *model.input_shape),
+        torch.zeros(batch_size * steps),
+    )
+    val_data = TensorDataset(
+        torch.rand(batch_size, *model.input_shape), torch.zeros(batch_size)
+    )
+    monitor = ThroughputMonitor(log_every_n_steps=steps)
+    with tempfile.TemporaryDirectory() as root:
+        trainer = pl.Trainer(
+            max_epochs=1,
+            callbacks=(
+                [callback, monitor] if callback else [monitor]
+            ),  # So that step times include the visualization
+            logger=False,
+            checkpoint_callback=False,
+            weights_summary=None,
+            progress_bar_refresh_rate=0,
+            num_sanity_val_steps=0,
+            default_root_dir=root,
+        )
+        trainer.fit(
+            model,
+            DataLoader(data, batch_size=batch_size),
+            DataLoader(val_data, batch_size=batch_size),
+        )
+    step_times = np.array(monitor.times["step"][1:]) * 1e3
+    blocking_time = np.mean(blocking_times) * 1e3 if blocking_times else 0.0
+    return np.median(step_times), np.percentile(step_times, 99), blocking_time
+
+
+@click.command()
+@click.option("--batch_size", default=4, show_default=True)
+@click.option("--n_mels", default=128, show_default=True)
+@click.option("--n_frames", default=160, show_default=True)
+@click.option("--steps", default=40, show_default=True)
+@click.option(
+    "--every",
+    type=int,
+    multiple=True,
+    default=[1, 5],
+    show_default=True,
+    help="Visualization frequencies (in batches) to compare",
+)
+@click.option("--num_examples", default=4, show_default=True)
+@click.option(
+    "--spectrograms/--no-spectrograms",
+    default=True,
+    show_default=True,
+    help="Whether to draw spectrogram figures",
+)
+def main(batch_size, n_mels, n_frames, steps, every, num_examples, spectrograms):
+    matplotlib.use("Agg")
+    hparams = {
+        "latent_dim": 32,
+        "channels": [16, 32, 64, 64, 64],
+        "spec": {"n_mels": n_mels, "n_frames": n_frames},
+    }
+    options = {
+        "num_examples": num_examples,
+        "spectrograms": spectrograms,
+        "raw_format": "tiff",
+    }
+    print(
+        f"SpectrogramCVAE, batch of {batch_size} x (1, {n_mels}, {n_frames}), {steps} steps"
+    )
+    print(
+        f"{'visualization (offloaded)':<32}{'median step (ms)':>18}{'p99 step (ms)':>15}{'blocking (ms)':>15}{'rendered':>10}{'dropped':>9}"
+    )
+    median, p99, _ = run(hparams, batch_size, steps, None)
+    print(f"{'no visualization':<32}{median:>18.1f}{p99:>15.1f}")
+    for frequency in every:
+        modes = [
+            ("nothing", InlineVisualizationCallback),
+            ("rendering", InlineModelVisualizationCallback),
+            ("model+rendering", VisualizationCallback),
+        ]
+        for name, callback_class in modes:
+            callback = callback_class(frequency=frequency, **options)
+            median, p99, blocking = run(hparams, batch_size, steps, callback)
+            label = f"{name}, every {frequency} batches"
+            print(
+                f"{label:<32}{median:>18.1f}{p99:>15.1f}{blocking:>15.1f}{callback.rendered:>10}{callback.dropped:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
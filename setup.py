@@ -11,6 +11,7 @@ dev_requirements = [
     "pytest-cov",
     "codecov",
     "pytest-dotenv",
+    "pytest-benchmark",
 ]
 
 with open("README.md", "r") as fh: